@@ -8,6 +8,12 @@ class ImageApp1Config(AppConfig):
         # Import and call setup_logging here
         from .logger import setup_logging
         setup_logging()
+        # Connect the Document signal handlers that maintain the DailyUsage rollups
+        from . import usage  # noqa: F401
+        # ... and the DocumentContent ones that maintain the DocumentSearchField index
+        from . import search  # noqa: F401
+        # ... and the ones that keep Blob.ref_count in step with Document.blob
+        from . import blob_storage  # noqa: F401
         # You can also set a default logger level for this app here
         # logging.getLogger('ImageExtraction').setLevel(logging.DEBUG)
         # logging.getLogger('ImageApp1').setLevel(logging.DEBUG)
\ No newline at end of file
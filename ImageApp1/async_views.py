@@ -0,0 +1,432 @@
+import json
+import time
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from cryptography.fernet import InvalidToken
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.utils.decorators import classonlymethod
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, ParseError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from ImageExtraction.logger import log_exception
+from .models import Document, ExtractionBatch
+from .ingestion import UploadRejected, ingest_upload
+from .jobs import DEFAULT_POLL_INTERVAL
+from .pipeline import (
+    PipelineError, arender_document_html, arender_html, arun_extraction_pipeline, astream_document_html,
+    astream_extraction_pipeline, get_renderer, parse_reimbursement_response, prepare_model_input,
+    save_reimbursement_document,
+)
+from .prompt import REIMBURSEMENT_VALIDATION_PROMPT
+from .retry_policy import CircuitOpenError
+from .rate_limiter import RateLimitExceeded
+from .vertex_model import acall_gemini_api
+from .views import (
+    BATCH_PROGRESS_TIMEOUT, JOB_FINAL_STATUSES, batch_job_entry, batch_manifest, decrypt_id, encrypt_id, is_truthy,
+)
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'), ensure_ascii=False)}\n\n"
+
+
+def event_stream_response(events) -> StreamingHttpResponse:
+    """
+    Serve (event, data) pairs from an async generator as text/event-stream.
+
+    Document ids are encrypted on the way out. A failure after the response
+    has started can no longer change the status code, so it is sent as an
+    "error" event carrying the status the JSON endpoints would answer with.
+    """
+    async def stream():
+        try:
+            async for event, data in events:
+                if "document_id" in data:
+                    data = {**data, "document_id": encrypt_id(data["document_id"])}
+                yield sse_event(event, data)
+        except PipelineError as e:
+            yield sse_event("error", {"message": e.message, "status": e.status_code})
+        except Exception as e:
+            logger.error(f"Error while streaming events: {str(e)}", exc_info=True)
+            log_exception(logger)
+            yield sse_event("error", {"message": f"An internal server error occurred: {str(e)}", "status": 500})
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # keep nginx from buffering the stream
+    return response
+
+
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of APIView for the model-bound endpoints.
+
+    DRF's APIView dispatch is synchronous, so under ASGI it would pin a
+    thread for the whole model call. These views run on the event loop and
+    only hop to a thread for the JWT lookup, file IO and ORM writes, so a
+    single process can keep hundreds of model calls in flight.
+    """
+
+    authenticator = JWTAuthentication()
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True  # token authenticated, same as the DRF views
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            result = await sync_to_async(self.authenticator.authenticate)(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({"detail": str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+        if result is None:
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided."},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        request.user, request.auth = result
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except ParseError as e:
+            return JsonResponse({"detail": str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @staticmethod
+    def request_data(request):
+        """
+        The request body like DRF's request.data: the decoded object of an
+        application/json body, the form fields otherwise.
+
+        Raises:
+            ParseError: If a JSON body is malformed or not an object
+        """
+        if request.content_type != "application/json":
+            return request.POST
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError as e:
+            raise ParseError(f"JSON parse error - {str(e)}")
+        if not isinstance(data, dict):
+            raise ParseError("JSON body must be an object")
+        return data
+
+
+class AsyncUploadAndProcessFileView(AsyncAPIView):
+    """Runs the extraction pipeline inline and returns the document, without going through the job queue."""
+
+    async def post(self, request):
+        uploaded_file = request.FILES.get("pdf_file")
+        prompt_text = request.POST.get("prompt_text")
+        user_id = request.POST.get("user_id")
+        doc_type = request.POST.get("doc_type")
+        bypass_cache = is_truthy(request.POST.get("bypass_cache", ""))
+        renderer = request.POST.get("renderer") or None
+
+        logger.info("Async upload request received")
+
+        if not uploaded_file:
+            logger.error("Upload failed: 'pdf_file' is missing in the request.")
+            return JsonResponse(
+                {"status": "error", "message": "Missing 'pdf_file'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            renderer = get_renderer(renderer)
+            ingested = await sync_to_async(ingest_upload)(uploaded_file, "uploads/pdf_files", document_type=doc_type)
+            doc = await arun_extraction_pipeline(
+                ingested.relative_path,
+                user_id,
+                doc_type=doc_type,
+                prompt_text=prompt_text,
+                use_cache=not bypass_cache,
+                renderer=renderer,
+                input_digest=ingested.sha256,
+                original_name=ingested.original_name,
+            )
+            return JsonResponse({
+                "status": "success",
+                "message": "File uploaded and processed successfully.",
+                "document_id": encrypt_id(doc.id),
+            }, status=status.HTTP_200_OK)
+
+        except UploadRejected as e:
+            logger.error(f"Upload rejected: {e.message}")
+            return JsonResponse({"status": "error", "message": e.message}, status=e.status_code)
+        except PipelineError as e:
+            return JsonResponse({"status": "error", "message": e.message}, status=e.status_code)
+        except Exception as e:
+            logger.error(f"Error in AsyncUploadAndProcessFileView: {str(e)}", exc_info=True)
+            log_exception(logger)
+            return JsonResponse(
+                {"status": "error", "message": f"An internal server error occurred: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class AsyncStreamUploadView(AsyncAPIView):
+    """
+    Same input as AsyncUploadAndProcessFileView, answered with server-sent
+    events: "stage" events as the pipeline moves on, "json_delta" and
+    "html_delta" events with model output as it is generated, the final
+    "json" and "html", and a "persisted" stage with the document_id.
+    Upload validation errors are still plain JSON responses.
+    """
+
+    async def post(self, request):
+        uploaded_file = request.FILES.get("pdf_file")
+        prompt_text = request.POST.get("prompt_text")
+        user_id = request.POST.get("user_id")
+        doc_type = request.POST.get("doc_type")
+        bypass_cache = is_truthy(request.POST.get("bypass_cache", ""))
+        renderer = request.POST.get("renderer") or None
+
+        logger.info("Streaming upload request received")
+
+        if not uploaded_file:
+            logger.error("Upload failed: 'pdf_file' is missing in the request.")
+            return JsonResponse(
+                {"status": "error", "message": "Missing 'pdf_file'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            renderer = get_renderer(renderer)
+            ingested = await sync_to_async(ingest_upload)(uploaded_file, "uploads/pdf_files", document_type=doc_type)
+        except UploadRejected as e:
+            logger.error(f"Upload rejected: {e.message}")
+            return JsonResponse({"status": "error", "message": e.message}, status=e.status_code)
+        except PipelineError as e:
+            return JsonResponse({"status": "error", "message": e.message}, status=e.status_code)
+
+        async def events():
+            yield "stage", {"stage": "uploaded"}
+            async for event, data in astream_extraction_pipeline(
+                ingested.relative_path,
+                user_id,
+                doc_type=doc_type,
+                prompt_text=prompt_text,
+                use_cache=not bypass_cache,
+                renderer=renderer,
+                input_digest=ingested.sha256,
+                original_name=ingested.original_name,
+            ):
+                yield event, data
+
+        return event_stream_response(events())
+
+
+class AsyncUploadAndValidateReimbursementView(AsyncAPIView):
+
+    async def post(self, request):
+        uploaded_file = request.FILES.get("file")
+        user_id = request.POST.get("user_id")
+        document_id = request.POST.get("document_id")
+        bypass_cache = is_truthy(request.POST.get("bypass_cache", ""))
+        renderer = request.POST.get("renderer") or None
+
+        if not uploaded_file or not user_id:
+            return JsonResponse({"error": "Missing file or user_id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            try:
+                ingested = await sync_to_async(ingest_upload)(
+                    uploaded_file, "uploads/reimbursement", document_type="reimbursement"
+                )
+            except UploadRejected as e:
+                return JsonResponse({"error": e.message}, status=e.status_code)
+
+            # Step 1: Extract JSON
+            try:
+                input_data, input_digest = await sync_to_async(prepare_model_input)(
+                    ingested.absolute_path, ingested.sha256
+                )
+                response = await acall_gemini_api(
+                    prompt_text=REIMBURSEMENT_VALIDATION_PROMPT,
+                    input_data=input_data,
+                    response_mime_type="application/json",
+                    use_cache=not bypass_cache,
+                    input_digest=input_digest
+                )
+            except (RateLimitExceeded, CircuitOpenError) as e:
+                logger.warning(f"Reimbursement extraction not attempted: {e.message}")
+                return JsonResponse({"error": e.message}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            except Exception as e:
+                logger.error(f"Error during reimbursement JSON extraction: {str(e)}", exc_info=True)
+                return JsonResponse(
+                    {"error": f"Error during reimbursement JSON extraction: {str(e)}"},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+
+            try:
+                extracted_json, input_tokens, output_tokens = parse_reimbursement_response(response)
+            except PipelineError as e:
+                return JsonResponse({"error": e.message}, status=e.status_code)
+
+            # Step 2: Convert JSON to HTML
+            try:
+                html_body, html_input_tokens, html_output_tokens = await arender_html(
+                    extracted_json, use_cache=not bypass_cache, renderer=renderer
+                )
+                input_tokens += html_input_tokens
+                output_tokens += html_output_tokens
+            except PipelineError as e:
+                logger.error(f"Error during reimbursement HTML conversion: {e.message}")
+                return JsonResponse(
+                    {"error": f"Error during reimbursement HTML conversion: {e.message}"},
+                    status=e.status_code
+                )
+
+            # Step 3: Save to DB (create or update)
+            try:
+                doc_id = decrypt_id(document_id) if document_id else None
+                doc = await sync_to_async(save_reimbursement_document)(
+                    ingested.relative_path, user_id, extracted_json, html_body, renderer,
+                    input_tokens, output_tokens, doc_id=doc_id, original_name=ingested.original_name
+                )
+            except Document.DoesNotExist:
+                logger.error(f"Document not found for ID {doc_id} and user {user_id}")
+                return JsonResponse({"error": "Document not found for given ID and user"}, status=status.HTTP_404_NOT_FOUND)
+            except InvalidToken:
+                logger.error(f"Invalid encrypted document ID for update: {document_id}")
+                return JsonResponse({"error": "Invalid encrypted document ID for update"}, status=status.HTTP_400_BAD_REQUEST)
+
+            return JsonResponse({
+                "status": "accepted",
+                "message": "Reimbursement claim is valid and saved.",
+                "document_id": encrypt_id(doc.id),
+                "data": extracted_json,
+                "html": html_body
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error(f"An unexpected error occurred in AsyncUploadAndValidateReimbursementView: {str(e)}", exc_info=True)
+            log_exception(logger)
+            return JsonResponse({"error": f"An internal server error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncRenderJsonToHtmlView(AsyncAPIView):
+
+    async def post(self, request):
+        data = self.request_data(request)
+        encrypted_id = data.get("encrypted_doc_id")
+        user_id = data.get("userid")
+        bypass_cache = is_truthy(data.get("bypass_cache", ""))
+        renderer = data.get("renderer")
+
+        if not encrypted_id or not user_id:
+            return JsonResponse({"error": "Missing required fields"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            decrypted_id = decrypt_id(encrypted_id)
+        except InvalidToken:
+            return JsonResponse({"error": "Invalid encrypted ID"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            doc = await Document.objects.select_related('content').aget(id=decrypted_id, userid_id=user_id)
+        except Document.DoesNotExist:
+            return JsonResponse({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            html_body = await arender_document_html(doc, use_cache=not bypass_cache, renderer=renderer)
+            return await sync_to_async(render)(request, 'rendered_html.html', {'html_body': html_body})
+        except PipelineError as e:
+            logger.error(f"Error rendering JSON to HTML: {e.message}")
+            return JsonResponse({"error": f"An error occurred while rendering HTML: {e.message}"}, status=e.status_code)
+        except Exception as e:
+            logger.error(f"Error rendering JSON to HTML: {e}", exc_info=True)
+            log_exception(logger)
+            return JsonResponse(
+                {"error": f"An error occurred while rendering HTML: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class AsyncStreamRenderHtmlView(AsyncAPIView):
+    """AsyncRenderJsonToHtmlView as server-sent events: "html_delta" events, then the final "html"."""
+
+    async def post(self, request):
+        data = self.request_data(request)
+        encrypted_id = data.get("encrypted_doc_id")
+        user_id = data.get("userid")
+        bypass_cache = is_truthy(data.get("bypass_cache", ""))
+        renderer = data.get("renderer")
+
+        if not encrypted_id or not user_id:
+            return JsonResponse({"error": "Missing required fields"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            decrypted_id = decrypt_id(encrypted_id)
+        except InvalidToken:
+            return JsonResponse({"error": "Invalid encrypted ID"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            renderer = get_renderer(renderer)
+            doc = await Document.objects.select_related('content').aget(id=decrypted_id, userid_id=user_id)
+        except PipelineError as e:
+            return JsonResponse({"error": e.message}, status=e.status_code)
+        except Document.DoesNotExist:
+            return JsonResponse({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return event_stream_response(astream_document_html(doc, use_cache=not bypass_cache, renderer=renderer))
+
+
+class AsyncBatchProgressView(AsyncAPIView):
+    """
+    Streams batch progress as NDJSON: one "file" event per input as soon as
+    it is rejected, succeeds or fails, then a "complete" event carrying the
+    full manifest (or "timeout" after BATCH_PROGRESS_TIMEOUT).
+
+    The stream polls the job table from the event loop, so an open stream
+    does not hold a worker thread for the life of the batch.
+    """
+
+    async def get(self, request, batch_id):
+        batches = ExtractionBatch.objects.filter(id=batch_id)
+        # Assuming user.id == 2 is an admin user
+        if request.user.id != 2:
+            batches = batches.filter(userid=request.user)
+        batch = await batches.afirst()
+        if batch is None:
+            return JsonResponse({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        response = StreamingHttpResponse(self.events(batch), content_type="application/x-ndjson")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    @staticmethod
+    async def events(batch: ExtractionBatch):
+        def line(payload):
+            return json.dumps(payload, default=str) + "\n"
+
+        for item in batch.rejected:
+            yield line({"event": "file", "index": item["index"], "file": item["file"],
+                        "status": "rejected", "error": item["error"]})
+
+        reported = set()
+        deadline = time.monotonic() + BATCH_PROGRESS_TIMEOUT
+        while True:
+            finished = batch.jobs.filter(status__in=JOB_FINAL_STATUSES).exclude(id__in=reported).only(
+                'id', 'batch_index', 'source_name', 'status', 'document_id', 'error'
+            ).order_by('finished_at')
+            async for job in finished:
+                reported.add(job.id)
+                yield line({"event": "file", **batch_job_entry(job)})
+
+            if not await batch.jobs.exclude(status__in=JOB_FINAL_STATUSES).aexists():
+                manifest = await sync_to_async(batch_manifest)(batch)
+                yield line({"event": "complete", "manifest": manifest})
+                return
+            if time.monotonic() > deadline:
+                yield line({"event": "timeout", "batch_id": str(batch.id)})
+                return
+            await asyncio.sleep(DEFAULT_POLL_INTERVAL)
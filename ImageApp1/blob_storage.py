@@ -0,0 +1,237 @@
+import os
+import re
+import shutil
+import logging
+import mimetypes
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .extraction_cache import sha256_file
+from .models import Blob, Document, ExtractionJob
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+CONTENT_ADDRESSED_STORAGE = getattr(settings, "CONTENT_ADDRESSED_STORAGE", {})
+ENABLED = CONTENT_ADDRESSED_STORAGE.get("ENABLED", True)
+ROOT = CONTENT_ADDRESSED_STORAGE.get("ROOT", "blobs")  # relative to MEDIA_ROOT
+# Unreferenced blobs younger than this are kept: their upload may still be waiting for its Document
+GC_GRACE_SECONDS = CONTENT_ADDRESSED_STORAGE.get("GC_GRACE_SECONDS", 24 * 60 * 60)
+
+BLOB_NAME = re.compile(r"^([0-9a-f]{64})(\.[a-z0-9]+)?$")
+ACTIVE_JOB_STATUSES = (ExtractionJob.STATUS_QUEUED, ExtractionJob.STATUS_RUNNING)
+
+
+def blob_path(sha256: str, extension: str = "") -> str:
+    """blobs/ab/cd/abcd...ef.pdf: fanned out over two levels so no directory grows huge."""
+    return os.path.join(ROOT, sha256[:2], sha256[2:4], f"{sha256}{extension.lower()}")
+
+
+def blob_id_for_path(relative_path: str) -> Optional[str]:
+    """The SHA-256 a blob path is named after, None for paths outside the blob store."""
+    if not relative_path or not os.path.normpath(relative_path).startswith(os.path.join(ROOT, "")):
+        return None
+    match = BLOB_NAME.match(os.path.basename(relative_path))
+    return match.group(1) if match else None
+
+
+def sidecar_path(relative_path: str) -> str:
+    """Where pipeline.write_sidecar_json puts the extracted JSON of a stored file."""
+    return os.path.splitext(relative_path)[0] + ".json"
+
+
+def store_blob(temp_path: str, sha256: str, size: int, mime_type: str, extension: str) -> Tuple[Blob, bool]:
+    """
+    Move a fully written and hashed temp file into the blob store.
+
+    When a blob with the same content already exists the temp file is
+    removed and the stored one is reused. The Blob row is locked while the
+    file is put in place, so a concurrent collect_garbage cannot delete the
+    file between the existence check and the caller's use of it.
+
+    Returns:
+        tuple: (blob, deduplicated), deduplicated is True when no new file was written
+    """
+    with transaction.atomic():
+        blob, created = Blob.objects.select_for_update().get_or_create(
+            sha256=sha256,
+            defaults={'path': blob_path(sha256, extension), 'size': size, 'mime_type': mime_type},
+        )
+        if not created:
+            Blob.objects.filter(pk=sha256).update(last_used_at=timezone.now())
+
+        final_path = os.path.join(settings.MEDIA_ROOT, blob.path)
+        if os.path.exists(final_path):
+            os.remove(temp_path)
+            return blob, True
+
+        # New content, or a blob row whose file went missing: (re)write it
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(temp_path, final_path)
+        return blob, False
+
+
+def _adjust_ref_count(sha256: Optional[str], delta: int):
+    if sha256:
+        Blob.objects.filter(pk=sha256).update(ref_count=F('ref_count') + delta, last_used_at=timezone.now())
+
+
+def _touches_blob(update_fields) -> bool:
+    return update_fields is None or bool({'blob', 'blob_id'} & set(update_fields))
+
+
+@receiver(pre_save, sender=Document)
+def remember_previous_blob(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._previous_blob_id = None
+    if raw or instance.pk is None or not _touches_blob(update_fields):
+        return
+    instance._previous_blob_id = Document.objects.filter(pk=instance.pk).values_list('blob_id', flat=True).first()
+
+
+@receiver(post_save, sender=Document)
+def update_blob_refs_on_save(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        _adjust_ref_count(instance.blob_id, 1)
+        return
+    if not _touches_blob(update_fields):
+        return
+    previous = getattr(instance, '_previous_blob_id', None)
+    if previous != instance.blob_id:
+        _adjust_ref_count(previous, -1)
+        _adjust_ref_count(instance.blob_id, 1)
+
+
+@receiver(post_delete, sender=Document)
+def update_blob_refs_on_delete(sender, instance, **kwargs):
+    _adjust_ref_count(instance.blob_id, -1)
+
+
+def recount_blob_refs() -> int:
+    """
+    Recompute every ref_count from Document, repairing writes that bypass
+    signals (bulk_create, queryset.update, raw SQL).
+
+    Returns:
+        int: Number of blobs whose count changed
+    """
+    fixed = 0
+    for sha256, ref_count in Blob.objects.values_list('sha256', 'ref_count').iterator():
+        actual = Document.objects.filter(blob_id=sha256).count()
+        if actual != ref_count:
+            Blob.objects.filter(pk=sha256).update(ref_count=actual)
+            fixed += 1
+    return fixed
+
+
+def _remove_file(relative_path: str) -> int:
+    absolute_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+    try:
+        size = os.path.getsize(absolute_path)
+        os.remove(absolute_path)
+        return size
+    except FileNotFoundError:
+        return 0
+
+
+def collect_garbage(grace_seconds: int = GC_GRACE_SECONDS, dry_run: bool = False) -> Tuple[int, int]:
+    """
+    Delete blobs no Document references, that were last used more than
+    grace_seconds ago and that no queued or running ExtractionJob still
+    points at, together with their sidecar JSON.
+
+    Each blob is re-checked and deleted under a row lock, so an upload of
+    the same content racing with the collector either revives the blob
+    first or re-creates it afterwards.
+
+    Returns:
+        tuple: (blobs deleted, bytes freed)
+    """
+    cutoff = timezone.now() - timedelta(seconds=grace_seconds)
+    candidates = list(
+        Blob.objects.filter(ref_count__lte=0, last_used_at__lt=cutoff).values_list('sha256', flat=True)
+    )
+
+    deleted = 0
+    freed = 0
+    for sha256 in candidates:
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update().filter(
+                pk=sha256, ref_count__lte=0, last_used_at__lt=cutoff
+            ).first()
+            if blob is None:
+                continue  # used again since the candidates were listed
+            if Document.objects.filter(blob_id=sha256).exists():
+                logger.warning(f"Blob {sha256[:12]} had ref_count {blob.ref_count} but is referenced, recounting")
+                Blob.objects.filter(pk=sha256).update(ref_count=Document.objects.filter(blob_id=sha256).count())
+                continue
+            if ExtractionJob.objects.filter(filepath=blob.path, status__in=ACTIVE_JOB_STATUSES).exists():
+                continue
+            if dry_run:
+                deleted += 1
+                freed += blob.size
+                continue
+            blob.delete()
+            freed += _remove_file(blob.path)
+            _remove_file(sidecar_path(blob.path))
+            deleted += 1
+
+    logger.info(f"Blob GC {'would delete' if dry_run else 'deleted'} {deleted} blob(s), {freed} bytes")
+    return deleted, freed
+
+
+def move_to_blob_store(relative_path: str) -> Tuple[int, bool]:
+    """
+    Move a file stored before content addressing into the blob store and
+    point its Documents at the blob, keeping the old name as original_name.
+    A duplicate of already stored content is simply removed. The blob file
+    is in place before any Document changes, and the old file (with its
+    sidecar JSON) is only removed once they are committed.
+
+    Returns:
+        tuple: (documents moved, deduplicated)
+    """
+    absolute_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+    sha256 = sha256_file(absolute_path)
+    extension = os.path.splitext(relative_path)[1].lower()
+    mime_type = mimetypes.guess_type(relative_path)[0] or "application/octet-stream"
+
+    with transaction.atomic():
+        blob, _ = Blob.objects.select_for_update().get_or_create(
+            sha256=sha256,
+            defaults={'path': blob_path(sha256, extension), 'size': os.path.getsize(absolute_path),
+                      'mime_type': mime_type},
+        )
+        final_path = os.path.join(settings.MEDIA_ROOT, blob.path)
+        deduplicated = os.path.exists(final_path)
+        if not deduplicated:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            try:
+                os.link(absolute_path, final_path)
+            except OSError:
+                shutil.copyfile(absolute_path, final_path)  # filesystem without hard links
+
+        documents = Document.objects.filter(file=relative_path, blob__isnull=True)
+        moved = 0
+        for doc in documents:
+            doc.file = blob.path
+            doc.filepath = blob.path
+            doc.blob = blob
+            doc.original_name = doc.original_name or os.path.basename(relative_path)[:255]
+            doc.save(update_fields=['file', 'filepath', 'blob', 'original_name'])
+            moved += 1
+
+    old_sidecar = os.path.join(settings.MEDIA_ROOT, sidecar_path(relative_path))
+    if os.path.exists(old_sidecar) and not os.path.exists(os.path.join(settings.MEDIA_ROOT, sidecar_path(blob.path))):
+        os.replace(old_sidecar, os.path.join(settings.MEDIA_ROOT, sidecar_path(blob.path)))
+    _remove_file(sidecar_path(relative_path))
+    _remove_file(relative_path)
+    return moved, deduplicated
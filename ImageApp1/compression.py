@@ -0,0 +1,107 @@
+import os
+import gzip
+import logging
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+from django.conf import settings
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+CONTENT_COMPRESSION = getattr(settings, "CONTENT_COMPRESSION", {})
+CODEC = CONTENT_COMPRESSION.get("CODEC", "gzip")  # "gzip", "zstd" or "none"
+LEVEL = CONTENT_COMPRESSION.get("LEVEL")  # None = codec default
+MIN_BYTES = CONTENT_COMPRESSION.get("MIN_BYTES", 256)  # smaller payloads are stored as plain UTF-8
+DICTIONARY_DIR = CONTENT_COMPRESSION.get("DICTIONARY_DIR", os.path.join(settings.MEDIA_ROOT, "compression_dicts"))
+DICTIONARY_ID = CONTENT_COMPRESSION.get("DICTIONARY_ID")  # zstd dictionary used for new writes
+
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 10}
+DICTIONARY_SUFFIX = ".zdict"
+
+# Stored blobs are self-describing: plain UTF-8 can never start with either magic
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstandard is not installed; set CONTENT_COMPRESSION['CODEC'] to 'gzip'.")
+    return zstandard
+
+
+def dictionary_path(dict_id: int) -> str:
+    return os.path.join(DICTIONARY_DIR, f"{dict_id}{DICTIONARY_SUFFIX}")
+
+
+@lru_cache(maxsize=8)
+def load_dictionary(dict_id: int):
+    with open(dictionary_path(dict_id), "rb") as f:
+        return _zstd().ZstdCompressionDict(f.read())
+
+
+@lru_cache(maxsize=8)
+def _zstd_compressor(level: int, dict_id: Optional[int]):
+    zstandard = _zstd()
+    dictionary = load_dictionary(dict_id) if dict_id else None
+    return zstandard.ZstdCompressor(level=level, dict_data=dictionary, write_content_size=True)
+
+
+def compress(data: bytes) -> bytes:
+    """Compress with the configured CODEC; payloads under MIN_BYTES are returned as is."""
+    if CODEC == "none" or len(data) < MIN_BYTES:
+        return data
+    level = LEVEL or DEFAULT_LEVELS.get(CODEC, 6)
+    if CODEC == "zstd":
+        return _zstd_compressor(level, DICTIONARY_ID).compress(data)
+    return gzip.compress(data, compresslevel=level, mtime=0)  # mtime=0 keeps the bytes deterministic
+
+
+def decompress(blob: bytes) -> bytes:
+    """Inverse of compress() for any codec or dictionary a blob was written with."""
+    if blob.startswith(GZIP_MAGIC):
+        return gzip.decompress(blob)
+    if blob.startswith(ZSTD_MAGIC):
+        zstandard = _zstd()
+        dict_id = zstandard.get_frame_parameters(blob).dict_id
+        dictionary = load_dictionary(dict_id) if dict_id else None
+        return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(blob)
+    return blob
+
+
+def content_encoding(blob: bytes) -> Optional[str]:
+    """
+    HTTP Content-Encoding under which `blob` can be sent unchanged, or None.
+    Dictionary-compressed zstd frames cannot: clients do not have our dictionary.
+    """
+    if blob.startswith(GZIP_MAGIC):
+        return "gzip"
+    if blob.startswith(ZSTD_MAGIC) and not _zstd().get_frame_parameters(blob).dict_id:
+        return "zstd"
+    return None
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows `encoding`; q=0 refuses it, an exact entry beats "*"."""
+    weights = {}
+    for item in (accept_encoding or "").split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.lower()] = weight
+    weight = weights.get(encoding, weights.get("*", 0.0))
+    return weight > 0
+
+
+def train_dictionary(samples: Iterable[bytes], size: int) -> Tuple[int, bytes]:
+    """Train a zstd dictionary; returns (dict_id, dictionary bytes)."""
+    dictionary = _zstd().train_dictionary(size, list(samples))
+    return dictionary.dict_id(), dictionary.as_bytes()
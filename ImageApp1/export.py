@@ -0,0 +1,272 @@
+import io
+import csv
+import json
+import logging
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db.models import BinaryField, ExpressionWrapper, F
+
+from .compression import decompress
+from .id_codec import encode_ids
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+DOCUMENT_EXPORT = getattr(settings, "DOCUMENT_EXPORT", {})
+CHUNK_SIZE = DOCUMENT_EXPORT.get("CHUNK_SIZE", 2000)  # rows per database fetch and per written chunk
+CSV_COLUMNS = DOCUMENT_EXPORT.get("CSV_COLUMNS", {})  # column name -> JSON path, e.g. {"vendor": "vendor.name"}
+PARQUET_ROW_GROUP_ROWS = DOCUMENT_EXPORT.get("PARQUET_ROW_GROUP_ROWS", 20000)  # buffered in memory per group
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+EXPORT_FORMATS = (FORMAT_NDJSON, FORMAT_CSV, FORMAT_PARQUET)
+CONTENT_TYPES = {
+    FORMAT_NDJSON: "application/x-ndjson",
+    FORMAT_CSV: "text/csv; charset=utf-8",
+    FORMAT_PARQUET: "application/vnd.apache.parquet",
+}
+
+METADATA_COLUMNS = ("document_id", "user_id", "document_type", "entry_date", "input_tokens", "output_tokens")
+JSON_COLUMN = "json_data"  # the whole document as JSON text, used when no column mapping is given
+
+
+class ExportError(Exception):
+    """Raised for export parameters that cannot be served; the views answer 400."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+def parse_column_mapping(spec: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    Parse "column=json.path,other=a.0.b" into {column: path}, None for an
+    empty spec (the format's default, see export_documents).
+
+    Raises:
+        ExportError: If an entry is not column=path or a column repeats
+    """
+    if not spec:
+        return None
+    mapping = {}
+    for entry in spec.split(","):
+        column, sep, path = entry.partition("=")
+        column, path = column.strip(), path.strip()
+        if not sep or not column or not path:
+            raise ExportError(f"Invalid column mapping '{entry}'. Use column=json.path")
+        if column in mapping or column in METADATA_COLUMNS:
+            raise ExportError(f"Duplicate export column '{column}'")
+        mapping[column] = path
+    return mapping
+
+
+def json_path(data, path: str):
+    """Value at a dotted path ("line_items.0.amount"), None when any step is missing."""
+    for step in path.split("."):
+        if isinstance(data, dict):
+            data = data.get(step)
+        elif isinstance(data, list) and step.lstrip("-").isdigit() and -len(data) <= int(step) < len(data):
+            data = data[int(step)]
+        else:
+            return None
+    return data
+
+
+def _compact_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), default=str, ensure_ascii=False)
+
+
+def _cell(value):
+    """Scalars as they are, objects and lists as compact JSON text."""
+    if isinstance(value, (dict, list)):
+        return _compact_json(value)
+    return value
+
+
+def export_rows(documents, chunk_size: int = CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Stream a Document queryset as chunks of (document_id, user_id,
+    document_type, entry_date, input_tokens, output_tokens, json_text)
+    rows, in id order.
+
+    Rows come from a server-side cursor (queryset.iterator), so memory
+    stays at one chunk. json_data is fetched as the stored blob and only
+    decompressed: it already is compact JSON text, so it is not parsed
+    unless a column mapping needs it. Ids are encrypted in bulk per chunk.
+    """
+    rows = (
+        documents.order_by("id")
+        .annotate(json_blob=ExpressionWrapper(F("content__json_data"), output_field=BinaryField()))
+        .values_list("id", "userid_id", "document_type", "entry_date", "input_token", "output_token", "json_blob")
+        .iterator(chunk_size=chunk_size)
+    )
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        tokens = encode_ids(row[0] for row in chunk)
+        yield [
+            (token, *row[1:6], decompress(bytes(row[6])).decode("utf-8") if row[6] is not None else None)
+            for token, row in zip(tokens, chunk)
+        ]
+
+
+def _mapped_values(json_text: Optional[str], columns: Dict[str, str]) -> list:
+    data = json.loads(json_text) if json_text else None
+    return [_cell(json_path(data, path)) for path in columns.values()]
+
+
+def ndjson_stream(chunks: Iterable[List[tuple]], columns: Dict[str, str] = None,
+                  stats: dict = None) -> Iterator[bytes]:
+    """One JSON object per line: the metadata, plus "data" with the document or the mapped columns."""
+    for chunk in chunks:
+        lines = []
+        for row in chunk:
+            meta = _compact_json(dict(zip(METADATA_COLUMNS, row[:6])))
+            if columns:
+                data = _compact_json(dict(zip(columns, _mapped_values(row[6], columns))))
+            else:
+                data = row[6] or "null"  # stored compact JSON, embedded without re-encoding
+            lines.append(f'{meta[:-1]},"data":{data}}}\n')
+        if stats is not None:
+            stats["rows"] = stats.get("rows", 0) + len(chunk)
+        yield "".join(lines).encode("utf-8")
+
+
+def csv_stream(chunks: Iterable[List[tuple]], columns: Dict[str, str] = None,
+               stats: dict = None) -> Iterator[bytes]:
+    """Flattened CSV: the metadata columns, then one column per mapping entry (or json_data)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(list(METADATA_COLUMNS) + (list(columns) if columns else [JSON_COLUMN]))
+    for chunk in chunks:
+        for row in chunk:
+            writer.writerow(list(row[:6]) + (_mapped_values(row[6], columns) if columns else [row[6]]))
+        if stats is not None:
+            stats["rows"] = stats.get("rows", 0) + len(chunk)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file for ParquetWriter whose bytes are taken out after each row group."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_stream(chunks: Iterable[List[tuple]], columns: Dict[str, str] = None, stats: dict = None,
+                   row_group_rows: int = PARQUET_ROW_GROUP_ROWS) -> Iterator[bytes]:
+    """
+    Columnar Parquet (zstd), written one row group at a time so memory stays
+    at PARQUET_ROW_GROUP_ROWS rows. Mapped columns are strings, objects and
+    lists in them compact JSON.
+
+    Raises:
+        ExportError: If pyarrow is not installed
+    """
+    pa, pq = _import_pyarrow()
+
+    names = list(METADATA_COLUMNS) + (list(columns) if columns else [JSON_COLUMN])
+    schema = pa.schema(
+        [
+            ("document_id", pa.string()), ("user_id", pa.int64()), ("document_type", pa.string()),
+            ("entry_date", pa.date32()), ("input_tokens", pa.int64()), ("output_tokens", pa.int64()),
+        ]
+        + [(name, pa.string()) for name in names[len(METADATA_COLUMNS):]]
+    )
+
+    def as_text(value):
+        return value if value is None or isinstance(value, str) else str(value)
+
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    group = [[] for _ in names]
+
+    def flush():
+        arrays = [pa.array(values, type=field.type) for values, field in zip(group, schema)]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        for values in group:
+            values.clear()
+        return sink.drain()
+
+    for chunk in chunks:
+        for row in chunk:
+            extra = [as_text(value) for value in _mapped_values(row[6], columns)] if columns else [row[6]]
+            for values, value in zip(group, list(row[:6]) + extra):
+                values.append(value)
+        if stats is not None:
+            stats["rows"] = stats.get("rows", 0) + len(chunk)
+        if len(group[0]) >= row_group_rows:
+            yield flush()
+    if group[0]:
+        yield flush()
+    writer.close()
+    yield sink.drain()
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportError("Parquet export needs pyarrow, which is not installed on this server.")
+    return pyarrow, pyarrow.parquet
+
+
+def export_documents(documents, export_format: str = FORMAT_NDJSON, columns: Dict[str, str] = None,
+                     chunk_size: int = CHUNK_SIZE, stats: dict = None) -> Iterator[bytes]:
+    """
+    Encoded export of a Document queryset, as an iterator of byte chunks
+    suitable for StreamingHttpResponse or writing to a file.
+
+    Args:
+        documents: Document queryset, already filtered and scoped to the caller
+        export_format: One of EXPORT_FORMATS
+        columns: {column: JSON path} to flatten json_data into, {} for the whole
+            document; None uses the whole document for NDJSON and
+            DOCUMENT_EXPORT["CSV_COLUMNS"] (if set) for CSV and Parquet
+        chunk_size: Rows per database fetch
+        stats: Optional dict that receives the running "rows" count
+
+    Raises:
+        ExportError: If the format is unknown or its dependency is missing;
+            checked before anything is read
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(f"Unknown export format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+    if export_format == FORMAT_PARQUET:
+        _import_pyarrow()
+
+    if columns is None:
+        columns = {} if export_format == FORMAT_NDJSON else dict(CSV_COLUMNS)
+
+    chunks = export_rows(documents, chunk_size=chunk_size)
+    if export_format == FORMAT_NDJSON:
+        return ndjson_stream(chunks, columns, stats)
+    if export_format == FORMAT_CSV:
+        return csv_stream(chunks, columns, stats)
+    return parquet_stream(chunks, columns, stats)
@@ -0,0 +1,305 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+DEFAULT_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+DEFAULT_CACHE_MAX_ENTRIES = 1000
+
+
+def sha256_file(path: str) -> str:
+    """SHA-256 of a file, read in chunks so large PDFs are never fully buffered."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def digest_input(input_data) -> str:
+    """
+    Fingerprint the input_data accepted by call_gemini_api.
+
+    Existing file paths are hashed by content, so the same invoice uploaded
+    under a different name maps to the same key. Everything else is hashed
+    as canonical JSON/text.
+    """
+    if input_data is None:
+        return ""
+    if isinstance(input_data, (list, tuple)):
+        return hashlib.sha256(
+            "|".join(digest_input(item) for item in input_data).encode()
+        ).hexdigest()
+    if hasattr(input_data, "fingerprint"):  # ContentPart
+        return hashlib.sha256(input_data.fingerprint().encode()).hexdigest()
+    if isinstance(input_data, str) and os.path.exists(input_data):
+        return sha256_file(input_data)
+    if isinstance(input_data, dict):
+        text = json.dumps(input_data, sort_keys=True, ensure_ascii=False)
+    else:
+        text = str(input_data)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def build_cache_key(input_digest: str, prompt_text: str, model_id: str, generation_params: Dict[str, Any],
+                    backend: str) -> str:
+    """
+    Content-addressed key: input bytes + prompt + model + generation config,
+    scoped by the model backend so fake or replayed responses are never
+    served as the real provider's.
+    """
+    material = json.dumps({
+        "input": input_digest or "",
+        "prompt": prompt_text or "",
+        "model": model_id or "",
+        "generation": generation_params,
+        "backend": backend,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process LRU. Fastest, but not shared between workers."""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_MAX_ENTRIES, **kwargs):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict, ttl: int) -> int:
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileCacheBackend:
+    """One JSON file per key under `location`; shared by every worker on the host."""
+
+    def __init__(self, location: str, max_entries: int = DEFAULT_CACHE_MAX_ENTRIES, **kwargs):
+        self.location = str(location)
+        self.max_entries = max_entries
+        os.makedirs(self.location, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.location, f"{key}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires_at", 0) < time.time():
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # mtime doubles as the LRU clock
+        except OSError:
+            pass
+        return entry.get("response")
+
+    def set(self, key: str, value: dict, ttl: int) -> int:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"expires_at": time.time() + ttl, "response": value}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return self._evict()
+
+    def _evict(self) -> int:
+        try:
+            names = [name for name in os.listdir(self.location) if name.endswith(".json")]
+        except OSError:
+            return 0
+        overflow = len(names) - self.max_entries
+        if overflow <= 0:
+            return 0
+        paths = [os.path.join(self.location, name) for name in names]
+        paths.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        for path in paths[:overflow]:
+            self._remove(path)
+        return overflow
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.location):
+            if name.endswith(".json"):
+                self._remove(os.path.join(self.location, name))
+
+
+class DatabaseCacheBackend:
+    """Stores entries in ExtractionCacheEntry; shared by every worker and host."""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_MAX_ENTRIES, **kwargs):
+        self.max_entries = max_entries
+
+    def get(self, key: str) -> Optional[dict]:
+        from django.utils import timezone
+        from .models import ExtractionCacheEntry
+
+        now = timezone.now()
+        entry = ExtractionCacheEntry.objects.filter(key=key, expires_at__gt=now).only("response").first()
+        if entry is None:
+            return None
+        ExtractionCacheEntry.objects.filter(key=key).update(last_accessed=now)
+        return entry.response
+
+    def set(self, key: str, value: dict, ttl: int) -> int:
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import ExtractionCacheEntry
+
+        now = timezone.now()
+        ExtractionCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                "response": value,
+                "expires_at": now + timedelta(seconds=ttl),
+                "last_accessed": now,
+            },
+        )
+
+        evicted, _ = ExtractionCacheEntry.objects.filter(expires_at__lte=now).delete()
+        overflow = ExtractionCacheEntry.objects.count() - self.max_entries
+        if overflow > 0:
+            stale_keys = list(
+                ExtractionCacheEntry.objects.order_by("last_accessed").values_list("key", flat=True)[:overflow]
+            )
+            deleted, _ = ExtractionCacheEntry.objects.filter(key__in=stale_keys).delete()
+            evicted += deleted
+        return evicted
+
+    def clear(self):
+        from .models import ExtractionCacheEntry
+        ExtractionCacheEntry.objects.all().delete()
+
+
+CACHE_BACKENDS = {
+    "memory": MemoryCacheBackend,
+    "file": FileCacheBackend,
+    "database": DatabaseCacheBackend,
+}
+
+
+class ExtractionCache:
+    """
+    Cache of formatted call_gemini_api responses with hit/miss counters.
+
+    Hits are returned with zeroed usageMetadata, since no tokens were spent
+    on them, and with "cacheHit": True so callers can tell them apart.
+    """
+
+    def __init__(self, backend, ttl: int = DEFAULT_CACHE_TTL, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0, "errors": 0}
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            value = self.backend.get(key)
+        except Exception:
+            logger.error("Extraction cache lookup failed.", exc_info=True)
+            self._count("errors")
+            return None
+
+        if value is None:
+            self._count("misses")
+            return None
+
+        self._count("hits")
+        response = copy.deepcopy(value)
+        response["usageMetadata"] = {"promptTokenCount": 0, "candidatesTokenCount": 0, "totalTokenCount": 0}
+        response["cacheHit"] = True
+        return response
+
+    def set(self, key: str, response: dict):
+        try:
+            evicted = self.backend.set(key, response, self.ttl)
+        except Exception:
+            logger.error("Extraction cache store failed.", exc_info=True)
+            self._count("errors")
+            return
+        self._count("sets")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["backend"] = type(self.backend).__name__
+        stats["enabled"] = self.enabled
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """Build the process-wide cache from settings.EXTRACTION_CACHE on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from django.conf import settings
+
+                config = getattr(settings, "EXTRACTION_CACHE", {})
+                backend_name = config.get("BACKEND", "memory")
+                backend_class = CACHE_BACKENDS[backend_name]
+                backend = backend_class(
+                    location=config.get("LOCATION", os.path.join(settings.MEDIA_ROOT, "cache", "extraction")),
+                    max_entries=config.get("MAX_ENTRIES", DEFAULT_CACHE_MAX_ENTRIES),
+                )
+                _cache = ExtractionCache(
+                    backend,
+                    ttl=config.get("TTL", DEFAULT_CACHE_TTL),
+                    enabled=config.get("ENABLED", True),
+                )
+                logger.info(f"Extraction cache initialized with {backend_name} backend.")
+    return _cache
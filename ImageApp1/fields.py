@@ -0,0 +1,68 @@
+import json
+
+from django.db import models
+
+from .compression import compress, decompress
+
+
+class CompressedText(str):
+    """A str read from a CompressedTextField that keeps the stored bytes, so they can be served or re-saved as is."""
+
+    compressed = None
+
+    def __new__(cls, value: str, compressed: bytes = None):
+        text = super().__new__(cls, value)
+        text.compressed = compressed
+        return text
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    Text column stored compressed (see compression.py), read back as a str.
+
+    Blobs carry their own codec, so changing CONTENT_COMPRESSION only
+    affects new writes; older rows keep decompressing.
+    """
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        blob = bytes(value)
+        return CompressedText(decompress(blob).decode("utf-8"), blob)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return decompress(bytes(value)).decode("utf-8")
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, CompressedText) and value.compressed is not None:
+            return value.compressed  # unchanged since it was read, no need to recompress
+        return compress(str(value).encode("utf-8"))
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+
+class CompressedJSONField(CompressedTextField):
+    """JSON value stored as compact, compressed JSON text. Not queryable by key in the database."""
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return json.loads(decompress(bytes(value)))
+
+    def to_python(self, value):
+        if value is None or not isinstance(value, (bytes, memoryview)):
+            return value
+        return json.loads(decompress(bytes(value)))
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        return compress(json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+    def value_to_string(self, obj):
+        return json.dumps(self.value_from_object(obj), ensure_ascii=False)
@@ -0,0 +1,178 @@
+import re
+from html import escape
+from numbers import Number
+
+# Bump whenever the markup or CSS below changes, so cached renderings are rebuilt
+RENDERER_VERSION = "local-2"
+
+REPORT_CSS = (
+    "body{font-family:'Segoe UI',Arial,sans-serif;background:#f4f6f9;color:#2c3e50;margin:0;padding:24px;}"
+    ".container{max-width:960px;margin:0 auto;background:#fff;padding:32px;border-radius:8px;"
+    "box-shadow:0 2px 12px rgba(0,0,0,0.08);}"
+    "h1{font-size:24px;margin:0 0 24px;padding-bottom:12px;border-bottom:2px solid #2c7be5;}"
+    "h2{font-size:19px;margin:28px 0 12px;color:#2c7be5;}"
+    "h3{font-size:16px;margin:20px 0 10px;}"
+    "h4{font-size:14px;margin:16px 0 8px;color:#52606d;}"
+    "section{margin-bottom:12px;}"
+    "table{width:100%;border-collapse:collapse;margin:8px 0 16px;font-size:14px;}"
+    "th,td{border:1px solid #dde3ea;padding:8px 10px;text-align:left;vertical-align:top;}"
+    "th{background:#f0f4f8;font-weight:600;}"
+    "tr:nth-child(even) td{background:#fafbfc;}"
+    "table.kv th{width:35%;}"
+    "td.num{text-align:right;font-variant-numeric:tabular-nums;}"
+    "td.empty,span.empty{color:#9aa5b1;}"
+    "ul{margin:4px 0 12px;padding-left:20px;}"
+    "@media print{body{background:#fff;padding:0;}.container{box-shadow:none;}}"
+)
+
+_CAMEL_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+def humanize_key(key) -> str:
+    """'invoice_number' / 'invoiceNumber' -> 'Invoice Number'."""
+    text = _CAMEL_BOUNDARY.sub(" ", str(key)).replace("_", " ").replace("-", " ")
+    return " ".join(word if word.isupper() else word.capitalize() for word in text.split())
+
+
+def _is_scalar(value) -> bool:
+    return value is None or isinstance(value, (str, Number, bool))
+
+
+def _format_scalar(value) -> str:
+    if value is None or value == "":
+        return '<span class="empty">&mdash;</span>'
+    if isinstance(value, bool):
+        return "Yes" if value else "No"
+    return escape(str(value))
+
+
+def _cell_class(value) -> str:
+    if value is None or value == "":
+        return ' class="empty"'
+    if isinstance(value, Number) and not isinstance(value, bool):
+        return ' class="num"'
+    return ""
+
+
+def _inline(value) -> str:
+    """Compact rendering for nested values inside a table cell."""
+    if _is_scalar(value):
+        return _format_scalar(value)
+    if isinstance(value, dict):
+        return "<br>".join(
+            f"<strong>{escape(humanize_key(k))}:</strong> {_inline(v)}" for k, v in value.items()
+        )
+    return ", ".join(_inline(item) for item in value)
+
+
+def _table_columns(rows):
+    columns = []
+    seen = set()
+    for row in rows:
+        for key in row:
+            if key not in seen:
+                seen.add(key)
+                columns.append(key)
+    return columns
+
+
+def _render_table(rows) -> str:
+    columns = _table_columns(rows)
+    head = "".join(f"<th>{escape(humanize_key(col))}</th>" for col in columns)
+    body = []
+    for row in rows:
+        cells = "".join(
+            f"<td{_cell_class(row.get(col))}>{_inline(row.get(col))}</td>" for col in columns
+        )
+        body.append(f"<tr>{cells}</tr>")
+    return f"<table><thead><tr>{head}</tr></thead><tbody>{''.join(body)}</tbody></table>"
+
+
+def _render_key_values(items) -> str:
+    rows = "".join(
+        f"<tr><th>{escape(humanize_key(key))}</th><td{_cell_class(value)}>{_format_scalar(value)}</td></tr>"
+        for key, value in items
+    )
+    return f'<table class="kv"><tbody>{rows}</tbody></table>'
+
+
+def _render_value(value, level: int) -> str:
+    if isinstance(value, dict):
+        return _render_dict(value, level)
+    if isinstance(value, (list, tuple)):
+        return _render_list(value, level)
+    return f"<p>{_format_scalar(value)}</p>"
+
+
+def _render_list(items, level: int) -> str:
+    if not items:
+        return '<p><span class="empty">No entries</span></p>'
+    if all(isinstance(item, dict) for item in items):
+        return _render_table(items)
+    if all(_is_scalar(item) for item in items):
+        return "<ul>" + "".join(f"<li>{_format_scalar(item)}</li>" for item in items) + "</ul>"
+    return "".join(_render_value(item, level) for item in items)
+
+
+def _is_metadata_key(key) -> bool:
+    """Keys like "_page_provenance" carry pipeline metadata, not document content."""
+    return str(key).startswith("_")
+
+
+def _render_dict(data: dict, level: int) -> str:
+    data = {key: value for key, value in data.items() if not _is_metadata_key(key)}
+    parts = []
+    scalars = [(key, value) for key, value in data.items() if _is_scalar(value)]
+    if scalars:
+        parts.append(_render_key_values(scalars))
+
+    heading = f"h{min(level, 4)}"
+    for key, value in data.items():
+        if _is_scalar(value):
+            continue
+        parts.append(
+            f"<section><{heading}>{escape(humanize_key(key))}</{heading}>"
+            f"{_render_value(value, level + 1)}</section>"
+        )
+    return "".join(parts)
+
+
+def guess_title(json_data) -> str:
+    if isinstance(json_data, dict):
+        keys = " ".join(str(key).lower() for key in json_data)
+        if "invoice" in keys:
+            return "Invoice Report"
+        if "reimburs" in keys or "expense" in keys:
+            return "Reimbursement Report"
+    return "Document Analysis"
+
+
+def render_json_to_html(json_data, title: str = None) -> str:
+    """
+    Render extracted JSON as a self-contained HTML report.
+
+    Objects become sections with a key/value table for their scalar fields,
+    lists of objects become tables (columns are the union of their keys) and
+    lists of scalars become bullet lists. The output has the same shape as
+    the JSON_TO_HTML_PROMPT reports (single page, embedded CSS, no scripts)
+    and is deterministic for a given json_data.
+
+    Args:
+        json_data: Extracted data (dict, list or scalar)
+        title: Optional report title, guessed from the data when omitted
+
+    Returns:
+        str: Complete HTML document
+    """
+    title = title or guess_title(json_data)
+    body = _render_value(json_data, level=2)
+    return (
+        "<!DOCTYPE html>"
+        "<html><head><meta charset=\"UTF-8\">"
+        f"<title>{escape(title)}</title>"
+        f"<style>{REPORT_CSS}</style>"
+        "</head><body><div class=\"container\">"
+        f"<h1>{escape(title)}</h1>"
+        f"{body}"
+        "</div></body></html>"
+    )
@@ -0,0 +1,162 @@
+import io
+import math
+import json
+import hashlib
+import logging
+import mimetypes
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from django.conf import settings
+
+from .model_backends import ContentPart
+from .model_backends.base import TOKENS_PER_MEDIA_PART
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+IMAGE_PREPROCESSING = getattr(settings, "IMAGE_PREPROCESSING", {})
+PREPROCESSING_ENABLED = IMAGE_PREPROCESSING.get("ENABLED", True)
+MAX_LONG_EDGE = IMAGE_PREPROCESSING.get("MAX_LONG_EDGE", 2048)  # pixels
+GRAYSCALE = IMAGE_PREPROCESSING.get("GRAYSCALE", True)
+AUTOCONTRAST = IMAGE_PREPROCESSING.get("AUTOCONTRAST", True)
+TARGET_BYTES = IMAGE_PREPROCESSING.get("TARGET_BYTES", 1024 * 1024)
+JPEG_QUALITY = IMAGE_PREPROCESSING.get("JPEG_QUALITY", 85)
+MIN_JPEG_QUALITY = IMAGE_PREPROCESSING.get("MIN_JPEG_QUALITY", 50)
+QUALITY_STEP = 10
+
+IMAGE_MIME_TYPES = ("image/jpeg", "image/png")
+
+# Gemini: images up to 384px on both sides cost 258 tokens, larger ones are tiled at 768x768, 258 each
+SMALL_IMAGE_EDGE = 384
+IMAGE_TILE_EDGE = 768
+
+# Bump when the processing steps change, so cached extractions of processed images are not reused
+PREPROCESSING_VERSION = "img-1"
+
+
+@dataclass
+class PreprocessingStats:
+    original_bytes: int
+    processed_bytes: int
+    original_size: tuple
+    processed_size: tuple
+    original_tokens: int
+    processed_tokens: int
+    quality: Optional[int]
+    steps: list
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["original_size"] = list(self.original_size)
+        data["processed_size"] = list(self.processed_size)
+        data["bytes_saved"] = self.original_bytes - self.processed_bytes
+        return data
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    if width <= SMALL_IMAGE_EDGE and height <= SMALL_IMAGE_EDGE:
+        return TOKENS_PER_MEDIA_PART
+    return math.ceil(width / IMAGE_TILE_EDGE) * math.ceil(height / IMAGE_TILE_EDGE) * TOKENS_PER_MEDIA_PART
+
+
+def preprocessing_signature() -> str:
+    """Short hash of the settings that shape the processed bytes, used in cache keys."""
+    material = json.dumps([
+        PREPROCESSING_VERSION, MAX_LONG_EDGE, GRAYSCALE, AUTOCONTRAST, TARGET_BYTES, JPEG_QUALITY, MIN_JPEG_QUALITY,
+    ])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+
+def is_image(absolute_path: str) -> bool:
+    return (mimetypes.guess_type(absolute_path)[0] or "") in IMAGE_MIME_TYPES
+
+
+def _encode_jpeg(image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def preprocess_image(absolute_path: str):
+    """
+    Shrink an uploaded JPEG/PNG before it is sent to the model.
+
+    Applies the EXIF orientation, downscales to MAX_LONG_EDGE, optionally
+    converts to grayscale with autocontrast (text documents lose nothing),
+    then re-encodes as JPEG, lowering the quality down to MIN_JPEG_QUALITY
+    until the result fits TARGET_BYTES. When nothing changed and the
+    re-encoded file is not smaller, the original bytes are kept.
+
+    Returns:
+        tuple: (ContentPart, PreprocessingStats), or None when the file is
+        not an image, preprocessing is disabled or Pillow is unavailable
+    """
+    if not PREPROCESSING_ENABLED or not is_image(absolute_path):
+        return None
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        logger.warning("Pillow is not installed, image preprocessing is disabled.")
+        return None
+
+    with open(absolute_path, "rb") as f:
+        original = f.read()
+    mime_type = mimetypes.guess_type(absolute_path)[0]
+
+    try:
+        with Image.open(io.BytesIO(original)) as source:
+            source.load()
+            original_size = source.size
+            steps = []
+
+            image = ImageOps.exif_transpose(source)
+            if image.size != original_size or source.getexif().get(0x0112, 1) != 1:
+                steps.append("exif_orientation")
+
+            if max(image.size) > MAX_LONG_EDGE:
+                image.thumbnail((MAX_LONG_EDGE, MAX_LONG_EDGE), Image.LANCZOS)
+                steps.append("downscale")
+
+            if GRAYSCALE:
+                image = image.convert("L")
+                steps.append("grayscale")
+            elif image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            if AUTOCONTRAST:
+                image = ImageOps.autocontrast(image, cutoff=1)
+                steps.append("autocontrast")
+
+            quality = JPEG_QUALITY
+            processed = _encode_jpeg(image, quality)
+            while len(processed) > TARGET_BYTES and quality - QUALITY_STEP >= MIN_JPEG_QUALITY:
+                quality -= QUALITY_STEP
+                processed = _encode_jpeg(image, quality)
+            processed_size = image.size
+    except Exception as e:
+        logger.warning(f"Could not preprocess {absolute_path}, sending it unchanged: {str(e)}")
+        return None
+
+    geometry_changed = "exif_orientation" in steps or "downscale" in steps
+    if len(processed) >= len(original) and not geometry_changed:
+        part = ContentPart.from_data(original, mime_type)
+        processed, processed_size, quality, steps = original, original_size, None, ["unchanged"]
+    else:
+        part = ContentPart.from_data(processed, "image/jpeg")
+        steps.append(f"jpeg_q{quality}")
+
+    stats = PreprocessingStats(
+        original_bytes=len(original),
+        processed_bytes=len(processed),
+        original_size=original_size,
+        processed_size=processed_size,
+        original_tokens=estimate_image_tokens(*original_size),
+        processed_tokens=estimate_image_tokens(*processed_size),
+        quality=quality,
+        steps=steps,
+    )
+    logger.info(
+        f"Preprocessed {absolute_path}: {stats.original_bytes} -> {stats.processed_bytes} bytes, "
+        f"~{stats.original_tokens} -> ~{stats.processed_tokens} image tokens ({', '.join(steps)})"
+    )
+    return part, stats
@@ -0,0 +1,243 @@
+import os
+import re
+import uuid
+import hashlib
+import logging
+import zipfile
+import mimetypes
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from . import blob_storage
+from .metrics import STAGE_FILE_SAVE, timed_stage
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".pdf")
+
+# Leading bytes every accepted file type must start with
+MAGIC_BYTES = {
+    ".pdf": (b"%PDF-",),
+    ".png": (b"\x89PNG\r\n\x1a\n",),
+    ".jpg": (b"\xff\xd8\xff",),
+    ".jpeg": (b"\xff\xd8\xff",),
+}
+
+UPLOAD_MAX_BYTES = getattr(settings, "UPLOAD_MAX_BYTES", 25 * 1024 * 1024)
+UPLOAD_MAX_PDF_PAGES = getattr(settings, "UPLOAD_MAX_PDF_PAGES", 100)
+UPLOAD_CHUNK_SIZE = getattr(settings, "UPLOAD_CHUNK_SIZE", 1024 * 1024)
+BATCH_MAX_FILES = getattr(settings, "BATCH_MAX_FILES", 200)
+
+# Page objects in a PDF body; "/Type /Pages" (the page tree) is excluded
+PDF_PAGE_PATTERN = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+PDF_PAGE_OVERLAP = 32  # bytes kept between chunks so a marker split across chunks still counts
+
+OUTCOME_REJECTED = "rejected"  # file_save outcome of uploads refused by validation
+
+
+class UploadRejected(Exception):
+    """Raised when an upload fails validation; nothing is left in storage."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+@dataclass
+class IngestedFile:
+    relative_path: str
+    absolute_path: str
+    sha256: str
+    size: int
+    mime_type: str
+    page_count: Optional[int] = None
+    original_name: str = ""
+    # True when identical content was already stored and its file is reused
+    deduplicated: bool = False
+
+
+class ArchiveMember:
+    """
+    A file inside an uploaded zip archive, with the parts of the UploadedFile
+    interface ingest_upload uses (name, size, chunks), read without unpacking
+    the archive to disk first.
+    """
+
+    def __init__(self, archive: zipfile.ZipFile, info: zipfile.ZipInfo):
+        self._archive = archive
+        self._info = info
+        self.name = os.path.basename(info.filename)
+        self.size = info.file_size  # declared size; ingest_upload still counts the real bytes
+
+    def chunks(self, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+        with self._archive.open(self._info) as member:
+            while True:
+                chunk = member.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+def iter_archive_members(archive_file, max_files: int = BATCH_MAX_FILES) -> Iterator[ArchiveMember]:
+    """
+    Yield the files of an uploaded zip archive in archive order.
+
+    Directories, hidden files and macOS resource forks are skipped. Only the
+    base name of each member is used, so paths inside the archive can never
+    point outside the upload folder.
+
+    Raises:
+        UploadRejected: If the upload is not a zip archive or has too many files
+    """
+    try:
+        archive = zipfile.ZipFile(archive_file)
+    except zipfile.BadZipFile:
+        raise UploadRejected("Archive is not a valid zip file")
+
+    members = [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and not info.filename.startswith("__MACOSX/")
+        and not os.path.basename(info.filename).startswith(".")
+    ]
+    if len(members) > max_files:
+        raise UploadRejected(f"Archive holds more than {max_files} files", status_code=413)
+
+    for info in members:
+        yield ArchiveMember(archive, info)
+
+
+def _sniff(extension: str, first_chunk: bytes):
+    signatures = MAGIC_BYTES.get(extension, ())
+    if not any(first_chunk.startswith(signature) for signature in signatures):
+        raise UploadRejected("File content does not match its extension")
+
+
+def _store(temp_path: str, relative_path: str) -> str:
+    """Move the completed temp file to a free name under MEDIA_ROOT, without overwriting."""
+    while True:
+        relative_path = default_storage.get_available_name(relative_path)
+        final_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+        try:
+            os.link(temp_path, final_path)
+        except FileExistsError:
+            continue  # another request took the name in between, pick the next one
+        except OSError:
+            os.replace(temp_path, final_path)  # filesystem without hard links
+            return relative_path
+        os.remove(temp_path)
+        return relative_path
+
+
+def ingest_upload(uploaded_file, folder: str, max_bytes: int = UPLOAD_MAX_BYTES,
+                  max_pdf_pages: int = UPLOAD_MAX_PDF_PAGES, document_type: str = None) -> IngestedFile:
+    """
+    Stream an uploaded file into storage while validating and hashing it.
+
+    The extension is checked before anything is written, the magic bytes are
+    sniffed from the first chunk, and size and PDF page limits are enforced
+    chunk by chunk. A failed check aborts the write and removes the partial
+    file. The SHA-256 is computed on the way through, so later stages (the
+    extraction cache) never re-read the file just to fingerprint it.
+
+    With CONTENT_ADDRESSED_STORAGE enabled the file is stored once per
+    content under blob_storage.blob_path (folder is then unused), and an
+    upload of already stored content keeps the existing file.
+
+    Args:
+        uploaded_file: Django UploadedFile from request.FILES
+        folder: Target directory relative to MEDIA_ROOT, without blob storage
+        max_bytes: Maximum accepted file size
+        max_pdf_pages: Maximum accepted number of PDF pages
+        document_type: Label of the file_save stage metrics
+
+    Returns:
+        IngestedFile: Where the file was stored and what was learned about it
+
+    Raises:
+        UploadRejected: If the file is not acceptable
+    """
+    with timed_stage(STAGE_FILE_SAVE, document_type=document_type or "") as stage:
+        try:
+            return _ingest_upload(uploaded_file, folder, max_bytes, max_pdf_pages)
+        except UploadRejected:
+            stage.outcome = OUTCOME_REJECTED
+            raise
+
+
+def _ingest_upload(uploaded_file, folder: str, max_bytes: int, max_pdf_pages: int) -> IngestedFile:
+    file_name = os.path.basename(uploaded_file.name)
+    extension = os.path.splitext(file_name)[1].lower()
+
+    if extension not in ALLOWED_EXTENSIONS:
+        raise UploadRejected("Unsupported file type")
+    if uploaded_file.size and uploaded_file.size > max_bytes:
+        raise UploadRejected(f"File exceeds the {max_bytes // (1024 * 1024)} MB limit", status_code=413)
+
+    save_dir = os.path.join(settings.MEDIA_ROOT, blob_storage.ROOT if blob_storage.ENABLED else folder)
+    os.makedirs(save_dir, exist_ok=True)
+    temp_path = os.path.join(save_dir, f".incoming-{uuid.uuid4().hex}.part")
+
+    digest = hashlib.sha256()
+    size = 0
+    page_count = 0
+    tail = b""
+    is_pdf = extension == ".pdf"
+
+    try:
+        with open(temp_path, "wb") as out:
+            for index, chunk in enumerate(uploaded_file.chunks(UPLOAD_CHUNK_SIZE)):
+                if index == 0 and chunk:  # an empty file is reported as such below
+                    _sniff(extension, chunk)
+
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(f"File exceeds the {max_bytes // (1024 * 1024)} MB limit", status_code=413)
+
+                if is_pdf:
+                    window = tail + chunk
+                    # Only count matches that end beyond the overlap, they were not counted last time
+                    page_count += sum(1 for match in PDF_PAGE_PATTERN.finditer(window) if match.end() > len(tail))
+                    tail = window[-PDF_PAGE_OVERLAP:]
+                    if page_count > max_pdf_pages:
+                        raise UploadRejected(f"PDF exceeds the {max_pdf_pages} page limit", status_code=413)
+
+                digest.update(chunk)
+                out.write(chunk)
+
+        if size == 0:
+            raise UploadRejected("Uploaded file is empty")
+
+        mime_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+        deduplicated = False
+        if blob_storage.ENABLED:
+            blob, deduplicated = blob_storage.store_blob(temp_path, digest.hexdigest(), size, mime_type, extension)
+            relative_path = blob.path
+        else:
+            relative_path = _store(temp_path, os.path.join(folder, file_name))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    ingested = IngestedFile(
+        relative_path=relative_path,
+        absolute_path=os.path.join(settings.MEDIA_ROOT, relative_path),
+        sha256=digest.hexdigest(),
+        size=size,
+        mime_type=mime_type,
+        # Pages inside compressed object streams are invisible to the scan, so 0 means unknown
+        page_count=page_count if is_pdf and page_count else None,
+        original_name=file_name,
+        deduplicated=deduplicated,
+    )
+    logger.info(
+        f"Stored upload {file_name} as {relative_path} ({size} bytes, sha256={ingested.sha256[:12]}..."
+        f"{', already stored' if deduplicated else ''})"
+    )
+    return ingested
@@ -0,0 +1,295 @@
+import os
+import random
+import socket
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction, close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ExtractionBatch, ExtractionJob
+from .pipeline import PipelineError, run_extraction_pipeline
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKER_CONCURRENCY = getattr(settings, "EXTRACTION_WORKER_CONCURRENCY", 4)
+DEFAULT_POLL_INTERVAL = getattr(settings, "EXTRACTION_JOB_POLL_INTERVAL", 1.0)  # seconds
+JOB_STALE_AFTER = getattr(settings, "EXTRACTION_JOB_STALE_AFTER", 15 * 60)  # seconds
+JOB_MAX_ATTEMPTS = getattr(settings, "EXTRACTION_JOB_MAX_ATTEMPTS", 3)
+JOB_DEFER_INITIAL_DELAY = getattr(settings, "EXTRACTION_JOB_DEFER_INITIAL_DELAY", 5)  # seconds
+JOB_DEFER_MAX_DELAY = getattr(settings, "EXTRACTION_JOB_DEFER_MAX_DELAY", 5 * 60)  # seconds
+JOB_MAX_DEFERRALS = getattr(settings, "EXTRACTION_JOB_MAX_DEFERRALS", 20)
+
+
+def enqueue_extraction_job(relative_path: str, user_id, doc_type: str = None, prompt_text: str = None,
+                           bypass_cache: bool = False, renderer: str = None,
+                           input_sha256: str = None, source_name: str = '') -> ExtractionJob:
+    """Persist a job for an already stored upload; a worker picks it up."""
+    job = ExtractionJob.objects.create(
+        userid_id=user_id,
+        filepath=relative_path,
+        input_sha256=input_sha256 or '',
+        source_name=(source_name or '')[:255],
+        document_type=doc_type,
+        prompt_text=prompt_text,
+        bypass_cache=bypass_cache,
+        renderer=renderer or '',
+    )
+    logger.info(f"Extraction job {job.id} queued for file {relative_path}")
+    return job
+
+
+def enqueue_extraction_batch(user_id, ingested_files, rejected=None, doc_type: str = None,
+                             prompt_text: str = None, bypass_cache: bool = False,
+                             renderer: str = None) -> ExtractionBatch:
+    """
+    Persist a batch and one job per accepted file in a single transaction.
+
+    Args:
+        user_id: Owner of the batch and of the resulting Documents
+        ingested_files: (index, source_name, IngestedFile) for every accepted file
+        rejected: {"index", "file", "error"} for every file refused at ingestion
+
+    Returns:
+        ExtractionBatch: The saved batch; workers pick its jobs up in index order
+    """
+    rejected = rejected or []
+    with transaction.atomic():
+        batch = ExtractionBatch.objects.create(
+            userid_id=user_id,
+            document_type=doc_type,
+            total_files=len(ingested_files) + len(rejected),
+            rejected=rejected,
+        )
+        now = timezone.now()
+        ExtractionJob.objects.bulk_create([
+            ExtractionJob(
+                userid_id=user_id,
+                batch=batch,
+                batch_index=index,
+                source_name=source_name[:255],
+                filepath=ingested.relative_path,
+                input_sha256=ingested.sha256,
+                document_type=doc_type,
+                prompt_text=prompt_text,
+                bypass_cache=bypass_cache,
+                renderer=renderer or '',
+                # Spread created_at by index so claim order (oldest first) follows upload order
+                created_at=now + timedelta(microseconds=index),
+            )
+            for index, source_name, ingested in ingested_files
+        ])
+    logger.info(f"Extraction batch {batch.id} queued with {len(ingested_files)} job(s), {len(rejected)} rejected")
+    return batch
+
+
+def claim_next_job(worker_id: str):
+    """
+    Atomically move the oldest queued job that is available (not deferred
+    into the future) to 'running' and return it.
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED where the database supports it
+    (PostgreSQL), so concurrent workers never block on each other. Other
+    backends fall back to a conditional UPDATE, where only the worker whose
+    update matched the row wins the job.
+
+    Returns:
+        ExtractionJob or None if the queue is empty
+    """
+    queued = ExtractionJob.objects.filter(
+        Q(available_at__isnull=True) | Q(available_at__lte=timezone.now()),
+        status=ExtractionJob.STATUS_QUEUED,
+    ).order_by('created_at')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = queued.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = ExtractionJob.STATUS_RUNNING
+            job.worker_id = worker_id
+            job.started_at = timezone.now()
+            job.attempts += 1
+            job.save(update_fields=['status', 'worker_id', 'started_at', 'attempts'])
+            return job
+
+    while True:
+        candidate_id = queued.values_list('id', flat=True).first()
+        if candidate_id is None:
+            return None
+        claimed = ExtractionJob.objects.filter(
+            id=candidate_id, status=ExtractionJob.STATUS_QUEUED
+        ).update(
+            status=ExtractionJob.STATUS_RUNNING,
+            worker_id=worker_id,
+            started_at=timezone.now(),
+        )
+        if claimed:
+            job = ExtractionJob.objects.get(id=candidate_id)
+            job.attempts += 1
+            job.save(update_fields=['attempts'])
+            return job
+
+
+def requeue_stale_jobs(stale_after: int = JOB_STALE_AFTER) -> int:
+    """
+    Return jobs whose worker died mid-run to the queue, or fail them once
+    they used up JOB_MAX_ATTEMPTS.
+
+    Returns:
+        int: Number of jobs requeued
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = ExtractionJob.objects.filter(status=ExtractionJob.STATUS_RUNNING, started_at__lt=cutoff)
+
+    stale.filter(attempts__gte=JOB_MAX_ATTEMPTS).update(
+        status=ExtractionJob.STATUS_FAILED,
+        error="Worker stopped responding while processing this job.",
+        finished_at=timezone.now(),
+    )
+    requeued = stale.filter(attempts__lt=JOB_MAX_ATTEMPTS).update(
+        status=ExtractionJob.STATUS_QUEUED,
+        worker_id='',
+    )
+    if requeued:
+        logger.warning(f"Requeued {requeued} stale extraction job(s).")
+    return requeued
+
+
+def defer_delay(deferrals: int, retry_after: float = None) -> float:
+    """
+    Seconds a shed job waits before it can be claimed again: capped
+    exponential backoff with up to 10% jitter, and never less than the
+    retry_after hint of the rate limiter or circuit breaker.
+    """
+    delay = min(JOB_DEFER_INITIAL_DELAY * (2 ** deferrals), JOB_DEFER_MAX_DELAY)
+    delay += random.uniform(0, 0.1 * delay)
+    return max(delay, retry_after or 0)
+
+
+def defer_job(job: ExtractionJob, retry_after: float = None) -> ExtractionJob:
+    """
+    Put a claimed job back in the queue, claimable after a backoff delay.
+
+    The model provider was never called, so the claim does not count
+    towards JOB_MAX_ATTEMPTS; JOB_MAX_DEFERRALS bounds how long a job
+    waits for the backend instead.
+    """
+    delay = defer_delay(job.deferrals, retry_after)
+    job.status = ExtractionJob.STATUS_QUEUED
+    job.worker_id = ''
+    job.attempts = max(job.attempts - 1, 0)
+    job.deferrals += 1
+    job.available_at = timezone.now() + timedelta(seconds=delay)
+    job.save(update_fields=['status', 'worker_id', 'attempts', 'deferrals', 'available_at'])
+    return job
+
+
+def run_job(job: ExtractionJob) -> ExtractionJob:
+    """Run the extraction pipeline for a claimed job and record the outcome."""
+    logger.info(f"Worker {job.worker_id} processing extraction job {job.id}")
+    stats = {}
+    try:
+        doc = run_extraction_pipeline(
+            relative_path=job.filepath,
+            user_id=job.userid_id,
+            doc_type=job.document_type,
+            prompt_text=job.prompt_text,
+            use_cache=not job.bypass_cache,
+            renderer=job.renderer or None,
+            input_digest=job.input_sha256 or None,
+            stats=stats,
+            original_name=job.source_name,
+        )
+        job.document = doc
+        job.status = ExtractionJob.STATUS_SUCCEEDED
+        job.error = None
+    except PipelineError as e:
+        if e.status_code == 503 and job.deferrals < JOB_MAX_DEFERRALS:
+            # Shed by the rate limiter or the circuit breaker; retried once the backend had time to recover
+            defer_job(job, e.retry_after)
+            logger.warning(f"Extraction job {job.id} not attempted ({e.message}), deferred until {job.available_at}")
+            return job
+        logger.error(f"Extraction job {job.id} failed: {e.message}")
+        job.status = ExtractionJob.STATUS_FAILED
+        job.error = e.message
+    except Exception as e:
+        logger.error(f"Unexpected error in extraction job {job.id}: {str(e)}", exc_info=True)
+        job.status = ExtractionJob.STATUS_FAILED
+        job.error = f"An internal server error occurred: {str(e)}"
+
+    job.finished_at = timezone.now()
+    job.stats = stats or None
+    job.save(update_fields=['document', 'status', 'error', 'finished_at', 'stats'])
+    return job
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _worker_loop(worker_id: str, stop_event: threading.Event, poll_interval: float, burst: bool):
+    while not stop_event.is_set():
+        close_old_connections()
+        try:
+            job = claim_next_job(worker_id)
+        except Exception:
+            logger.error(f"Worker {worker_id} could not claim a job.", exc_info=True)
+            job = None
+
+        if job is None:
+            if burst:
+                break
+            stop_event.wait(poll_interval)
+            continue
+
+        run_job(job)
+    close_old_connections()
+
+
+def run_worker(concurrency: int = DEFAULT_WORKER_CONCURRENCY, poll_interval: float = DEFAULT_POLL_INTERVAL,
+               burst: bool = False, stop_event: threading.Event = None):
+    """
+    Run a pool of worker threads that drain the extraction queue.
+
+    Each thread claims one job at a time, so `concurrency` is the number of
+    pipelines this process keeps in flight. Run more worker processes (or
+    hosts) to scale beyond one process; the queue is shared through the DB.
+
+    Args:
+        concurrency: Number of worker threads in this process
+        poll_interval: Seconds to wait before polling an empty queue again
+        burst: Exit once the queue is empty instead of polling forever
+        stop_event: Optional event that stops the workers when set
+    """
+    stop_event = stop_event or threading.Event()
+    base_id = default_worker_id()
+
+    requeue_stale_jobs()
+
+    threads = []
+    for index in range(concurrency):
+        worker_id = f"{base_id}:{index}"
+        thread = threading.Thread(
+            target=_worker_loop,
+            args=(worker_id, stop_event, poll_interval, burst),
+            name=f"extraction-worker-{index}",
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+
+    logger.info(f"Started {concurrency} extraction worker thread(s) ({base_id}).")
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=poll_interval)
+    except KeyboardInterrupt:
+        logger.info("Stopping extraction workers...")
+        stop_event.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,69 @@
+import time
+import statistics
+
+from cryptography.fernet import Fernet
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ImageApp1.id_codec import (
+    decode_compact_id, decode_fernet_id, encode_compact_ids, encode_fernet_id,
+)
+
+
+def legacy_encrypt_id(id: int) -> str:
+    # The per-call implementation id_codec replaced, kept here as the baseline
+    return Fernet(settings.FERNET_KEY).encrypt(str(id).encode()).decode()
+
+
+def legacy_decrypt_id(token: str) -> int:
+    return int(Fernet(settings.FERNET_KEY).decrypt(token.encode()).decode())
+
+
+class Command(BaseCommand):
+    help = "Compare the per-id cost and token length of the document id encodings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ids", type=int, default=1000, help="Ids encoded per run (one list page).")
+        parser.add_argument("--runs", type=int, default=5, help="Runs per variant; the median is reported.")
+
+    def _time(self, func, runs):
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = func()
+            samples.append(time.perf_counter() - start)
+        return statistics.median(samples), result
+
+    def handle(self, *args, **options):
+        ids = list(range(1, options["ids"] + 1))
+        runs = options["runs"]
+        legacy_tokens = [legacy_encrypt_id(id) for id in ids]
+        fernet_tokens = [encode_fernet_id(id) for id in ids]
+        compact_tokens = encode_compact_ids(ids)
+
+        variants = [
+            ("legacy fernet encode (new Fernet per id)", lambda: [legacy_encrypt_id(id) for id in ids], legacy_tokens),
+            ("cached fernet encode", lambda: [encode_fernet_id(id) for id in ids], fernet_tokens),
+            ("compact encode, one id per call", lambda: [encode_compact_ids([id])[0] for id in ids], compact_tokens),
+            ("compact encode, bulk", lambda: encode_compact_ids(ids), compact_tokens),
+            ("legacy fernet decode", lambda: [legacy_decrypt_id(token) for token in legacy_tokens], legacy_tokens),
+            ("cached fernet decode", lambda: [decode_fernet_id(token) for token in fernet_tokens], fernet_tokens),
+            ("compact decode", lambda: [decode_compact_id(token) for token in compact_tokens], compact_tokens),
+        ]
+
+        baseline = None
+        self.stdout.write(f"{len(ids)} ids, median of {runs} runs")
+        for name, func, tokens in variants:
+            elapsed, result = self._time(func, runs)
+            if name.endswith("decode") and result != ids:
+                self.stderr.write(self.style.ERROR(f"{name} did not round-trip"))
+            per_id_us = elapsed / len(ids) * 1e6
+            if baseline is None or name == "legacy fernet decode":
+                baseline = per_id_us
+            self.stdout.write(
+                f"{name:<42} {per_id_us:8.2f} us/id  {baseline / per_id_us:6.1f}x  "
+                f"token {statistics.mean(len(token) for token in tokens):.0f} chars"
+            )
+        self.stdout.write(
+            f"compact tokens are stable across calls: {encode_compact_ids(ids[:10]) == compact_tokens[:10]}"
+        )
@@ -0,0 +1,164 @@
+import time
+import datetime
+import statistics
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from ImageApp1.models import Document, DocumentContent, DocumentSearchField
+from ImageApp1.pagination import DEFAULT_PAGE_SIZE, keyset_page
+from ImageApp1.search import search_documents, search_rows
+from ImageApp1.serializers import DOCUMENT_LIST_FIELDS, document_queryset
+
+SEED_USERNAME_PREFIX = "search_seed_"
+SEED_VENDORS = [
+    "Acme Industrial Supplies", "Bharat Steel Traders", "Coastal Logistics", "Deccan Office Mart",
+    "Everest Consulting", "Fresh Farm Foods", "Global Travel Desk", "Horizon Software Services",
+]
+SEED_ITEMS = ["consulting services", "steel rods", "office chairs", "air travel", "cloud hosting", "printer toner"]
+SEED_DAYS = 730
+SEED_BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed invoice-like documents with their search index inside a transaction, then time the "
+        "search endpoint's queries and check each one uses a DocumentSearchField index. "
+        "The seed is rolled back unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Documents to seed.")
+        parser.add_argument("--users", type=int, default=100, help="Users the documents are spread over.")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query.")
+        parser.add_argument("--no-seed", action="store_true", help="Search the existing data only.")
+        parser.add_argument("--keep", action="store_true", help="Commit the seeded rows instead of rolling back.")
+
+    def handle(self, *args, **options):
+        failures = []
+        with transaction.atomic():
+            if not options["no_seed"]:
+                self._seed(options["rows"], options["users"])
+            user_id = DocumentSearchField.objects.order_by("-id").values_list("userid_id", flat=True).first()
+            if user_id is None:
+                raise CommandError("No indexed documents to search; run without --no-seed.")
+
+            self.stdout.write(f"\n{'query':<36} {'rows':>6} {'median ms':>10} {'max ms':>8}  index")
+            for name, filters, query in self._queries(user_id):
+                documents = search_documents(Document.objects.filter(userid_id=user_id), filters, query, user_id=user_id)
+                documents = document_queryset(documents, DOCUMENT_LIST_FIELDS)
+                timings = []
+                for _ in range(options["repeat"]):
+                    start = time.perf_counter()
+                    page, _ = keyset_page(documents, None, DEFAULT_PAGE_SIZE)
+                    timings.append((time.perf_counter() - start) * 1000)
+                plan = documents.order_by("-entry_date", "-id").explain()
+                used = "search_user_path_" in plan
+                if not used:
+                    failures.append(name)
+                    self.stdout.write(plan)
+                status = self.style.SUCCESS("ok") if used else self.style.ERROR("not used")
+                self.stdout.write(
+                    f"{name:<36} {len(page):>6} {statistics.median(timings):>10.1f} {max(timings):>8.1f}  {status}"
+                )
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"{len(failures)} search(es) without a search index: {', '.join(failures)}")
+
+    def _seed(self, rows, users):
+        User = get_user_model()
+        start = time.perf_counter()
+        seed_users = User.objects.bulk_create([
+            User(username=f"{SEED_USERNAME_PREFIX}{i}", password="!") for i in range(users)
+        ])
+        user_ids = [user.pk for user in seed_users]
+        if user_ids[0] is None:  # backends that do not return ids from bulk_create
+            user_ids = list(User.objects.filter(username__startswith=SEED_USERNAME_PREFIX).values_list("pk", flat=True))
+
+        today = datetime.date.today()
+        index_rows = 0
+        for offset in range(0, rows, SEED_BATCH_SIZE):
+            numbers = range(offset + 1, min(offset + SEED_BATCH_SIZE, rows) + 1)
+            documents = Document.objects.bulk_create([
+                Document(
+                    userid_id=user_ids[g % len(user_ids)],
+                    file=f"uploads/seed_{g}.pdf",
+                    entry_date=today - datetime.timedelta(days=g % SEED_DAYS),
+                    document_type="invoice",
+                    input_token=1000 + g % 500,
+                    output_token=100 + g % 50,
+                )
+                for g in numbers
+            ])
+            if documents[0].pk is None:
+                documents = list(Document.objects.filter(file__in=[d.file for d in documents]).order_by("id"))
+
+            contents, fields = [], []
+            for g, document in zip(numbers, documents):
+                json_data = self._invoice(g, document.entry_date)
+                contents.append(DocumentContent(document=document, json_data=json_data))
+                fields += [
+                    DocumentSearchField(
+                        document=document, userid_id=document.userid_id, path=path,
+                        value_text=text, value_number=number, value_date=date,
+                    )
+                    for path, text, number, date in search_rows(json_data)
+                ]
+            DocumentContent.objects.bulk_create(contents)
+            DocumentSearchField.objects.bulk_create(fields, batch_size=10000)
+            index_rows += len(fields)
+
+        with connection.cursor() as cursor:
+            for model in (Document, DocumentSearchField):
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+        self.stdout.write(
+            f"Seeded {rows} documents ({index_rows} index rows) for {len(user_ids)} users "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+
+    @staticmethod
+    def _invoice(g, entry_date):
+        items = [
+            {
+                "description": SEED_ITEMS[(g + i) % len(SEED_ITEMS)],
+                "quantity": 1 + i,
+                "amount": (g * 31 + i * 977) % 40000,
+            }
+            for i in range(3)
+        ]
+        return {
+            "invoice_number": f"INV-{g:08d}",
+            "invoice_date": entry_date.isoformat(),
+            "vendor": {"name": SEED_VENDORS[g // 7 % len(SEED_VENDORS)], "gstin": f"29ABCDE{g % 10000:04d}F1Z5"},
+            "line_items": items,
+            "total_amount": sum(item["amount"] for item in items),
+            "currency": "INR",
+        }
+
+    @staticmethod
+    def _queries(user_id):
+        """(name, filters, q) searches the endpoint runs, "invoices from vendor X over 50,000 last quarter" last."""
+        def sample(path, default):
+            values = DocumentSearchField.objects.filter(userid_id=user_id, path=path).values_list("value_text", flat=True)
+            return values.first() or default
+
+        today = datetime.date.today()
+        quarter_start = datetime.date(today.year, 3 * ((today.month - 1) // 3) + 1, 1)
+        last_quarter_end = quarter_start - datetime.timedelta(days=1)
+        last_quarter_start = datetime.date(last_quarter_end.year, 3 * ((last_quarter_end.month - 1) // 3) + 1, 1)
+        vendor = sample("vendor.name", SEED_VENDORS[0])
+        invoice_number = sample("invoice_number", "INV-00000001")
+        return [
+            ("field equality (vendor)", [f"vendor.name={vendor}"], ""),
+            ("unique value (invoice number)", [f"invoice_number={invoice_number}"], ""),
+            ("numeric range (total > 50000)", ["total_amount>50000"], ""),
+            ("date range (last quarter)", [f"invoice_date>={last_quarter_start}", f"invoice_date<={last_quarter_end}"], ""),
+            ("full text (steel)", [], "steel"),
+            ("vendor, > 50000, last quarter", [
+                f"vendor.name={vendor}", "total_amount>50000",
+                f"invoice_date>={last_quarter_start}", f"invoice_date<={last_quarter_end}",
+            ], ""),
+        ]
@@ -0,0 +1,143 @@
+import time
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from ImageApp1.models import RECENT_DOCUMENTS_SINCE, Document
+from ImageApp1.pagination import DEFAULT_PAGE_SIZE
+from ImageApp1.serializers import DOCUMENT_LIST_FIELDS, document_queryset
+
+SEED_USERNAME_PREFIX = "explain_seed_"
+SEED_DOCUMENT_TYPES = ["invoice", "receipt", "reimbursement", "purchase_order"]
+SEED_DAYS = 730
+SEED_BATCH_SIZE = 5000
+
+POSTGRES_SEED_SQL = """
+INSERT INTO {table} (userid_id, filepath, file, entry_date, document_type, input_token, output_token)
+SELECT
+    (%(user_ids)s::bigint[])[1 + g %% %(users)s],
+    '',
+    'uploads/seed_' || g || '.pdf',
+    %(today)s::date - (g %% %(days)s),
+    (%(types)s::text[])[1 + g %% %(type_count)s],
+    1000 + g %% 500,
+    100 + g %% 50
+FROM generate_series(1, %(rows)s) AS g
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a Document dataset inside a transaction, EXPLAIN the listing and filter queries and "
+        "fail when one of them does not use its index. The seed is rolled back unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Documents to seed.")
+        parser.add_argument("--users", type=int, default=1000, help="Users the documents are spread over.")
+        parser.add_argument("--no-seed", action="store_true", help="EXPLAIN against the existing data only.")
+        parser.add_argument("--analyze", action="store_true", help="Use EXPLAIN ANALYZE where supported.")
+        parser.add_argument("--keep", action="store_true", help="Commit the seeded rows instead of rolling back.")
+
+    def handle(self, *args, **options):
+        failures = []
+        with transaction.atomic():
+            if not options["no_seed"]:
+                self._seed(options["rows"], options["users"])
+            user = self._sample_user()
+            if user is None:
+                raise CommandError("No documents to EXPLAIN; run without --no-seed.")
+            for name, queryset, index in self._queries(user):
+                plan = self._explain(queryset, options["analyze"])
+                used = index in plan
+                if not used:
+                    failures.append(name)
+                status = self.style.SUCCESS("ok") if used else self.style.ERROR(f"missing {index}")
+                self.stdout.write(f"\n== {name}: {status}\n{plan}")
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"{len(failures)} query plan(s) without their index: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("\nAll document queries use their indexes"))
+
+    def _seed(self, rows, users):
+        User = get_user_model()
+        start = time.perf_counter()
+        seed_users = User.objects.bulk_create([
+            User(username=f"{SEED_USERNAME_PREFIX}{i}", password="!") for i in range(users)
+        ])
+        user_ids = [user.pk for user in seed_users]
+        if user_ids[0] is None:  # backends that do not return ids from bulk_create
+            user_ids = list(User.objects.filter(username__startswith=SEED_USERNAME_PREFIX).values_list("pk", flat=True))
+
+        today = datetime.date.today()
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(POSTGRES_SEED_SQL.format(table=connection.ops.quote_name(Document._meta.db_table)), {
+                    "user_ids": user_ids, "users": len(user_ids), "today": today, "days": SEED_DAYS,
+                    "types": SEED_DOCUMENT_TYPES, "type_count": len(SEED_DOCUMENT_TYPES), "rows": rows,
+                })
+        else:
+            for offset in range(0, rows, SEED_BATCH_SIZE):
+                Document.objects.bulk_create([
+                    Document(
+                        userid_id=user_ids[g % len(user_ids)],
+                        file=f"uploads/seed_{g}.pdf",
+                        entry_date=today - datetime.timedelta(days=g % SEED_DAYS),
+                        document_type=SEED_DOCUMENT_TYPES[g % len(SEED_DOCUMENT_TYPES)],
+                        input_token=1000 + g % 500,
+                        output_token=100 + g % 50,
+                    )
+                    for g in range(offset + 1, min(offset + SEED_BATCH_SIZE, rows) + 1)
+                ])
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(Document._meta.db_table)}")
+        self.stdout.write(f"Seeded {rows} documents for {len(user_ids)} users in {time.perf_counter() - start:.1f}s")
+
+    def _sample_user(self):
+        document = Document.objects.order_by("-id").only("userid").first()
+        return document.userid_id if document else None
+
+    def _queries(self, user_id):
+        """The querysets the document endpoints run, with the index each one should use."""
+        listing = document_queryset(Document.objects.filter(userid_id=user_id), DOCUMENT_LIST_FIELDS)
+        listing = listing.order_by("-entry_date", "-id")
+        page_limit = DEFAULT_PAGE_SIZE + 1
+        middle = Document.objects.filter(userid_id=user_id).order_by("-entry_date", "-id")[50:51].first()
+        cursor_date, cursor_id = (middle.entry_date, middle.id) if middle else (datetime.date.today(), 0)
+        recent_day = max(RECENT_DOCUMENTS_SINCE, datetime.date.today() - datetime.timedelta(days=30))
+
+        return [
+            ("documents list, first page", listing[:page_limit], "document_user_date_id_idx"),
+            (
+                "documents list, next page",
+                listing.filter(Q(entry_date__lt=cursor_date) | Q(entry_date=cursor_date, id__lt=cursor_id))[:page_limit],
+                "document_user_date_id_idx",
+            ),
+            (
+                "document-filter (userid, date)",
+                Document.objects.filter(userid_id=user_id, entry_date=cursor_date).order_by("id"),
+                "document_user_date_id_idx",
+            ),
+            (
+                "document type in a date range",
+                Document.objects.filter(document_type="receipt", entry_date__gte=recent_day),
+                "document_type_date_idx",
+            ),
+            (
+                "admin feed, recent page",
+                document_queryset(Document.objects.filter(entry_date__gte=RECENT_DOCUMENTS_SINCE), DOCUMENT_LIST_FIELDS)
+                .order_by("-entry_date", "-id")[:page_limit],
+                "document_recent_idx",
+            ),
+        ]
+
+    def _explain(self, queryset, analyze):
+        if analyze and connection.vendor == "postgresql":
+            return queryset.explain(analyze=True, buffers=True)
+        return queryset.explain()
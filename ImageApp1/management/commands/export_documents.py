@@ -0,0 +1,75 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from ImageApp1.export import (
+    CHUNK_SIZE, EXPORT_FORMATS, FORMAT_NDJSON, ExportError, export_documents, parse_column_mapping,
+)
+from ImageApp1.models import Document
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the extracted data of documents as NDJSON, flattened CSV or Parquet, "
+        "streaming rows in constant memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default=FORMAT_NDJSON)
+        parser.add_argument(
+            "--output", "-o", default="-",
+            help="File to write, '-' for stdout (default).",
+        )
+        parser.add_argument("--from", dest="date_from", help="First entry_date to export, YYYY-MM-DD.")
+        parser.add_argument("--to", dest="date_to", help="Last entry_date to export, YYYY-MM-DD.")
+        parser.add_argument("--user-id", type=int, default=None, help="Only export this user's documents.")
+        parser.add_argument("--document-type", default=None, help="Only export this document type.")
+        parser.add_argument(
+            "--columns", default=None,
+            help="column=json.path pairs, comma separated, e.g. vendor=vendor.name,total=total_amount",
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per database fetch.")
+
+    def handle(self, *args, **options):
+        documents = Document.objects.all()
+        for option, lookup in (("date_from", "entry_date__gte"), ("date_to", "entry_date__lte")):
+            if options[option]:
+                try:
+                    value = parse_date(options[option])
+                except ValueError:  # well formed but not a real date, e.g. 2026-02-30
+                    value = None
+                if not value:
+                    raise CommandError(f"Invalid date '{options[option]}'. Please use YYYY-MM-DD.")
+                documents = documents.filter(**{lookup: value})
+        if options["user_id"] is not None:
+            documents = documents.filter(userid_id=options["user_id"])
+        if options["document_type"] is not None:
+            documents = documents.filter(document_type=options["document_type"])
+
+        stats = {"rows": 0}
+        try:
+            stream = export_documents(
+                documents, options["format"], columns=parse_column_mapping(options["columns"]),
+                chunk_size=options["chunk_size"], stats=stats,
+            )
+        except ExportError as e:
+            raise CommandError(e.message)
+
+        started = time.perf_counter()
+        written = 0
+        output = sys.stdout.buffer if options["output"] == "-" else open(options["output"], "wb")
+        try:
+            for data in stream:
+                output.write(data)
+                written += len(data)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        elapsed = time.perf_counter() - started
+
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {stats['rows']} document(s), {written} bytes in {elapsed:.2f}s "
+            f"({stats['rows'] / elapsed if elapsed else 0:.0f} rows/s)"
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from ImageApp1.blob_storage import GC_GRACE_SECONDS, collect_garbage, recount_blob_refs
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete uploaded blobs that no Document references any more, once they have been "
+        "unused for the grace period. Safe to run while uploads are being served."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-seconds", type=int, default=GC_GRACE_SECONDS,
+            help="Keep unreferenced blobs used more recently than this (default from settings).",
+        )
+        parser.add_argument(
+            "--recount", action="store_true",
+            help="Recompute every ref_count from Document first.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted.")
+
+    def handle(self, *args, **options):
+        if options["recount"]:
+            fixed = recount_blob_refs()
+            self.stdout.write(f"Recounted references, {fixed} blob(s) corrected")
+        deleted, freed = collect_garbage(options["grace_seconds"], dry_run=options["dry_run"])
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} blob(s), {freed / (1024 * 1024):.1f} MB"))
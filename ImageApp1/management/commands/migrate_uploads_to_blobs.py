@@ -0,0 +1,45 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ImageApp1.blob_storage import ACTIVE_JOB_STATUSES, move_to_blob_store
+from ImageApp1.models import Document, ExtractionJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Move uploads stored under their original names into the content-addressed blob store, "
+        "sharing one file between identical uploads. Documents keep their file name as original_name."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None, help="Move at most this many files.")
+
+    def handle(self, *args, **options):
+        busy = set(ExtractionJob.objects.filter(status__in=ACTIVE_JOB_STATUSES).values_list('filepath', flat=True))
+        paths = (
+            Document.objects.filter(blob__isnull=True).exclude(file='')
+            .order_by('file').values_list('file', flat=True).distinct()
+        )
+        if options["limit"]:
+            paths = paths[:options["limit"]]
+
+        files = documents = duplicates = missing = pending = 0
+        for relative_path in paths.iterator():
+            if relative_path in busy:
+                pending += 1  # moved on a later run, once its job is done
+                continue
+            if not os.path.exists(os.path.join(settings.MEDIA_ROOT, relative_path)):
+                missing += 1
+                continue
+            moved, deduplicated = move_to_blob_store(relative_path)
+            files += 1
+            documents += moved
+            duplicates += deduplicated
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {files} file(s) of {documents} document(s) to blob storage, {duplicates} duplicate(s) removed"
+        ))
+        if missing or pending:
+            self.stderr.write(f"Skipped {missing} missing file(s) and {pending} with a pending extraction job")
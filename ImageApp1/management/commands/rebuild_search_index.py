@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from ImageApp1.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DocumentSearchField index from the stored json_data."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user-id", type=int, default=None,
+            help="Only re-index the documents of this user.",
+        )
+
+    def handle(self, *args, **options):
+        documents = rebuild_search_index(user_id=options["user_id"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {documents} document(s)"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from ImageApp1.usage import rebuild_usage
+
+
+class Command(BaseCommand):
+    help = "Recompute the DailyUsage token rollups from the Document table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user-id", type=int, default=None,
+            help="Only rebuild the rollups of this user.",
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_usage(user_id=options["user_id"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} daily usage row(s)"))
@@ -0,0 +1,43 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from ImageApp1.jobs import DEFAULT_POLL_INTERVAL, DEFAULT_WORKER_CONCURRENCY, run_worker
+
+
+class Command(BaseCommand):
+    help = "Process queued extraction jobs created by the /IDA/upload/ endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, default=DEFAULT_WORKER_CONCURRENCY,
+            help="Number of jobs this process runs in parallel.",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+            help="Seconds to wait before polling an empty queue again.",
+        )
+        parser.add_argument(
+            "--burst", action="store_true",
+            help="Exit once the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        stop_event = threading.Event()
+
+        def _stop(signum, frame):
+            self.stdout.write("Shutdown requested, finishing running jobs...")
+            stop_event.set()
+
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+
+        self.stdout.write(f"Starting extraction worker with concurrency={options['concurrency']}")
+        run_worker(
+            concurrency=options["concurrency"],
+            poll_interval=options["poll_interval"],
+            burst=options["burst"],
+            stop_event=stop_event,
+        )
+        self.stdout.write(self.style.SUCCESS("Extraction worker stopped."))
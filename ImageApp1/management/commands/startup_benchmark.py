@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Modules that must not be imported while Django boots; they belong to first use
+DEFAULT_FORBIDDEN_MODULES = ("vertexai", "google.generativeai", "google.auth", "PIL")
+
+# Runs in a fresh interpreter so every sample is a cold start
+PROBE = """
+import json, os, sys, time
+from importlib import import_module
+start = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.conf import settings
+import_module(settings.ROOT_URLCONF)
+urls_done = time.perf_counter()
+print(json.dumps({
+    "setup_ms": (setup_done - start) * 1000,
+    "urlconf_ms": (urls_done - setup_done) * 1000,
+    "total_ms": (urls_done - start) * 1000,
+    "loaded": [name for name in json.loads(sys.argv[1]) if name in sys.modules],
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure cold-start time (django.setup() + URLconf import) in fresh interpreters "
+        "and fail if it exceeds the budget or eagerly imports model SDKs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Number of cold starts to sample.")
+        parser.add_argument(
+            "--budget-ms", type=float, default=getattr(settings, "STARTUP_BUDGET_MS", 1500),
+            help="Fail when the median startup time is above this many milliseconds.",
+        )
+        parser.add_argument(
+            "--forbid", nargs="*", default=list(DEFAULT_FORBIDDEN_MODULES),
+            help="Modules that must not be loaded at startup.",
+        )
+
+    def _sample(self, forbidden):
+        env = dict(os.environ)
+        env.setdefault("DJANGO_SETTINGS_MODULE", os.environ.get("DJANGO_SETTINGS_MODULE", "ImageExtraction.settings"))
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE, json.dumps(forbidden)],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Startup probe failed:\n{result.stderr}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        samples = [self._sample(options["forbid"]) for _ in range(options["runs"])]
+
+        setup_ms = statistics.median(sample["setup_ms"] for sample in samples)
+        urlconf_ms = statistics.median(sample["urlconf_ms"] for sample in samples)
+        total_ms = statistics.median(sample["total_ms"] for sample in samples)
+        loaded = sorted({name for sample in samples for name in sample["loaded"]})
+
+        self.stdout.write(f"django.setup():  {setup_ms:8.1f} ms (median of {len(samples)})")
+        self.stdout.write(f"URLconf import:  {urlconf_ms:8.1f} ms")
+        self.stdout.write(f"Total:           {total_ms:8.1f} ms (budget {options['budget_ms']:.0f} ms)")
+
+        if loaded:
+            raise CommandError(f"Heavy modules imported at startup: {', '.join(loaded)}")
+        if total_ms > options["budget_ms"]:
+            raise CommandError(
+                f"Startup regression: {total_ms:.1f} ms exceeds the {options['budget_ms']:.0f} ms budget"
+            )
+        self.stdout.write(self.style.SUCCESS("Startup time within budget."))
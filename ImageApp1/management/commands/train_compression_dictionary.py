@@ -0,0 +1,49 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ImageApp1.compression import DEFAULT_LEVELS, DICTIONARY_DIR, dictionary_path, train_dictionary
+from ImageApp1.models import DocumentContent
+
+DEFAULT_DICTIONARY_SIZE = 112640  # zstd's default, 110 KiB
+
+
+class Command(BaseCommand):
+    help = (
+        "Train a zstd dictionary on stored HTML reports and write it to CONTENT_COMPRESSION['DICTIONARY_DIR']. "
+        "Enable it with CONTENT_COMPRESSION_CODEC=zstd and CONTENT_COMPRESSION_DICTIONARY_ID=<printed id>."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--samples", type=int, default=2000, help="Most recent reports to train on.")
+        parser.add_argument("--size", type=int, default=DEFAULT_DICTIONARY_SIZE, help="Dictionary size in bytes.")
+
+    def handle(self, *args, **options):
+        rows = (
+            DocumentContent.objects.exclude(html_content__isnull=True)
+            .order_by("-document_id").values_list("html_content", flat=True)[:options["samples"]]
+        )
+        samples = [html.encode("utf-8") for html in rows]  # decompressed by the field
+        if len(samples) < 10:
+            raise CommandError(f"Need at least 10 stored reports to train on, found {len(samples)}.")
+
+        start = time.perf_counter()
+        dict_id, data = train_dictionary(samples, options["size"])
+        os.makedirs(DICTIONARY_DIR, exist_ok=True)
+        path = dictionary_path(dict_id)
+        with open(path, "wb") as f:
+            f.write(data)
+
+        import zstandard
+        plain = sum(len(sample) for sample in samples)
+        level = DEFAULT_LEVELS["zstd"]
+        with_dictionary = zstandard.ZstdCompressor(level=level, dict_data=zstandard.ZstdCompressionDict(data))
+        without_dictionary = zstandard.ZstdCompressor(level=level)
+        dict_size = sum(len(with_dictionary.compress(sample)) for sample in samples)
+        plain_size = sum(len(without_dictionary.compress(sample)) for sample in samples)
+        self.stdout.write(
+            f"Trained on {len(samples)} reports ({plain} bytes) in {time.perf_counter() - start:.1f}s\n"
+            f"zstd ratio without dictionary: {plain / plain_size:.1f}x, with: {plain / dict_size:.1f}x"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {path}; set CONTENT_COMPRESSION_DICTIONARY_ID={dict_id}"))
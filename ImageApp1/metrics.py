@@ -0,0 +1,421 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import fcntl
+import logging
+import tempfile
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+METRICS = getattr(settings, "METRICS", {})
+ENABLED = METRICS.get("ENABLED", True)
+DIRECTORY = METRICS.get("DIRECTORY", os.path.join(tempfile.gettempdir(), "imageextraction_metrics"))
+FLUSH_INTERVAL = METRICS.get("FLUSH_INTERVAL", 5.0)  # seconds between writes of a process's values
+MAX_DOCUMENT_TYPES = METRICS.get("MAX_DOCUMENT_TYPES", 20)  # distinct document_type label values per process
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+ARCHIVE_FILE = "metrics-archive.json"  # values of worker processes that have exited
+LOCK_FILE = ".lock"
+
+# Seconds; model calls can take minutes, JSON parsing well under a millisecond
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+OUTCOME_SUCCESS = "success"
+OUTCOME_ERROR = "error"
+
+Samples = Dict[Tuple[str, ...], list]
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Samples = {}
+        registry.register(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _empty(self) -> list:
+        raise NotImplementedError
+
+    def merge(self, into: list, values: list) -> bool:
+        """Add one process's values of a label set to the running totals; False if they do not fit."""
+        if len(into) != len(values):
+            return False
+        for index, value in enumerate(values):
+            into[index] += value
+        return True
+
+    def render(self, samples: Samples) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonic total; names end in _total."""
+
+    type = "counter"
+
+    def _empty(self) -> list:
+        return [0.0]
+
+    def inc(self, amount: float = 1, **labels):
+        if not ENABLED or not amount:
+            return
+        key = self._key(labels)
+        with self.registry.lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0.0]
+            values[0] += amount
+        self.registry.touch()
+
+    def render(self, samples: Samples) -> List[str]:
+        if not samples and not self.labelnames:
+            return [f"{self.name} 0"]
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(values[0])}" for key, values in samples.items()]
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative le buckets, with _sum and _count."""
+
+    type = "histogram"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(float(bucket) for bucket in buckets)
+        super().__init__(registry, name, documentation, labelnames)
+
+    def _empty(self) -> list:
+        # One count per bucket plus +Inf, then the sum of observed values
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value: float, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self.registry.lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = self._empty()
+            values[index] += 1
+            values[-1] += value
+        self.registry.touch()
+
+    def render(self, samples: Samples) -> List[str]:
+        lines = []
+        names = self.labelnames + ("le",)
+        for key, values in samples.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(names, key + (le,))} {_number(cumulative)}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(values[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {_number(cumulative)}")
+        return lines
+
+
+def _number(value) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms of this process, exposed for every worker on
+    the host in Prometheus text format.
+
+    Recording is an in-memory update under one lock, so it is cheap enough
+    for the hot path. A daemon thread writes the process's values to its
+    own file in directory every flush_interval seconds (and at exit);
+    render() merges the files of all processes. Files of processes that
+    have exited are folded into one archive file, so counters survive
+    worker restarts. A forked child (gunicorn workers) starts from zero
+    with a file of its own.
+    """
+
+    def __init__(self, directory: str = DIRECTORY, flush_interval: float = FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics: Dict[str, Metric] = {}
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self.lock = threading.Lock()
+        self._dirty = False
+        self._flusher = None
+        self._file = os.path.join(self.directory, f"metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json")
+        for metric in self._metrics.values():
+            metric._values = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return Counter(self, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return Histogram(self, name, documentation, labelnames, buckets)
+
+    def touch(self):
+        self._dirty = True
+        if self._flusher is None:
+            with self.lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _snapshot(self) -> dict:
+        with self.lock:
+            self._dirty = False
+            return {
+                name: [[list(key), list(values)] for key, values in metric._values.items()]
+                for name, metric in self._metrics.items() if metric._values
+            }
+
+    def flush(self, force: bool = False):
+        """Write this process's values to its file, if anything was recorded since the last write."""
+        if not (self._dirty or force):
+            return
+        try:
+            _write_json(self._file, self._snapshot())
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {self._file}: {str(e)}")
+
+    def collect(self) -> Dict[str, Samples]:
+        """Values of every process on the host, merged per metric and label set."""
+        self.flush(force=True)
+        merged: Dict[str, Samples] = {}
+        archive: Dict[str, Samples] = {}
+        exited = []
+        with _locked(os.path.join(self.directory, LOCK_FILE)):
+            for file_name in sorted(os.listdir(self.directory)):
+                if not (file_name.startswith("metrics-") and file_name.endswith(".json")):
+                    continue
+                path = os.path.join(self.directory, file_name)
+                data = _read_json(path)
+                self._merge(merged, data)
+                if file_name == ARCHIVE_FILE or not _process_alive(file_name):
+                    self._merge(archive, data)
+                    if file_name != ARCHIVE_FILE:
+                        exited.append(path)
+            if exited:
+                # Archive first: a crash in between double counts an exited worker, it never loses one
+                _write_json(os.path.join(self.directory, ARCHIVE_FILE), {
+                    name: [[list(key), values] for key, values in samples.items()]
+                    for name, samples in archive.items()
+                })
+                for path in exited:
+                    os.remove(path)
+        return merged
+
+    def _merge(self, into: Dict[str, Samples], data: dict):
+        for name, samples in (data or {}).items():
+            metric = self._metrics.get(name)
+            if metric is None:
+                continue  # dropped since that process wrote it
+            totals = into.setdefault(name, {})
+            for key, values in samples:
+                key = tuple(key)
+                if key not in totals:
+                    totals[key] = metric._empty()
+                if not metric.merge(totals[key], values):
+                    logger.warning(f"Skipping {name}{key} values recorded with different buckets")
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        merged = self.collect() if ENABLED else {}
+        lines = []
+        for name in sorted(self._metrics):
+            metric = self._metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            lines.extend(metric.render(dict(sorted(merged.get(name, {}).items()))))
+        return "\n".join(lines) + "\n"
+
+
+def _write_json(path: str, data: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(temp_path, path)
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}  # removed or replaced while listing
+
+
+def _process_alive(file_name: str) -> bool:
+    """Whether the process that writes metrics-<pid>-<token>.json is still running."""
+    try:
+        pid = int(file_name.split("-")[1])
+        os.kill(pid, 0)
+    except (ValueError, IndexError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass  # exists, owned by another user
+    return True
+
+
+@contextmanager
+def _locked(path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+REGISTRY = MetricsRegistry()
+
+# Upload pipeline stages, see timed_stage
+STAGE_FILE_SAVE = "file_save"
+STAGE_EXTRACTION_CALL = "extraction_call"
+STAGE_JSON_PARSE = "json_parse"
+STAGE_HTML_CALL = "html_call"
+STAGE_HTML_RENDER = "html_render"  # the local renderer, no model call
+STAGE_SIDECAR_WRITE = "sidecar_write"
+STAGE_DB_INSERT = "db_insert"
+
+PIPELINE_STAGE_SECONDS = REGISTRY.histogram(
+    "pipeline_stage_seconds",
+    "Duration of upload pipeline stages by stage, document_type and outcome.",
+    ("stage", "document_type", "outcome"),
+)
+MODEL_CALLS = REGISTRY.counter(
+    "model_calls_total",
+    "Model API calls by api and outcome (success, cache_hit, shed, failed, cancelled).",
+    ("api", "outcome"),
+)
+MODEL_ATTEMPT_SECONDS = REGISTRY.histogram(
+    "model_attempt_seconds",
+    "Provider latency of single model call attempts, by outcome (success or error class).",
+    ("outcome",),
+)
+MODEL_ERRORS = REGISTRY.counter(
+    "model_call_errors_total",
+    "Failed model call attempts by error class; quota counts the provider's 429 responses.",
+    ("error_class",),
+)
+MODEL_RETRIES = REGISTRY.counter(
+    "model_call_retries_total",
+    "Model call attempts retried after an error, by error class.",
+    ("error_class",),
+)
+MODEL_INPUT_TOKENS = REGISTRY.counter("model_input_tokens_total", "Prompt tokens billed by the provider.")
+MODEL_OUTPUT_TOKENS = REGISTRY.counter("model_output_tokens_total", "Response tokens billed by the provider.")
+MODEL_REQUEST_BYTES = REGISTRY.counter(
+    "model_request_bytes_total", "Bytes of prompt text and input data sent to the provider, every attempt."
+)
+
+_document_type = contextvars.ContextVar("metrics_document_type", default=None)
+_document_types = set()
+
+
+def document_type_label(document_type: Optional[str]) -> str:
+    """document_type as a label value; client supplied, so capped at MAX_DOCUMENT_TYPES values."""
+    if not document_type:
+        return "none"
+    label = str(document_type)[:64]
+    if label in _document_types:
+        return label
+    if len(_document_types) >= MAX_DOCUMENT_TYPES:
+        return "other"
+    _document_types.add(label)
+    return label
+
+
+@contextmanager
+def document_type_context(document_type: Optional[str]):
+    """Label the stages timed inside the block (and its tasks and to_thread calls) with document_type."""
+    token = _document_type.set(document_type_label(document_type))
+    try:
+        yield
+    finally:
+        try:
+            _document_type.reset(token)
+        except ValueError:
+            pass  # an async generator closed from another context, e.g. after a client disconnect
+
+
+class StageTimer:
+    """Context manager returned by timed_stage."""
+
+    def __init__(self, stage: str, document_type: Optional[str] = None):
+        self.stage = stage
+        self.document_type = document_type
+        self.outcome = OUTCOME_SUCCESS
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self.outcome == OUTCOME_SUCCESS:
+            self.outcome = OUTCOME_ERROR
+        if self.document_type is not None:
+            document_type = document_type_label(self.document_type)
+        else:
+            document_type = _document_type.get() or "none"
+        PIPELINE_STAGE_SECONDS.observe(
+            time.perf_counter() - self._started, stage=self.stage, document_type=document_type, outcome=self.outcome
+        )
+        return False
+
+
+def timed_stage(stage: str, document_type: Optional[str] = None) -> StageTimer:
+    """
+    Observe the duration of a block in PIPELINE_STAGE_SECONDS. The outcome
+    is "success", or "error" if the block raises, unless the block sets
+    another one; document_type defaults to the enclosing
+    document_type_context.
+
+        with timed_stage(STAGE_FILE_SAVE) as stage:
+            ...
+            stage.outcome = "rejected"
+    """
+    return StageTimer(stage, document_type)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
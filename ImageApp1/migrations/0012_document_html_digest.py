@@ -0,0 +1,18 @@
+# Generated by Django 4.2.21 on 2026-10-17 08:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ImageApp1', '0011_extractionjob_renderer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='html_digest',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
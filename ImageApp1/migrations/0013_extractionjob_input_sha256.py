@@ -0,0 +1,18 @@
+# Generated by Django 4.2.21 on 2026-10-17 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ImageApp1', '0012_document_html_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractionjob',
+            name='input_sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
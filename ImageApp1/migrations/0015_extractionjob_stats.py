@@ -0,0 +1,18 @@
+# Generated by Django 4.2.21 on 2026-10-17 08:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ImageApp1', '0014_extraction_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractionjob',
+            name='stats',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.21 on 2026-10-17 08:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ImageApp1', '0015_extractionjob_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('document_type', models.CharField(blank=True, default='', max_length=255)),
+                ('document_count', models.IntegerField(default=0)),
+                ('input_tokens', models.BigIntegerField(default=0)),
+                ('output_tokens', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('userid', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='dailyusage_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyusage',
+            constraint=models.UniqueConstraint(fields=('userid', 'date', 'document_type'), name='dailyusage_user_date_type_uniq'),
+        ),
+    ]
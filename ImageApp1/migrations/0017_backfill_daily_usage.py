@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def backfill_daily_usage(apps, schema_editor):
+    from ImageApp1.usage import rebuild_usage
+
+    rebuild_usage(apps.get_model('ImageApp1', 'Document'), apps.get_model('ImageApp1', 'DailyUsage'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ImageApp1', '0016_daily_usage'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.21 on 2026-10-17 08:38
+
+import datetime
+from django.db import migrations, models
+
+from ImageApp1.migration_operations import AddIndexConcurrentlyOnPostgres
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction; Document stays writable while the indexes build
+    atomic = False
+
+    dependencies = [
+        ('ImageApp1', '0017_backfill_daily_usage'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyOnPostgres(
+            model_name='document',
+            index=models.Index(fields=['userid', 'entry_date', 'id'], name='document_user_date_id_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='document',
+            index=models.Index(fields=['document_type', 'entry_date'], name='document_type_date_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='document',
+            index=models.Index(condition=models.Q(('entry_date__gte', datetime.date(2026, 1, 1))), fields=['-entry_date', '-id'], name='document_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.21 on 2026-10-17 08:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ImageApp1', '0018_document_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentContent',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='content', serialize=False, to='ImageApp1.document')),
+                ('json_data', models.JSONField(blank=True, null=True)),
+                ('html_content', models.TextField(blank=True, null=True)),
+                ('html_digest', models.CharField(blank=True, max_length=64, null=True)),
+            ],
+        ),
+    ]
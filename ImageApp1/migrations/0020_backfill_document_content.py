@@ -0,0 +1,63 @@
+from django.db import migrations, transaction
+
+# Rows per transaction; each batch holds at most this many HTML payloads in memory
+BATCH_SIZE = 500
+
+
+def copy_content_forward(apps, schema_editor):
+    """
+    Copy json_data/html_content/html_digest into DocumentContent in
+    primary key order, one short transaction per batch. Only plain SELECTs
+    run against the Document table, so it stays writable throughout.
+    """
+    Document = apps.get_model('ImageApp1', 'Document')
+    DocumentContent = apps.get_model('ImageApp1', 'DocumentContent')
+    db_alias = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        rows = list(
+            Document.objects.using(db_alias).filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'json_data', 'html_content', 'html_digest')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        with transaction.atomic(using=db_alias):
+            DocumentContent.objects.using(db_alias).bulk_create([
+                DocumentContent(document_id=pk, json_data=json_data, html_content=html_content, html_digest=digest)
+                for pk, json_data, html_content, digest in rows
+            ], ignore_conflicts=True)
+        last_id = rows[-1][0]
+
+
+def copy_content_backward(apps, schema_editor):
+    Document = apps.get_model('ImageApp1', 'Document')
+    DocumentContent = apps.get_model('ImageApp1', 'DocumentContent')
+    db_alias = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        contents = list(
+            DocumentContent.objects.using(db_alias).filter(document_id__gt=last_id).order_by('document_id')[:BATCH_SIZE]
+        )
+        if not contents:
+            break
+        with transaction.atomic(using=db_alias):
+            for content in contents:
+                Document.objects.using(db_alias).filter(id=content.document_id).update(
+                    json_data=content.json_data, html_content=content.html_content, html_digest=content.html_digest,
+                )
+        last_id = contents[-1].document_id
+
+
+class Migration(migrations.Migration):
+    # Every batch commits on its own instead of one transaction over the whole table
+    atomic = False
+
+    dependencies = [
+        ('ImageApp1', '0019_document_content'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_content_forward, copy_content_backward),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def copy_remaining_content(apps, schema_editor):
+    """Documents created by servers still running the old code after 0020 ran."""
+    Document = apps.get_model('ImageApp1', 'Document')
+    DocumentContent = apps.get_model('ImageApp1', 'DocumentContent')
+    db_alias = schema_editor.connection.alias
+
+    missing = Document.objects.using(db_alias).filter(content__isnull=True)
+    DocumentContent.objects.using(db_alias).bulk_create([
+        DocumentContent(document_id=pk, json_data=json_data, html_content=html_content, html_digest=digest)
+        for pk, json_data, html_content, digest in missing.values_list('id', 'json_data', 'html_content', 'html_digest')
+    ], batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ImageApp1', '0020_backfill_document_content'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_remaining_content, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='document',
+            name='html_content',
+        ),
+        migrations.RemoveField(
+            model_name='document',
+            name='html_digest',
+        ),
+        migrations.RemoveField(
+            model_name='document',
+            name='json_data',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.21 on 2026-10-17 08:42
+
+import ImageApp1.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ImageApp1', '0021_remove_document_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentcontent',
+            name='html_content_compressed',
+            field=ImageApp1.fields.CompressedTextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='documentcontent',
+            name='json_data_compressed',
+            field=ImageApp1.fields.CompressedJSONField(blank=True, null=True),
+        ),
+    ]
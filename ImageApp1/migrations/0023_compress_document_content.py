@@ -0,0 +1,59 @@
+from django.db import migrations, transaction
+
+# Rows per transaction, as in 0020_backfill_document_content
+BATCH_SIZE = 500
+
+
+def compress_content(apps, schema_editor):
+    """Fill the compressed columns in primary key batches; the field classes do the compression."""
+    DocumentContent = apps.get_model('ImageApp1', 'DocumentContent')
+    db_alias = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        contents = list(
+            DocumentContent.objects.using(db_alias).filter(document_id__gt=last_id).order_by('document_id')
+            .only('document_id', 'json_data', 'html_content')[:BATCH_SIZE]
+        )
+        if not contents:
+            break
+        for content in contents:
+            content.json_data_compressed = content.json_data
+            content.html_content_compressed = content.html_content
+        with transaction.atomic(using=db_alias):
+            DocumentContent.objects.using(db_alias).bulk_update(
+                contents, ['json_data_compressed', 'html_content_compressed']
+            )
+        last_id = contents[-1].document_id
+
+
+def decompress_content(apps, schema_editor):
+    DocumentContent = apps.get_model('ImageApp1', 'DocumentContent')
+    db_alias = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        contents = list(
+            DocumentContent.objects.using(db_alias).filter(document_id__gt=last_id).order_by('document_id')
+            .only('document_id', 'json_data_compressed', 'html_content_compressed')[:BATCH_SIZE]
+        )
+        if not contents:
+            break
+        for content in contents:
+            content.json_data = content.json_data_compressed
+            content.html_content = content.html_content_compressed
+        with transaction.atomic(using=db_alias):
+            DocumentContent.objects.using(db_alias).bulk_update(contents, ['json_data', 'html_content'])
+        last_id = contents[-1].document_id
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('ImageApp1', '0022_documentcontent_compressed_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(compress_content, decompress_content),
+    ]
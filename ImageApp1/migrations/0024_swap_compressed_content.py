@@ -0,0 +1,68 @@
+from django.db import migrations
+
+# Rows per batch, as in 0023_compress_document_content
+BATCH_SIZE = 500
+
+
+def compress_remaining_content(apps, schema_editor):
+    """
+    Carry over what servers still running the old code wrote after 0023
+    ran: new rows, and json_data or html_content (the lazy render cache)
+    updated on rows 0023 had already copied. Every row is compared column
+    by column, so the drop below loses no write made before this runs.
+    Writes landing while this migration runs can still be lost: apply it
+    once the old servers are drained.
+    """
+    DocumentContent = apps.get_model('ImageApp1', 'DocumentContent')
+    db_alias = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        contents = list(
+            DocumentContent.objects.using(db_alias).filter(document_id__gt=last_id).order_by('document_id')
+            .only('document_id', 'json_data', 'html_content', 'json_data_compressed', 'html_content_compressed')
+            [:BATCH_SIZE]
+        )
+        if not contents:
+            break
+        changed = []
+        for content in contents:
+            if content.json_data == content.json_data_compressed \
+                    and content.html_content == content.html_content_compressed:
+                continue
+            content.json_data_compressed = content.json_data
+            content.html_content_compressed = content.html_content
+            changed.append(content)
+        DocumentContent.objects.using(db_alias).bulk_update(
+            changed, ['json_data_compressed', 'html_content_compressed']
+        )
+        last_id = contents[-1].document_id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ImageApp1', '0023_compress_document_content'),
+    ]
+
+    operations = [
+        migrations.RunPython(compress_remaining_content, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='documentcontent',
+            name='html_content',
+        ),
+        migrations.RemoveField(
+            model_name='documentcontent',
+            name='json_data',
+        ),
+        migrations.RenameField(
+            model_name='documentcontent',
+            old_name='html_content_compressed',
+            new_name='html_content',
+        ),
+        migrations.RenameField(
+            model_name='documentcontent',
+            old_name='json_data_compressed',
+            new_name='json_data',
+        ),
+    ]
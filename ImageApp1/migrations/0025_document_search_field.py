@@ -0,0 +1,31 @@
+# Generated by Django 4.2.21 on 2026-10-17 08:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ImageApp1', '0024_swap_compressed_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSearchField',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255)),
+                ('value_text', models.CharField(max_length=255)),
+                ('value_number', models.FloatField(blank=True, null=True)),
+                ('value_date', models.DateField(blank=True, null=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_fields', to='ImageApp1.document')),
+                ('userid', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['userid', 'path', 'value_text', 'document'], name='search_user_path_text_idx'), models.Index(fields=['userid', 'path', 'value_number', 'document'], name='search_user_path_number_idx'), models.Index(fields=['userid', 'path', 'value_date', 'document'], name='search_user_path_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def backfill_search_index(apps, schema_editor):
+    from ImageApp1.search import rebuild_search_index
+
+    rebuild_search_index(apps.get_model('ImageApp1', 'DocumentContent'), apps.get_model('ImageApp1', 'DocumentSearchField'))
+
+
+class Migration(migrations.Migration):
+    # rebuild_search_index commits one batch at a time
+    atomic = False
+
+    dependencies = [
+        ('ImageApp1', '0025_document_search_field'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.21 on 2026-10-17 09:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+from ImageApp1.migration_operations import AddIndexConcurrentlyOnPostgres
+
+
+class Migration(migrations.Migration):
+    # The Document indexes are built with CREATE INDEX CONCURRENTLY, which cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('ImageApp1', '0026_backfill_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='extraction_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='original_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('mime_type', models.CharField(max_length=100)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'last_used_at'], name='blob_gc_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='documents', db_index=False, to='ImageApp1.blob'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='document',
+            index=models.Index(fields=['extraction_key'], name='document_extraction_key_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='document',
+            index=models.Index(fields=['blob'], name='document_blob_idx'),
+        ),
+    ]
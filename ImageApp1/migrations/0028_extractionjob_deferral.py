@@ -0,0 +1,23 @@
+# Generated by Django 4.2.21 on 2026-10-17 09:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ImageApp1', '0027_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractionjob',
+            name='available_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='extractionjob',
+            name='deferrals',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,73 @@
+"""
+Model providers behind call_gemini_api.
+
+MODEL_BACKEND selects the provider:
+    vertex  - Gemini on Vertex AI (default)
+    fake    - offline FakeBackend, see FAKE_MODEL_* variables
+    record  - call MODEL_RECORD_BACKEND (default vertex) and save responses to MODEL_REPLAY_DIR
+    replay  - serve responses previously recorded in MODEL_REPLAY_DIR
+"""
+import os
+import threading
+
+from .base import (
+    ContentPart, ModelBackend, StreamChunk, build_response, estimate_tokens, request_bytes, request_fingerprint,
+    response_text,
+)
+
+DEFAULT_REPLAY_DIR = os.path.join("recordings", "model")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name: str) -> ModelBackend:
+    """Instantiate a provider by name. Provider modules are imported on demand."""
+    if name == "vertex":
+        from .vertex import VertexBackend
+        return VertexBackend()
+    if name == "fake":
+        from .fake import FakeBackend
+        return FakeBackend()
+    if name in ("record", "replay"):
+        from .replay import RecordReplayBackend
+        directory = os.getenv("MODEL_REPLAY_DIR", DEFAULT_REPLAY_DIR)
+        inner = create_backend(os.getenv("MODEL_RECORD_BACKEND", "vertex")) if name == "record" else None
+        return RecordReplayBackend(directory, mode=name, inner=inner)
+    raise ValueError(f"Unknown MODEL_BACKEND '{name}'")
+
+
+def get_model_backend() -> ModelBackend:
+    """
+    The process-wide backend selected by MODEL_BACKEND, created on first use.
+
+    Creation is guarded by a lock, so concurrent first requests in a worker
+    thread pool initialize the provider (credentials, SDK client) only once.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(os.getenv("MODEL_BACKEND", "vertex"))
+    return _backend
+
+
+def model_backend_source() -> str:
+    """
+    ModelBackend.source of the process-wide backend, for cache and
+    extraction keys. Read from MODEL_BACKEND until the backend exists, so a
+    cache hit does not pay for the provider's client initialization.
+    """
+    if _backend is not None:
+        return _backend.source
+    name = os.getenv("MODEL_BACKEND", "vertex")
+    if name == "record":
+        return os.getenv("MODEL_RECORD_BACKEND", "vertex")
+    return name
+
+
+def set_model_backend(backend: ModelBackend):
+    """Swap the process-wide backend, e.g. for a benchmark run."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
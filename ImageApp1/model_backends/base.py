@@ -0,0 +1,139 @@
+import asyncio
+import base64
+import hashlib
+import json
+import math
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# Gemini bills every image (and every PDF page) at a flat 258 tokens
+TOKENS_PER_MEDIA_PART = 258
+
+
+@dataclass
+class ContentPart:
+    """Provider neutral request part: either text or raw bytes with a MIME type."""
+
+    text: Optional[str] = None
+    data: Optional[bytes] = None
+    mime_type: Optional[str] = None
+
+    @classmethod
+    def from_text(cls, text: str) -> "ContentPart":
+        return cls(text=text)
+
+    @classmethod
+    def from_data(cls, data: bytes, mime_type: str) -> "ContentPart":
+        return cls(data=data, mime_type=mime_type)
+
+    @property
+    def is_text(self) -> bool:
+        return self.data is None
+
+    def fingerprint(self) -> str:
+        if self.is_text:
+            return "text:" + hashlib.sha256((self.text or "").encode("utf-8")).hexdigest()
+        return f"data:{self.mime_type}:" + hashlib.sha256(self.data).hexdigest()
+
+    def to_json(self) -> Dict[str, Any]:
+        if self.is_text:
+            return {"text": self.text}
+        return {"mime_type": self.mime_type, "data": base64.b64encode(self.data).decode("ascii")}
+
+
+@dataclass
+class StreamChunk:
+    """One piece of a streamed generate: a text delta, or on the last chunk the assembled response."""
+
+    text: str = ""
+    response: Optional[Dict[str, Any]] = None
+
+
+def estimate_tokens(parts: List[ContentPart]) -> int:
+    """Rough prompt size without a count_tokens round trip: ~4 characters per text token."""
+    tokens = 0
+    for part in parts:
+        if part.is_text:
+            tokens += math.ceil(len(part.text or "") / 4)
+        else:
+            tokens += TOKENS_PER_MEDIA_PART
+    return tokens
+
+
+def request_bytes(parts: List[ContentPart]) -> int:
+    """Size of the prompt text (UTF-8) and input data of a request."""
+    return sum(len((part.text or "").encode("utf-8")) if part.is_text else len(part.data) for part in parts)
+
+
+def request_fingerprint(parts: List[ContentPart], generation_config: Dict[str, Any]) -> str:
+    """Stable identifier of a generate request, used by the record/replay backend."""
+    material = json.dumps({
+        "parts": [part.fingerprint() for part in parts],
+        "generation_config": generation_config,
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def build_response(text: str, prompt_tokens: int = 0, candidate_tokens: int = 0,
+                   finish_reason: str = "STOP", block_reason: Optional[str] = None) -> Dict[str, Any]:
+    """Response dict in the shape call_gemini_api has always returned."""
+    return {
+        "candidates": [] if block_reason else [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": finish_reason,
+            "safetyRatings": [],
+        }],
+        "promptFeedback": {"blockReason": block_reason, "safetyRatings": []},
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": candidate_tokens,
+            "totalTokenCount": prompt_tokens + candidate_tokens,
+        },
+    }
+
+
+def response_text(response: Dict[str, Any]) -> str:
+    """Text of the first candidate of a response dict, "" when it has none."""
+    try:
+        return "".join(part.get("text", "") for part in response["candidates"][0]["content"]["parts"])
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+
+class ModelBackend:
+    """
+    Interface every model provider implements.
+
+    generation_config is a plain dict with temperature, top_p, top_k,
+    max_output_tokens and an optional response_mime_type. generate() returns
+    the formatted response dict (see build_response).
+    """
+
+    name = "base"
+
+    @property
+    def source(self) -> str:
+        """The provider whose output generate() returns; cache and extraction keys are scoped by it."""
+        return self.name
+
+    def generate(self, parts: List[ContentPart], generation_config: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def count_tokens(self, parts: List[ContentPart]) -> int:
+        raise NotImplementedError
+
+    async def agenerate(self, parts: List[ContentPart], generation_config: Dict[str, Any]) -> Dict[str, Any]:
+        """Async generate; providers without a native async client run generate() in a thread."""
+        return await asyncio.to_thread(self.generate, parts, generation_config)
+
+    async def astream(self, parts: List[ContentPart], generation_config: Dict[str, Any]) -> AsyncIterator[StreamChunk]:
+        """
+        Streamed generate: text deltas as they are produced, then one chunk
+        carrying the assembled response dict. Providers without native
+        streaming send the whole text as a single delta.
+        """
+        response = await self.agenerate(parts, generation_config)
+        text = response_text(response)
+        if text:
+            yield StreamChunk(text=text)
+        yield StreamChunk(response=response)
@@ -0,0 +1,147 @@
+import os
+import json
+import math
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .base import ContentPart, ModelBackend, StreamChunk, build_response, estimate_tokens, response_text
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_CANNED_RESPONSES = {
+    "application/json": json.dumps({
+        "invoice_number": "FAKE-0001",
+        "invoice_date": "2025-01-31",
+        "vendor": {"name": "Fake Vendor Pvt Ltd", "gstin": "29ABCDE1234F1Z5"},
+        "line_items": [
+            {"description": "Consulting services", "quantity": 1, "unit_price": 40000, "amount": 40000},
+            {"description": "Travel", "quantity": 1, "unit_price": 12500, "amount": 12500},
+        ],
+        "total_amount": 52500,
+        "currency": "INR",
+    }),
+    "text/plain": (
+        "<!DOCTYPE html><html><head><meta charset=\"UTF-8\"><title>Document Analysis</title>"
+        "<style>.container{max-width:960px;margin:0 auto;}</style></head>"
+        "<body><div class=\"container\"><h1>Document Analysis</h1></div></body></html>"
+    ),
+}
+
+# Streaming: the first delta arrives after this share of the drawn latency, the rest is spread over the deltas
+FIRST_CHUNK_SHARE = 0.2
+STREAM_CHUNK_CHARS = 64
+
+
+class InjectedError(Exception):
+    """Failure raised on purpose by FakeBackend."""
+
+
+class InjectedRateLimitError(InjectedError):
+    """429 raised on purpose by FakeBackend; matches the quota handling in call_gemini_api."""
+
+
+def parse_latency(spec: str):
+    """
+    Parse a latency distribution spec (seconds) into a sampler.
+
+    Supported: "constant:0.5", "uniform:0.2,1.5", "normal:1.0,0.3",
+    "lognormal:0.0,0.5" (mu, sigma of the underlying normal).
+    """
+    kind, _, raw_args = (spec or "constant:0").partition(":")
+    args = [float(value) for value in raw_args.split(",") if value.strip()]
+
+    if kind == "constant":
+        return lambda rng: args[0] if args else 0.0
+    if kind == "uniform":
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(args[0], args[1])
+    raise ValueError(f"Unknown latency distribution '{spec}'")
+
+
+class FakeBackend(ModelBackend):
+    """
+    Offline deterministic provider for load tests and benchmarks.
+
+    Responses come from canned outputs keyed by response MIME type, latency
+    is drawn from a configurable distribution, and errors/429s are injected
+    at configurable rates. With a fixed seed, a run is reproducible.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: str = None, error_rate: float = None, rate_limit_rate: float = None,
+                 responses_path: str = None, seed: Optional[int] = None):
+        self._sample_latency = parse_latency(latency or os.getenv("FAKE_MODEL_LATENCY", "constant:0"))
+        self.error_rate = float(error_rate if error_rate is not None else os.getenv("FAKE_MODEL_ERROR_RATE", 0))
+        self.rate_limit_rate = float(
+            rate_limit_rate if rate_limit_rate is not None else os.getenv("FAKE_MODEL_429_RATE", 0)
+        )
+        seed = seed if seed is not None else os.getenv("FAKE_MODEL_SEED")
+        self._rng = random.Random(int(seed) if seed is not None else None)
+        self._lock = threading.Lock()
+
+        self.responses = dict(DEFAULT_CANNED_RESPONSES)
+        responses_path = responses_path or os.getenv("FAKE_MODEL_RESPONSES")
+        if responses_path:
+            with open(responses_path, "r", encoding="utf-8") as f:
+                self.responses.update(json.load(f))
+        logger.info(f"Fake model backend enabled (error_rate={self.error_rate}, 429_rate={self.rate_limit_rate})")
+
+    def _draw(self):
+        """Decide latency and outcome for one call, under the lock so seeded runs stay deterministic."""
+        with self._lock:
+            latency = self._sample_latency(self._rng)
+            roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            return latency, InjectedRateLimitError("429 Resource exhausted (injected by fake backend)")
+        if roll < self.rate_limit_rate + self.error_rate:
+            return latency, InjectedError("500 Internal error (injected by fake backend)")
+        return latency, None
+
+    def _respond(self, parts: List[ContentPart], generation_config: Dict[str, Any]) -> Dict[str, Any]:
+        mime_type = generation_config.get("response_mime_type") or "text/plain"
+        text = self.responses.get(mime_type, self.responses["text/plain"])
+        return build_response(
+            text,
+            prompt_tokens=estimate_tokens(parts),
+            candidate_tokens=math.ceil(len(text) / 4),
+        )
+
+    def generate(self, parts: List[ContentPart], generation_config: Dict[str, Any]) -> Dict[str, Any]:
+        latency, error = self._draw()
+        time.sleep(latency)
+        if error:
+            raise error
+        return self._respond(parts, generation_config)
+
+    def count_tokens(self, parts: List[ContentPart]) -> int:
+        return estimate_tokens(parts)
+
+    async def agenerate(self, parts: List[ContentPart], generation_config: Dict[str, Any]) -> Dict[str, Any]:
+        latency, error = self._draw()
+        await asyncio.sleep(latency)
+        if error:
+            raise error
+        return self._respond(parts, generation_config)
+
+    async def astream(self, parts: List[ContentPart], generation_config: Dict[str, Any]) -> AsyncIterator[StreamChunk]:
+        latency, error = self._draw()
+        await asyncio.sleep(latency * FIRST_CHUNK_SHARE)
+        if error:
+            raise error
+        response = self._respond(parts, generation_config)
+        text = response_text(response)
+        pieces = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+        for index, piece in enumerate(pieces):
+            if index:
+                await asyncio.sleep(latency * (1 - FIRST_CHUNK_SHARE) / (len(pieces) - 1))
+            yield StreamChunk(text=piece)
+        yield StreamChunk(response=response)
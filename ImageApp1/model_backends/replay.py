@@ -0,0 +1,90 @@
+import os
+import json
+import logging
+import threading
+from typing import Any, Dict, List
+
+from .base import ContentPart, ModelBackend, request_fingerprint
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+
+class ReplayMissError(Exception):
+    """No recording exists for a request while in replay mode."""
+
+
+class RecordReplayBackend(ModelBackend):
+    """
+    Wraps another backend and stores its responses on disk ('record'), or
+    serves previously recorded responses without any network ('replay').
+
+    Recordings are one JSON file per request, named after the request
+    fingerprint (parts + generation config), so they can be committed next
+    to a benchmark and replayed on any machine.
+    """
+
+    name = "replay"
+
+    def __init__(self, directory: str, mode: str = "replay", inner: ModelBackend = None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown record/replay mode '{mode}'")
+        if mode == "record" and inner is None:
+            raise ValueError("Record mode needs a backend to record from")
+        self.directory = directory
+        self.mode = mode
+        self.inner = inner
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        logger.info(f"Model {mode} backend using {directory}")
+
+    @property
+    def source(self) -> str:
+        # Recording passes the inner provider's responses through; replayed ones are canned
+        return self.inner.source if self.mode == "record" else self.name
+
+    def _path(self, parts: List[ContentPart], generation_config: Dict[str, Any]) -> str:
+        return os.path.join(self.directory, f"{request_fingerprint(parts, generation_config)}.json")
+
+    def _load(self, path: str) -> Dict[str, Any]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)["response"]
+        except FileNotFoundError:
+            raise ReplayMissError(f"No recorded response at {path}")
+
+    def _save(self, path: str, parts: List[ContentPart], generation_config: Dict[str, Any], response: Dict[str, Any]):
+        recording = {
+            "request": {
+                "parts": [part.fingerprint() if not part.is_text else part.text for part in parts],
+                "generation_config": generation_config,
+            },
+            "response": response,
+        }
+        with self._lock:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(recording, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+
+    def generate(self, parts: List[ContentPart], generation_config: Dict[str, Any]) -> Dict[str, Any]:
+        path = self._path(parts, generation_config)
+        if self.mode == "replay":
+            return self._load(path)
+        response = self.inner.generate(parts, generation_config)
+        self._save(path, parts, generation_config, response)
+        return response
+
+    async def agenerate(self, parts: List[ContentPart], generation_config: Dict[str, Any]) -> Dict[str, Any]:
+        path = self._path(parts, generation_config)
+        if self.mode == "replay":
+            return self._load(path)
+        response = await self.inner.agenerate(parts, generation_config)
+        self._save(path, parts, generation_config, response)
+        return response
+
+    def count_tokens(self, parts: List[ContentPart]) -> int:
+        if self.inner is not None:
+            return self.inner.count_tokens(parts)
+        from .fake import estimate_tokens
+        return estimate_tokens(parts)
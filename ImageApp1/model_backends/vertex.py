@@ -0,0 +1,151 @@
+import os
+import logging
+from typing import Any, AsyncIterator, Dict, List
+
+import google.auth
+import vertexai
+from vertexai.generative_models import GenerativeModel, Part, GenerationConfig
+
+from .base import ContentPart, ModelBackend, StreamChunk, build_response, response_text
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+
+def format_response(response) -> Dict[str, Any]:
+    """Convert a Vertex AI GenerationResponse to the REST-style dict the app uses."""
+    formatted_response = {
+        "candidates": [],
+        "promptFeedback": {
+            "blockReason": response.prompt_feedback.block_reason.name if response.prompt_feedback and response.prompt_feedback.block_reason else None,
+            "safetyRatings": []
+        },
+        "usageMetadata": {
+            "promptTokenCount": response.usage_metadata.prompt_token_count if response.usage_metadata else 0,
+            "candidatesTokenCount": response.usage_metadata.candidates_token_count if response.usage_metadata else 0,
+            "totalTokenCount": response.usage_metadata.total_token_count if response.usage_metadata else 0,
+        }
+    }
+
+    # Add prompt feedback safety ratings if available
+    if response.prompt_feedback and response.prompt_feedback.safety_ratings:
+        for rating in response.prompt_feedback.safety_ratings:
+            formatted_response["promptFeedback"]["safetyRatings"].append({
+                "category": rating.category.name,
+                "probability": rating.probability.name,
+                "blocked": rating.blocked
+            })
+
+    # Process candidates
+    if response.candidates:
+        for candidate in response.candidates:
+            candidate_data = {
+                "content": {
+                    "parts": [],
+                    "role": "model"
+                },
+                "finishReason": candidate.finish_reason.name if candidate.finish_reason else None,
+                "safetyRatings": []
+            }
+
+            # Add text content if available
+            if candidate.content and candidate.content.parts:
+                for part in candidate.content.parts:
+                    if hasattr(part, 'text') and part.text:
+                        candidate_data["content"]["parts"].append({"text": part.text})
+
+            # Add safety ratings
+            if candidate.safety_ratings:
+                for rating in candidate.safety_ratings:
+                    candidate_data["safetyRatings"].append({
+                        "category": rating.category.name,
+                        "probability": rating.probability.name,
+                        "blocked": rating.blocked
+                    })
+
+            formatted_response["candidates"].append(candidate_data)
+
+    return formatted_response
+
+
+class VertexBackend(ModelBackend):
+    """Gemini on Vertex AI, authenticated with the service account in SERVICE_ACCOUNT_KEY_PATH."""
+
+    name = "vertex"
+
+    def __init__(self, model_id: str = None, location: str = None, service_account_key_path: str = None):
+        self.model_id = model_id or os.getenv("MODEL_ID")
+        self.location = location or os.getenv("LOCATION")
+        key_path = service_account_key_path or os.getenv("SERVICE_ACCOUNT_KEY_PATH")
+
+        try:
+            credentials, project_id = google.auth.load_credentials_from_file(key_path)
+            vertexai.init(project=project_id, location=self.location, credentials=credentials)
+            logger.info(f"Vertex AI initialized for project: {project_id}, location: {self.location}")
+        except Exception as e:
+            raise RuntimeError(f"Error initializing Vertex AI: {e}") from e
+
+        try:
+            self.model = GenerativeModel(self.model_id)
+            logger.info(f"Using model: {self.model_id} in project: {project_id}, location: {self.location}")
+        except Exception as e:
+            raise RuntimeError(f"Error loading GenerativeModel '{self.model_id}': {e}") from e
+
+    @staticmethod
+    def _to_parts(parts: List[ContentPart]) -> List[Part]:
+        return [
+            Part.from_text(part.text) if part.is_text else Part.from_data(part.data, part.mime_type)
+            for part in parts
+        ]
+
+    @staticmethod
+    def _to_generation_config(generation_config: Dict[str, Any]) -> GenerationConfig:
+        config = GenerationConfig(
+            temperature=generation_config.get("temperature"),
+            top_p=generation_config.get("top_p"),
+            top_k=generation_config.get("top_k"),
+            max_output_tokens=generation_config.get("max_output_tokens"),
+        )
+        if generation_config.get("response_mime_type"):
+            config.response_mime_type = generation_config["response_mime_type"]
+        return config
+
+    def generate(self, parts: List[ContentPart], generation_config: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.model.generate_content(
+            contents=self._to_parts(parts),
+            generation_config=self._to_generation_config(generation_config),
+            stream=False
+        )
+        return format_response(response)
+
+    def count_tokens(self, parts: List[ContentPart]) -> int:
+        return self.model.count_tokens(self._to_parts(parts)).total_tokens
+
+    async def agenerate(self, parts: List[ContentPart], generation_config: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self.model.generate_content_async(
+            contents=self._to_parts(parts),
+            generation_config=self._to_generation_config(generation_config),
+            stream=False
+        )
+        return format_response(response)
+
+    async def astream(self, parts: List[ContentPart], generation_config: Dict[str, Any]) -> AsyncIterator[StreamChunk]:
+        stream = await self.model.generate_content_async(
+            contents=self._to_parts(parts),
+            generation_config=self._to_generation_config(generation_config),
+            stream=True
+        )
+        texts = []
+        last_chunk = None
+        async for chunk in stream:
+            last_chunk = chunk
+            text = response_text(format_response(chunk))
+            if text:
+                texts.append(text)
+                yield StreamChunk(text=text)
+
+        # The last chunk carries the usage metadata and finish reason, but only the final delta of the text
+        response = format_response(last_chunk) if last_chunk is not None else build_response("")
+        if response["candidates"]:
+            response["candidates"][0]["content"]["parts"] = [{"text": "".join(texts)}]
+        yield StreamChunk(response=response)
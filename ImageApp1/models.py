@@ -1,8 +1,45 @@
 # Create your models here.
+import uuid
+import datetime
+
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
 
+from .fields import CompressedJSONField, CompressedTextField
+
+# Lower bound of the partial document_recent_idx. Partial index predicates must be
+# constant, so moving it forward takes a new migration (e.g. once a year).
+RECENT_DOCUMENTS_SINCE = datetime.date(2026, 1, 1)
+
+
+class Blob(models.Model):
+    """
+    One stored upload, addressed by the SHA-256 of its content (blob_storage.py).
+    Identical uploads share the blob; ref_count is the number of Documents
+    pointing at it, kept up to date by the Document signal handlers in
+    blob_storage.py. Unreferenced blobs are removed by `manage.py gc_blobs`.
+    """
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    # Relative to MEDIA_ROOT, e.g. blobs/ab/cd/abcd...ef.pdf
+    path = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    mime_type = models.CharField(max_length=100)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Last upload or reference change; the GC grace period counts from here
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'last_used_at'], name='blob_gc_idx'),
+        ]
+
+    def __str__(self):
+        return f"Blob {self.sha256[:12]} ({self.ref_count} refs)"
+
+
 class Document(models.Model):
     userid = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -11,16 +48,233 @@ class Document(models.Model):
     )
     filepath = models.CharField(max_length=255, blank=True)
     file = models.FileField(upload_to='uploads/')
-    json_data = models.JSONField(blank=True, null=True)
+    # Content-addressed upload behind file; null for files stored before blob storage
+    blob = models.ForeignKey(
+        Blob,
+        on_delete=models.PROTECT,
+        blank=True,
+        null=True,
+        related_name='documents',
+        db_index=False  # document_blob_idx, built concurrently
+    )
+    # File name as uploaded; blob paths are named after the content hash
+    original_name = models.CharField(max_length=255, blank=True)
+    # Digest of input + prompt + model that json_data was extracted with (pipeline.extraction_key)
+    extraction_key = models.CharField(max_length=64, blank=True)
     entry_date = models.DateField(default=timezone.now)
-    html_content = models.TextField(blank=True, null=True)
+    # json_data / html_content live in DocumentContent (doc.content)
     # reimbursement_data = models.TextField(blank=True, null=True)
     document_type = models.TextField(blank=True, null=True) 
     input_token =  models.IntegerField(blank=True, null=True) 
     output_token =  models.IntegerField(blank=True, null=True) 
 
- 
+    class Meta:
+        indexes = [
+            # Per-user listing (keyset on entry_date, id) and the userid + date filter
+            models.Index(fields=['userid', 'entry_date', 'id'], name='document_user_date_id_idx'),
+            models.Index(fields=['document_type', 'entry_date'], name='document_type_date_idx'),
+            # Admin feed across all users, newest first; only recent rows are indexed
+            models.Index(
+                fields=['-entry_date', '-id'],
+                name='document_recent_idx',
+                condition=models.Q(entry_date__gte=RECENT_DOCUMENTS_SINCE),
+            ),
+            # Exact lookups only (reuse of an identical upload's extraction)
+            models.Index(fields=['extraction_key'], name='document_extraction_key_idx'),
+            models.Index(fields=['blob'], name='document_blob_idx'),
+        ]
 
     def __str__(self):
         return f"Document {self.id} for {self.user.username}"
 
+
+
+class DocumentContent(models.Model):
+    """
+    The large payloads of a Document, kept out of the metadata row so that
+    listings, aggregates and the admin never read them. Detail endpoints
+    load it with select_related('content').
+    """
+
+    document = models.OneToOneField(
+        Document,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='content'
+    )
+    # Both stored compressed (compression.py), transparently decompressed on access
+    json_data = CompressedJSONField(blank=True, null=True)
+    html_content = CompressedTextField(blank=True, null=True)
+    # Digest of json_data + renderer version that html_content was rendered from
+    html_digest = models.CharField(max_length=64, blank=True, null=True)
+
+    def __str__(self):
+        return f"DocumentContent {self.document_id}"
+
+
+class ExtractionBatch(models.Model):
+    """A multi-file upload; each accepted file becomes one ExtractionJob."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    userid = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='extraction_batches'
+    )
+    document_type = models.TextField(blank=True, null=True)
+    total_files = models.PositiveIntegerField(default=0)
+    # Files refused at ingestion: [{"index": ..., "file": ..., "error": ...}]
+    rejected = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"ExtractionBatch {self.id} ({self.total_files} files)"
+
+
+class ExtractionJob(models.Model):
+    """A queued run of the upload pipeline, picked up by run_extraction_worker."""
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    userid = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='extraction_jobs'
+    )
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='jobs'
+    )
+    filepath = models.CharField(max_length=255)
+    # SHA-256 computed while the upload was streamed to storage
+    input_sha256 = models.CharField(max_length=64, blank=True)
+    document_type = models.TextField(blank=True, null=True)
+    prompt_text = models.TextField(blank=True, null=True)
+    bypass_cache = models.BooleanField(default=False)
+    renderer = models.CharField(max_length=16, blank=True)
+    batch = models.ForeignKey(
+        ExtractionBatch,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='jobs'
+    )
+    batch_index = models.PositiveIntegerField(blank=True, null=True)
+    source_name = models.CharField(max_length=255, blank=True)
+    # Per-stage statistics, e.g. {"preprocessing": {"original_bytes": ..., "processed_bytes": ...}}
+    stats = models.JSONField(blank=True, null=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    # Times the job was put back because the rate limiter or circuit breaker shed it
+    deferrals = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    worker_id = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Not claimed before this time; set with a backoff delay when the job is deferred
+    available_at = models.DateTimeField(blank=True, null=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='extractionjob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"ExtractionJob {self.id} ({self.status})"
+
+
+class ExtractionCacheEntry(models.Model):
+    """Model response cached by the 'database' extraction cache backend."""
+
+    key = models.CharField(max_length=64, primary_key=True)
+    response = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+    last_accessed = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"ExtractionCacheEntry {self.key}"
+
+
+class DailyUsage(models.Model):
+    """
+    Documents and tokens per user, day and document type, kept up to date
+    by the Document signal handlers in usage.py so usage queries never scan
+    Document.
+    """
+
+    userid = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='daily_usage'
+    )
+    date = models.DateField()
+    # Document.document_type, '' when it was not set
+    document_type = models.CharField(max_length=255, blank=True, default='')
+    document_count = models.IntegerField(default=0)
+    input_tokens = models.BigIntegerField(default=0)
+    output_tokens = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['userid', 'date', 'document_type'], name='dailyusage_user_date_type_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='dailyusage_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"DailyUsage {self.userid_id} {self.date} {self.document_type or '-'}"
+
+
+class DocumentSearchField(models.Model):
+    """
+    Inverted index over the extracted values of DocumentContent.json_data,
+    which is stored compressed and cannot be queried in the database. One
+    row per scalar leaf (path without list positions, normalized text plus
+    its number and date readings) and one per full-text word. Maintained
+    by the signal handlers in search.py.
+    """
+
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name='search_fields'
+    )
+    # Denormalized from Document so every search is a range scan inside one user's rows
+    userid = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False
+    )
+    path = models.CharField(max_length=255)
+    value_text = models.CharField(max_length=255)
+    value_number = models.FloatField(blank=True, null=True)
+    value_date = models.DateField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # document_id last so the id lookups behind each condition are answered from the index
+            models.Index(fields=['userid', 'path', 'value_text', 'document'], name='search_user_path_text_idx'),
+            models.Index(fields=['userid', 'path', 'value_number', 'document'], name='search_user_path_number_idx'),
+            models.Index(fields=['userid', 'path', 'value_date', 'document'], name='search_user_path_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"DocumentSearchField {self.document_id} {self.path}={self.value_text}"
@@ -0,0 +1,88 @@
+import datetime
+import logging
+from typing import Optional, Tuple
+
+from django.core import signing
+from django.db.models import Q
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+CURSOR_SALT = "ImageApp1.documents.cursor"
+
+
+class InvalidCursor(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+def encode_cursor(entry_date: datetime.date, pk: int) -> str:
+    """Opaque, signed position after the row (entry_date, pk); clients cannot forge other users' offsets."""
+    return signing.dumps([entry_date.isoformat(), pk], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.date, int]:
+    try:
+        entry_date, pk = signing.loads(cursor, salt=CURSOR_SALT)
+        return datetime.date.fromisoformat(entry_date), int(pk)
+    except (signing.BadSignature, ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor.") from e
+
+
+def parse_page_size(value, default: int = DEFAULT_PAGE_SIZE) -> int:
+    if value in (None, ""):
+        return default
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        raise InvalidCursor("page_size must be an integer.")
+    if page_size < 1:
+        raise InvalidCursor("page_size must be at least 1.")
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def _after(queryset, position: Optional[Tuple[datetime.date, int]]):
+    if position is None:
+        return queryset
+    entry_date, pk = position
+    return queryset.filter(Q(entry_date__lt=entry_date) | Q(entry_date=entry_date, id__lt=pk))
+
+
+def keyset_page(queryset, cursor: Optional[str], page_size: int, recent_since: Optional[datetime.date] = None):
+    """
+    One page of `queryset`, newest first, ordered by (entry_date, id).
+
+    Instead of OFFSET, the cursor carries the last row's (entry_date, id)
+    and the next page starts strictly after it, so every page costs the
+    same index range scan however deep the client pages, and rows inserted
+    meanwhile neither repeat nor get skipped.
+
+    recent_since lets a query without a selective filter (the admin feed)
+    use a partial index on entry_date >= recent_since: pages inside that
+    range are read with the bound added, and only a page that crosses it
+    falls back to the unbounded query for its remaining rows.
+
+    Returns:
+        tuple: (list of rows, next cursor or None when this is the last page)
+
+    Raises:
+        InvalidCursor: If the cursor was not issued by encode_cursor
+    """
+    queryset = queryset.order_by('-entry_date', '-id')
+    position = decode_cursor(cursor) if cursor else None
+    limit = page_size + 1  # one extra row tells whether there is a next page
+
+    if recent_since and (position is None or position[0] >= recent_since):
+        rows = list(_after(queryset.filter(entry_date__gte=recent_since), position)[:limit])
+        if len(rows) < limit:
+            # Every older row comes after the recent ones
+            rows += list(queryset.filter(entry_date__lt=recent_since)[:limit - len(rows)])
+    else:
+        rows = list(_after(queryset, position)[:limit])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1].entry_date, rows[-1].id)
@@ -0,0 +1,194 @@
+import io
+import math
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .model_backends.base import TOKENS_PER_MEDIA_PART
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+PDF_SHARDING = getattr(settings, "PDF_SHARDING", {})
+SHARDING_ENABLED = PDF_SHARDING.get("ENABLED", True)
+SHARD_MIN_PAGES = PDF_SHARDING.get("MIN_PAGES", 10)  # smaller documents go out in one request
+SHARD_PAGES = PDF_SHARDING.get("PAGES_PER_SHARD", 5)
+SHARD_MAX_TOKENS = PDF_SHARDING.get("MAX_SHARD_TOKENS", 0)  # 0 = split by page count only
+MAX_CONCURRENT_SHARDS = PDF_SHARDING.get("MAX_CONCURRENT_SHARDS", 8)
+
+PROVENANCE_KEY = "_page_provenance"
+
+SHARD_PROMPT_SUFFIX = (
+    "\n\nThis file holds pages {first}-{last} of a {total}-page document. "
+    "Extract only what appears on these pages, using the same JSON structure; "
+    "leave fields that are not on these pages empty."
+)
+
+
+@dataclass
+class PdfShard:
+    first_page: int  # 1-based, inclusive
+    last_page: int
+    total_pages: int
+    data: bytes = field(repr=False)
+
+    @property
+    def label(self) -> str:
+        return f"{self.first_page}-{self.last_page}"
+
+    def prompt(self, prompt_text: str) -> str:
+        return prompt_text + SHARD_PROMPT_SUFFIX.format(
+            first=self.first_page, last=self.last_page, total=self.total_pages
+        )
+
+
+def estimate_page_tokens(page) -> int:
+    """Media tokens for the page plus its text layer (~4 chars per token), a proxy for output size."""
+    try:
+        text = page.extract_text() or ""
+    except Exception:
+        text = ""
+    return TOKENS_PER_MEDIA_PART + math.ceil(len(text) / 4)
+
+
+def plan_shards(page_tokens: List[int], pages_per_shard: int = SHARD_PAGES,
+                max_shard_tokens: int = SHARD_MAX_TOKENS) -> List[Tuple[int, int]]:
+    """
+    Group pages into contiguous (start, end) index ranges, end exclusive.
+
+    A shard closes when it reaches pages_per_shard pages or when the next
+    page would take it past max_shard_tokens. A single page larger than
+    max_shard_tokens still gets a shard of its own.
+    """
+    ranges = []
+    start = 0
+    tokens = 0
+    for index, page_token_count in enumerate(page_tokens):
+        size = index - start
+        over_budget = max_shard_tokens and size and tokens + page_token_count > max_shard_tokens
+        if size >= pages_per_shard or over_budget:
+            ranges.append((start, index))
+            start, tokens = index, 0
+        tokens += page_token_count
+    if start < len(page_tokens):
+        ranges.append((start, len(page_tokens)))
+    return ranges
+
+
+def load_pdf_shards(absolute_path: str) -> List[PdfShard]:
+    """
+    Split a PDF into page-range shards, or return [] when it should be sent whole:
+    sharding disabled, not a PDF, pypdf missing, unreadable, or fewer than
+    SHARD_MIN_PAGES pages.
+    """
+    if not SHARDING_ENABLED or not absolute_path.lower().endswith(".pdf"):
+        return []
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        logger.warning("pypdf is not installed, PDF sharding is disabled.")
+        return []
+
+    try:
+        reader = PdfReader(absolute_path)
+        total_pages = len(reader.pages)
+        if total_pages < SHARD_MIN_PAGES:
+            return []
+
+        if SHARD_MAX_TOKENS:
+            page_tokens = [estimate_page_tokens(page) for page in reader.pages]
+        else:
+            page_tokens = [TOKENS_PER_MEDIA_PART] * total_pages
+
+        shards = []
+        for start, end in plan_shards(page_tokens):
+            writer = PdfWriter()
+            for index in range(start, end):
+                writer.add_page(reader.pages[index])
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            shards.append(PdfShard(start + 1, end, total_pages, buffer.getvalue()))
+    except Exception as e:
+        logger.warning(f"Could not shard {absolute_path}, sending it whole: {str(e)}")
+        return []
+
+    logger.info(f"Split {absolute_path} ({total_pages} pages) into {len(shards)} shard(s)")
+    return shards
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+class ShardMerger:
+    """
+    Deterministic merge of per-shard extraction results, applied in page order.
+
+    - lists are concatenated (line items keep document order)
+    - objects are merged key by key, recursively
+    - scalars (header fields) keep the first non-empty value; a later shard
+      with a different non-empty value is recorded as a conflict
+    - provenance records which pages every field and list slice came from
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.conflicts: Dict[str, List[dict]] = {}
+
+    def merge(self, results: List[Tuple[PdfShard, Any]]) -> Any:
+        merged = None
+        for shard, data in results:
+            merged = self._merge_value(merged, data, shard, path="")
+        if isinstance(merged, dict):
+            merged[PROVENANCE_KEY] = {
+                "shards": [
+                    {"pages": shard.label} for shard, _ in results
+                ],
+                "fields": self.fields,
+                "conflicts": self.conflicts,
+            }
+        return merged
+
+    def _merge_value(self, current, incoming, shard: PdfShard, path: str):
+        if _is_empty(incoming):
+            return incoming if current is None else current
+
+        if isinstance(incoming, list):
+            if current is None or _is_empty(current):
+                current = []
+            if not isinstance(current, list):
+                self._conflict(path, shard, incoming)
+                return current
+            start = len(current)
+            self.fields.setdefault(path or "$", []).append(
+                {"pages": shard.label, "items": [start, start + len(incoming)]}
+            )
+            return current + incoming
+
+        if isinstance(incoming, dict):
+            if current is None or _is_empty(current):
+                current = {}
+            if not isinstance(current, dict):
+                self._conflict(path, shard, incoming)
+                return current
+            merged = dict(current)
+            for key, value in incoming.items():
+                merged[key] = self._merge_value(current.get(key), value, shard, f"{path}.{key}" if path else key)
+            return merged
+
+        if _is_empty(current):
+            self.fields[path or "$"] = shard.label
+            return incoming
+        if current != incoming:
+            self._conflict(path, shard, incoming)
+        return current
+
+    def _conflict(self, path: str, shard: PdfShard, value):
+        self.conflicts.setdefault(path or "$", []).append({"pages": shard.label, "value": value})
+
+
+def merge_shard_results(results: List[Tuple[PdfShard, Any]]) -> Optional[Any]:
+    """Merge (shard, parsed_json) pairs, which must be in page order."""
+    return ShardMerger().merge(results)
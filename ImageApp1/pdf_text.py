@@ -0,0 +1,171 @@
+import io
+import re
+import json
+import math
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import List, Union
+
+from django.conf import settings
+
+from .model_backends import ContentPart
+from .model_backends.base import TOKENS_PER_MEDIA_PART
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+PDF_TEXT_LAYER = getattr(settings, "PDF_TEXT_LAYER", {})
+TEXT_LAYER_ENABLED = PDF_TEXT_LAYER.get("ENABLED", True)
+MIN_CHARS_PER_PAGE = PDF_TEXT_LAYER.get("MIN_CHARS_PER_PAGE", 200)  # fewer means a scanned page
+MIN_PRINTABLE_RATIO = PDF_TEXT_LAYER.get("MIN_PRINTABLE_RATIO", 0.9)  # below means broken font encoding
+MAX_TOKENS_PER_PAGE = PDF_TEXT_LAYER.get("MAX_TOKENS_PER_PAGE", 1500)  # denser pages are cheaper as binary
+
+# Bump when the text rendering below changes, so cached extractions are not reused
+TEXT_LAYER_VERSION = "text-1"
+
+TEXT_LAYER_HEADER = (
+    "The embedded text layer of the document follows, page by page, with the original line breaks. "
+    "Lines marked with | are table rows, | separates their columns."
+)
+
+COLUMN_GAP = re.compile(r"\s{2,}")
+CID_GLYPH = re.compile(r"\(cid:\d+\)")
+MIN_TABLE_COLUMNS = 3
+
+
+def text_layer_signature() -> str:
+    """Short hash of the version and the settings that decide which pages go as text, used in cache keys."""
+    material = json.dumps([TEXT_LAYER_VERSION, MIN_CHARS_PER_PAGE, MIN_PRINTABLE_RATIO, MAX_TOKENS_PER_PAGE])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class TextLayerStats:
+    pages: int
+    text_pages: List[int] = field(default_factory=list)
+    binary_pages: List[int] = field(default_factory=list)
+    text_chars: int = 0
+    estimated_text_tokens: int = 0
+    estimated_binary_tokens: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "version": TEXT_LAYER_VERSION,
+            "pages": self.pages,
+            "text_pages": self.text_pages,
+            "binary_pages": self.binary_pages,
+            "text_chars": self.text_chars,
+            "estimated_input_tokens": self.estimated_text_tokens + len(self.binary_pages) * TOKENS_PER_MEDIA_PART,
+            "estimated_binary_only_tokens": self.estimated_binary_tokens,
+        }
+
+
+def compact_layout_text(raw: str) -> str:
+    """
+    Shrink layout-mode text without losing its structure: lines with at least
+    MIN_TABLE_COLUMNS column gaps become "| a | b | c |" rows, other lines get
+    their runs of spaces collapsed, and blank lines are squeezed.
+    """
+    lines = []
+    for line in raw.splitlines():
+        line = line.strip()
+        if not line:
+            if lines and lines[-1]:
+                lines.append("")
+            continue
+        cells = COLUMN_GAP.split(line)
+        if len(cells) >= MIN_TABLE_COLUMNS:
+            lines.append("| " + " | ".join(cells) + " |")
+        else:
+            lines.append(" ".join(line.split()))
+    return "\n".join(lines).strip()
+
+
+def is_reliable_text(text: str) -> bool:
+    """Enough characters, and mostly real ones (not (cid:NN) glyphs or replacement characters)."""
+    if len(text) < MIN_CHARS_PER_PAGE:
+        return False
+    cleaned = CID_GLYPH.sub("�", text)
+    printable = sum(1 for char in cleaned if char.isprintable() and char != "�" or char in "\n\t")
+    return printable / len(cleaned) >= MIN_PRINTABLE_RATIO
+
+
+def _page_text(page) -> str:
+    try:
+        return page.extract_text(extraction_mode="layout")
+    except TypeError:
+        return page.extract_text()  # pypdf without layout mode
+
+
+def text_layer_parts(source: Union[str, bytes], first_page: int = 1):
+    """
+    Build model input for a PDF from its embedded text layer.
+
+    Pages with reliable text are sent as compact layout text; scanned pages
+    (too little or garbled text, or text denser than MAX_TOKENS_PER_PAGE)
+    are copied into a smaller PDF that is sent as binary alongside.
+
+    Args:
+        source: Path of the PDF, or its bytes
+        first_page: Number of its first page in the original document, for
+            page-range shards, so page labels match the shard prompt
+
+    Returns:
+        tuple: (List[ContentPart], TextLayerStats), or None when no page has
+        usable text, the fast path is disabled or pypdf is unavailable
+    """
+    if not TEXT_LAYER_ENABLED:
+        return None
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        logger.warning("pypdf is not installed, the PDF text-layer fast path is disabled.")
+        return None
+
+    try:
+        reader = PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+        stats = TextLayerStats(pages=len(reader.pages))
+        stats.estimated_binary_tokens = stats.pages * TOKENS_PER_MEDIA_PART
+
+        blocks = []
+        for number, page in enumerate(reader.pages, start=first_page):
+            raw = _page_text(page) or ""
+            text = compact_layout_text(raw)
+            tokens = math.ceil(len(text) / 4)
+            if is_reliable_text(text) and tokens <= MAX_TOKENS_PER_PAGE:
+                blocks.append(f"--- Page {number} ---\n{text}")
+                stats.text_pages.append(number)
+                stats.text_chars += len(text)
+                stats.estimated_text_tokens += tokens
+            else:
+                stats.binary_pages.append(number)
+
+        if not stats.text_pages:
+            return None
+
+        parts = [ContentPart.from_text(TEXT_LAYER_HEADER + "\n\n" + "\n\n".join(blocks))]
+        if stats.binary_pages:
+            writer = PdfWriter()
+            for number in stats.binary_pages:
+                writer.add_page(reader.pages[number - first_page])
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            parts.append(ContentPart.from_text(
+                "Pages " + ", ".join(str(number) for number in stats.binary_pages)
+                + " have no usable text layer and are attached as PDF."
+            ))
+            parts.append(ContentPart.from_data(buffer.getvalue(), "application/pdf"))
+    except Exception as e:
+        logger.warning(f"Could not read the PDF text layer, sending the file as binary: {str(e)}")
+        return None
+
+    logger.info(
+        f"PDF text layer: {len(stats.text_pages)}/{stats.pages} page(s) as text, "
+        f"~{stats.to_dict()['estimated_input_tokens']} input tokens vs ~{stats.estimated_binary_tokens} as binary"
+    )
+    return parts, stats
+
+
+def is_pdf(absolute_path: str) -> bool:
+    return absolute_path.lower().endswith(".pdf")
@@ -0,0 +1,882 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection as db_connection, transaction
+
+from .models import Document, DocumentContent
+from .prompt import (
+    DOC_EXTRACTION_PROMPT,
+    REIMBURSEMENT_EXTRACTION_PROMPT,
+    GENERIC_EXTRACTION_PROMPT,
+    JSON_TO_HTML_PROMPT,
+)
+from .vertex_model import acall_gemini_api, astream_gemini_api, call_gemini_api
+from .rate_limiter import RateLimitExceeded
+from .retry_policy import CircuitOpenError
+from .html_renderer import RENDERER_VERSION, render_json_to_html
+from .model_backends import ContentPart, model_backend_source
+from .pdf_sharding import MAX_CONCURRENT_SHARDS, PdfShard, load_pdf_shards, merge_shard_results
+from .image_preprocessing import preprocess_image, preprocessing_signature
+from .pdf_text import is_pdf, text_layer_parts, text_layer_signature
+from .extraction_cache import sha256_file
+from .blob_storage import blob_id_for_path
+from .metrics import (
+    STAGE_DB_INSERT, STAGE_EXTRACTION_CALL, STAGE_HTML_CALL, STAGE_HTML_RENDER, STAGE_JSON_PARSE,
+    STAGE_SIDECAR_WRITE, document_type_context, timed_stage,
+)
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+RENDERER_LOCAL = "local"
+RENDERER_LLM = "llm"
+HTML_RENDERERS = (RENDERER_LOCAL, RENDERER_LLM)
+
+
+class PipelineError(Exception):
+    """
+    Raised when a pipeline stage fails. Carries the HTTP status the views
+    should answer with, so sync views and background workers report the
+    same message for the same failure.
+    """
+
+    def __init__(self, message: str, status_code: int = 500, retry_after: float = None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        # Seconds to wait before trying again, when a shed call came with a hint
+        self.retry_after = retry_after
+
+
+def safe_json_load(raw_string: str):
+    if not raw_string or not raw_string.strip():
+        raise json.JSONDecodeError("Empty or whitespace-only string", raw_string, 0)
+
+    cleaned = raw_string.strip()
+
+    if cleaned.startswith("```json"):
+        lines = cleaned.splitlines()
+        cleaned = "\n".join(lines[1:-1])
+
+    return json.loads(cleaned)
+
+
+def resolve_prompt(doc_type: str, prompt_text: str = None) -> str:
+    """Return the client supplied prompt or the default prompt for doc_type."""
+    if prompt_text:
+        return prompt_text
+    if doc_type == 'docextraction':
+        return DOC_EXTRACTION_PROMPT
+    if doc_type == 'reimbursement':
+        return REIMBURSEMENT_EXTRACTION_PROMPT
+    logger.warning(f"No specific prompt provided for doc_type: {doc_type}. Using generic prompt.")
+    return GENERIC_EXTRACTION_PROMPT
+
+
+def parse_extraction_response(response: dict):
+    """
+    Turn an extraction response into (parsed_json, input_tokens, output_tokens).
+
+    Raises:
+        PipelineError: If the response holds no usable JSON object
+    """
+    input_tokens = 0
+    output_tokens = 0
+
+    if not response or 'candidates' not in response:
+        logger.error("Invalid API response format for JSON extraction.")
+        raise PipelineError("Invalid API response format")
+
+    try:
+        result_json = response['candidates'][0]['content']['parts'][0]['text']
+        logger.debug(f"Raw JSON API response: {result_json[:200]}...")  # Log first 200 chars for debugging
+    except (KeyError, IndexError) as e:
+        logger.error(f"Missing key in API response: {str(e)}", exc_info=True)
+        raise PipelineError("Invalid API response format")
+
+    if not result_json:
+        logger.error("Empty JSON response from API.")
+        raise PipelineError("Empty JSON response from API")
+
+    try:
+        parsed_json = safe_json_load(result_json)
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decoding error during extraction: {str(e)}", exc_info=True)
+        raise PipelineError("Invalid JSON received from API", status_code=400)
+
+    # Handle cases where the model might return a list with a single dictionary
+    if isinstance(parsed_json, list) and parsed_json:
+        parsed_json = parsed_json[0]
+
+    if not isinstance(parsed_json, dict):
+        logger.error("Parsed JSON is not a dictionary.")
+        raise PipelineError("Invalid JSON format received from API", status_code=400)
+
+    logger.debug("Successfully parsed JSON response")
+
+    if 'usageMetadata' in response:
+        usage_metadata = response['usageMetadata']
+        input_tokens = usage_metadata.get('promptTokenCount', 0)
+        output_tokens = usage_metadata.get('candidatesTokenCount', 0)
+        logger.info(f"JSON Extraction - Input Tokens: {input_tokens}, Output Tokens: {output_tokens}")
+    else:
+        logger.info("JSON Extraction - Usage metadata not available in the response.")
+
+    return parsed_json, input_tokens, output_tokens
+
+
+def _request_extraction(prompt_text: str, input_data, use_cache: bool = True, input_digest: str = None):
+    with timed_stage(STAGE_EXTRACTION_CALL):
+        try:
+            response = call_gemini_api(
+                prompt_text=prompt_text,
+                input_data=input_data,
+                response_mime_type="application/json",
+                use_cache=use_cache,
+                input_digest=input_digest
+            )
+        except (RateLimitExceeded, CircuitOpenError) as e:
+            logger.warning(f"JSON extraction not attempted: {e.message}")
+            raise PipelineError(e.message, status_code=503, retry_after=e.retry_after)
+        except Exception as e:
+            logger.error(f"Error during JSON extraction API call: {str(e)}", exc_info=True)
+            raise PipelineError(f"Error during JSON extraction: {str(e)}")
+
+    with timed_stage(STAGE_JSON_PARSE):
+        return parse_extraction_response(response)
+
+
+async def _arequest_extraction(prompt_text: str, input_data, use_cache: bool = True, input_digest: str = None):
+    with timed_stage(STAGE_EXTRACTION_CALL):
+        try:
+            response = await acall_gemini_api(
+                prompt_text=prompt_text,
+                input_data=input_data,
+                response_mime_type="application/json",
+                use_cache=use_cache,
+                input_digest=input_digest
+            )
+        except (RateLimitExceeded, CircuitOpenError) as e:
+            logger.warning(f"JSON extraction not attempted: {e.message}")
+            raise PipelineError(e.message, status_code=503, retry_after=e.retry_after)
+        except Exception as e:
+            logger.error(f"Error during JSON extraction API call: {str(e)}", exc_info=True)
+            raise PipelineError(f"Error during JSON extraction: {str(e)}")
+
+    with timed_stage(STAGE_JSON_PARSE):
+        return parse_extraction_response(response)
+
+
+def shard_input(shard: PdfShard):
+    """Text layer of the shard when it has one, otherwise the shard PDF."""
+    prepared = text_layer_parts(shard.data, first_page=shard.first_page)
+    if prepared is not None:
+        return prepared[0]
+    return ContentPart.from_data(shard.data, "application/pdf")
+
+
+def _merge_shards(shards: List[PdfShard], results):
+    merged = merge_shard_results([(shard, parsed_json) for shard, (parsed_json, _, _) in zip(shards, results)])
+    input_tokens = sum(result[1] for result in results)
+    output_tokens = sum(result[2] for result in results)
+    logger.info(f"Merged {len(shards)} shard(s) - Input Tokens: {input_tokens}, Output Tokens: {output_tokens}")
+    return merged, input_tokens, output_tokens
+
+
+def extract_json_sharded(prompt_text: str, shards: List[PdfShard], use_cache: bool = True):
+    """
+    Extract every page-range shard concurrently with the same prompt and
+    merge the partial JSON in page order (see pdf_sharding.ShardMerger).
+    Latency follows the slowest shard; the shared rate limiter still
+    applies to every shard call.
+
+    Returns:
+        tuple: (parsed_json, input_tokens, output_tokens)
+
+    Raises:
+        PipelineError: If any shard fails
+    """
+    def run(shard: PdfShard):
+        try:
+            return _request_extraction(shard.prompt(prompt_text), shard_input(shard), use_cache=use_cache)
+        finally:
+            db_connection.close()  # database cache backend connections opened by this thread
+
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_SHARDS, len(shards))) as pool:
+        # Each shard runs in a copy of this context, so its stages keep the document_type label
+        futures = [pool.submit(contextvars.copy_context().run, run, shard) for shard in shards]
+        results = [future.result() for future in futures]
+    return _merge_shards(shards, results)
+
+
+async def aextract_json_sharded(prompt_text: str, shards: List[PdfShard], use_cache: bool = True):
+    """Async variant of extract_json_sharded."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SHARDS)
+
+    async def run(shard: PdfShard):
+        async with semaphore:
+            shard_parts = await asyncio.to_thread(shard_input, shard)
+            return await _arequest_extraction(shard.prompt(prompt_text), shard_parts, use_cache=use_cache)
+
+    results = await asyncio.gather(*(run(shard) for shard in shards))
+    return _merge_shards(shards, results)
+
+
+def prepare_model_input(absolute_path: str, input_digest: str = None, stats: dict = None):
+    """
+    What to send the model for a stored file: the embedded text layer for
+    PDFs that have one (see pdf_text), the preprocessed image bytes for
+    JPEG/PNG uploads (see image_preprocessing), otherwise the path.
+
+    The cache key of prepared input combines the original file's digest
+    with the preparation version/settings, so a change is a cache miss.
+
+    Returns:
+        tuple: (input_data, input_digest) for call_gemini_api
+    """
+    if is_pdf(absolute_path):
+        prepared = text_layer_parts(absolute_path)
+        if prepared is None:
+            return absolute_path, input_digest
+
+        parts, text_layer = prepared
+        if stats is not None:
+            stats["text_layer"] = text_layer.to_dict()
+        digest = input_digest or sha256_file(absolute_path)
+        return parts, f"{digest}:{text_layer_signature()}"
+
+    prepared = preprocess_image(absolute_path)
+    if prepared is None:
+        return absolute_path, input_digest
+
+    part, preprocessing = prepared
+    if stats is not None:
+        stats["preprocessing"] = preprocessing.to_dict()
+    digest = input_digest or sha256_file(absolute_path)
+    return part, f"{digest}:{preprocessing_signature()}"
+
+
+def extract_json(prompt_text: str, absolute_path: str, use_cache: bool = True, input_digest: str = None,
+                 stats: dict = None):
+    """
+    Step 1: run the extraction prompt against the stored file. PDFs of at
+    least PDF_SHARDING["MIN_PAGES"] pages are split into shards first, PDF
+    text layers replace the binary where reliable and images are
+    preprocessed.
+
+    Args:
+        stats: Optional dict that receives per-stage statistics ("preprocessing")
+
+    Returns:
+        tuple: (parsed_json, input_tokens, output_tokens)
+
+    Raises:
+        PipelineError: If the model call fails or returns unusable JSON
+    """
+    shards = load_pdf_shards(absolute_path)
+    if shards:
+        return extract_json_sharded(prompt_text, shards, use_cache=use_cache)
+    input_data, input_digest = prepare_model_input(absolute_path, input_digest, stats)
+    return _request_extraction(prompt_text, input_data, use_cache=use_cache, input_digest=input_digest)
+
+
+async def aextract_json(prompt_text: str, absolute_path: str, use_cache: bool = True, input_digest: str = None,
+                        stats: dict = None):
+    """Async variant of extract_json."""
+    shards = await asyncio.to_thread(load_pdf_shards, absolute_path)
+    if shards:
+        return await aextract_json_sharded(prompt_text, shards, use_cache=use_cache)
+    input_data, input_digest = await asyncio.to_thread(prepare_model_input, absolute_path, input_digest, stats)
+    return await _arequest_extraction(prompt_text, input_data, use_cache=use_cache, input_digest=input_digest)
+
+
+def clean_model_html(result_html: str) -> str:
+    """Unwrap HTML the model returned as a JSON string/list and strip escapes."""
+    try:
+        maybe_list = json.loads(result_html)
+        if isinstance(maybe_list, list):
+            html_content = "".join(maybe_list)
+        else:
+            html_content = str(maybe_list)
+    except json.JSONDecodeError:
+        html_content = result_html  # If not JSON, use as is
+
+    return html_content.replace("\\n", "").replace("\n", "").replace('\\"', '"')
+
+
+def get_renderer(renderer: str = None) -> str:
+    """Validate a requested renderer, defaulting to settings.HTML_RENDERER."""
+    renderer = renderer or getattr(settings, "HTML_RENDERER", RENDERER_LOCAL)
+    if renderer not in HTML_RENDERERS:
+        raise PipelineError(f"Unknown renderer '{renderer}'. Use one of: {', '.join(HTML_RENDERERS)}", status_code=400)
+    return renderer
+
+
+def renderer_version(renderer: str = None) -> str:
+    """Version tag of a renderer; changes whenever its output could change."""
+    if get_renderer(renderer) == RENDERER_LOCAL:
+        return RENDERER_VERSION
+    prompt_hash = hashlib.sha256(JSON_TO_HTML_PROMPT.encode("utf-8")).hexdigest()[:16]
+    return f"llm-{model_backend_source()}-{os.getenv('MODEL_ID', '')}-{prompt_hash}"
+
+
+def html_digest(json_data, renderer: str = None) -> str:
+    """
+    Render cache key for DocumentContent.html_digest: canonical json_data plus the
+    renderer version. Any change to json_data changes the digest, so a
+    stale html_content is never served.
+    """
+    canonical = json.dumps(json_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    material = f"{renderer_version(renderer)}\n{canonical}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def document_content(doc: Document) -> DocumentContent:
+    """doc.content, or an empty unsaved one for documents that have none."""
+    return getattr(doc, 'content', None) or DocumentContent(document=doc)
+
+
+def save_rendered_html(content: DocumentContent, html_content: str, renderer: str = None):
+    content.html_content = html_content
+    content.html_digest = html_digest(content.json_data, renderer)
+    if content._state.adding:
+        content.save()
+    else:
+        content.save(update_fields=['html_content', 'html_digest'])
+
+
+def get_cached_html(doc: Document, renderer: str = None):
+    """Return the stored html_content if it was rendered from the current json_data, else None."""
+    return current_html(document_content(doc), renderer)
+
+
+def current_html(content: DocumentContent, renderer: str = None):
+    """content.html_content if it was rendered from content.json_data with this renderer, else None."""
+    if content.html_content and content.html_digest and content.html_digest == html_digest(content.json_data, renderer):
+        return content.html_content
+    return None
+
+
+def render_document_html(doc: Document, use_cache: bool = True, renderer: str = None) -> str:
+    """
+    HTML report for a stored document, reusing html_content when its digest
+    still matches json_data. Fresh renderings are saved back on the
+    document's content row so every later request (from any user) is
+    served from it. doc should come with select_related('content').
+    """
+    if use_cache:
+        cached_html = get_cached_html(doc, renderer)
+        if cached_html is not None:
+            logger.info(f"Serving cached HTML for document {doc.id}")
+            return cached_html
+
+    content = document_content(doc)
+    html_content, _, _ = render_html(content.json_data, use_cache=use_cache, renderer=renderer)
+    save_rendered_html(content, html_content, renderer)
+    return html_content
+
+
+def parse_html_response(html_response_obj: dict):
+    """Turn an LLM rendering response into (html_content, input_tokens, output_tokens)."""
+    try:
+        result_html = html_response_obj['candidates'][0]['content']['parts'][0]['text']
+    except (KeyError, IndexError, TypeError) as e:
+        logger.error(f"Invalid API response format for HTML conversion: {str(e)}")
+        raise PipelineError(f"Error during HTML conversion: {str(e)}")
+
+    usage_metadata = html_response_obj.get('usageMetadata', {})
+    input_tokens = usage_metadata.get('promptTokenCount', 0)
+    output_tokens = usage_metadata.get('candidatesTokenCount', 0)
+    logger.info(f"HTML Conversion - Input Tokens: {input_tokens}, Output Tokens: {output_tokens}")
+
+    return clean_model_html(result_html), input_tokens, output_tokens
+
+
+async def arender_document_html(doc: Document, use_cache: bool = True, renderer: str = None) -> str:
+    """Async variant of render_document_html."""
+    if use_cache:
+        cached_html = get_cached_html(doc, renderer)
+        if cached_html is not None:
+            logger.info(f"Serving cached HTML for document {doc.id}")
+            return cached_html
+
+    content = document_content(doc)
+    html_content, _, _ = await arender_html(content.json_data, use_cache=use_cache, renderer=renderer)
+    await sync_to_async(save_rendered_html)(content, html_content, renderer)
+    return html_content
+
+
+def render_html(parsed_json: dict, use_cache: bool = True, renderer: str = None):
+    """
+    Step 2: convert the extracted JSON to a styled HTML report.
+
+    The local renderer is deterministic and costs no tokens. The LLM
+    renderer (JSON_TO_HTML_PROMPT) is kept as an opt-in mode.
+
+    Returns:
+        tuple: (html_content, input_tokens, output_tokens)
+
+    Raises:
+        PipelineError: If the renderer is unknown or the model call fails
+    """
+    if get_renderer(renderer) == RENDERER_LOCAL:
+        with timed_stage(STAGE_HTML_RENDER):
+            return render_json_to_html(parsed_json), 0, 0
+
+    html_prompt = JSON_TO_HTML_PROMPT.format(json.dumps(parsed_json, indent=2, ensure_ascii=False))
+
+    with timed_stage(STAGE_HTML_CALL):
+        try:
+            html_response_obj = call_gemini_api(
+                prompt_text=html_prompt,
+                use_cache=use_cache
+            )
+        except (RateLimitExceeded, CircuitOpenError) as e:
+            logger.warning(f"HTML conversion not attempted: {e.message}")
+            raise PipelineError(e.message, status_code=503, retry_after=e.retry_after)
+        except Exception as e:
+            logger.error(f"Error during HTML conversion API call: {str(e)}", exc_info=True)
+            raise PipelineError(f"Error during HTML conversion: {str(e)}")
+
+    return parse_html_response(html_response_obj)
+
+
+async def arender_html(parsed_json: dict, use_cache: bool = True, renderer: str = None):
+    """Async variant of render_html."""
+    if get_renderer(renderer) == RENDERER_LOCAL:
+        with timed_stage(STAGE_HTML_RENDER):
+            return render_json_to_html(parsed_json), 0, 0
+
+    html_prompt = JSON_TO_HTML_PROMPT.format(json.dumps(parsed_json, indent=2, ensure_ascii=False))
+
+    with timed_stage(STAGE_HTML_CALL):
+        try:
+            html_response_obj = await acall_gemini_api(
+                prompt_text=html_prompt,
+                use_cache=use_cache
+            )
+        except (RateLimitExceeded, CircuitOpenError) as e:
+            logger.warning(f"HTML conversion not attempted: {e.message}")
+            raise PipelineError(e.message, status_code=503, retry_after=e.retry_after)
+        except Exception as e:
+            logger.error(f"Error during HTML conversion API call: {str(e)}", exc_info=True)
+            raise PipelineError(f"Error during HTML conversion: {str(e)}")
+
+    return parse_html_response(html_response_obj)
+
+
+def write_sidecar_json(relative_path: str, parsed_json: dict) -> str:
+    """Save extracted JSON next to the uploaded file and return its path."""
+    json_filename = os.path.splitext(relative_path)[0] + ".json"
+    json_path = os.path.join(settings.MEDIA_ROOT, json_filename)
+    with open(json_path, "w", encoding="utf-8") as jf:
+        json.dump(parsed_json, jf, separators=(",", ":"), ensure_ascii=False)
+    return json_path
+
+
+def extraction_key(input_digest: str, prompt_text: str) -> str:
+    """
+    Document.extraction_key: what an extraction was computed from, i.e. the
+    uploaded content, the prompt, the model backend and model, and the input
+    preparation settings. Two documents with the same key have interchangeable
+    json_data. '' when the input digest is unknown.
+    """
+    if not input_digest:
+        return ''
+    material = json.dumps([
+        input_digest,
+        prompt_text,
+        model_backend_source(),
+        os.getenv('MODEL_ID', ''),
+        text_layer_signature(),
+        preprocessing_signature(),
+        getattr(settings, "PDF_SHARDING", {}),
+    ], sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def linked_extraction(key: str):
+    """
+    The content of the latest document extracted with the same
+    extraction_key, so an identical upload reuses its extraction instead
+    of calling the model again. None when there is none.
+    """
+    if not key:
+        return None
+    return DocumentContent.objects.filter(
+        document__extraction_key=key, json_data__isnull=False
+    ).order_by('-document_id').first()
+
+
+def _reuse_extraction(content: DocumentContent, stats: dict = None):
+    """(parsed_json, 0, 0) from a linked extraction, with the same shape as extract_json."""
+    logger.info(f"Reusing the extraction of document {content.document_id} for identical content")
+    if stats is not None:
+        stats["reused_extraction"] = {"document_id": content.document_id}
+    return content.json_data, 0, 0
+
+
+def save_document(relative_path: str, user_id, doc_type: str, parsed_json: dict, html_content: str,
+                  renderer: str, input_tokens: int, output_tokens: int, original_name: str = '',
+                  extraction_key: str = '') -> Document:
+    """Write the sidecar JSON and insert the Document row with its content."""
+    with timed_stage(STAGE_SIDECAR_WRITE, document_type=doc_type):
+        write_sidecar_json(relative_path, parsed_json)
+
+    with timed_stage(STAGE_DB_INSERT, document_type=doc_type), transaction.atomic():
+        doc = Document.objects.create(
+            filepath=relative_path,
+            file=relative_path,
+            blob_id=blob_id_for_path(relative_path),
+            original_name=(original_name or '')[:255],
+            extraction_key=extraction_key,
+            userid_id=user_id,
+            document_type=doc_type,
+            input_token=input_tokens,
+            output_token=output_tokens
+        )
+        DocumentContent.objects.create(
+            document=doc,
+            json_data=parsed_json,
+            html_content=html_content,
+            html_digest=html_digest(parsed_json, renderer),
+        )
+    logger.info(f"Document {doc.id} processed and saved successfully.")
+    return doc
+
+
+def run_extraction_pipeline(relative_path: str, user_id, doc_type: str = None, prompt_text: str = None,
+                            use_cache: bool = True, renderer: str = None, input_digest: str = None,
+                            stats: dict = None, original_name: str = '') -> Document:
+    """
+    Run the full upload pipeline for an already stored file: extraction,
+    JSON to HTML conversion, sidecar JSON and the Document insert.
+
+    With use_cache, content already extracted with the same prompt and model
+    (see extraction_key) reuses that document's json_data, and its HTML when
+    rendered by the same renderer, without any model call.
+
+    Args:
+        relative_path: Path of the uploaded file relative to MEDIA_ROOT
+        user_id: Owner of the resulting Document
+        doc_type: Document type, also used to pick the default prompt
+        prompt_text: Optional client supplied extraction prompt
+        use_cache: Set to False to force fresh model calls
+        renderer: "local" or "llm", defaults to settings.HTML_RENDERER
+        input_digest: SHA-256 of the file computed at ingestion, if known
+        stats: Optional dict that receives per-stage statistics
+        original_name: File name as uploaded
+
+    Returns:
+        Document: The saved document
+
+    Raises:
+        PipelineError: If any stage fails
+    """
+    with document_type_context(doc_type):
+        absolute_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+        prompt_text = resolve_prompt(doc_type, prompt_text)
+        key = extraction_key(input_digest, prompt_text)
+        linked = linked_extraction(key) if use_cache else None
+
+        if linked is not None:
+            parsed_json, input_tokens, output_tokens = _reuse_extraction(linked, stats)
+        else:
+            parsed_json, input_tokens, output_tokens = extract_json(
+                prompt_text, absolute_path, use_cache=use_cache, input_digest=input_digest, stats=stats
+            )
+        html_content = current_html(linked, renderer) if linked is not None else None
+        if html_content is not None:
+            html_input_tokens = html_output_tokens = 0
+        else:
+            html_content, html_input_tokens, html_output_tokens = render_html(
+                parsed_json, use_cache=use_cache, renderer=renderer
+            )
+
+        return save_document(
+            relative_path, user_id, doc_type, parsed_json, html_content, renderer,
+            input_tokens + html_input_tokens, output_tokens + html_output_tokens,
+            original_name=original_name, extraction_key=key,
+        )
+
+
+async def arun_extraction_pipeline(relative_path: str, user_id, doc_type: str = None, prompt_text: str = None,
+                                   use_cache: bool = True, renderer: str = None,
+                                   input_digest: str = None, stats: dict = None,
+                                   original_name: str = '') -> Document:
+    """Async variant of run_extraction_pipeline; model calls never block the event loop."""
+    with document_type_context(doc_type):
+        absolute_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+        prompt_text = resolve_prompt(doc_type, prompt_text)
+        key = extraction_key(input_digest, prompt_text)
+        linked = await sync_to_async(linked_extraction)(key) if use_cache else None
+
+        if linked is not None:
+            parsed_json, input_tokens, output_tokens = _reuse_extraction(linked, stats)
+        else:
+            parsed_json, input_tokens, output_tokens = await aextract_json(
+                prompt_text, absolute_path, use_cache=use_cache, input_digest=input_digest, stats=stats
+            )
+        html_content = current_html(linked, renderer) if linked is not None else None
+        if html_content is not None:
+            html_input_tokens = html_output_tokens = 0
+        else:
+            html_content, html_input_tokens, html_output_tokens = await arender_html(
+                parsed_json, use_cache=use_cache, renderer=renderer
+            )
+
+        return await sync_to_async(save_document)(
+            relative_path, user_id, doc_type, parsed_json, html_content, renderer,
+            input_tokens + html_input_tokens, output_tokens + html_output_tokens,
+            original_name=original_name, extraction_key=key,
+        )
+
+
+async def _astream_model_call(label: str, delta_event: str, **call_kwargs):
+    """
+    Forward astream_gemini_api deltas as (delta_event, {"text": ...}) events,
+    then yield (None, response) with the assembled response.
+
+    Raises:
+        PipelineError: Same messages and status codes as the non-streaming calls
+    """
+    try:
+        async for chunk in astream_gemini_api(**call_kwargs):
+            if chunk.response is not None:
+                yield None, chunk.response
+            else:
+                yield delta_event, {"text": chunk.text}
+    except (RateLimitExceeded, CircuitOpenError) as e:
+        logger.warning(f"{label} not attempted: {e.message}")
+        raise PipelineError(e.message, status_code=503, retry_after=e.retry_after)
+    except Exception as e:
+        logger.error(f"Error during {label} API call: {str(e)}", exc_info=True)
+        raise PipelineError(f"Error during {label}: {str(e)}")
+
+
+async def astream_json(prompt_text: str, absolute_path: str, use_cache: bool = True, input_digest: str = None,
+                       stats: dict = None):
+    """
+    Streaming variant of aextract_json: yields ("json_delta", {"text"}) events
+    while the model writes, then ("json", {"data", "input_tokens", "output_tokens"}).
+    Sharded PDFs are extracted concurrently and merged, so they only get the
+    final event.
+    """
+    shards = await asyncio.to_thread(load_pdf_shards, absolute_path)
+    if shards:
+        parsed_json, input_tokens, output_tokens = await aextract_json_sharded(
+            prompt_text, shards, use_cache=use_cache
+        )
+    else:
+        input_data, input_digest = await asyncio.to_thread(prepare_model_input, absolute_path, input_digest, stats)
+        response = None
+        with timed_stage(STAGE_EXTRACTION_CALL):
+            async for event, data in _astream_model_call(
+                "JSON extraction", "json_delta",
+                prompt_text=prompt_text,
+                input_data=input_data,
+                response_mime_type="application/json",
+                use_cache=use_cache,
+                input_digest=input_digest,
+            ):
+                if event is None:
+                    response = data
+                else:
+                    yield event, data
+        with timed_stage(STAGE_JSON_PARSE):
+            parsed_json, input_tokens, output_tokens = parse_extraction_response(response)
+
+    yield "json", {"data": parsed_json, "input_tokens": input_tokens, "output_tokens": output_tokens}
+
+
+async def astream_html(parsed_json: dict, use_cache: bool = True, renderer: str = None):
+    """
+    Streaming variant of arender_html: ("html_delta", {"text"}) events from the
+    LLM renderer, then ("html", {"html", "input_tokens", "output_tokens"}) with
+    the cleaned report. The local renderer only yields the final event.
+    """
+    if get_renderer(renderer) == RENDERER_LOCAL:
+        with timed_stage(STAGE_HTML_RENDER):
+            html_content = render_json_to_html(parsed_json)
+        yield "html", {"html": html_content, "input_tokens": 0, "output_tokens": 0}
+        return
+
+    html_prompt = JSON_TO_HTML_PROMPT.format(json.dumps(parsed_json, indent=2, ensure_ascii=False))
+    response = None
+    with timed_stage(STAGE_HTML_CALL):
+        async for event, data in _astream_model_call(
+            "HTML conversion", "html_delta", prompt_text=html_prompt, use_cache=use_cache
+        ):
+            if event is None:
+                response = data
+            else:
+                yield event, data
+
+    html_content, input_tokens, output_tokens = parse_html_response(response)
+    yield "html", {"html": html_content, "input_tokens": input_tokens, "output_tokens": output_tokens}
+
+
+async def astream_document_html(doc: Document, use_cache: bool = True, renderer: str = None):
+    """Streaming variant of arender_document_html, with the events of astream_html."""
+    if use_cache:
+        cached_html = get_cached_html(doc, renderer)
+        if cached_html is not None:
+            logger.info(f"Serving cached HTML for document {doc.id}")
+            yield "html", {"html": cached_html, "input_tokens": 0, "output_tokens": 0}
+            return
+
+    content = document_content(doc)
+    async for event, data in astream_html(content.json_data, use_cache=use_cache, renderer=renderer):
+        if event == "html":
+            await sync_to_async(save_rendered_html)(content, data["html"], renderer)
+        yield event, data
+
+
+async def astream_extraction_pipeline(relative_path: str, user_id, doc_type: str = None, prompt_text: str = None,
+                                      use_cache: bool = True, renderer: str = None,
+                                      input_digest: str = None, stats: dict = None,
+                                      original_name: str = ''):
+    """
+    Streaming variant of arun_extraction_pipeline for server-sent events.
+
+    Yields (event, data) pairs: ("stage", {"stage": "extracting"}), the
+    astream_json events, ("stage", {"stage": "rendering", ...}), the
+    astream_html events and finally ("stage", {"stage": "persisted",
+    "document_id": ...}) once the Document is saved. The "json" and "html"
+    events carry the authoritative results; deltas are raw model output
+    for progressive display. A reused extraction (see run_extraction_pipeline)
+    only gets the final "json" and "html" events.
+
+    Raises:
+        PipelineError: If any stage fails; events already yielded stay valid
+    """
+    with document_type_context(doc_type):
+        absolute_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+        prompt_text = resolve_prompt(doc_type, prompt_text)
+        renderer = get_renderer(renderer)
+        key = extraction_key(input_digest, prompt_text)
+        linked = await sync_to_async(linked_extraction)(key) if use_cache else None
+
+        yield "stage", {"stage": "extracting"}
+        extraction = None
+        if linked is not None:
+            parsed_json, input_tokens, output_tokens = _reuse_extraction(linked, stats)
+            extraction = {"data": parsed_json, "input_tokens": input_tokens, "output_tokens": output_tokens}
+            yield "json", extraction
+        else:
+            async for event, data in astream_json(
+                prompt_text, absolute_path, use_cache=use_cache, input_digest=input_digest, stats=stats
+            ):
+                if event == "json":
+                    extraction = data
+                yield event, data
+
+        yield "stage", {"stage": "rendering", "renderer": renderer}
+        rendering = None
+        linked_html = current_html(linked, renderer) if linked is not None else None
+        if linked_html is not None:
+            rendering = {"html": linked_html, "input_tokens": 0, "output_tokens": 0}
+            yield "html", rendering
+        else:
+            async for event, data in astream_html(extraction["data"], use_cache=use_cache, renderer=renderer):
+                if event == "html":
+                    rendering = data
+                yield event, data
+
+        doc = await sync_to_async(save_document)(
+            relative_path, user_id, doc_type, extraction["data"], rendering["html"], renderer,
+            extraction["input_tokens"] + rendering["input_tokens"],
+            extraction["output_tokens"] + rendering["output_tokens"],
+            original_name=original_name, extraction_key=key,
+        )
+        yield "stage", {"stage": "persisted", "document_id": doc.id}
+
+
+def parse_reimbursement_response(response: dict):
+    """
+    Turn a reimbursement extraction response into (extracted_json, input_tokens, output_tokens).
+
+    Unlike parse_extraction_response, non-object JSON is accepted as is.
+    """
+    input_tokens = 0
+    output_tokens = 0
+
+    try:
+        result = response['candidates'][0]['content']['parts'][0]['text']
+        extracted_json = safe_json_load(result)
+    except Exception as e:
+        logger.error(f"Error during reimbursement JSON extraction: {str(e)}", exc_info=True)
+        raise PipelineError(f"Error during reimbursement JSON extraction: {str(e)}")
+
+    if isinstance(extracted_json, list) and extracted_json:
+        extracted_json = extracted_json[0]
+
+    if 'usageMetadata' in response:
+        usage_metadata = response['usageMetadata']
+        input_tokens = usage_metadata.get('promptTokenCount', 0)
+        output_tokens = usage_metadata.get('candidatesTokenCount', 0)
+        logger.info(f"Reimbursement - Input Tokens: {input_tokens}, Output Tokens: {output_tokens}")
+    else:
+        logger.info("Reimbursement - Usage metadata not available in the response.")
+
+    return extracted_json, input_tokens, output_tokens
+
+
+def save_reimbursement_document(file_path: str, user_id, extracted_json, html_body: str, renderer: str,
+                                input_tokens: int, output_tokens: int, doc_id: int = None,
+                                original_name: str = '') -> Document:
+    """
+    Create a reimbursement Document, or update doc_id when given.
+
+    Raises:
+        Document.DoesNotExist: If doc_id does not belong to user_id
+    """
+    if doc_id:
+        logger.info(f"Updating existing reimbursement document for ID: {doc_id}")
+        logger.debug(f"HTML Body: {html_body[:200]}...") # Log beginning of HTML
+        with timed_stage(STAGE_DB_INSERT, document_type='reimbursement'), transaction.atomic():
+            doc = Document.objects.get(id=doc_id, userid_id=user_id)
+            doc.file = file_path
+            doc.filepath = file_path
+            doc.blob_id = blob_id_for_path(file_path)
+            doc.original_name = (original_name or '')[:255]
+            doc.extraction_key = ''
+            doc.input_token = input_tokens
+            doc.output_token = output_tokens
+            doc.save()
+            DocumentContent.objects.update_or_create(document=doc, defaults={
+                'json_data': extracted_json,
+                'html_content': html_body,
+                'html_digest': html_digest(extracted_json, renderer),
+            })
+        logger.info(f"Updated reimbursement document {doc_id}")
+        return doc
+
+    logger.info("Creating new reimbursement document.")
+    with timed_stage(STAGE_DB_INSERT, document_type='reimbursement'), transaction.atomic():
+        doc = Document.objects.create(
+            file=file_path,
+            filepath=file_path,
+            blob_id=blob_id_for_path(file_path),
+            original_name=(original_name or '')[:255],
+            userid_id=user_id,
+            document_type='reimbursement', # Explicitly set for new docs
+            input_token=input_tokens,
+            output_token=output_tokens
+        )
+        DocumentContent.objects.create(
+            document=doc,
+            json_data=extracted_json,
+            html_content=html_body,
+            html_digest=html_digest(extracted_json, renderer),
+        )
+    logger.info(f"Created new reimbursement document {doc.id}")
+    return doc
@@ -0,0 +1,340 @@
+import os
+import time
+import uuid
+import random
+import asyncio
+import logging
+import sqlite3
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITER_PATH = os.path.join(tempfile.gettempdir(), "imageextraction_model_rate_limit.sqlite3")
+DEFAULT_MAX_WAIT = 30.0  # seconds a call may queue before it is shed
+DEFAULT_LEASE_TTL = 300.0  # seconds after which an in-flight slot of a dead process is reclaimed
+MIN_POLL_INTERVAL = 0.01
+MAX_POLL_INTERVAL = 0.25
+
+BUCKET_REQUESTS = "requests"
+BUCKET_TOKENS = "tokens"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (id TEXT PRIMARY KEY, tokens INTEGER NOT NULL, pid INTEGER NOT NULL,
+                                   expires REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS pauses (name TEXT PRIMARY KEY, until REAL NOT NULL);
+"""
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a model call could not be admitted within the allowed wait."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+@dataclass
+class Lease:
+    id: str
+    tokens: int
+
+
+class ModelRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets plus an in-flight cap,
+    shared by every thread and worker process on the host.
+
+    State lives in a small SQLite file and every decision runs inside a
+    BEGIN IMMEDIATE transaction, so admissions from different processes are
+    serialized without a broker. Calls are admitted before they reach the
+    provider; a call that cannot be admitted within max_wait is shed with
+    RateLimitExceeded instead of being sent and answered with a 429.
+
+    Token usage is only known after the response, so acquire() charges an
+    estimate and release() settles the difference against the actual
+    totalTokenCount. A quota error from the provider pauses admissions for
+    everyone (pause()), so workers do not retry in lockstep.
+
+    A limit of 0 disables that dimension.
+    """
+
+    def __init__(self, path: str = DEFAULT_LIMITER_PATH, requests_per_minute: int = 0, tokens_per_minute: int = 0,
+                 max_in_flight: int = 0, max_wait: float = DEFAULT_MAX_WAIT, lease_ttl: float = DEFAULT_LEASE_TTL,
+                 enabled: bool = True):
+        self.path = path
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_in_flight = max_in_flight
+        self.max_wait = max_wait
+        self.lease_ttl = lease_ttl
+        self.enabled = enabled and bool(requests_per_minute or tokens_per_minute or max_in_flight)
+        self._local = threading.local()
+        if self.enabled:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn, time.time())
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def _bump(conn, name: str, amount: float = 1):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    @staticmethod
+    def _level(conn, name: str, capacity: int, now: float) -> float:
+        """Current bucket level after refilling at capacity per minute."""
+        row = conn.execute("SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return float(capacity)
+        level, updated = row
+        return min(float(capacity), level + max(0.0, now - updated) * capacity / 60.0)
+
+    @staticmethod
+    def _store_level(conn, name: str, level: float, now: float):
+        conn.execute(
+            "INSERT INTO buckets (name, level, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET level = excluded.level, updated = excluded.updated",
+            (name, level, now),
+        )
+
+    def _try_acquire(self, tokens: int):
+        """One admission attempt. Returns (lease, 0) or (None, seconds until it may succeed)."""
+
+        def attempt(conn, now):
+            conn.execute("DELETE FROM leases WHERE expires < ?", (now,))
+
+            row = conn.execute("SELECT until FROM pauses WHERE name = 'provider'").fetchone()
+            if row and row[0] > now:
+                return None, row[0] - now
+
+            waits = []
+            if self.max_in_flight:
+                in_flight = conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0]
+                if in_flight >= self.max_in_flight:
+                    waits.append(MAX_POLL_INTERVAL)
+
+            request_level = token_level = None
+            if self.requests_per_minute:
+                request_level = self._level(conn, BUCKET_REQUESTS, self.requests_per_minute, now)
+                if request_level < 1:
+                    waits.append((1 - request_level) * 60.0 / self.requests_per_minute)
+
+            # A request larger than the whole bucket only needs a full bucket, otherwise it could never run
+            charge = min(tokens, self.tokens_per_minute) if self.tokens_per_minute else tokens
+            if self.tokens_per_minute:
+                token_level = self._level(conn, BUCKET_TOKENS, self.tokens_per_minute, now)
+                if token_level < charge:
+                    waits.append((charge - token_level) * 60.0 / self.tokens_per_minute)
+
+            if waits:
+                return None, max(waits)
+
+            if request_level is not None:
+                self._store_level(conn, BUCKET_REQUESTS, request_level - 1, now)
+            if token_level is not None:
+                self._store_level(conn, BUCKET_TOKENS, token_level - charge, now)
+
+            lease = Lease(id=uuid.uuid4().hex, tokens=charge)
+            conn.execute(
+                "INSERT INTO leases (id, tokens, pid, expires) VALUES (?, ?, ?, ?)",
+                (lease.id, charge, os.getpid(), now + self.lease_ttl),
+            )
+            self._bump(conn, "admitted")
+            return lease, 0.0
+
+        return self._transaction(attempt)
+
+    def _record_wait(self, waited: float, shed: bool):
+        def record(conn, now):
+            if waited > 0:
+                self._bump(conn, "waited")
+                self._bump(conn, "wait_seconds", waited)
+            if shed:
+                self._bump(conn, "shed")
+        self._transaction(record)
+
+    def _next_sleep(self, wait: float, deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return 0.0
+        # Jitter so callers waiting on the same refill do not wake up together
+        sleep = min(max(wait, MIN_POLL_INTERVAL), MAX_POLL_INTERVAL) * random.uniform(0.5, 1.0)
+        return min(sleep, remaining)
+
+    def _shed(self, tokens: int, wait: float, waited: float):
+        self._record_wait(waited, shed=True)
+        logger.warning(f"Model call shed after waiting {waited:.2f}s (estimated {tokens} tokens)")
+        raise RateLimitExceeded(
+            "Model capacity is exhausted, please retry shortly.", retry_after=round(max(wait, 1.0), 1)
+        )
+
+    def acquire(self, tokens: int = 0, max_wait: float = None) -> Optional[Lease]:
+        """
+        Block until the call fits under every limit and take an in-flight slot.
+
+        Args:
+            tokens: Estimated tokens the call will consume
+            max_wait: Seconds to queue before shedding, defaults to self.max_wait
+
+        Returns:
+            Lease to hand back to release(), or None when the limiter is disabled
+
+        Raises:
+            RateLimitExceeded: If the call could not be admitted in time
+        """
+        if not self.enabled:
+            return None
+        started = time.monotonic()
+        deadline = started + (self.max_wait if max_wait is None else max_wait)
+        while True:
+            lease, wait = self._try_acquire(tokens)
+            if lease is not None:
+                if time.monotonic() - started > MIN_POLL_INTERVAL:
+                    self._record_wait(time.monotonic() - started, shed=False)
+                return lease
+            sleep = self._next_sleep(wait, deadline)
+            if not sleep:
+                self._shed(tokens, wait, time.monotonic() - started)
+            time.sleep(sleep)
+
+    async def aacquire(self, tokens: int = 0, max_wait: float = None) -> Optional[Lease]:
+        """Async acquire(): queues on the event loop instead of blocking a thread."""
+        if not self.enabled:
+            return None
+        started = time.monotonic()
+        deadline = started + (self.max_wait if max_wait is None else max_wait)
+        while True:
+            lease, wait = await asyncio.to_thread(self._try_acquire, tokens)
+            if lease is not None:
+                if time.monotonic() - started > MIN_POLL_INTERVAL:
+                    await asyncio.to_thread(self._record_wait, time.monotonic() - started, False)
+                return lease
+            sleep = self._next_sleep(wait, deadline)
+            if not sleep:
+                await asyncio.to_thread(self._shed, tokens, wait, time.monotonic() - started)
+            await asyncio.sleep(sleep)
+
+    def release(self, lease: Optional[Lease], used_tokens: int = None):
+        """
+        Free the in-flight slot and settle the token estimate against actual usage.
+        A call that used more than estimated leaves the bucket in debt, which
+        delays the next admissions accordingly.
+        """
+        if lease is None:
+            return
+
+        def settle(conn, now):
+            conn.execute("DELETE FROM leases WHERE id = ?", (lease.id,))
+            if self.tokens_per_minute and used_tokens is not None and used_tokens != lease.tokens:
+                level = self._level(conn, BUCKET_TOKENS, self.tokens_per_minute, now)
+                level = min(float(self.tokens_per_minute), level + lease.tokens - used_tokens)
+                self._store_level(conn, BUCKET_TOKENS, level, now)
+            if used_tokens:
+                self._bump(conn, "tokens_used", used_tokens)
+
+        self._transaction(settle)
+
+    def pause(self, seconds: float):
+        """Stop admitting calls in every process for the given time, after the provider reported a quota error."""
+        if not self.enabled:
+            return
+
+        def extend(conn, now):
+            conn.execute(
+                "INSERT INTO pauses (name, until) VALUES ('provider', ?) "
+                "ON CONFLICT(name) DO UPDATE SET until = MAX(until, excluded.until)",
+                (now + seconds,),
+            )
+            self._bump(conn, "provider_rate_limited")
+
+        self._transaction(extend)
+
+    def stats(self) -> dict:
+        """Utilization snapshot shared by all processes using the same file."""
+        if not self.enabled:
+            return {"enabled": False}
+
+        def snapshot(conn, now):
+            conn.execute("DELETE FROM leases WHERE expires < ?", (now,))
+            in_flight = conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0]
+            row = conn.execute("SELECT until FROM pauses WHERE name = 'provider'").fetchone()
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            data = {
+                "enabled": True,
+                "in_flight": in_flight,
+                "max_in_flight": self.max_in_flight or None,
+                "paused_for": round(max(0.0, row[0] - now), 2) if row else 0.0,
+                "admitted": int(counters.get("admitted", 0)),
+                "waited": int(counters.get("waited", 0)),
+                "wait_seconds": round(counters.get("wait_seconds", 0.0), 3),
+                "shed": int(counters.get("shed", 0)),
+                "provider_rate_limited": int(counters.get("provider_rate_limited", 0)),
+                "tokens_used": int(counters.get("tokens_used", 0)),
+            }
+            if self.requests_per_minute:
+                level = self._level(conn, BUCKET_REQUESTS, self.requests_per_minute, now)
+                data["requests_per_minute"] = self.requests_per_minute
+                data["requests_available"] = round(level, 2)
+                data["requests_utilization"] = round(1 - level / self.requests_per_minute, 3)
+            if self.tokens_per_minute:
+                level = self._level(conn, BUCKET_TOKENS, self.tokens_per_minute, now)
+                data["tokens_per_minute"] = self.tokens_per_minute
+                data["tokens_available"] = round(level)
+                data["tokens_utilization"] = round(1 - level / self.tokens_per_minute, 3)
+            return data
+
+        return self._transaction(snapshot)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> ModelRateLimiter:
+    """Build the process-wide limiter from settings.MODEL_RATE_LIMIT on first use."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                from django.conf import settings
+
+                config = getattr(settings, "MODEL_RATE_LIMIT", {})
+                _limiter = ModelRateLimiter(
+                    path=config.get("LOCATION", DEFAULT_LIMITER_PATH),
+                    requests_per_minute=config.get("REQUESTS_PER_MINUTE", 0),
+                    tokens_per_minute=config.get("TOKENS_PER_MINUTE", 0),
+                    max_in_flight=config.get("MAX_IN_FLIGHT", 0),
+                    max_wait=config.get("MAX_WAIT", DEFAULT_MAX_WAIT),
+                    lease_ttl=config.get("LEASE_TTL", DEFAULT_LEASE_TTL),
+                    enabled=config.get("ENABLED", True),
+                )
+                logger.info(f"Model rate limiter initialized (enabled={_limiter.enabled})")
+    return _limiter
@@ -0,0 +1,344 @@
+import os
+import time
+import random
+import logging
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, Optional
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+ERROR_RETRYABLE = "retryable"
+ERROR_QUOTA = "quota"
+ERROR_PERMANENT = "permanent"
+ERROR_SAFETY = "safety_blocked"
+ERROR_CLASSES = (ERROR_RETRYABLE, ERROR_QUOTA, ERROR_PERMANENT, ERROR_SAFETY)
+
+# Retries allowed per error class; MAX_RETRIES in call_gemini_api stays the overall cap
+DEFAULT_RETRY_BUDGETS = {ERROR_RETRYABLE: 3, ERROR_QUOTA: 5, ERROR_PERMANENT: 0, ERROR_SAFETY: 0}
+DEFAULT_MAX_DELAYS = {ERROR_RETRYABLE: 10, ERROR_QUOTA: 60}  # seconds
+INITIAL_RETRY_DELAY = 1  # seconds
+BACKOFF_FACTOR = 2
+
+# google.api_core exception class names, matched by name so the SDK is not imported here
+PERMANENT_EXCEPTION_NAMES = {
+    "InvalidArgument", "BadRequest", "FailedPrecondition", "PermissionDenied", "Forbidden",
+    "Unauthenticated", "Unauthorized", "NotFound", "MethodNotImplemented", "OutOfRange",
+}
+QUOTA_EXCEPTION_NAMES = {"ResourceExhausted", "TooManyRequests", "APIRateLimitError"}
+SAFETY_EXCEPTION_NAMES = {"ResponseBlockedError", "ResponseValidationError"}
+PERMANENT_EXCEPTION_TYPES = (ValueError, TypeError, KeyError, FileNotFoundError, PermissionError)
+
+QUOTA_MARKERS = ("rate limit", "quota", "429", "resource exhausted")
+SAFETY_MARKERS = ("safety", "blocked", "prohibited content")
+PERMANENT_MARKERS = (
+    "400 ", "401 ", "403 ", "404 ", "invalid argument", "unsupported mime", "mime type",
+    "permission denied", "not found",
+)
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+DEFAULT_BREAKER_PATH = os.path.join(tempfile.gettempdir(), "imageextraction_model_circuit.sqlite3")
+DEFAULT_PROBE_TIMEOUT = 120.0  # seconds after which the probe of a dead process is given up
+
+BREAKER_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS circuit (id INTEGER PRIMARY KEY CHECK (id = 1), state TEXT NOT NULL,
+                                    opened_at REAL NOT NULL, probe_until REAL NOT NULL,
+                                    times_opened INTEGER NOT NULL, rejected INTEGER NOT NULL);
+INSERT OR IGNORE INTO circuit (id, state, opened_at, probe_until, times_opened, rejected)
+    VALUES (1, '{CIRCUIT_CLOSED}', 0, 0, 0, 0);
+CREATE TABLE IF NOT EXISTS circuit_outcomes (second INTEGER PRIMARY KEY, calls INTEGER NOT NULL,
+                                             failures INTEGER NOT NULL);
+"""
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the model while the circuit breaker is open."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+def classify_error(error: Exception) -> str:
+    """
+    Sort a failed model call into one of ERROR_CLASSES.
+
+    Exception types are checked first (our own validation errors and the
+    google.api_core hierarchy by class name), then the message, which is
+    all the information some SDK errors carry. Anything unrecognized is
+    treated as transient.
+    """
+    names = {cls.__name__ for cls in type(error).__mro__}
+    error_str = str(error).lower()
+
+    if names & SAFETY_EXCEPTION_NAMES:
+        return ERROR_SAFETY
+    if names & QUOTA_EXCEPTION_NAMES:
+        return ERROR_QUOTA
+    if names & PERMANENT_EXCEPTION_NAMES or isinstance(error, PERMANENT_EXCEPTION_TYPES):
+        return ERROR_PERMANENT
+
+    if any(marker in error_str for marker in QUOTA_MARKERS):
+        return ERROR_QUOTA
+    if any(marker in error_str for marker in SAFETY_MARKERS):
+        return ERROR_SAFETY
+    if any(error_str.startswith(marker) or f" {marker}" in error_str for marker in PERMANENT_MARKERS):
+        return ERROR_PERMANENT
+    return ERROR_RETRYABLE
+
+
+class RetryPolicy:
+    """Per error class retry budgets with capped exponential backoff and jitter."""
+
+    def __init__(self, budgets: Dict[str, int] = None, max_delays: Dict[str, float] = None,
+                 initial_delay: float = INITIAL_RETRY_DELAY, backoff_factor: float = BACKOFF_FACTOR):
+        self.budgets = {**DEFAULT_RETRY_BUDGETS, **(budgets or {})}
+        self.max_delays = {**DEFAULT_MAX_DELAYS, **(max_delays or {})}
+        self.initial_delay = initial_delay
+        self.backoff_factor = backoff_factor
+
+    def budget(self, error_class: str) -> int:
+        return self.budgets.get(error_class, 0)
+
+    def delay(self, error_class: str, attempt: int) -> float:
+        max_delay = self.max_delays.get(error_class, self.max_delays[ERROR_RETRYABLE])
+        delay = min(self.initial_delay * (self.backoff_factor ** attempt), max_delay)
+        return delay + random.uniform(0, 0.1 * delay)  # Add up to 10% jitter
+
+
+class CircuitBreaker:
+    """
+    Fails model calls fast while the backend is unhealthy.
+
+    Outcomes of the last `window` seconds are kept; once at least
+    `min_calls` were seen and the share of backend failures (retryable and
+    quota errors) reaches `failure_rate`, the circuit opens and every call
+    raises CircuitOpenError for `cool_down` seconds. After that a single
+    probe call is let through (half open): success closes the circuit,
+    failure opens it again. Permanent and safety errors are the request's
+    fault and count as successes for the backend.
+
+    State is shared by every thread and process on the host through a small
+    SQLite file, like the rate limiter's, so the extraction workers trip one
+    breaker together and the web process reports the state they see.
+    Outcomes are kept as per-second counts, so the file stays small. A probe
+    whose process died is given up after probe_timeout seconds.
+    """
+
+    def __init__(self, path: str = DEFAULT_BREAKER_PATH, window: float = 60, min_calls: int = 10,
+                 failure_rate: float = 0.5, cool_down: float = 30, probe_timeout: float = DEFAULT_PROBE_TIMEOUT,
+                 enabled: bool = True):
+        self.path = path
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.cool_down = cool_down
+        self.probe_timeout = probe_timeout
+        self.enabled = enabled
+        self._local = threading.local()
+        if self.enabled:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._connection().executescript(BREAKER_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Keyed on the pid: a connection inherited across fork must not be reused
+        if getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def _transaction(self, fn):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn, time.time())
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def _read_state(conn):
+        return conn.execute("SELECT state, opened_at, probe_until FROM circuit WHERE id = 1").fetchone()
+
+    def _window_counts(self, conn, now: float):
+        calls, failures = conn.execute(
+            "SELECT COALESCE(SUM(calls), 0), COALESCE(SUM(failures), 0) FROM circuit_outcomes WHERE second >= ?",
+            (int(now - self.window),),
+        ).fetchone()
+        return calls, failures
+
+    def _record_outcome(self, conn, now: float, failed: bool):
+        conn.execute(
+            "INSERT INTO circuit_outcomes (second, calls, failures) VALUES (?, 1, ?) "
+            "ON CONFLICT(second) DO UPDATE SET calls = calls + 1, failures = failures + excluded.failures",
+            (int(now), int(failed)),
+        )
+        conn.execute("DELETE FROM circuit_outcomes WHERE second < ?", (int(now - self.window),))
+
+    def _open(self, conn, now: float):
+        conn.execute(
+            "UPDATE circuit SET state = ?, opened_at = ?, probe_until = 0, times_opened = times_opened + 1 "
+            "WHERE id = 1",
+            (CIRCUIT_OPEN, now),
+        )
+        conn.execute("DELETE FROM circuit_outcomes")
+        logger.error(f"Model circuit breaker opened for {self.cool_down}s")
+
+    def before_call(self):
+        """
+        Raises:
+            CircuitOpenError: If the circuit is open, or half open with the probe already running
+        """
+        if not self.enabled:
+            return
+        # Closed is the common case: answered by a read, without taking the write lock
+        if self._read_state(self._connection())[0] == CIRCUIT_CLOSED:
+            return
+
+        def admit(conn, now):
+            state, opened_at, probe_until = self._read_state(conn)
+            if state == CIRCUIT_OPEN:
+                remaining = opened_at + self.cool_down - now
+                if remaining > 0:
+                    conn.execute("UPDATE circuit SET rejected = rejected + 1 WHERE id = 1")
+                    return "Model backend is unavailable, please retry shortly.", round(remaining, 1)
+                state = CIRCUIT_HALF_OPEN
+                conn.execute("UPDATE circuit SET state = ?, probe_until = 0 WHERE id = 1", (state,))
+                probe_until = 0
+                logger.warning("Model circuit breaker half open, sending a probe call")
+            if state == CIRCUIT_HALF_OPEN:
+                if probe_until > now:
+                    conn.execute("UPDATE circuit SET rejected = rejected + 1 WHERE id = 1")
+                    return "Model backend is recovering, please retry shortly.", 1.0
+                conn.execute("UPDATE circuit SET probe_until = ? WHERE id = 1", (now + self.probe_timeout,))
+            return None
+
+        rejection = self._transaction(admit)
+        if rejection is not None:
+            message, retry_after = rejection
+            raise CircuitOpenError(message, retry_after=retry_after)
+
+    def abandon(self):
+        """The call admitted by before_call() never reached the backend (e.g. it was shed)."""
+        if not self.enabled:
+            return
+
+        def release_probe(conn, now):
+            conn.execute("UPDATE circuit SET probe_until = 0 WHERE id = 1 AND state = ?", (CIRCUIT_HALF_OPEN,))
+
+        self._transaction(release_probe)
+
+    def record_success(self):
+        if not self.enabled:
+            return
+
+        def succeeded(conn, now):
+            if self._read_state(conn)[0] == CIRCUIT_HALF_OPEN:
+                conn.execute("UPDATE circuit SET state = ?, probe_until = 0 WHERE id = 1", (CIRCUIT_CLOSED,))
+                logger.info("Model circuit breaker closed")
+            self._record_outcome(conn, now, failed=False)
+
+        self._transaction(succeeded)
+
+    def record_error(self, error_class: str):
+        if error_class not in (ERROR_RETRYABLE, ERROR_QUOTA):
+            self.record_success()
+            return
+        if not self.enabled:
+            return
+
+        def failed(conn, now):
+            if self._read_state(conn)[0] == CIRCUIT_HALF_OPEN:
+                self._open(conn, now)
+                return
+            self._record_outcome(conn, now, failed=True)
+            calls, failures = self._window_counts(conn, now)
+            if calls >= self.min_calls and failures / calls >= self.failure_rate:
+                self._open(conn, now)
+
+        self._transaction(failed)
+
+    @property
+    def is_open(self) -> bool:
+        if not self.enabled:
+            return False
+        state, opened_at, _ = self._read_state(self._connection())
+        return state == CIRCUIT_OPEN and time.time() < opened_at + self.cool_down
+
+    def state(self) -> dict:
+        """Snapshot of the breaker shared by all processes using the same file."""
+        if not self.enabled:
+            return {"enabled": False, "state": CIRCUIT_CLOSED, "retry_after": 0.0}
+
+        def snapshot(conn, now):
+            state, opened_at, times_opened, rejected = conn.execute(
+                "SELECT state, opened_at, times_opened, rejected FROM circuit WHERE id = 1"
+            ).fetchone()
+            calls, failures = self._window_counts(conn, now)
+            retry_after = 0.0
+            if state == CIRCUIT_OPEN:
+                retry_after = max(0.0, opened_at + self.cool_down - now)
+                if not retry_after:
+                    state = CIRCUIT_HALF_OPEN
+            return {
+                "enabled": True,
+                "state": state,
+                "retry_after": round(retry_after, 1),
+                "window_calls": calls,
+                "window_failures": failures,
+                "failure_rate_threshold": self.failure_rate,
+                "times_opened": times_opened,
+                "rejected": rejected,
+            }
+
+        return self._transaction(snapshot)
+
+
+_policy: Optional[RetryPolicy] = None
+_breaker: Optional[CircuitBreaker] = None
+_init_lock = threading.Lock()
+
+
+def get_retry_policy() -> RetryPolicy:
+    """Build the process-wide policy from settings.MODEL_RETRY_POLICY on first use."""
+    global _policy
+    if _policy is None:
+        with _init_lock:
+            if _policy is None:
+                from django.conf import settings
+
+                config = getattr(settings, "MODEL_RETRY_POLICY", {})
+                _policy = RetryPolicy(budgets=config.get("BUDGETS"), max_delays=config.get("MAX_DELAYS"))
+    return _policy
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Build the process-wide breaker from settings.MODEL_CIRCUIT_BREAKER on first use."""
+    global _breaker
+    if _breaker is None:
+        with _init_lock:
+            if _breaker is None:
+                from django.conf import settings
+
+                config = getattr(settings, "MODEL_CIRCUIT_BREAKER", {})
+                _breaker = CircuitBreaker(
+                    path=config.get("LOCATION", DEFAULT_BREAKER_PATH),
+                    window=config.get("WINDOW", 60),
+                    min_calls=config.get("MIN_CALLS", 10),
+                    failure_rate=config.get("FAILURE_RATE", 0.5),
+                    cool_down=config.get("COOL_DOWN", 30),
+                    probe_timeout=config.get("PROBE_TIMEOUT", DEFAULT_PROBE_TIMEOUT),
+                    enabled=config.get("ENABLED", True),
+                )
+    return _breaker
@@ -0,0 +1,247 @@
+import re
+import datetime
+import logging
+from typing import Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Document, DocumentContent, DocumentSearchField
+from .pdf_sharding import PROVENANCE_KEY
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX = getattr(settings, "SEARCH_INDEX", {})
+MAX_ROWS_PER_DOCUMENT = SEARCH_INDEX.get("MAX_ROWS_PER_DOCUMENT", 2000)  # caps the index cost of huge extractions
+MAX_CONDITIONS = SEARCH_INDEX.get("MAX_CONDITIONS", 10)  # filters plus words per search
+REBUILD_BATCH_SIZE = 500
+
+MAX_VALUE_LENGTH = 255
+MIN_TERM_LENGTH = 2
+TERM_PATH = "*"  # rows holding one full-text word of any string value
+
+WORD = re.compile(r"\w+")
+NUMBER = re.compile(r"^(?:[₹$€£]|rs\.?|inr|usd|eur|gbp)?\s*(-?\d[\d,]*(?:\.\d+)?)\s*$", re.IGNORECASE)
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d %b %Y", "%d %B %Y", "%b %d, %Y", "%B %d, %Y")
+CONDITION = re.compile(r"^\s*([^<>=]+?)\s*(>=|<=|=|>|<)\s*(.+?)\s*$")
+
+SearchRow = Tuple[str, str, Optional[float], Optional[datetime.date]]
+
+
+class SearchError(Exception):
+    """Raised for a search that cannot be run as given; the views answer 400."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+def normalize_text(value) -> str:
+    """Case-folded, whitespace-collapsed text, as stored in value_text."""
+    return " ".join(str(value).casefold().split())[:MAX_VALUE_LENGTH]
+
+
+def normalize_path(path: str) -> str:
+    return ".".join(normalize_text(step) for step in path.split("."))[:MAX_VALUE_LENGTH]
+
+
+def parse_number(value) -> Optional[float]:
+    """Numbers, and strings like "52,500.00" or "₹ 50000"; None for anything else."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = NUMBER.match(str(value).strip())
+    if match is None:
+        return None
+    try:
+        return float(match.group(1).replace(",", ""))
+    except ValueError:
+        return None
+
+
+def parse_date_value(value) -> Optional[datetime.date]:
+    """ISO dates (with or without a time) and the day-first formats of DATE_FORMATS."""
+    if not isinstance(value, str):
+        return None
+    text = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text[:10] if date_format == "%Y-%m-%d" else text, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def flatten(data, path: str = "") -> Iterator[Tuple[str, object]]:
+    """(path, scalar) leaves of a JSON value; list positions are dropped, so "line_items.amount" covers every item."""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if not path and key == PROVENANCE_KEY:
+                continue
+            yield from flatten(value, f"{path}.{key}" if path else str(key))
+    elif isinstance(data, list):
+        for value in data:
+            yield from flatten(value, path)
+    elif data is not None and data != "" and path:
+        yield path, data
+
+
+def search_rows(json_data) -> List[SearchRow]:
+    """The (path, value_text, value_number, value_date) rows indexing one document's json_data."""
+    rows = {}
+    terms = set()
+    for path, value in flatten(json_data):
+        text = normalize_text(value)
+        number, date = parse_number(value), parse_date_value(value)
+        rows.setdefault((normalize_path(path), text), (number, date))
+        if isinstance(value, str) and number is None and date is None:  # amounts and dates are filters, not words
+            terms.update(word for word in WORD.findall(text) if len(word) >= MIN_TERM_LENGTH)
+
+    indexed = [(path, text, number, date) for (path, text), (number, date) in rows.items()]
+    indexed += [(TERM_PATH, term, None, None) for term in sorted(terms)]
+    if len(indexed) > MAX_ROWS_PER_DOCUMENT:
+        logger.warning(f"Search index truncated to {MAX_ROWS_PER_DOCUMENT} of {len(indexed)} rows")
+        indexed = indexed[:MAX_ROWS_PER_DOCUMENT]
+    return indexed
+
+
+def index_document(document_id: int, user_id: int, json_data, search_model=DocumentSearchField):
+    """Replace the search rows of one document."""
+    with transaction.atomic():
+        search_model.objects.filter(document_id=document_id).delete()
+        search_model.objects.bulk_create([
+            search_model(
+                document_id=document_id, userid_id=user_id, path=path,
+                value_text=text, value_number=number, value_date=date,
+            )
+            for path, text, number, date in search_rows(json_data)
+        ])
+
+
+@receiver(post_save, sender=DocumentContent)
+def update_search_index_on_save(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and 'json_data' not in update_fields:
+        return  # e.g. a new HTML rendering
+    user_id = Document.objects.filter(pk=instance.document_id).values_list('userid_id', flat=True).first()
+    if user_id is not None:
+        index_document(instance.document_id, user_id, instance.json_data)
+
+
+@receiver(post_save, sender=Document)
+def update_search_owner_on_save(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw or created:
+        return
+    if update_fields is not None and 'userid' not in update_fields:
+        return
+    DocumentSearchField.objects.filter(document_id=instance.pk).exclude(userid_id=instance.userid_id).update(
+        userid_id=instance.userid_id
+    )
+
+
+def rebuild_search_index(content_model=DocumentContent, search_model=DocumentSearchField,
+                         user_id: Optional[int] = None, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    """
+    Re-index every document (of one user, or all) in primary key order, one
+    short transaction per batch. Used by the backfill migration and the
+    rebuild_search_index command to repair writes that bypass signals.
+
+    Returns:
+        int: Number of documents indexed
+    """
+    contents = content_model.objects.all()
+    if user_id is not None:
+        contents = contents.filter(document__userid_id=user_id)
+
+    indexed = 0
+    last_id = 0
+    while True:
+        batch = list(
+            contents.filter(document_id__gt=last_id).order_by('document_id')
+            .values_list('document_id', 'document__userid_id', 'json_data')[:batch_size]
+        )
+        if not batch:
+            return indexed
+        with transaction.atomic():
+            search_model.objects.filter(document_id__in=[row[0] for row in batch]).delete()
+            search_model.objects.bulk_create([
+                search_model(
+                    document_id=document_id, userid_id=owner_id, path=path,
+                    value_text=text, value_number=number, value_date=date,
+                )
+                for document_id, owner_id, json_data in batch
+                for path, text, number, date in search_rows(json_data)
+            ], batch_size=5000)
+        indexed += len(batch)
+        last_id = batch[-1][0]
+
+
+def parse_condition(expression: str) -> dict:
+    """
+    Turn "vendor.name=Acme Ltd", "total_amount>=50000" or
+    "invoice_date<2026-01-01" into DocumentSearchField lookups.
+
+    Equality compares the reading of the value: a date, else a number, else
+    normalized text. Ranges need a date or a number.
+
+    Raises:
+        SearchError: If the expression cannot be parsed
+    """
+    match = CONDITION.match(expression or "")
+    if match is None:
+        raise SearchError(
+            f"Invalid filter '{expression}'. Use path=value, path>value, path>=value, path<value or path<=value"
+        )
+    path, operator, raw = match.groups()
+    lookups = {'path': normalize_path(path)}
+
+    date = parse_date_value(raw)
+    number = parse_number(raw) if date is None else None
+    if operator == "=":
+        if date is not None:
+            lookups['value_date'] = date
+        elif number is not None:
+            lookups['value_number'] = number
+        else:
+            lookups['value_text'] = normalize_text(raw)
+        return lookups
+
+    if date is None and number is None:
+        raise SearchError(f"Filter '{expression}' compares with '{raw}', which is neither a number nor a date")
+    field = 'value_date' if date is not None else 'value_number'
+    suffix = {">": "gt", ">=": "gte", "<": "lt", "<=": "lte"}[operator]
+    lookups[f"{field}__{suffix}"] = date if date is not None else number
+    return lookups
+
+
+def search_documents(documents, filters: List[str] = (), query: str = "", user_id: Optional[int] = None):
+    """
+    Narrow a Document queryset to the documents matching every filter
+    (see parse_condition) and containing every word of query.
+
+    Each condition becomes one id IN (...) subquery over DocumentSearchField,
+    answered from the (userid, path, value) indexes when user_id is given.
+
+    Raises:
+        SearchError: If a filter is invalid, there is nothing to search for,
+            or there are more than MAX_CONDITIONS conditions
+    """
+    conditions = [parse_condition(expression) for expression in filters]
+    words = sorted({word for word in WORD.findall(normalize_text(query or "")) if len(word) >= MIN_TERM_LENGTH})
+    conditions += [{'path': TERM_PATH, 'value_text': word} for word in words]
+    if not conditions:
+        raise SearchError("Give at least one filter or a search query")
+    if len(conditions) > MAX_CONDITIONS:
+        raise SearchError(f"At most {MAX_CONDITIONS} filters and words per search")
+
+    fields = DocumentSearchField.objects.all()
+    if user_id is not None:
+        fields = fields.filter(userid_id=user_id)
+    for lookups in conditions:
+        documents = documents.filter(id__in=fields.filter(**lookups).values('document_id'))
+    return documents
@@ -2,15 +2,58 @@ from rest_framework import serializers
 from .models import Document
 
 
-from rest_framework import serializers
-from .models import Document
+# Light metadata returned by list endpoints unless ?fields= asks for more
+DOCUMENT_LIST_FIELDS = (
+    'id', 'filename', 'filepath', 'file', 'entry_date', 'document_type', 'input_token', 'output_token', 'userid',
+)
+# Serializer fields that are not model columns, with the columns they read
+DOCUMENT_COMPUTED_FIELDS = {'filename': ('file', 'original_name')}
+# Fields read from the DocumentContent side table, through select_related('content')
+DOCUMENT_CONTENT_FIELDS = ('json_data', 'html_content', 'html_digest')
+
 
 class DocumentSerializer(serializers.ModelSerializer):
     filename = serializers.SerializerMethodField()  # ✅ Custom field
+    # None when the document has no content row
+    json_data = serializers.JSONField(source='content.json_data', read_only=True)
+    html_content = serializers.CharField(source='content.html_content', read_only=True)
+    html_digest = serializers.CharField(source='content.html_digest', read_only=True)
 
     class Meta:
         model = Document
         fields = '__all__'  # or list all explicitly, including 'filename'
 
+    def __init__(self, *args, **kwargs):
+        # Optional projection: DocumentSerializer(docs, many=True, fields=['id', 'filename'])
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     def get_filename(self, obj):
+        if obj.original_name:
+            return obj.original_name  # blob paths are named after the content hash
         return obj.file.name.split('/')[-1] if obj.file else None
+
+
+def document_field_names():
+    return [field.name for field in Document._meta.concrete_fields] + list(DOCUMENT_COMPUTED_FIELDS) + list(DOCUMENT_CONTENT_FIELDS)
+
+
+def document_columns(fields):
+    """Model columns needed to serialize `fields`, for QuerySet.only() (plus the pagination keys)."""
+    columns = {'id', 'entry_date'}
+    for name in fields:
+        if name in DOCUMENT_CONTENT_FIELDS:
+            columns.add(f'content__{name}')
+        else:
+            columns.update(DOCUMENT_COMPUTED_FIELDS.get(name, (name,)))
+    return sorted(columns)
+
+
+def document_queryset(queryset, fields):
+    """Restrict a Document queryset to what serializing `fields` reads; the side table is joined only when needed."""
+    if set(fields) & set(DOCUMENT_CONTENT_FIELDS):
+        queryset = queryset.select_related('content')
+    return queryset.only(*document_columns(fields))
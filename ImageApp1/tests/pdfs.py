@@ -0,0 +1,39 @@
+import io
+from typing import List
+
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """A PDF with a Helvetica text layer, one list of lines per page; an empty list makes a page without text."""
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    for lines in pages:
+        page = writer.add_blank_page(width=612, height=792)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+        })
+        commands = ["BT", "/F1 10 Tf", "12 TL", "40 750 Td"]
+        commands += [f"({_escape(line)}) Tj T*" for line in lines]
+        commands.append("ET")
+        content = DecodedStreamObject()
+        content.set_data("\n".join(commands).encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(content)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def invoice_lines(number: int, count: int = 12) -> List[str]:
+    """Enough text for a page to count as born-digital."""
+    return [f"Invoice {number} line {line}: consulting services 2026, amount {line * 10}.00 EUR"
+            for line in range(count)]
@@ -0,0 +1,95 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, SimpleTestCase, TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ImageApp1.async_views import event_stream_response, sse_event
+from ImageApp1.id_codec import decode_id, encode_id
+from ImageApp1.models import Document, DocumentContent
+from ImageApp1.pipeline import PipelineError
+
+
+def parse_events(body: str):
+    """(event, data) pairs of a text/event-stream body."""
+    events = []
+    for block in body.split("\n\n"):
+        if block:
+            event, data = block.split("\n")
+            events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+async def read_stream(response) -> str:
+    return b"".join([chunk async for chunk in response.streaming_content]).decode("utf-8")
+
+
+class EventStreamTests(SimpleTestCase):
+
+    def test_sse_event_framing(self):
+        self.assertEqual(sse_event("stage", {"stage": "uploaded", "note": "Café\nline"}),
+                         'event: stage\ndata: {"stage":"uploaded","note":"Café\\nline"}\n\n')
+
+    def stream(self, *items, error=None):
+        async def events():
+            for item in items:
+                yield item
+            if error:
+                raise error
+
+        response = event_stream_response(events())
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual((response["Cache-Control"], response["X-Accel-Buffering"]), ("no-cache", "no"))
+        return parse_events(async_to_sync(read_stream)(response))
+
+    def test_document_ids_are_encrypted(self):
+        events = self.stream(("stage", {"stage": "persisted", "document_id": 41}), ("html", {"html": "<p>"}))
+
+        self.assertEqual(events[0][0], "stage")
+        self.assertEqual(decode_id(events[0][1]["document_id"]), 41)
+        self.assertEqual(events[1], ("html", {"html": "<p>"}))
+
+    def test_pipeline_error_becomes_an_error_event(self):
+        events = self.stream(("stage", {"stage": "extracting"}), error=PipelineError("Model quota exhausted", 429))
+
+        self.assertEqual(events, [
+            ("stage", {"stage": "extracting"}),
+            ("error", {"message": "Model quota exhausted", "status": 429}),
+        ])
+
+    def test_unexpected_error_becomes_a_500_event(self):
+        events = self.stream(error=KeyError("html"))
+
+        self.assertEqual(events[-1][0], "error")
+        self.assertEqual(events[-1][1]["status"], 500)
+
+
+class StreamRenderHtmlViewTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="stream", password="x")
+        self.document = Document.objects.create(userid=self.user, file="uploads/a.pdf")
+        DocumentContent.objects.create(document=self.document, json_data={"invoice_number": "INV-7"})
+        self.client = AsyncClient()
+
+    async def post(self, **data):
+        return await self.client.post(
+            "/IDA/async/render-html/stream/", data, content_type="application/json",
+            headers={"Authorization": f"Bearer {AccessToken.for_user(self.user)}"},
+        )
+
+    async def test_local_renderer_streams_the_report(self):
+        response = await self.post(encrypted_doc_id=encode_id(self.document.id), userid=self.user.id,
+                                   renderer="local", bypass_cache="true")
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        event, data = parse_events(await read_stream(response))[-1]
+        self.assertEqual(event, "html")
+        self.assertIn("<td>INV-7</td>", data["html"])
+
+    async def test_errors_before_the_stream_are_json(self):
+        response = await self.post(encrypted_doc_id=encode_id(self.document.id), userid=self.user.id, renderer="fancy")
+        self.assertEqual(response.status_code, 400)
+        response = await self.post(encrypted_doc_id="garbage", userid=self.user.id)
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,131 @@
+import os
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ImageApp1 import jobs
+from ImageApp1.blob_storage import collect_garbage, sidecar_path
+from ImageApp1.ingestion import ingest_upload
+from ImageApp1.models import Blob, Document, DocumentContent
+from ImageApp1.pipeline import linked_extraction
+
+PDF = b"%PDF-1.7\n1 0 obj << /Type /Page >> endobj\n%%EOF\n"
+
+
+class BlobStorageTests(TestCase):
+    """Uploads stored once per content, reference counted by Document, and collected once unused."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = get_user_model().objects.create_user(username="blobs", password="x")
+
+    def upload(self, name="invoice.pdf", content=PDF):
+        return ingest_upload(SimpleUploadedFile(name, content), "uploads")
+
+    def document(self, blob, **fields):
+        return Document.objects.create(userid=self.user, file=blob.path, filepath=blob.path, blob=blob, **fields)
+
+    def ref_count(self, blob):
+        return Blob.objects.get(pk=blob.pk).ref_count
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), self.media_root)
+            for directory, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.upload("invoice.pdf")
+        second = self.upload("copy of invoice.PDF")
+        other = self.upload("other.pdf", PDF + b"% other\n")
+
+        self.assertFalse(first.deduplicated)
+        self.assertTrue(second.deduplicated)
+        self.assertEqual(first.relative_path, second.relative_path)
+        self.assertEqual(first.sha256, second.sha256)
+        self.assertNotEqual(other.relative_path, first.relative_path)
+        self.assertEqual(second.original_name, "copy of invoice.PDF")
+        # No temp files left behind
+        self.assertEqual(self.stored_files(), sorted([first.relative_path, other.relative_path]))
+        self.assertEqual(Blob.objects.count(), 2)
+
+    def test_ref_count_follows_documents(self):
+        blob = Blob.objects.get(pk=self.upload().sha256)
+        other = Blob.objects.get(pk=self.upload("b.pdf", PDF + b"%b\n").sha256)
+        self.assertEqual(self.ref_count(blob), 0)
+
+        first, second = self.document(blob), self.document(blob)
+        self.assertEqual(self.ref_count(blob), 2)
+
+        second.blob = other
+        second.save()
+        self.assertEqual((self.ref_count(blob), self.ref_count(other)), (1, 1))
+
+        first.document_type = "invoice"
+        first.save(update_fields=["document_type"])
+        self.assertEqual(self.ref_count(blob), 1)
+
+        first.delete()
+        second.delete()
+        self.assertEqual((self.ref_count(blob), self.ref_count(other)), (0, 0))
+
+    def age(self, blob, seconds):
+        Blob.objects.filter(pk=blob.pk).update(last_used_at=timezone.now() - timedelta(seconds=seconds))
+
+    def test_gc_deletes_old_unreferenced_blobs(self):
+        ingested = self.upload()
+        blob = Blob.objects.get(pk=ingested.sha256)
+        sidecar = os.path.join(self.media_root, sidecar_path(blob.path))
+        with open(sidecar, "w") as f:
+            f.write("{}")
+        self.document(blob).delete()
+        self.age(blob, 120)
+
+        self.assertEqual(collect_garbage(grace_seconds=60, dry_run=True), (1, len(PDF)))
+        self.assertTrue(Blob.objects.filter(pk=blob.pk).exists())
+
+        self.assertEqual(collect_garbage(grace_seconds=60), (1, len(PDF)))
+        self.assertFalse(Blob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(os.path.exists(ingested.absolute_path))
+        self.assertFalse(os.path.exists(sidecar))
+
+    def test_gc_keeps_referenced_recent_and_queued_blobs(self):
+        referenced = Blob.objects.get(pk=self.upload("a.pdf", PDF + b"%a\n").sha256)
+        self.document(referenced)
+        recent = Blob.objects.get(pk=self.upload("b.pdf", PDF + b"%b\n").sha256)
+        queued = Blob.objects.get(pk=self.upload("c.pdf", PDF + b"%c\n").sha256)
+        jobs.enqueue_extraction_job(queued.path, self.user.id)
+        # A count that drifted (e.g. a bulk write) is repaired instead of deleting a file in use
+        drifted = Blob.objects.get(pk=self.upload("d.pdf", PDF + b"%d\n").sha256)
+        self.document(drifted)
+        Blob.objects.filter(pk=drifted.pk).update(ref_count=0)
+        for blob in (referenced, queued, drifted):
+            self.age(blob, 120)
+
+        self.assertEqual(collect_garbage(grace_seconds=60), (0, 0))
+        self.assertEqual(Blob.objects.count(), 4)
+        self.assertEqual(self.ref_count(drifted), 1)
+        for blob in (referenced, recent, queued, drifted):
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, blob.path)))
+
+    def test_linked_extraction_reuses_the_latest_identical_upload(self):
+        blob = Blob.objects.get(pk=self.upload().sha256)
+        older = self.document(blob, extraction_key="k" * 64)
+        DocumentContent.objects.create(document=older, json_data={"total": 1})
+        newer = self.document(blob, extraction_key="k" * 64)
+        DocumentContent.objects.create(document=newer, json_data={"total": 2})
+        failed = self.document(blob, extraction_key="k" * 64)
+        DocumentContent.objects.create(document=failed, json_data=None)
+
+        self.assertEqual(linked_extraction("k" * 64).document_id, newer.id)
+        self.assertIsNone(linked_extraction("j" * 64))
+        self.assertIsNone(linked_extraction(""))
@@ -0,0 +1,136 @@
+import csv
+import datetime
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ImageApp1.export import (
+    METADATA_COLUMNS, ExportError, export_documents, json_path, parse_column_mapping,
+)
+from ImageApp1.id_codec import decode_id
+from ImageApp1.models import Document, DocumentContent
+
+
+class ColumnMappingTests(SimpleTestCase):
+
+    def test_parse(self):
+        self.assertIsNone(parse_column_mapping(""))
+        self.assertEqual(parse_column_mapping("vendor=vendor.name, first=line_items.0.amount"),
+                         {"vendor": "vendor.name", "first": "line_items.0.amount"})
+        for spec in ("vendor", "=vendor.name", "a=x,a=y", "user_id=vendor.id"):
+            with self.subTest(spec=spec), self.assertRaises(ExportError):
+                parse_column_mapping(spec)
+
+    def test_json_path(self):
+        data = {"vendor": {"name": "Acme"}, "line_items": [{"amount": 1}, {"amount": 2}]}
+        self.assertEqual(json_path(data, "vendor.name"), "Acme")
+        self.assertEqual(json_path(data, "line_items.-1.amount"), 2)
+        self.assertIsNone(json_path(data, "line_items.5.amount"))
+        self.assertIsNone(json_path(data, "vendor.name.first"))
+
+
+class DocumentExportTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(id=2, username="admin", password="x")
+        self.user = User.objects.create_user(username="export", password="x")
+        self.other = User.objects.create_user(username="other", password="x")
+        self.invoice = self.document(self.user, datetime.date(2026, 3, 1), "invoice",
+                                     {"vendor": {"name": "Acme, Ltd"}, "line_items": [{"amount": 10}, {"amount": 5}]})
+        self.receipt = self.document(self.user, datetime.date(2026, 4, 1), "receipt", {"total": 12.5})
+        self.empty = self.document(self.user, datetime.date(2026, 5, 1), None, None)
+        self.hidden = self.document(self.other, datetime.date(2026, 3, 1), "invoice", {"vendor": {"name": "Other"}})
+
+    def document(self, user, entry_date, document_type, json_data):
+        document = Document.objects.create(userid=user, file="uploads/a.pdf", entry_date=entry_date,
+                                           document_type=document_type, input_token=100, output_token=20)
+        DocumentContent.objects.create(document=document, json_data=json_data)
+        return document
+
+    def export(self, user=None, **params):
+        return self.client.get("/IDA/documents/export/", params,
+                               headers={"Authorization": f"Bearer {AccessToken.for_user(user or self.user)}"})
+
+    def body(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_ndjson(self):
+        response = self.export()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="documents-start-end.ndjson"')
+
+        rows = [json.loads(line) for line in self.body(response).decode().splitlines()]
+        self.assertEqual([decode_id(row["document_id"]) for row in rows],
+                         [self.invoice.id, self.receipt.id, self.empty.id])
+        self.assertEqual(rows[0], {
+            "document_id": rows[0]["document_id"], "user_id": self.user.id, "document_type": "invoice",
+            "entry_date": "2026-03-01", "input_tokens": 100, "output_tokens": 20,
+            "data": {"vendor": {"name": "Acme, Ltd"}, "line_items": [{"amount": 10}, {"amount": 5}]},
+        })
+        self.assertIsNone(rows[2]["data"])
+
+    def test_csv_with_columns(self):
+        response = self.export(export_format="csv", columns="vendor=vendor.name,items=line_items,total=total")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+
+        rows = list(csv.reader(io.StringIO(self.body(response).decode())))
+        self.assertEqual(rows[0], list(METADATA_COLUMNS) + ["vendor", "items", "total"])
+        self.assertEqual(rows[1][1:], [str(self.user.id), "invoice", "2026-03-01", "100", "20", "Acme, Ltd",
+                                       '[{"amount":10},{"amount":5}]', ""])
+        self.assertEqual(rows[2][-3:], ["", "", "12.5"])
+        self.assertEqual(len(rows), 4)
+
+    def test_csv_without_columns_has_the_whole_document(self):
+        rows = list(csv.reader(io.StringIO(self.body(self.export(export_format="csv")).decode())))
+        self.assertEqual(rows[0][-1], "json_data")
+        self.assertEqual(json.loads(rows[2][-1]), {"total": 12.5})
+
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+
+        response = self.export(export_format="parquet", columns="vendor=vendor.name,total=total")
+        self.assertEqual(response["Content-Type"], "application/vnd.apache.parquet")
+
+        table = pq.read_table(io.BytesIO(self.body(response)))
+        self.assertEqual(table.column_names, list(METADATA_COLUMNS) + ["vendor", "total"])
+        self.assertEqual(table.column("entry_date").to_pylist(),
+                         [datetime.date(2026, 3, 1), datetime.date(2026, 4, 1), datetime.date(2026, 5, 1)])
+        self.assertEqual(table.column("vendor").to_pylist(), ["Acme, Ltd", None, None])
+        self.assertEqual(table.column("total").to_pylist(), [None, "12.5", None])
+
+    def test_parquet_row_groups(self):
+        import pyarrow.parquet as pq
+        from ImageApp1.export import export_rows, parquet_stream
+
+        chunks = export_rows(Document.objects.all(), chunk_size=1)
+        data = b"".join(parquet_stream(chunks, {}, row_group_rows=2))
+        parquet = pq.ParquetFile(io.BytesIO(data))
+        self.assertEqual((parquet.metadata.num_rows, parquet.num_row_groups), (4, 2))
+
+    def test_filters_and_scope(self):
+        rows = self.body(self.export(**{"from": "2026-03-15", "to": "2026-04-30"})).decode().splitlines()
+        self.assertEqual([decode_id(json.loads(row)["document_id"]) for row in rows], [self.receipt.id])
+
+        rows = self.body(self.export(self.admin, document_type="invoice")).decode().splitlines()
+        self.assertEqual({decode_id(json.loads(row)["document_id"]) for row in rows}, {self.invoice.id, self.hidden.id})
+
+        rows = self.body(self.export(self.admin, user_id=str(self.other.id))).decode().splitlines()
+        self.assertEqual([decode_id(json.loads(row)["document_id"]) for row in rows], [self.hidden.id])
+
+    def test_invalid_parameters(self):
+        for params in ({"from": "2026-02-30"}, {"to": "01/03/2026"}, {"export_format": "xlsx"},
+                       {"columns": "vendor"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.export(**params).status_code, 400)
+        self.assertEqual(self.export(self.admin, user_id="abc").status_code, 400)
+
+    def test_stats_count_rows(self):
+        stats = {}
+        b"".join(export_documents(Document.objects.filter(userid=self.user), "csv", columns={}, chunk_size=2,
+                                  stats=stats))
+        self.assertEqual(stats, {"rows": 3})
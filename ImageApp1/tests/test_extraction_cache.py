@@ -0,0 +1,58 @@
+import os
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ImageApp1 import model_backends, pipeline
+from ImageApp1.extraction_cache import build_cache_key, digest_input
+
+
+class CacheKeyTests(SimpleTestCase):
+    """A cached response is only served for the same input, prompt, model, generation config and backend."""
+
+    base = {
+        "input_digest": digest_input("INVOICE 2026-001 total 120.00"),
+        "prompt_text": "Extract the invoice fields.",
+        "model_id": "gemini-2.0-flash",
+        "generation_params": {"temperature": 0.0, "max_output_tokens": 8192},
+        "backend": "vertex",
+    }
+
+    def key(self, **changes):
+        return build_cache_key(**{**self.base, **changes})
+
+    def test_key_is_stable(self):
+        self.assertEqual(self.key(), self.key())
+        # Generation params are compared by value, not by insertion order
+        reordered = {"max_output_tokens": 8192, "temperature": 0.0}
+        self.assertEqual(self.key(generation_params=reordered), self.key())
+
+    def test_every_component_changes_the_key(self):
+        changes = {
+            "input_digest": digest_input("RECEIPT 2026-002 total 12.50"),
+            "prompt_text": "Extract the receipt fields.",
+            "model_id": "gemini-2.5-pro",
+            "generation_params": {"temperature": 0.2, "max_output_tokens": 8192},
+            "backend": "fake",
+        }
+        keys = {name: self.key(**{name: value}) for name, value in changes.items()}
+        self.assertNotIn(self.key(), keys.values())
+        self.assertEqual(len(set(keys.values())), len(changes))
+
+    def test_backend_source_follows_the_environment(self):
+        with mock.patch.object(model_backends, "_backend", None):
+            with mock.patch.dict(os.environ, {"MODEL_BACKEND": "fake"}):
+                self.assertEqual(model_backends.model_backend_source(), "fake")
+            # Recording passes the calls through to the real provider, whose responses may be shared
+            with mock.patch.dict(os.environ, {"MODEL_BACKEND": "record", "MODEL_RECORD_BACKEND": "vertex"}):
+                self.assertEqual(model_backends.model_backend_source(), "vertex")
+
+    def test_extraction_key_is_scoped_by_backend(self):
+        digest = self.base["input_digest"]
+        with mock.patch.object(pipeline, "model_backend_source", return_value="vertex"):
+            vertex = pipeline.extraction_key(digest, "prompt")
+            self.assertEqual(pipeline.extraction_key(digest, "prompt"), vertex)
+        with mock.patch.object(pipeline, "model_backend_source", return_value="replay"):
+            replay = pipeline.extraction_key(digest, "prompt")
+        self.assertNotEqual(vertex, replay)
+        self.assertEqual(pipeline.extraction_key("", "prompt"), "")
@@ -0,0 +1,56 @@
+from django.test import SimpleTestCase
+
+from ImageApp1.html_renderer import guess_title, humanize_key, render_json_to_html
+
+INVOICE = {
+    "invoice_number": "INV-7",
+    "paid": True,
+    "notes": None,
+    "vendor": {"name": "Acme", "gstin": ""},
+    "line_items": [{"description": "Hosting", "amount": 100}, {"description": "Support", "qty": 2}],
+    "tags": ["cloud", "annual"],
+    "_page_provenance": {"fields": {"invoice_number": "1-5"}},
+}
+
+
+class RenderJsonToHtmlTests(SimpleTestCase):
+
+    def test_report_layout(self):
+        html = render_json_to_html(INVOICE)
+
+        self.assertTrue(html.startswith("<!DOCTYPE html><html><head><meta charset=\"UTF-8\"><title>Invoice Report</title>"))
+        self.assertIn("<h1>Invoice Report</h1>", html)
+        self.assertIn('<table class="kv"><tbody><tr><th>Invoice Number</th><td>INV-7</td></tr>'
+                      '<tr><th>Paid</th><td>Yes</td></tr>'
+                      '<tr><th>Notes</th><td class="empty"><span class="empty">&mdash;</span></td></tr>', html)
+        self.assertIn("<section><h2>Vendor</h2>", html)
+        # Lists of objects become one table over the union of their keys
+        self.assertIn("<thead><tr><th>Description</th><th>Amount</th><th>Qty</th></tr></thead>", html)
+        self.assertIn('<td>Hosting</td><td class="num">100</td><td class="empty"><span class="empty">&mdash;</span></td>',
+                      html)
+        self.assertIn("<ul><li>cloud</li><li>annual</li></ul>", html)
+        self.assertNotIn("Provenance", html)
+        self.assertNotIn("<script", html)
+
+    def test_output_is_deterministic(self):
+        self.assertEqual(render_json_to_html(INVOICE), render_json_to_html(dict(INVOICE)))
+
+    def test_values_and_keys_are_escaped(self):
+        html = render_json_to_html({
+            "<b>key</b>": "<script>alert('x')</script>",
+            "items": [{"name": "A & B"}],
+            "nested": {"list": ["<i>"]},
+        }, title="</title><script>")
+
+        self.assertNotIn("<script>", html)
+        self.assertIn("<title>&lt;/title&gt;&lt;script&gt;</title>", html)
+        self.assertIn("&lt;script&gt;alert(&#x27;x&#x27;)&lt;/script&gt;", html)
+        self.assertIn("<th>&lt;b&gt;key&lt;/b&gt;</th>", html)
+        self.assertIn("<td>A &amp; B</td>", html)
+        self.assertIn("<li>&lt;i&gt;</li>", html)
+
+    def test_titles_and_keys(self):
+        self.assertEqual(guess_title({"expense_total": 1}), "Reimbursement Report")
+        self.assertEqual(guess_title([1, 2]), "Document Analysis")
+        self.assertEqual(humanize_key("invoiceNumber"), "Invoice Number")
+        self.assertEqual(humanize_key("vendor_GSTIN"), "Vendor GSTIN")
@@ -0,0 +1,67 @@
+import struct
+from unittest import mock
+
+from cryptography.fernet import InvalidToken
+from django.test import SimpleTestCase
+
+from ImageApp1 import id_codec
+from ImageApp1.id_codec import (
+    COMPACT_TOKEN_LENGTH, _b64, _block_cipher, _key, decode_compact_id, decode_id, encode_fernet_id, encode_id,
+    encode_ids,
+)
+
+
+def encrypt_block(plain: bytes) -> str:
+    encryptor = _block_cipher(_key()).encryptor()
+    return _b64(encryptor.update(plain) + encryptor.finalize())
+
+
+class IdCodecTests(SimpleTestCase):
+    """Which document id tokens are accepted, and what they decode to."""
+
+    ids = [1, 2, 42, 10 ** 6, 2 ** 63 - 1]
+
+    def test_round_trip(self):
+        for id in self.ids:
+            token = encode_id(id)
+            self.assertEqual(len(token), COMPACT_TOKEN_LENGTH)
+            self.assertEqual(decode_id(token), id)
+
+    def test_tokens_are_deterministic_and_distinct(self):
+        tokens = encode_ids(self.ids)
+        self.assertEqual(tokens, [encode_id(id) for id in self.ids])
+        self.assertEqual(len(set(tokens)), len(self.ids))
+
+    def test_altered_token_is_rejected(self):
+        token = encode_id(42)
+        for position in range(COMPACT_TOKEN_LENGTH - 1):  # the last character only carries 2 bits
+            replacement = "A" if token[position] != "A" else "B"
+            tampered = token[:position] + replacement + token[position + 1:]
+            with self.subTest(position=position), self.assertRaises(InvalidToken):
+                decode_id(tampered)
+
+    def test_non_zero_check_bytes_are_rejected(self):
+        self.assertEqual(decode_id(encrypt_block(struct.pack(">Q", 42) + b"\x00" * 8)), 42)
+        with self.assertRaises(InvalidToken):
+            decode_id(encrypt_block(struct.pack(">Q", 42) + b"\x00" * 7 + b"\x01"))
+
+    def test_legacy_fernet_tokens_are_decoded(self):
+        token = encode_fernet_id(42)
+        self.assertNotEqual(len(token), COMPACT_TOKEN_LENGTH)
+        self.assertEqual(decode_id(token), 42)
+        with self.assertRaises(InvalidToken):
+            decode_id(token[:-4] + ("AAAA" if not token.endswith("AAAA") else "BBBB"))
+
+    def test_fernet_mode(self):
+        with mock.patch.object(id_codec, "ID_CODEC_MODE", "fernet"):
+            token = encode_id(42)
+            self.assertEqual(decode_id(encode_ids([7])[0]), 7)
+        self.assertNotEqual(len(token), COMPACT_TOKEN_LENGTH)
+        self.assertEqual(decode_id(token), 42)
+
+    def test_malformed_input_is_rejected(self):
+        for token in ("", "abc", "A" * 21, "A" * 23, "*" * COMPACT_TOKEN_LENGTH, "not a token at all", None, 42):
+            with self.subTest(token=token), self.assertRaises(InvalidToken):
+                decode_id(token)
+        with self.assertRaises(InvalidToken):
+            decode_compact_id(_b64(b"\x00" * 15))
@@ -0,0 +1,60 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+from PIL import Image
+
+from ImageApp1 import image_preprocessing, pipeline
+from ImageApp1.image_preprocessing import estimate_image_tokens, preprocess_image, preprocessing_signature
+
+
+class ImagePreprocessingTests(SimpleTestCase):
+
+    def image_file(self, size, suffix=".png"):
+        buffer = io.BytesIO()
+        image = Image.new("RGB", size, "white")
+        for x in range(0, size[0], 16):
+            image.paste((20, 40, 200), (x, 0, x + 4, size[1]))
+        image.save(buffer, format="PNG" if suffix == ".png" else "JPEG")
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+            f.write(buffer.getvalue())
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_large_image_is_downscaled_to_grayscale_jpeg(self):
+        with mock.patch.object(image_preprocessing, "MAX_LONG_EDGE", 1000):
+            part, stats = preprocess_image(self.image_file((3000, 1500)))
+
+        self.assertEqual(part.mime_type, "image/jpeg")
+        self.assertEqual((stats.original_size, stats.processed_size), ((3000, 1500), (1000, 500)))
+        self.assertEqual(stats.steps[:3], ["downscale", "grayscale", "autocontrast"])
+        self.assertLess(stats.processed_tokens, stats.original_tokens)
+        self.assertEqual(Image.open(io.BytesIO(part.data)).mode, "L")
+
+    def test_not_an_image(self):
+        self.assertIsNone(preprocess_image("uploads/invoice.pdf"))
+        with mock.patch.object(image_preprocessing, "PREPROCESSING_ENABLED", False):
+            self.assertIsNone(preprocess_image(self.image_file((100, 100))))
+
+    def test_token_estimate(self):
+        self.assertEqual(estimate_image_tokens(384, 200), 258)
+        self.assertEqual(estimate_image_tokens(1536, 800), 2 * 2 * 258)
+
+    def test_settings_change_the_cache_keys(self):
+        path = self.image_file((3000, 1500))
+        signature = preprocessing_signature()
+        _, digest = pipeline.prepare_model_input(path, input_digest="abc")
+        extraction_key = pipeline.extraction_key("abc", "prompt")
+        self.assertEqual(digest, f"abc:{signature}")
+
+        for setting, value in (("MAX_LONG_EDGE", 1024), ("GRAYSCALE", False), ("AUTOCONTRAST", False),
+                               ("TARGET_BYTES", 1), ("JPEG_QUALITY", 95), ("MIN_JPEG_QUALITY", 30),
+                               ("PREPROCESSING_VERSION", "img-test")):
+            with self.subTest(setting=setting), mock.patch.object(image_preprocessing, setting, value):
+                self.assertNotEqual(preprocessing_signature(), signature)
+                self.assertNotEqual(pipeline.prepare_model_input(path, input_digest="abc")[1], digest)
+                self.assertNotEqual(pipeline.extraction_key("abc", "prompt"), extraction_key)
+
+        self.assertEqual(preprocessing_signature(), signature)
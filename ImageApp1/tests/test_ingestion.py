@@ -0,0 +1,112 @@
+import hashlib
+import io
+import os
+import tempfile
+import zipfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from ImageApp1 import blob_storage, ingestion
+from ImageApp1.ingestion import UploadRejected, ingest_upload, iter_archive_members
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def pdf(pages):
+    return b"%PDF-1.7\n" + b"".join(b"%d 0 obj << /Type /Page >> endobj\n" % n for n in range(pages)) \
+        + b"99 0 obj << /Type /Pages /Count 1 >> endobj\n%%EOF\n"
+
+
+class IngestUploadTests(SimpleTestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        patcher = mock.patch.object(blob_storage, "ENABLED", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), self.media_root)
+            for directory, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def assertRejected(self, name, content, status_code=400, **limits):
+        with self.assertRaises(UploadRejected) as caught:
+            ingest_upload(SimpleUploadedFile(name, content), "uploads", **limits)
+        self.assertEqual(caught.exception.status_code, status_code)
+        # Nothing, not even the partial temp file, is left behind
+        self.assertEqual(self.stored_files(), [])
+        return caught.exception
+
+    def test_accepted_upload(self):
+        content = pdf(3)
+        ingested = ingest_upload(SimpleUploadedFile("Invoice.PDF", content), "uploads")
+
+        self.assertEqual(ingested.relative_path, "uploads/Invoice.PDF")
+        self.assertEqual(ingested.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual((ingested.size, ingested.page_count, ingested.mime_type), (len(content), 3, "application/pdf"))
+        with open(ingested.absolute_path, "rb") as f:
+            self.assertEqual(f.read(), content)
+
+        again = ingest_upload(SimpleUploadedFile("Invoice.PDF", content), "uploads")
+        self.assertNotEqual(again.relative_path, ingested.relative_path)  # never overwrites
+        self.assertIsNone(ingest_upload(SimpleUploadedFile("scan.png", PNG), "uploads").page_count)
+
+    def test_type_is_checked(self):
+        self.assertEqual(self.assertRejected("notes.txt", b"hello").message, "Unsupported file type")
+        self.assertEqual(self.assertRejected("scan.png", pdf(1)).message, "File content does not match its extension")
+        self.assertEqual(self.assertRejected("scan.jpg", PNG).message, "File content does not match its extension")
+        self.assertEqual(self.assertRejected("empty.pdf", b"").message, "Uploaded file is empty")
+
+    def test_size_limit(self):
+        self.assertRejected("scan.png", PNG, status_code=413, max_bytes=len(PNG) - 1)
+        # The declared size may lie, the streamed bytes are counted too
+        upload = SimpleUploadedFile("scan.png", PNG)
+        upload.size = 1
+        with self.assertRaises(UploadRejected) as caught:
+            ingest_upload(upload, "uploads", max_bytes=len(PNG) - 1)
+        self.assertEqual(caught.exception.status_code, 413)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_pdf_page_limit(self):
+        self.assertRejected("six.pdf", pdf(6), status_code=413, max_pdf_pages=5)
+        self.assertEqual(ingest_upload(SimpleUploadedFile("five.pdf", pdf(5)), "uploads", max_pdf_pages=5).page_count, 5)
+
+    def test_page_markers_split_across_chunks_count_once(self):
+        content = pdf(20)
+        for chunk_size in (7, 13, 64):
+            with self.subTest(chunk_size=chunk_size), mock.patch.object(ingestion, "UPLOAD_CHUNK_SIZE", chunk_size):
+                ingested = ingest_upload(SimpleUploadedFile("a.pdf", content), "uploads")
+                self.assertEqual(ingested.page_count, 20)
+
+
+class ArchiveTests(SimpleTestCase):
+
+    def archive(self, names):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for name in names:
+                archive.writestr(name, PNG)
+        buffer.seek(0)
+        return buffer
+
+    def test_members(self):
+        members = list(iter_archive_members(self.archive(["a.png", "nested/../b.png", "__MACOSX/._a.png", ".hidden.png"])))
+
+        self.assertEqual([member.name for member in members], ["a.png", "b.png"])
+        self.assertEqual(b"".join(members[0].chunks(8)), PNG)
+
+    def test_rejected_archives(self):
+        with self.assertRaises(UploadRejected):
+            list(iter_archive_members(io.BytesIO(b"not a zip")))
+        with self.assertRaises(UploadRejected) as caught:
+            list(iter_archive_members(self.archive(["a.png", "b.png", "c.png"]), max_files=2))
+        self.assertEqual(caught.exception.status_code, 413)
@@ -0,0 +1,153 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from ImageApp1 import jobs
+from ImageApp1.models import ExtractionJob
+from ImageApp1.pipeline import PipelineError
+
+
+class JobQueueTests(TestCase):
+    """Claiming, running and recovering jobs of the database-backed queue."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="queue", password="x")
+
+    def enqueue(self, name):
+        return jobs.enqueue_extraction_job(f"uploads/{name}.pdf", self.user.id)
+
+    def test_claims_oldest_queued_job_once(self):
+        first, second = self.enqueue("first"), self.enqueue("second")
+
+        claimed = jobs.claim_next_job("w1")
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(claimed.status, ExtractionJob.STATUS_RUNNING)
+        self.assertEqual(claimed.worker_id, "w1")
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNotNone(claimed.started_at)
+
+        self.assertEqual(jobs.claim_next_job("w2").pk, second.pk)
+        self.assertIsNone(jobs.claim_next_job("w3"))
+
+    def test_finished_jobs_are_not_claimed(self):
+        job = self.enqueue("done")
+        ExtractionJob.objects.filter(pk=job.pk).update(status=ExtractionJob.STATUS_SUCCEEDED)
+        self.assertIsNone(jobs.claim_next_job("w1"))
+
+    def test_failed_pipeline_fails_the_job(self):
+        self.enqueue("broken")
+        job = jobs.claim_next_job("w1")
+        with mock.patch.object(jobs, "run_extraction_pipeline",
+                               side_effect=PipelineError("Unsupported file type.", status_code=400)):
+            jobs.run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExtractionJob.STATUS_FAILED)
+        self.assertEqual(job.error, "Unsupported file type.")
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(jobs.claim_next_job("w2"))
+
+    def test_stale_jobs_are_requeued(self):
+        self.enqueue("stale")
+        stale = jobs.claim_next_job("dead")
+        ExtractionJob.objects.filter(pk=stale.pk).update(
+            started_at=timezone.now() - timedelta(seconds=jobs.JOB_STALE_AFTER + 1)
+        )
+        self.enqueue("busy")
+        busy = jobs.claim_next_job("alive")
+
+        self.assertEqual(jobs.requeue_stale_jobs(), 1)
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, ExtractionJob.STATUS_QUEUED)
+        self.assertEqual(stale.worker_id, "")
+        busy.refresh_from_db()
+        self.assertEqual(busy.status, ExtractionJob.STATUS_RUNNING)
+
+        reclaimed = jobs.claim_next_job("w2")
+        self.assertEqual(reclaimed.pk, stale.pk)
+        self.assertEqual(reclaimed.attempts, 2)
+
+    def test_stale_job_out_of_attempts_fails(self):
+        self.enqueue("poison")
+        job = jobs.claim_next_job("dead")
+        ExtractionJob.objects.filter(pk=job.pk).update(
+            attempts=jobs.JOB_MAX_ATTEMPTS,
+            started_at=timezone.now() - timedelta(seconds=jobs.JOB_STALE_AFTER + 1),
+        )
+
+        self.assertEqual(jobs.requeue_stale_jobs(), 0)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExtractionJob.STATUS_FAILED)
+        self.assertIsNotNone(job.error)
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(jobs.claim_next_job("w2"))
+
+
+class ShedJobTests(TestCase):
+    """Jobs shed by the rate limiter or circuit breaker wait out a backoff instead of failing."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="jobs", password="x")
+        self.job = jobs.enqueue_extraction_job("uploads/a.pdf", self.user.id, doc_type="invoice")
+        self.shed = PipelineError("Model backend is unavailable, please retry shortly.", status_code=503,
+                                  retry_after=30)
+
+    def test_shed_job_is_deferred_without_using_an_attempt(self):
+        job = jobs.claim_next_job("w1")
+        started = timezone.now()
+        with mock.patch.object(jobs, "run_extraction_pipeline", side_effect=self.shed):
+            jobs.run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExtractionJob.STATUS_QUEUED)
+        self.assertEqual(job.attempts, 0)
+        self.assertEqual(job.deferrals, 1)
+        self.assertGreaterEqual(job.available_at, started + timedelta(seconds=30))
+        self.assertIsNone(jobs.claim_next_job("w2"))
+
+    def test_open_breaker_does_not_fail_the_job(self):
+        # A burst worker would re-claim an immediately requeued job until it ran out of attempts.
+        # The loop runs in this thread: the test database lives in its transaction.
+        with mock.patch.object(jobs, "run_extraction_pipeline", side_effect=self.shed) as pipeline, \
+                mock.patch.object(jobs, "close_old_connections"):
+            jobs._worker_loop("w1", threading.Event(), poll_interval=0.01, burst=True)
+
+        self.job.refresh_from_db()
+        self.assertEqual(pipeline.call_count, 1)
+        self.assertEqual(self.job.status, ExtractionJob.STATUS_QUEUED)
+        self.assertEqual(self.job.attempts, 0)
+
+    def test_deferred_job_is_claimed_once_available(self):
+        ExtractionJob.objects.filter(pk=self.job.pk).update(
+            deferrals=1, available_at=timezone.now() - timedelta(seconds=1)
+        )
+        later = jobs.enqueue_extraction_job("uploads/b.pdf", self.user.id)
+
+        claimed = jobs.claim_next_job("w1")
+        self.assertEqual(claimed.pk, self.job.pk)  # keeps its place in the queue
+        self.assertEqual(claimed.attempts, 1)
+        self.assertEqual(jobs.claim_next_job("w1").pk, later.pk)
+
+    def test_backoff_grows_and_is_capped(self):
+        with mock.patch.object(jobs.random, "uniform", return_value=0):
+            delays = [jobs.defer_delay(deferrals) for deferrals in range(12)]
+            self.assertEqual(jobs.defer_delay(0, retry_after=42), 42)
+        self.assertEqual(delays[0], jobs.JOB_DEFER_INITIAL_DELAY)
+        self.assertEqual(delays, sorted(delays))
+        self.assertEqual(delays[-1], jobs.JOB_DEFER_MAX_DELAY)
+
+    def test_job_fails_after_max_deferrals(self):
+        ExtractionJob.objects.filter(pk=self.job.pk).update(deferrals=jobs.JOB_MAX_DEFERRALS)
+        job = jobs.claim_next_job("w1")
+        with mock.patch.object(jobs, "run_extraction_pipeline", side_effect=self.shed):
+            jobs.run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExtractionJob.STATUS_FAILED)
+        self.assertEqual(job.error, self.shed.message)
@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ImageApp1 import metrics
+from ImageApp1.metrics import ARCHIVE_FILE, MetricsRegistry, PROMETHEUS_CONTENT_TYPE
+
+
+class PrometheusExpositionTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.registry = MetricsRegistry(directory=self.directory, flush_interval=3600)
+        self.calls = self.registry.counter("calls_total", "Calls by outcome.", ("api", "outcome"))
+        self.tokens = self.registry.counter("tokens_total", "Tokens billed.")
+        self.seconds = self.registry.histogram("stage_seconds", "Stage duration.", ("stage",), buckets=(0.1, 1))
+
+    def test_text_format(self):
+        self.calls.inc(api="extract", outcome="success")
+        self.calls.inc(2, api="extract", outcome="success")
+        self.calls.inc(api="html", outcome="failed")
+        self.seconds.observe(0.05, stage="parse")
+        self.seconds.observe(0.5, stage="parse")
+        self.seconds.observe(7.25, stage="parse")
+
+        self.assertEqual(self.registry.render(), "\n".join([
+            "# HELP calls_total Calls by outcome.",
+            "# TYPE calls_total counter",
+            'calls_total{api="extract",outcome="success"} 3',
+            'calls_total{api="html",outcome="failed"} 1',
+            "# HELP stage_seconds Stage duration.",
+            "# TYPE stage_seconds histogram",
+            'stage_seconds_bucket{stage="parse",le="0.1"} 1',
+            'stage_seconds_bucket{stage="parse",le="1.0"} 2',
+            'stage_seconds_bucket{stage="parse",le="+Inf"} 3',
+            'stage_seconds_sum{stage="parse"} 7.8',
+            'stage_seconds_count{stage="parse"} 3',
+            "# HELP tokens_total Tokens billed.",
+            "# TYPE tokens_total counter",
+            "tokens_total 0",
+        ]) + "\n")
+
+    def test_label_values_are_escaped(self):
+        self.calls.inc(api='a"b\\c\nd', outcome="success")
+        self.assertIn('calls_total{api="a\\"b\\\\c\\nd",outcome="success"} 1', self.registry.render())
+
+    def test_exited_processes_are_archived(self):
+        self.tokens.inc(5)
+        exited = os.path.join(self.directory, "metrics-999999999-deadbeef.json")
+        with open(exited, "w") as f:
+            json.dump({"tokens_total": [[[], [10.0]]], "dropped_total": [[[], [1.0]]]}, f)
+
+        self.assertIn("tokens_total 15", self.registry.render())
+        self.assertFalse(os.path.exists(exited))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, ARCHIVE_FILE)))
+        # Counted once, from the archive, on the next scrape
+        self.assertIn("tokens_total 15", self.registry.render())
+
+    def test_duplicate_names_are_refused(self):
+        with self.assertRaises(ValueError):
+            self.registry.counter("calls_total", "Again.")
+
+    def test_timed_stage_outcomes(self):
+        histogram = metrics.PIPELINE_STAGE_SECONDS
+        with mock.patch.object(histogram, "observe") as observe:
+            with metrics.document_type_context("invoice"), metrics.timed_stage("json_parse"):
+                pass
+            with self.assertRaises(KeyError), metrics.timed_stage("db_insert", document_type="receipt"):
+                raise KeyError("x")
+            with metrics.timed_stage("file_save") as stage:
+                stage.outcome = "rejected"
+
+        self.assertEqual([call.kwargs for call in observe.call_args_list], [
+            {"stage": "json_parse", "document_type": "invoice", "outcome": "success"},
+            {"stage": "db_insert", "document_type": "receipt", "outcome": "error"},
+            {"stage": "file_save", "document_type": "none", "outcome": "rejected"},
+        ])
+
+
+class MetricsViewTests(SimpleTestCase):
+
+    def test_token(self):
+        with mock.patch.dict("ImageApp1.views.METRICS", {"TOKEN": "s3cret"}):
+            self.assertEqual(self.client.get("/metrics").status_code, 401)
+            self.assertEqual(self.client.get("/metrics", headers={"Authorization": "Bearer nope"}).status_code, 401)
+            response = self.client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], PROMETHEUS_CONTENT_TYPE)
+        self.assertIn("# TYPE pipeline_stage_seconds histogram", response.content.decode())
@@ -0,0 +1,177 @@
+from importlib import import_module
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Migrates ImageApp1 back to migrate_from, lets the test seed rows, then runs up to migrate_to."""
+
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.latest = executor.loader.graph.leaf_nodes()
+        executor.migrate([("ImageApp1", self.migrate_from)])
+        self.old_apps = executor.loader.project_state([("ImageApp1", self.migrate_from)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.latest)
+
+    def migrate(self, target=None):
+        target = target or self.migrate_to
+        executor = MigrationExecutor(connection)
+        executor.migrate([("ImageApp1", target)])
+        return executor.loader.project_state([("ImageApp1", target)]).apps
+
+    def small_batches(self, migration, size=2):
+        # Several batches from a handful of rows
+        return mock.patch.object(import_module(f"ImageApp1.migrations.{migration}"), "BATCH_SIZE", size)
+
+    def create_user(self, username="migrations"):
+        # Only ImageApp1 is migrated back, the user model is current
+        return get_user_model().objects.create_user(username=username, password="x")
+
+
+class BackfillDocumentContentTests(MigrationTestCase):
+    """0020 copies the payloads of every Document into DocumentContent."""
+
+    migrate_from = "0019_document_content"
+    migrate_to = "0020_backfill_document_content"
+
+    def test_copies_every_document(self):
+        Document = self.old_apps.get_model("ImageApp1", "Document")
+        user = self.create_user()
+        documents = [
+            Document.objects.create(
+                userid_id=user.id, file=f"uploads/{n}.pdf",
+                json_data={"invoice": n}, html_content=f"<p>{n}</p>", html_digest=f"{n:064d}",
+            )
+            for n in range(5)
+        ]
+        empty = Document.objects.create(userid_id=user.id, file="uploads/empty.pdf")
+
+        with self.small_batches("0020_backfill_document_content"):
+            apps = self.migrate()
+
+        contents = {
+            content.document_id: content
+            for content in apps.get_model("ImageApp1", "DocumentContent").objects.all()
+        }
+        self.assertEqual(len(contents), 6)
+        for n, document in enumerate(documents):
+            content = contents[document.id]
+            self.assertEqual(content.json_data, {"invoice": n})
+            self.assertEqual(content.html_content, f"<p>{n}</p>")
+            self.assertEqual(content.html_digest, f"{n:064d}")
+        self.assertIsNone(contents[empty.id].json_data)
+        self.assertIsNone(contents[empty.id].html_content)
+
+    def test_keeps_content_written_by_new_servers(self):
+        Document = self.old_apps.get_model("ImageApp1", "Document")
+        DocumentContent = self.old_apps.get_model("ImageApp1", "DocumentContent")
+        document = Document.objects.create(
+            userid_id=self.create_user().id, file="uploads/a.pdf", json_data={"v": "old"}
+        )
+        DocumentContent.objects.create(document_id=document.id, json_data={"v": "new"})
+
+        apps = self.migrate()
+
+        content = apps.get_model("ImageApp1", "DocumentContent").objects.get(document_id=document.id)
+        self.assertEqual(content.json_data, {"v": "new"})
+
+    def test_reverse_copies_content_back(self):
+        apps = self.migrate()
+        Document = apps.get_model("ImageApp1", "Document")
+        document = Document.objects.create(userid_id=self.create_user().id, file="uploads/a.pdf")
+        apps.get_model("ImageApp1", "DocumentContent").objects.create(
+            document_id=document.id, json_data={"v": 1}, html_content="<p>1</p>", html_digest="d" * 64
+        )
+
+        with self.small_batches("0020_backfill_document_content", size=1):
+            apps = self.migrate(self.migrate_from)
+
+        document = apps.get_model("ImageApp1", "Document").objects.get(id=document.id)
+        self.assertEqual((document.json_data, document.html_content, document.html_digest),
+                         ({"v": 1}, "<p>1</p>", "d" * 64))
+
+
+class CompressDocumentContentTests(MigrationTestCase):
+    """0023 fills the compressed columns from the plain ones."""
+
+    migrate_from = "0022_documentcontent_compressed_fields"
+    migrate_to = "0023_compress_document_content"
+
+    def test_compresses_every_row(self):
+        Document = self.old_apps.get_model("ImageApp1", "Document")
+        DocumentContent = self.old_apps.get_model("ImageApp1", "DocumentContent")
+        user = self.create_user()
+        payloads = {}
+        for n in range(5):
+            document = Document.objects.create(userid_id=user.id, file=f"uploads/{n}.pdf")
+            json_data = {"items": [{"line": i, "description": "Consulting services"} for i in range(20 + n)]}
+            html = "<table>" + "<tr><td>Consulting services</td></tr>" * (20 + n) + "</table>"
+            DocumentContent.objects.create(document_id=document.id, json_data=json_data, html_content=html)
+            payloads[document.id] = (json_data, html)
+        empty = Document.objects.create(userid_id=user.id, file="uploads/empty.pdf")
+        DocumentContent.objects.create(document_id=empty.id)
+        payloads[empty.id] = (None, None)
+
+        with self.small_batches("0023_compress_document_content"):
+            apps = self.migrate()
+
+        for content in apps.get_model("ImageApp1", "DocumentContent").objects.all():
+            self.assertEqual((content.json_data_compressed, content.html_content_compressed),
+                             payloads[content.document_id])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT html_content, html_content_compressed FROM "ImageApp1_documentcontent" '
+                'WHERE html_content IS NOT NULL'
+            )
+            rows = cursor.fetchall()
+        self.assertEqual(len(rows), 5)
+        for html, stored in rows:
+            self.assertLess(len(bytes(stored)), len(html.encode("utf-8")))
+
+
+class SwapCompressedContentTests(MigrationTestCase):
+    """0024 carries over what old servers wrote between 0023 and the column swap."""
+
+    migrate_from = "0023_compress_document_content"
+    migrate_to = "0024_swap_compressed_content"
+
+    def test_writes_after_the_backfill_survive_the_swap(self):
+        Document = self.old_apps.get_model("ImageApp1", "Document")
+        DocumentContent = self.old_apps.get_model("ImageApp1", "DocumentContent")
+        user = self.create_user()
+        untouched, rendered, updated, created = [
+            Document.objects.create(userid_id=user.id, file=f"uploads/{name}.pdf")
+            for name in ("untouched", "rendered", "updated", "created")
+        ]
+        # Copied by 0023
+        for document in (untouched, rendered, updated):
+            DocumentContent.objects.create(
+                document_id=document.id,
+                json_data={"n": document.id}, json_data_compressed={"n": document.id},
+                html_content="<p>old</p>", html_content_compressed="<p>old</p>",
+            )
+        # Written by old code afterwards, to the plain columns only
+        DocumentContent.objects.filter(document_id=rendered.id).update(html_content="<p>rendered</p>")
+        DocumentContent.objects.filter(document_id=updated.id).update(json_data={"n": "edited"})
+        DocumentContent.objects.create(document_id=created.id, json_data={"n": "new"}, html_content=None)
+
+        apps = self.migrate()
+
+        contents = {
+            content.document_id: (content.json_data, content.html_content)
+            for content in apps.get_model("ImageApp1", "DocumentContent").objects.all()
+        }
+        self.assertEqual(contents[untouched.id], ({"n": untouched.id}, "<p>old</p>"))
+        self.assertEqual(contents[rendered.id], ({"n": rendered.id}, "<p>rendered</p>"))
+        self.assertEqual(contents[updated.id], ({"n": "edited"}, "<p>old</p>"))
+        self.assertEqual(contents[created.id], ({"n": "new"}, None))
@@ -0,0 +1,116 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ImageApp1.id_codec import decode_id
+from ImageApp1.models import RECENT_DOCUMENTS_SINCE, Document
+from ImageApp1.pagination import (
+    MAX_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor, keyset_page, parse_page_size,
+)
+
+# Start of the partial index the admin feed reads first
+BOUNDARY = RECENT_DOCUMENTS_SINCE
+
+
+class CursorTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        cursor = encode_cursor(datetime.date(2026, 3, 2), 41)
+        self.assertEqual(decode_cursor(cursor), (datetime.date(2026, 3, 2), 41))
+
+    def test_bad_cursors(self):
+        cursor = encode_cursor(datetime.date(2026, 3, 2), 41)
+        for bad in ("", "garbage", cursor[:-1] + ("A" if cursor[-1] != "A" else "B"), cursor + "x"):
+            with self.subTest(cursor=bad), self.assertRaises(InvalidCursor):
+                decode_cursor(bad)
+
+    def test_page_size(self):
+        self.assertEqual(parse_page_size(None), 50)
+        self.assertEqual(parse_page_size("7"), 7)
+        self.assertEqual(parse_page_size(str(MAX_PAGE_SIZE * 10)), MAX_PAGE_SIZE)
+        for bad in ("0", "-1", "ten"):
+            with self.subTest(page_size=bad), self.assertRaises(InvalidCursor):
+                parse_page_size(bad)
+
+
+class KeysetPageTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="pages", password="x")
+        # Ties on entry_date on both sides of the boundary, inserted out of order
+        dates = [BOUNDARY + datetime.timedelta(days=offset) for offset in (5, 0, 5, -3, 5, 0, -3, -10, 5)]
+        self.documents = [Document.objects.create(userid=self.user, file="uploads/a.pdf", entry_date=date)
+                          for date in dates]
+        self.expected = [document.id for document in
+                         sorted(self.documents, key=lambda document: (document.entry_date, document.id), reverse=True)]
+
+    def pages(self, page_size, recent_since=None):
+        ids, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(Document.objects.all(), cursor, page_size, recent_since=recent_since)
+            self.assertLessEqual(len(rows), page_size)
+            ids += [row.id for row in rows]
+            if cursor is None:
+                return ids
+
+    def test_pages_follow_entry_date_then_id(self):
+        for page_size in (1, 2, 3, 4, 9, 10):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self.pages(page_size), self.expected)
+
+    def test_recent_since_gives_the_same_pages(self):
+        for page_size in (1, 2, 3, 5, 6, 9, 10):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self.pages(page_size, recent_since=BOUNDARY), self.expected)
+
+    def test_rows_inserted_meanwhile_do_not_shift_pages(self):
+        first, cursor = keyset_page(Document.objects.all(), None, 3)
+        Document.objects.create(userid=self.user, file="uploads/new.pdf", entry_date=BOUNDARY + datetime.timedelta(days=9))
+        rest, _ = keyset_page(Document.objects.all(), cursor, 100)
+
+        self.assertEqual([row.id for row in first + rest], self.expected)
+
+
+class DocumentListViewTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(id=2, username="admin", password="x")
+        self.user = User.objects.create_user(username="pages", password="x")
+        self.other = User.objects.create_user(username="other", password="x")
+        for offset in (3, 0, 0, -1, -20):
+            for owner in (self.user, self.other):
+                Document.objects.create(userid=owner, file="uploads/a.pdf",
+                                        entry_date=BOUNDARY + datetime.timedelta(days=offset))
+
+    def get(self, user, **params):
+        return self.client.get("/IDA/documents/", params,
+                               headers={"Authorization": f"Bearer {AccessToken.for_user(user)}"})
+
+    def listed(self, user, page_size):
+        ids, cursor = [], None
+        while True:
+            params = {"page_size": page_size, "fields": "id,entry_date"}
+            if cursor:
+                params["cursor"] = cursor
+            body = self.get(user, **params).json()
+            ids += [decode_id(document["id"]) for document in body["documents"]]
+            cursor = body["next_cursor"]
+            if cursor is None:
+                return ids
+
+    def test_user_sees_own_documents_in_order(self):
+        expected = list(Document.objects.filter(userid=self.user).order_by("-entry_date", "-id")
+                        .values_list("id", flat=True))
+        self.assertEqual(self.listed(self.user, 2), expected)
+
+    def test_admin_feed_crosses_the_recent_boundary(self):
+        expected = list(Document.objects.order_by("-entry_date", "-id").values_list("id", flat=True))
+        self.assertEqual(self.listed(self.admin, 3), expected)
+
+    def test_bad_cursor_and_page_size(self):
+        self.assertEqual(self.get(self.user, cursor="garbage").status_code, 400)
+        self.assertEqual(self.get(self.user, page_size="lots").status_code, 400)
+        self.assertEqual(self.get(self.user, fields="id,password").status_code, 400)
@@ -0,0 +1,114 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+from pypdf import PdfReader
+
+from ImageApp1 import pdf_sharding
+from ImageApp1.pdf_sharding import PROVENANCE_KEY, PdfShard, load_pdf_shards, merge_shard_results, plan_shards
+from ImageApp1.tests.pdfs import invoice_lines, make_pdf
+
+
+class PlanShardsTests(SimpleTestCase):
+
+    def test_split_by_page_count(self):
+        self.assertEqual(plan_shards([1] * 10, pages_per_shard=5), [(0, 5), (5, 10)])
+        self.assertEqual(plan_shards([1] * 12, pages_per_shard=5), [(0, 5), (5, 10), (10, 12)])
+        self.assertEqual(plan_shards([1] * 3, pages_per_shard=5), [(0, 3)])
+        self.assertEqual(plan_shards([], pages_per_shard=5), [])
+
+    def test_split_by_token_budget(self):
+        self.assertEqual(
+            plan_shards([100, 100, 300, 100, 100], pages_per_shard=5, max_shard_tokens=250),
+            [(0, 2), (2, 3), (3, 5)],  # the 300-token page is over budget on its own, and still gets a shard
+        )
+
+
+class LoadPdfShardsTests(SimpleTestCase):
+
+    def setUp(self):
+        for name, value in (("SHARDING_ENABLED", True), ("SHARD_MIN_PAGES", 10), ("SHARD_PAGES", 5),
+                            ("SHARD_MAX_TOKENS", 0)):
+            patcher = mock.patch.object(pdf_sharding, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def pdf_file(self, pages):
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(make_pdf([invoice_lines(page, count=2) for page in range(1, pages + 1)]))
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_shards_cover_every_page_in_order(self):
+        shards = load_pdf_shards(self.pdf_file(12))
+
+        self.assertEqual([shard.label for shard in shards], ["1-5", "6-10", "11-12"])
+        self.assertEqual({shard.total_pages for shard in shards}, {12})
+        first_lines = [
+            [page.extract_text().splitlines()[0] for page in PdfReader(io.BytesIO(shard.data)).pages]
+            for shard in shards
+        ]
+        self.assertEqual(first_lines[2], ["Invoice 11 line 0: consulting services 2026, amount 0.00 EUR",
+                                          "Invoice 12 line 0: consulting services 2026, amount 0.00 EUR"])
+        self.assertEqual(sum(len(lines) for lines in first_lines), 12)
+        self.assertIn("pages 6-10 of a 12-page document", shards[1].prompt("Extract."))
+
+    def test_small_documents_are_sent_whole(self):
+        self.assertEqual(load_pdf_shards(self.pdf_file(9)), [])
+        self.assertEqual(load_pdf_shards("uploads/scan.png"), [])
+
+
+class ShardMergerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.shards = [PdfShard(1, 5, 12, b""), PdfShard(6, 10, 12, b""), PdfShard(11, 12, 12, b"")]
+
+    def test_lists_are_concatenated_in_page_order(self):
+        merged = merge_shard_results([
+            (self.shards[0], {"line_items": [{"n": 1}, {"n": 2}]}),
+            (self.shards[1], {"line_items": []}),
+            (self.shards[2], {"line_items": [{"n": 3}]}),
+        ])
+
+        self.assertEqual(merged["line_items"], [{"n": 1}, {"n": 2}, {"n": 3}])
+        self.assertEqual(merged[PROVENANCE_KEY]["fields"]["line_items"], [
+            {"pages": "1-5", "items": [0, 2]},
+            {"pages": "11-12", "items": [2, 3]},
+        ])
+
+    def test_scalars_keep_the_first_non_empty_value(self):
+        merged = merge_shard_results([
+            (self.shards[0], {"invoice_number": "", "vendor": {"name": "Acme", "gstin": None}, "total": None}),
+            (self.shards[1], {"invoice_number": "INV-7", "vendor": {"name": "Acme", "gstin": "29AB"}}),
+            (self.shards[2], {"invoice_number": "INV-8", "vendor": {"name": "ACME Ltd"}, "total": 1200}),
+        ])
+
+        self.assertEqual(merged["invoice_number"], "INV-7")
+        self.assertEqual(merged["vendor"], {"name": "Acme", "gstin": "29AB"})
+        self.assertEqual(merged["total"], 1200)
+        provenance = merged[PROVENANCE_KEY]
+        self.assertEqual(provenance["fields"], {
+            "vendor.name": "1-5", "invoice_number": "6-10", "vendor.gstin": "6-10", "total": "11-12",
+        })
+        self.assertEqual(provenance["conflicts"], {
+            "invoice_number": [{"pages": "11-12", "value": "INV-8"}],
+            "vendor.name": [{"pages": "11-12", "value": "ACME Ltd"}],
+        })
+        self.assertEqual(provenance["shards"], [{"pages": "1-5"}, {"pages": "6-10"}, {"pages": "11-12"}])
+
+    def test_merge_is_deterministic(self):
+        results = [
+            (self.shards[0], {"total": 10, "items": [1]}),
+            (self.shards[1], {"total": 20, "items": [2]}),
+        ]
+        self.assertEqual(merge_shard_results(results), merge_shard_results(results))
+
+    def test_mismatched_types_are_conflicts(self):
+        merged = merge_shard_results([
+            (self.shards[0], {"items": [1]}),
+            (self.shards[1], {"items": {"n": 2}}),
+        ])
+        self.assertEqual(merged["items"], [1])
+        self.assertEqual(merged[PROVENANCE_KEY]["conflicts"], {"items": [{"pages": "6-10", "value": {"n": 2}}]})
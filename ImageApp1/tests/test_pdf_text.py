@@ -0,0 +1,61 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ImageApp1 import pdf_text, pipeline
+from ImageApp1.pdf_sharding import PdfShard
+from ImageApp1.pdf_text import text_layer_parts, text_layer_signature
+from ImageApp1.tests.pdfs import invoice_lines, make_pdf
+
+
+class TextLayerTests(SimpleTestCase):
+    """Born-digital PDF pages go to the model as text, the others as a smaller PDF."""
+
+    def setUp(self):
+        # Page 2 has no text, like a scanned page
+        self.pdf = make_pdf([invoice_lines(1), [], invoice_lines(3)])
+
+    def test_text_and_binary_pages(self):
+        parts, stats = text_layer_parts(self.pdf)
+
+        self.assertEqual((stats.pages, stats.text_pages, stats.binary_pages), (3, [1, 3], [2]))
+        self.assertIn("--- Page 1 ---\nInvoice 1 line 0", parts[0].text)
+        self.assertIn("--- Page 3 ---\nInvoice 3 line 0", parts[0].text)
+        self.assertEqual(parts[1].text, "Pages 2 have no usable text layer and are attached as PDF.")
+        self.assertEqual(parts[2].mime_type, "application/pdf")
+        self.assertLess(stats.to_dict()["estimated_input_tokens"], stats.estimated_binary_tokens)
+
+    def test_pdf_without_text_is_sent_as_is(self):
+        self.assertIsNone(text_layer_parts(make_pdf([[], []])))
+
+    def test_shard_pages_are_numbered_from_their_offset(self):
+        parts, stats = text_layer_parts(self.pdf, first_page=11)
+
+        self.assertEqual((stats.text_pages, stats.binary_pages), ([11, 13], [12]))
+        self.assertIn("--- Page 11 ---", parts[0].text)
+        self.assertNotIn("--- Page 1 ---", parts[0].text)
+        self.assertEqual(parts[1].text, "Pages 12 have no usable text layer and are attached as PDF.")
+
+        shard = PdfShard(21, 23, 40, self.pdf)
+        text = pipeline.shard_input(shard)[0].text
+        self.assertIn("--- Page 21 ---", text)
+        self.assertIn("--- Page 23 ---", text)
+
+    def test_settings_change_the_cache_keys(self):
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(self.pdf)
+        self.addCleanup(os.remove, f.name)
+
+        signature = text_layer_signature()
+        _, digest = pipeline.prepare_model_input(f.name, input_digest="abc")
+        extraction_key = pipeline.extraction_key("abc", "prompt")
+        self.assertEqual(digest, f"abc:{signature}")
+
+        for setting, value in (("MIN_CHARS_PER_PAGE", 100), ("MAX_TOKENS_PER_PAGE", 3000),
+                               ("MIN_PRINTABLE_RATIO", 0.8)):
+            with self.subTest(setting=setting), mock.patch.object(pdf_text, setting, value):
+                self.assertNotEqual(text_layer_signature(), signature)
+                self.assertNotEqual(pipeline.prepare_model_input(f.name, input_digest="abc")[1], digest)
+                self.assertNotEqual(pipeline.extraction_key("abc", "prompt"), extraction_key)
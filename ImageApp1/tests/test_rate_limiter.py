@@ -0,0 +1,104 @@
+import asyncio
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ImageApp1.rate_limiter import ModelRateLimiter, RateLimitExceeded
+
+
+class RateLimiterTests(SimpleTestCase):
+    """Admission of model calls against the shared SQLite buckets. Calls are shed at once (max_wait=0)."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "limiter.sqlite3")
+        # Bucket levels refill with wall-clock time; hold it still unless a test moves it
+        self.now = 1_000_000.0
+        clock = mock.patch("ImageApp1.rate_limiter.time.time", side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def limiter(self, **limits):
+        return ModelRateLimiter(path=self.path, max_wait=0, **limits)
+
+    def test_requests_per_minute(self):
+        limiter = self.limiter(requests_per_minute=2)
+        limiter.acquire()
+        limiter.acquire()
+        with self.assertRaises(RateLimitExceeded) as shed:
+            limiter.acquire()
+        self.assertEqual(shed.exception.retry_after, 30.0)
+
+        self.now += 30  # refills one request
+        limiter.acquire()
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire()
+
+    def test_tokens_per_minute_settle_against_actual_usage(self):
+        limiter = self.limiter(tokens_per_minute=1000)
+        lease = limiter.acquire(tokens=600)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire(tokens=600)
+
+        # Overestimated: the unused 500 tokens go back to the bucket
+        limiter.release(lease, used_tokens=100)
+        lease = limiter.acquire(tokens=600)
+        # Underestimated: the bucket goes into debt and delays the next call
+        limiter.release(lease, used_tokens=1500)
+        self.assertEqual(limiter.stats()["tokens_available"], -600)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire(tokens=1)
+
+    def test_request_larger_than_the_bucket_waits_for_a_full_bucket(self):
+        limiter = self.limiter(tokens_per_minute=1000)
+        lease = limiter.acquire(tokens=5000)
+        self.assertEqual(lease.tokens, 1000)
+
+    def test_in_flight_cap(self):
+        limiter = self.limiter(max_in_flight=1)
+        lease = limiter.acquire()
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire()
+        limiter.release(lease)
+        limiter.acquire()
+
+    def test_in_flight_slot_of_a_dead_process_expires(self):
+        limiter = self.limiter(max_in_flight=1)
+        limiter.acquire()  # never released
+        self.now += limiter.lease_ttl + 1
+        limiter.acquire()
+
+    def test_pause_stops_admissions(self):
+        limiter = self.limiter(requests_per_minute=100)
+        limiter.pause(10)
+        with self.assertRaises(RateLimitExceeded) as shed:
+            limiter.acquire()
+        self.assertEqual(shed.exception.retry_after, 10.0)
+
+        self.now += 10.5
+        limiter.acquire()
+        stats = limiter.stats()
+        self.assertEqual(stats["provider_rate_limited"], 1)
+        self.assertEqual(stats["shed"], 1)
+        self.assertEqual(stats["admitted"], 1)
+
+    def test_limits_are_shared_through_the_file(self):
+        first, second = self.limiter(requests_per_minute=1), self.limiter(requests_per_minute=1)
+        first.acquire()
+        with self.assertRaises(RateLimitExceeded):
+            second.acquire()
+
+    def test_async_acquire(self):
+        limiter = self.limiter(requests_per_minute=1)
+        self.assertIsNotNone(asyncio.run(limiter.aacquire()))
+        with self.assertRaises(RateLimitExceeded):
+            asyncio.run(limiter.aacquire())
+
+    def test_no_limits_disables_the_limiter(self):
+        limiter = self.limiter()
+        self.assertFalse(limiter.enabled)
+        self.assertIsNone(limiter.acquire(tokens=10 ** 9))
+        self.assertFalse(os.path.exists(self.path))
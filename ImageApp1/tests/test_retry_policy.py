@@ -0,0 +1,180 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ImageApp1.retry_policy import (
+    CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, ERROR_PERMANENT, ERROR_QUOTA, ERROR_RETRYABLE, ERROR_SAFETY,
+    CircuitBreaker, CircuitOpenError, classify_error,
+)
+
+
+# Stand-ins for google.api_core exceptions, which classify_error matches by class name
+class ResourceExhausted(Exception):
+    pass
+
+
+class InvalidArgument(Exception):
+    pass
+
+
+class ResponseBlockedError(Exception):
+    pass
+
+
+class ServiceUnavailable(Exception):
+    pass
+
+
+class ProjectQuotaExceeded(ResourceExhausted):
+    pass
+
+
+class ClassifyErrorTests(SimpleTestCase):
+
+    def test_exception_types(self):
+        cases = [
+            (ResourceExhausted("anything"), ERROR_QUOTA),
+            (ProjectQuotaExceeded("subclass"), ERROR_QUOTA),
+            (InvalidArgument("anything"), ERROR_PERMANENT),
+            (ResponseBlockedError("anything"), ERROR_SAFETY),
+            (ServiceUnavailable("anything"), ERROR_RETRYABLE),
+            (ValueError("Unable to parse model response"), ERROR_PERMANENT),
+            (FileNotFoundError("uploads/a.pdf"), ERROR_PERMANENT),
+            (TimeoutError("read timed out"), ERROR_RETRYABLE),
+        ]
+        for error, expected in cases:
+            with self.subTest(error=repr(error)):
+                self.assertEqual(classify_error(error), expected)
+
+    def test_messages(self):
+        cases = [
+            ("429 Resource exhausted. Please try again later.", ERROR_QUOTA),
+            ("Quota exceeded for aiplatform.googleapis.com", ERROR_QUOTA),
+            ("The response was blocked for safety reasons", ERROR_SAFETY),
+            ("400 Request contains an invalid argument.", ERROR_PERMANENT),
+            ("Unsupported MIME type: application/zip", ERROR_PERMANENT),
+            ("Publisher model was not found", ERROR_PERMANENT),
+            ("503 The service is currently unavailable.", ERROR_RETRYABLE),
+            ("Connection reset by peer", ERROR_RETRYABLE),
+        ]
+        for message, expected in cases:
+            with self.subTest(message=message):
+                self.assertEqual(classify_error(Exception(message)), expected)
+
+    def test_type_wins_over_message(self):
+        self.assertEqual(classify_error(InvalidArgument("quota of the argument")), ERROR_PERMANENT)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """The breaker shared through a SQLite file, with the wall clock held still unless a test moves it."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "circuit.sqlite3")
+        self.now = 1_000_000.0
+        clock = mock.patch("ImageApp1.retry_policy.time.time", side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def breaker(self, **options):
+        options = {"window": 60, "min_calls": 4, "failure_rate": 0.5, "cool_down": 30, "probe_timeout": 120,
+                   **options}
+        return CircuitBreaker(path=self.path, **options)
+
+    def trip(self, breaker):
+        for _ in range(breaker.min_calls):
+            breaker.record_error(ERROR_RETRYABLE)
+
+    def test_opens_once_the_failure_rate_is_reached(self):
+        breaker = self.breaker()
+        breaker.record_success()
+        breaker.record_success()
+        breaker.record_error(ERROR_RETRYABLE)
+        breaker.before_call()  # 3 calls are below min_calls
+
+        breaker.record_error(ERROR_QUOTA)
+        self.assertTrue(breaker.is_open)
+        with self.assertRaises(CircuitOpenError) as rejected:
+            breaker.before_call()
+        self.assertEqual(rejected.exception.retry_after, 30)
+        state = breaker.state()
+        self.assertEqual(state["state"], CIRCUIT_OPEN)
+        self.assertEqual(state["times_opened"], 1)
+        self.assertEqual(state["rejected"], 1)
+
+    def test_request_errors_do_not_count_against_the_backend(self):
+        breaker = self.breaker()
+        for _ in range(10):
+            breaker.record_error(ERROR_PERMANENT)
+            breaker.record_error(ERROR_SAFETY)
+        self.assertFalse(breaker.is_open)
+        self.assertEqual(breaker.state()["window_failures"], 0)
+
+    def test_failures_leave_the_window(self):
+        breaker = self.breaker()
+        for _ in range(3):
+            breaker.record_error(ERROR_RETRYABLE)
+        self.now += 61
+        breaker.record_error(ERROR_RETRYABLE)
+        self.assertFalse(breaker.is_open)
+        self.assertEqual(breaker.state()["window_calls"], 1)
+
+    def test_successful_probe_closes_the_circuit(self):
+        breaker = self.breaker()
+        self.trip(breaker)
+        self.now += 30
+
+        self.assertEqual(breaker.state()["state"], CIRCUIT_HALF_OPEN)
+        breaker.before_call()  # the probe
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()  # only one probe at a time
+
+        breaker.record_success()
+        self.assertEqual(breaker.state()["state"], CIRCUIT_CLOSED)
+        breaker.before_call()
+
+    def test_failed_probe_opens_the_circuit_again(self):
+        breaker = self.breaker()
+        self.trip(breaker)
+        self.now += 30
+        breaker.before_call()
+        breaker.record_error(ERROR_RETRYABLE)
+
+        self.assertTrue(breaker.is_open)
+        self.assertEqual(breaker.state()["times_opened"], 2)
+
+    def test_abandoned_or_lost_probe_lets_another_call_probe(self):
+        breaker = self.breaker()
+        self.trip(breaker)
+        self.now += 30
+        breaker.before_call()
+        breaker.abandon()  # e.g. shed by the rate limiter before reaching the backend
+        breaker.before_call()
+
+        # The process running this probe dies without recording an outcome
+        self.now += breaker.probe_timeout + 1
+        breaker.before_call()
+
+    def test_state_is_shared_through_the_file(self):
+        worker, web = self.breaker(), self.breaker()
+        self.trip(worker)
+        self.assertTrue(web.is_open)
+        with self.assertRaises(CircuitOpenError):
+            web.before_call()
+
+        self.now += 30
+        web.before_call()
+        with self.assertRaises(CircuitOpenError):
+            worker.before_call()
+        web.record_success()
+        worker.before_call()
+
+    def test_disabled_breaker_never_opens(self):
+        breaker = self.breaker(enabled=False)
+        self.trip(breaker)
+        breaker.before_call()
+        self.assertFalse(breaker.is_open)
+        self.assertFalse(os.path.exists(self.path))
@@ -0,0 +1,132 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ImageApp1.id_codec import decode_id
+from ImageApp1.models import Document, DocumentContent
+from ImageApp1.search import TERM_PATH, SearchError, parse_condition, search_documents, search_rows
+
+
+class ParseConditionTests(SimpleTestCase):
+
+    def test_equality_reads_dates_then_numbers_then_text(self):
+        self.assertEqual(parse_condition("Invoice_Date=2026-07-01"),
+                         {"path": "invoice_date", "value_date": datetime.date(2026, 7, 1)})
+        self.assertEqual(parse_condition("invoice_date = 01/07/2026"),
+                         {"path": "invoice_date", "value_date": datetime.date(2026, 7, 1)})
+        self.assertEqual(parse_condition("total_amount=₹ 52,500.00"),
+                         {"path": "total_amount", "value_number": 52500.0})
+        self.assertEqual(parse_condition("vendor.name=  Acme   LTD "),
+                         {"path": "vendor.name", "value_text": "acme ltd"})
+
+    def test_ranges(self):
+        self.assertEqual(parse_condition("total_amount>=50000"),
+                         {"path": "total_amount", "value_number__gte": 50000.0})
+        self.assertEqual(parse_condition("invoice_date<2026-01-01"),
+                         {"path": "invoice_date", "value_date__lt": datetime.date(2026, 1, 1)})
+
+    def test_malformed_filters(self):
+        for expression in ("vendor.name", "=Acme", "", "vendor.name>Acme"):
+            with self.subTest(expression=expression), self.assertRaises(SearchError):
+                parse_condition(expression)
+
+
+class SearchRowsTests(SimpleTestCase):
+
+    def test_rows_of_a_document(self):
+        rows = search_rows({
+            "Vendor": {"Name": "Acme  Ltd"},
+            "invoice_date": "2026-07-01",
+            "total_amount": "52,500.00",
+            "line_items": [{"amount": 500}, {"amount": 52000}],
+            "notes": "",
+        })
+
+        self.assertIn(("vendor.name", "acme ltd", None, None), rows)
+        self.assertIn(("invoice_date", "2026-07-01", None, datetime.date(2026, 7, 1)), rows)
+        self.assertIn(("total_amount", "52,500.00", 52500.0, None), rows)
+        self.assertIn(("line_items.amount", "500", 500.0, None), rows)
+        self.assertIn(("line_items.amount", "52000", 52000.0, None), rows)
+        # Words of text values only; amounts and dates are filters
+        self.assertEqual(sorted(text for path, text, _, _ in rows if path == TERM_PATH), ["acme", "ltd"])
+        self.assertFalse([row for row in rows if row[0] == "notes"])
+
+
+class SearchDocumentsTests(TestCase):
+    """Search through the index kept by the DocumentContent signal."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(id=2, username="admin", password="x")
+        self.user = User.objects.create_user(username="search", password="x")
+        self.other = User.objects.create_user(username="other", password="x")
+        self.acme = self.document(self.user, {"vendor": {"name": "Acme Ltd"}, "total_amount": "52,500.00",
+                                              "invoice_date": "2026-07-01", "description": "Cloud hosting"})
+        self.globex = self.document(self.user, {"vendor": {"name": "Globex"}, "total_amount": 1200,
+                                                "invoice_date": "15/03/2026", "description": "Office chairs"})
+        self.other_acme = self.document(self.other, {"vendor": {"name": "Acme Ltd"}, "total_amount": 99000,
+                                                     "invoice_date": "2026-08-01"})
+
+    def document(self, user, json_data):
+        document = Document.objects.create(userid=user, file="uploads/a.pdf", document_type="invoice")
+        DocumentContent.objects.create(document=document, json_data=json_data)
+        return document
+
+    def search(self, filters=(), query="", user=None):
+        user = user or self.user
+        documents = Document.objects.filter(userid=user)
+        return set(search_documents(documents, filters, query, user_id=user.id).values_list("id", flat=True))
+
+    def test_equality(self):
+        self.assertEqual(self.search(["vendor.name=acme ltd"]), {self.acme.id})
+        self.assertEqual(self.search(["total_amount=1200"]), {self.globex.id})
+        self.assertEqual(self.search(["invoice_date=2026-03-15"]), {self.globex.id})
+
+    def test_ranges(self):
+        self.assertEqual(self.search(["total_amount>=50000"]), {self.acme.id})
+        self.assertEqual(self.search(["total_amount<50000"]), {self.globex.id})
+        self.assertEqual(self.search(["invoice_date>2026-04-01"]), {self.acme.id})
+        self.assertEqual(self.search(["invoice_date>=2026-01-01", "total_amount>0"]), {self.acme.id, self.globex.id})
+
+    def test_words(self):
+        self.assertEqual(self.search(query="HOSTING cloud"), {self.acme.id})
+        self.assertEqual(self.search(query="cloud chairs"), set())
+        self.assertEqual(self.search(["total_amount<50000"], query="office"), {self.globex.id})
+
+    def test_nothing_to_search_for(self):
+        with self.assertRaises(SearchError):
+            self.search()
+
+    def test_other_users_documents_stay_out(self):
+        self.assertEqual(self.search(["total_amount>90000"]), set())
+        # Even without the owner filter on the documents, the index is scoped by user
+        documents = Document.objects.all()
+        found = search_documents(documents, ["vendor.name=acme ltd"], user_id=self.user.id)
+        self.assertEqual(set(found.values_list("id", flat=True)), {self.acme.id})
+
+    def test_index_follows_content_updates(self):
+        content = DocumentContent.objects.get(document=self.globex)
+        content.json_data = {"vendor": {"name": "Initech"}}
+        content.save()
+        self.assertEqual(self.search(["vendor.name=initech"]), {self.globex.id})
+        self.assertEqual(self.search(["vendor.name=globex"]), set())
+
+    def get(self, user, **params):
+        return self.client.get("/IDA/documents/search/", params,
+                               headers={"Authorization": f"Bearer {AccessToken.for_user(user)}"})
+
+    def test_view(self):
+        response = self.get(self.user, filter="vendor.name=Acme Ltd", fields="id,document_type")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([decode_id(document["id"]) for document in response.json()["documents"]], [self.acme.id])
+
+        response = self.get(self.admin, filter="vendor.name=Acme Ltd", fields="id")
+        self.assertEqual({decode_id(document["id"]) for document in response.json()["documents"]},
+                         {self.acme.id, self.other_acme.id})
+
+    def test_view_rejects_bad_searches(self):
+        self.assertEqual(self.get(self.user, filter="total_amount>lots").status_code, 400)
+        self.assertEqual(self.get(self.user).status_code, 400)
+        self.assertEqual(self.get(self.admin, q="acme", user_id="abc").status_code, 400)
@@ -0,0 +1,134 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ImageApp1.models import DailyUsage, Document
+from ImageApp1.usage import rebuild_usage
+
+DAY = datetime.date(2026, 3, 2)
+
+
+class UsageRollupSignalTests(TestCase):
+    """DailyUsage follows Document saves, updates, moves and deletes."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="usage", password="x")
+
+    def document(self, **fields):
+        fields = {"userid": self.user, "file": "uploads/a.pdf", "entry_date": DAY, "document_type": "invoice",
+                  "input_token": 100, "output_token": 10, **fields}
+        return Document.objects.create(**fields)
+
+    def rollups(self):
+        return {
+            (row.userid_id, row.date, row.document_type): (row.document_count, row.input_tokens, row.output_tokens)
+            for row in DailyUsage.objects.all()
+        }
+
+    def test_create_adds_to_the_rollup(self):
+        self.document()
+        self.document(input_token=50, output_token=None)
+        self.document(document_type=None, input_token=None, output_token=None)
+
+        self.assertEqual(self.rollups(), {
+            (self.user.id, DAY, "invoice"): (2, 150, 10),
+            (self.user.id, DAY, ""): (1, 0, 0),
+        })
+
+    def test_token_update_changes_the_totals(self):
+        document = self.document()
+        document.input_token = 130
+        document.output_token = 7
+        document.save()
+
+        self.assertEqual(self.rollups(), {(self.user.id, DAY, "invoice"): (1, 130, 7)})
+
+    def test_unrelated_update_skips_the_bookkeeping(self):
+        document = self.document()
+        DailyUsage.objects.update(input_tokens=0)
+        document.filepath = "uploads/b.pdf"
+        document.save(update_fields=["filepath"])
+
+        self.assertEqual(self.rollups(), {(self.user.id, DAY, "invoice"): (1, 0, 10)})
+
+    def test_changing_date_or_type_moves_the_document(self):
+        document = self.document()
+        document.entry_date = DAY + datetime.timedelta(days=1)
+        document.save()
+        document.document_type = "receipt"
+        document.save()
+
+        self.assertEqual(self.rollups(), {
+            (self.user.id, DAY, "invoice"): (0, 0, 0),
+            (self.user.id, DAY + datetime.timedelta(days=1), "invoice"): (0, 0, 0),
+            (self.user.id, DAY + datetime.timedelta(days=1), "receipt"): (1, 100, 10),
+        })
+
+    def test_delete_subtracts_from_the_rollup(self):
+        document = self.document()
+        self.document(input_token=20, output_token=2)
+        document.delete()
+
+        self.assertEqual(self.rollups(), {(self.user.id, DAY, "invoice"): (1, 20, 2)})
+
+    def test_delete_without_a_rollup_does_not_create_one(self):
+        document = self.document()
+        DailyUsage.objects.all().delete()
+        document.delete()
+
+        self.assertEqual(self.rollups(), {})
+
+    def test_deleting_a_user_with_documents(self):
+        self.document()
+        self.document(entry_date=DAY + datetime.timedelta(days=1))
+        other = get_user_model().objects.create_user(username="other", password="x")
+        self.document(userid=other)
+
+        self.user.delete()
+
+        self.assertFalse(Document.objects.filter(userid_id=self.user.id).exists())
+        self.assertEqual(self.rollups(), {(other.id, DAY, "invoice"): (1, 100, 10)})
+
+    def test_deleting_users_through_a_queryset(self):
+        self.document()
+        get_user_model().objects.filter(pk=self.user.pk).delete()
+
+        self.assertEqual(self.rollups(), {})
+
+    def test_rebuild_matches_the_signals(self):
+        self.document()
+        self.document(document_type="receipt", entry_date=DAY + datetime.timedelta(days=3))
+        expected = self.rollups()
+        DailyUsage.objects.update(document_count=0, input_tokens=0, output_tokens=0)
+
+        self.assertEqual(rebuild_usage(), 2)
+        self.assertEqual(self.rollups(), expected)
+
+
+class UsageViewTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(id=2, username="admin", password="x")
+        self.user = User.objects.create_user(username="usage", password="x")
+        for offset in (0, 1, 40):
+            Document.objects.create(userid=self.user, file="uploads/a.pdf", document_type="invoice", input_token=100,
+                                    output_token=10, entry_date=DAY + datetime.timedelta(days=offset))
+
+    def get(self, user, **params):
+        return self.client.get("/IDA/usage/", params, headers={"Authorization": f"Bearer {AccessToken.for_user(user)}"})
+
+    def test_totals_between_dates(self):
+        response = self.get(self.user, group_by="total", **{"from": "2026-03-01", "to": "2026-03-31"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 2)
+        self.assertEqual(response.json()["total_input_tokens"], 200)
+
+    def test_invalid_parameters(self):
+        for params in ({"from": "2026-02-30"}, {"to": "March"}, {"group_by": "week"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(self.user, **params).status_code, 400)
+        self.assertEqual(self.get(self.admin, user_id="abc").status_code, 400)
+        self.assertEqual(self.get(self.admin, user_id=str(self.user.id), group_by="total").json()["count"], 3)
@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ImageApp1 import jobs
+from ImageApp1.models import ExtractionBatch
+
+
+class OwnerScopeTests(TestCase):
+    """Jobs and batches are only visible to the user who uploaded them, and to the admin."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(id=2, username="admin", password="x")
+        self.owner = User.objects.create_user(username="owner", password="x")
+        self.other = User.objects.create_user(username="other", password="x")
+        self.job = jobs.enqueue_extraction_job("uploads/a.pdf", self.owner.id)
+        self.batch = ExtractionBatch.objects.create(userid=self.owner, total_files=0)
+
+    def get(self, url, user):
+        return self.client.get(url, headers={"Authorization": f"Bearer {AccessToken.for_user(user)}"})
+
+    def test_job_status(self):
+        url = f"/IDA/upload/status/{self.job.id}/"
+        self.assertEqual(self.get(url, self.owner).status_code, 200)
+        self.assertEqual(self.get(url, self.admin).status_code, 200)
+        self.assertEqual(self.get(url, self.other).status_code, 404)
+
+    def test_batch_status(self):
+        url = f"/IDA/upload/batch/{self.batch.id}/"
+        self.assertEqual(self.get(url, self.owner).status_code, 200)
+        self.assertEqual(self.get(url, self.admin).status_code, 200)
+        self.assertEqual(self.get(url, self.other).status_code, 404)
+
+    def test_batch_progress(self):
+        response = self.get(f"/IDA/upload/batch/{self.batch.id}/progress/", self.other)
+        self.assertEqual(response.status_code, 404)
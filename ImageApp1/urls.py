@@ -7,15 +7,41 @@ from django.conf import settings
 from django.urls import path
 from .views import GetDocumentByIdView ,UserDocumentView,FilteredDocumentView # <-- This line is important
 from .views import RenderJsonToHtmlView , UploadAndValidateReimbursementView,UploadAndProcessFileView
+from .views import ExtractionJobStatusView, ExtractionCacheStatsView, ModelRateLimitStatsView, ModelHealthView
+from .views import BatchUploadView, BatchStatusView, UsageView, DocumentHtmlView, DocumentExportView
+from .views import DocumentSearchView
+from .async_views import (
+    AsyncUploadAndProcessFileView, AsyncUploadAndValidateReimbursementView, AsyncRenderJsonToHtmlView,
+    AsyncStreamUploadView, AsyncStreamRenderHtmlView, AsyncBatchProgressView,
+)
 urlpatterns = [
     path("upload/", UploadAndProcessFileView.as_view(), name="upload_file"),
+    path("upload/status/<uuid:job_id>/", ExtractionJobStatusView.as_view(), name="upload_status"),
+    path("upload/batch/", BatchUploadView.as_view(), name="batch_upload"),
+    path("upload/batch/<uuid:batch_id>/", BatchStatusView.as_view(), name="batch_status"),
+    path("upload/batch/<uuid:batch_id>/progress/", AsyncBatchProgressView.as_view(), name="batch_progress"),
     # path("upload_receipt/", UploadAndProcessReceiptView.as_view(), name="upload_file"),
     path('documents/', UserDocumentView.as_view(), name='user-documents'),
+    path('documents/search/', DocumentSearchView.as_view(), name='document-search'),
+    path('documents/export/', DocumentExportView.as_view(), name='document-export'),
+    path('documents/<str:doc_id>/html/', DocumentHtmlView.as_view(), name='document-html'),
+    path('usage/', UsageView.as_view(), name='usage'),
     path('document-filter/', FilteredDocumentView.as_view(), name='filtered-documents'),
     path('get-document/<path:doc_id>/', GetDocumentByIdView.as_view(), name='get-document-by-id'),  # Note: <path:doc_id>
     path('render-html/', RenderJsonToHtmlView.as_view(), name='render_html'),
+    path('cache/stats/', ExtractionCacheStatsView.as_view(), name='extraction-cache-stats'),
+    path('model/limits/', ModelRateLimitStatsView.as_view(), name='model-rate-limit-stats'),
+    path('health/', ModelHealthView.as_view(), name='model-health'),
     
     path('reimbursement-upload/', UploadAndValidateReimbursementView.as_view(), name='reimbursement-upload'),
+
+    # Async variants, served without a thread per request under ASGI (ImageExtraction/asgi.py)
+    path("async/upload/", AsyncUploadAndProcessFileView.as_view(), name="async-upload-file"),
+    path('async/reimbursement-upload/', AsyncUploadAndValidateReimbursementView.as_view(), name='async-reimbursement-upload'),
+    path('async/render-html/', AsyncRenderJsonToHtmlView.as_view(), name='async-render-html'),
+    # Server-sent events variants, streaming model output as it is generated
+    path("async/upload/stream/", AsyncStreamUploadView.as_view(), name="async-upload-stream"),
+    path('async/render-html/stream/', AsyncStreamRenderHtmlView.as_view(), name='async-render-html-stream'),
 ]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 
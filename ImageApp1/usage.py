@@ -0,0 +1,195 @@
+import datetime
+import logging
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, QuerySet, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import DailyUsage, Document
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# Document fields the rollups depend on; saves touching none of them skip the bookkeeping
+USAGE_FIELDS = ('userid', 'entry_date', 'document_type', 'input_token', 'output_token')
+
+USAGE_GROUPINGS = ('day', 'month', 'document_type', 'total')
+REBUILD_BATCH_SIZE = 1000
+
+UsageKey = Tuple[int, datetime.date, str]
+
+
+def _as_date(value) -> datetime.date:
+    # Document.entry_date defaults to timezone.now, so unsaved instances can hold a datetime
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value[:10])
+    return value
+
+
+def _usage_of(user_id, entry_date, document_type, input_token, output_token) -> Tuple[UsageKey, Tuple[int, int]]:
+    key = (user_id, _as_date(entry_date), document_type or '')
+    return key, (input_token or 0, output_token or 0)
+
+
+def apply_usage_delta(key: UsageKey, documents: int, input_tokens: int, output_tokens: int):
+    """
+    Add to one rollup row with a single UPDATE, creating the row on first use.
+    A negative delta only updates an existing row: without one there is
+    nothing to subtract from (e.g. the rollups went with their user).
+    """
+    if not (documents or input_tokens or output_tokens):
+        return
+    user_id, date, document_type = key
+    rows = DailyUsage.objects.filter(userid_id=user_id, date=date, document_type=document_type)
+    increments = {
+        'document_count': F('document_count') + documents,
+        'input_tokens': F('input_tokens') + input_tokens,
+        'output_tokens': F('output_tokens') + output_tokens,
+    }
+    if rows.update(**increments):
+        return
+    if min(documents, input_tokens, output_tokens) < 0:
+        logger.warning(f"No usage rollup for {key} to subtract from, run rebuild_usage_rollups if totals look off")
+        return
+    try:
+        with transaction.atomic():
+            DailyUsage.objects.create(
+                userid_id=user_id, date=date, document_type=document_type,
+                document_count=documents, input_tokens=input_tokens, output_tokens=output_tokens,
+            )
+    except IntegrityError:
+        rows.update(**increments)  # another writer created the row first
+
+
+@receiver(pre_save, sender=Document)
+def remember_previous_usage(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._previous_usage = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(USAGE_FIELDS):
+        return  # e.g. a file path change
+    previous = Document.objects.filter(pk=instance.pk).values_list(
+        'userid_id', 'entry_date', 'document_type', 'input_token', 'output_token'
+    ).first()
+    if previous is not None:
+        instance._previous_usage = _usage_of(*previous)
+
+
+@receiver(post_save, sender=Document)
+def update_usage_on_save(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if not created and update_fields is not None and not set(update_fields) & set(USAGE_FIELDS):
+        return
+    key, (input_tokens, output_tokens) = _usage_of(
+        instance.userid_id, instance.entry_date, instance.document_type, instance.input_token, instance.output_token
+    )
+    previous = None if created else getattr(instance, '_previous_usage', None)
+    if previous is None:
+        apply_usage_delta(key, 1 if created else 0, input_tokens, output_tokens)
+        return
+
+    previous_key, (previous_input, previous_output) = previous
+    if previous_key == key:
+        apply_usage_delta(key, 0, input_tokens - previous_input, output_tokens - previous_output)
+    else:
+        apply_usage_delta(previous_key, -1, -previous_input, -previous_output)
+        apply_usage_delta(key, 1, input_tokens, output_tokens)
+
+
+def _owner_deleted(origin) -> bool:
+    """Whether a delete cascades from the owner of the documents, whose rollups are deleted with it."""
+    User = get_user_model()
+    if isinstance(origin, User):
+        return True
+    return isinstance(origin, QuerySet) and issubclass(origin.model, User)
+
+
+@receiver(post_delete, sender=Document)
+def update_usage_on_delete(sender, instance, origin=None, **kwargs):
+    if _owner_deleted(origin):
+        return
+    key, (input_tokens, output_tokens) = _usage_of(
+        instance.userid_id, instance.entry_date, instance.document_type, instance.input_token, instance.output_token
+    )
+    apply_usage_delta(key, -1, -input_tokens, -output_tokens)
+
+
+def rebuild_usage(document_model=Document, usage_model=DailyUsage, user_id: Optional[int] = None) -> int:
+    """
+    Recompute the rollups from Document with one GROUP BY, replacing the
+    existing rows (of one user, or all). Used by the backfill migration and
+    the rebuild_usage_rollups command to repair drift from bulk writes that
+    bypass signals, e.g. QuerySet.update().
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    documents = document_model.objects.all()
+    rollups = usage_model.objects.all()
+    if user_id is not None:
+        documents = documents.filter(userid_id=user_id)
+        rollups = rollups.filter(userid_id=user_id)
+
+    totals: Dict[UsageKey, list] = defaultdict(lambda: [0, 0, 0])
+    grouped = documents.values('userid_id', 'entry_date', 'document_type').annotate(
+        documents=Count('id'),
+        input_tokens=Coalesce(Sum('input_token'), 0),
+        output_tokens=Coalesce(Sum('output_token'), 0),
+    ).order_by()
+    for row in grouped.iterator():
+        # NULL and '' document types share a rollup row
+        total = totals[(row['userid_id'], row['entry_date'], row['document_type'] or '')]
+        total[0] += row['documents']
+        total[1] += row['input_tokens']
+        total[2] += row['output_tokens']
+
+    with transaction.atomic():
+        rollups.delete()
+        usage_model.objects.bulk_create([
+            usage_model(
+                userid_id=owner_id, date=date, document_type=document_type,
+                document_count=count, input_tokens=input_tokens, output_tokens=output_tokens,
+            )
+            for (owner_id, date, document_type), (count, input_tokens, output_tokens) in totals.items()
+        ], batch_size=REBUILD_BATCH_SIZE)
+    return len(totals)
+
+
+def usage_totals(rollups) -> dict:
+    """Document count and token totals over a DailyUsage queryset."""
+    return rollups.aggregate(
+        count=Coalesce(Sum('document_count'), 0),
+        total_input_tokens=Coalesce(Sum('input_tokens'), 0),
+        total_output_tokens=Coalesce(Sum('output_tokens'), 0),
+    )
+
+
+def usage_series(rollups, group_by: str) -> list:
+    """
+    Aggregate a DailyUsage queryset by day, month or document type.
+
+    Cost depends on the number of rollup rows in range (users x days x
+    types), not on the number of documents.
+    """
+    sums = {
+        'document_count': Sum('document_count'),
+        'input_tokens': Sum('input_tokens'),
+        'output_tokens': Sum('output_tokens'),
+    }
+    if group_by == 'day':
+        rows = rollups.values('date').annotate(**sums).order_by('date')
+        return [{**row, 'date': row['date'].isoformat()} for row in rows]
+    if group_by == 'month':
+        rows = rollups.annotate(month=TruncMonth('date')).values('month').annotate(**sums).order_by('month')
+        return [{**row, 'month': row['month'].strftime('%Y-%m')} for row in rows]
+    if group_by == 'document_type':
+        return list(rollups.values('document_type').annotate(**sums).order_by('document_type'))
+    raise ValueError(f"group_by must be one of {', '.join(USAGE_GROUPINGS)}")
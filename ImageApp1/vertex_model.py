@@ -1,71 +1,138 @@
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part, GenerationConfig, HarmCategory, HarmBlockThreshold
-import google.auth
 import json
-import base64
+import asyncio
+import logging
+import weakref
 import mimetypes
 import os
 import time
-import random
-from typing import Union, List, Dict, Any, Optional
+from contextlib import contextmanager
+from typing import Union, List, Dict, Any, AsyncIterator, Optional
 from dotenv import load_dotenv
 
+from .extraction_cache import build_cache_key, digest_input, get_extraction_cache
+from .metrics import (
+    MODEL_ATTEMPT_SECONDS, MODEL_CALLS, MODEL_ERRORS, MODEL_INPUT_TOKENS, MODEL_OUTPUT_TOKENS, MODEL_REQUEST_BYTES,
+    MODEL_RETRIES,
+)
+from .model_backends import (
+    ContentPart, StreamChunk, estimate_tokens, get_model_backend, model_backend_source, request_bytes, response_text,
+)
+from .rate_limiter import RateLimitExceeded, get_rate_limiter
+from .retry_policy import (
+    ERROR_PERMANENT, ERROR_QUOTA, ERROR_SAFETY, CircuitOpenError, classify_error, get_circuit_breaker,
+    get_retry_policy,
+)
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
 # --- Configuration ---
 load_dotenv()
 
 LOCATION = os.getenv("LOCATION")
 MODEL_ID = os.getenv("MODEL_ID") # This should be 'gemini-1.5-flash' in your .env
-service_account_key_path = os.getenv('SERVICE_ACCOUNT_KEY_PATH')
-
-# Initialize Vertex AI
-try:
-    credentials, project_id = google.auth.load_credentials_from_file(service_account_key_path)
-    vertexai.init(project=project_id, location=LOCATION, credentials=credentials)
-    print(f"Vertex AI initialized for project: {project_id}, location: {LOCATION}")
-except Exception as e:
-    print(f"Error initializing Vertex AI: {e}")
-    # You might want to raise this error or handle it more robustly in production
-    exit(1) # Exit if initialization fails, as API calls won't work
-
-# Load the GenerativeModel
-try:
-    model = GenerativeModel(MODEL_ID)
-    print(f"Using model: {MODEL_ID} in project: {project_id}, location: {LOCATION}")
-except Exception as e:
-    print(f"Error loading GenerativeModel '{MODEL_ID}': {e}")
-    # This might indicate an incorrect MODEL_ID or permissions issue
-    exit(1)
-
-
-# Retry configuration
+
+# The provider (Vertex AI, fake, record/replay) is chosen by MODEL_BACKEND and
+# initialized on first use, see ImageApp1.model_backends
+
+
+# Retry configuration; per error class budgets and delays live in retry_policy
 MAX_RETRIES = 5
-INITIAL_RETRY_DELAY = 1  # seconds
-MAX_RETRY_DELAY = 60  # seconds
-BACKOFF_FACTOR = 2
+
+# Upper bound on concurrent model calls per event loop in acall_gemini_api
+MAX_CONCURRENT_CALLS = int(os.getenv("MODEL_MAX_CONCURRENT_CALLS", 64))
+_call_semaphores = weakref.WeakKeyDictionary()
 
 class APIRateLimitError(Exception):
     """Custom exception for API rate limiting errors"""
     pass
 
-def exponential_backoff(retry_count):
-    """Calculate delay with exponential backoff and jitter"""
-    delay = min(INITIAL_RETRY_DELAY * (BACKOFF_FACTOR ** retry_count), MAX_RETRY_DELAY)
-    jitter = random.uniform(0, 0.1 * delay)  # Add up to 10% jitter
-    return delay + jitter
+def used_tokens(response: Dict[str, Any]) -> int:
+    return response.get("usageMetadata", {}).get("totalTokenCount", 0)
 
-def process_input(input_data) -> Part:
+@contextmanager
+def counted_call(api: str):
+    """Count a model call in MODEL_CALLS by how it ended; cache hits are counted where they are served."""
+    outcome = "success"
+    try:
+        yield
+    except (RateLimitExceeded, CircuitOpenError):
+        outcome = "shed"
+        raise
+    except Exception:
+        outcome = "failed"
+        raise
+    except BaseException:
+        outcome = "cancelled"  # e.g. a streaming client went away
+        raise
+    finally:
+        MODEL_CALLS.inc(api=api, outcome=outcome)
+
+def record_attempt(started: float, size: int, response: Dict[str, Any] = None, error_class: str = None):
+    """Latency and bytes sent of one attempt, plus its error class or the tokens it was billed."""
+    MODEL_REQUEST_BYTES.inc(size)
+    MODEL_ATTEMPT_SECONDS.observe(time.perf_counter() - started, outcome=error_class or "success")
+    if error_class is not None:
+        MODEL_ERRORS.inc(error_class=error_class)
+        return
+    usage = response.get("usageMetadata", {})
+    MODEL_INPUT_TOKENS.inc(usage.get("promptTokenCount", 0))
+    MODEL_OUTPUT_TOKENS.inc(usage.get("candidatesTokenCount", 0))
+
+def retry_delay_for(error: Exception, error_class: str, attempt: int, max_retries: int) -> float:
     """
-    Process different types of input data and return the appropriate Part for the API.
+    Decide what to do after a failed attempt, based on the error class.
+
+    Permanent and safety-blocked errors are re-raised at once; retryable
+    and quota errors get their own budget from the retry policy, capped
+    by max_retries.
+
+    Returns:
+        float: Seconds to wait before the next attempt
+
+    Raises:
+        APIRateLimitError: If rate limited and the quota budget is used up
+        Exception: The original error if it is not worth retrying, or a
+            summary once the retry budget is used up
+    """
+    policy = get_retry_policy()
+    budget = min(policy.budget(error_class), max_retries)
+
+    if attempt < budget:
+        retry_delay = policy.delay(error_class, attempt)
+        logger.warning(
+            f"Model call failed ({error_class}): {str(error)}. "
+            f"Retrying in {retry_delay:.2f} seconds... (Attempt {attempt + 1}/{budget})"
+        )
+        return retry_delay
+
+    if error_class == ERROR_QUOTA:
+        raise APIRateLimitError(
+            f"Max retries ({budget}) exceeded due to rate limiting. "
+            f"Please wait before making more requests."
+        ) from error
+    if error_class in (ERROR_PERMANENT, ERROR_SAFETY):
+        logger.error(f"Model call failed ({error_class}), not retrying: {str(error)}")
+        raise error
+
+    raise Exception(f"API request failed after {budget} retries: {str(error)}") from error
+
+def process_input(input_data) -> ContentPart:
+    """
+    Process different types of input data and return the appropriate part for the API.
     
     Args:
-        input_data: Can be a file path (str), text (str), or JSON (dict/str)
+        input_data: Can be a file path (str), text (str), JSON (dict/str) or a ContentPart
         
     Returns:
-        Part: Formatted input part for the Vertex AI API
+        ContentPart: Provider neutral input part
     """
+    if isinstance(input_data, ContentPart):
+        return input_data
+
     # If input is a dictionary (already parsed JSON)
     if isinstance(input_data, dict):
-        return Part.from_text(json.dumps(input_data, ensure_ascii=False))
+        return ContentPart.from_text(json.dumps(input_data, ensure_ascii=False))
     
     # If input is a string, check if it's a file path or JSON string
     if isinstance(input_data, str):
@@ -81,7 +148,7 @@ def process_input(input_data) -> Part:
                 if not mime_type:
                     mime_type = "application/octet-stream"
                 
-                return Part.from_data(file_bytes, mime_type)
+                return ContentPart.from_data(file_bytes, mime_type)
             except (IOError, OSError):
                 # If file read fails, treat as text
                 pass
@@ -89,13 +156,41 @@ def process_input(input_data) -> Part:
         # Check if it's a JSON string
         try:
             json_data = json.loads(input_data)
-            return Part.from_text(json.dumps(json_data, ensure_ascii=False))
+            return ContentPart.from_text(json.dumps(json_data, ensure_ascii=False))
         except (json.JSONDecodeError, TypeError):
             # If not JSON, treat as plain text
-            return Part.from_text(input_data)
+            return ContentPart.from_text(input_data)
     
     # For any other type, convert to string
-    return Part.from_text(str(input_data))
+    return ContentPart.from_text(str(input_data))
+
+def is_cacheable(response: Dict[str, Any]) -> bool:
+    return bool(response["candidates"]) and not response["promptFeedback"]["blockReason"]
+
+def build_content_parts(prompt_text: str, input_data=None) -> List[ContentPart]:
+    """Turn prompt_text and input_data into the ordered parts sent to the backend."""
+    content_parts = []
+
+    if input_data is not None:
+        # Handle multiple inputs (list/tuple)
+        if isinstance(input_data, (list, tuple)):
+            for item in input_data:
+                content_parts.append(process_input(item))
+        else:
+            content_parts.append(process_input(input_data))
+
+    # Add prompt text (required)
+    if not prompt_text and not content_parts:
+        raise ValueError("Either prompt_text or input_data must be provided")
+
+    if prompt_text:
+        content_parts.append(ContentPart.from_text(prompt_text))
+
+    return content_parts
+
+def count_tokens(prompt_text: str, input_data=None) -> int:
+    """Token count of a request as reported by the active model backend."""
+    return get_model_backend().count_tokens(build_content_parts(prompt_text, input_data))
 
 def call_gemini_api(
     prompt_text: str,
@@ -105,147 +200,318 @@ def call_gemini_api(
     temperature: float = 0.9,
     top_p: float = 1.0,
     top_k: int = 32,
-    max_output_tokens: int = 65536
+    max_output_tokens: int = 65536,
+    use_cache: bool = True,
+    input_digest: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Call Gemini API with flexible input handling and automatic retries.
+
+    Responses are cached by content: the SHA-256 of the input, the prompt,
+    MODEL_ID, the generation parameters and the model backend. A cache hit
+    makes no API call and reports zero tokens.
     
     Args:
         prompt_text: The prompt text to send to the model (required)
-        input_data: Optional - Can be a file path (str), text (str), or JSON (dict/str)
+        input_data: Optional - Can be a file path (str), text (str), JSON (dict/str) or ContentPart
         response_mime_type: Optional MIME type for the response
         max_retries: Maximum number of retry attempts (default: 5)
         temperature: Controls randomness in generation (0.0-1.0)
         top_p: Controls diversity via nucleus sampling (0.0-1.0)
         top_k: Controls diversity by considering top k tokens
         max_output_tokens: Maximum number of tokens to generate
+        use_cache: Set to False to bypass the extraction cache for this call
+        input_digest: Optional precomputed SHA-256 of input_data, saves re-reading the file
         
     Returns:
         dict: API response in a format similar to the original REST API
         
     Raises:
+        ValueError: If neither prompt_text nor input_data is provided
+        RateLimitExceeded: If the shared rate limiter shed the call
+        CircuitOpenError: If the circuit breaker is open
         APIRateLimitError: If rate limited and max retries exceeded
         Exception: For other API errors
     """
-    
-    for attempt in range(max_retries + 1):
-        try:
-            # Process the input data if provided
-            content_parts = []
-            
-            if input_data is not None:
-                # Handle multiple inputs (list/tuple)
-                if isinstance(input_data, (list, tuple)):
-                    for item in input_data:
-                        content_parts.append(process_input(item))
-                else:
-                    content_parts.append(process_input(input_data))
-            
-            # Add prompt text (required)
-            if not prompt_text and not content_parts:
-                raise ValueError("Either prompt_text or input_data must be provided")
-                
-            if prompt_text:
-                content_parts.append(Part.from_text(prompt_text))
-            
-            # Configure generation parameters
-            generation_config = GenerationConfig(
-                temperature=temperature,
-                top_p=top_p,
-                top_k=top_k,
-                max_output_tokens=max_output_tokens,
-            )
-            
-            # Add response MIME type if specified
-            if response_mime_type:
-                generation_config.response_mime_type = response_mime_type
-            
-            response = model.generate_content(
-                contents=content_parts,
-                generation_config=generation_config,
-                stream=False
-            )
-            
-            # Format response to match the original API structure
-            formatted_response = {
-                "candidates": [],
-                "promptFeedback": {
-                    "blockReason": response.prompt_feedback.block_reason.name if response.prompt_feedback and response.prompt_feedback.block_reason else None,
-                    "safetyRatings": []
-                },
-                # --- HIGHLIGHT: Add usageMetadata here ---
-                "usageMetadata": {
-                    "promptTokenCount": response.usage_metadata.prompt_token_count if response.usage_metadata else 0,
-                    "candidatesTokenCount": response.usage_metadata.candidates_token_count if response.usage_metadata else 0,
-                    "totalTokenCount": response.usage_metadata.total_token_count if response.usage_metadata else 0,
-                }
-                # --- END HIGHLIGHT ---
-            }
-            
-            # Add prompt feedback safety ratings if available
-            if response.prompt_feedback and response.prompt_feedback.safety_ratings:
-                for rating in response.prompt_feedback.safety_ratings:
-                    formatted_response["promptFeedback"]["safetyRatings"].append({
-                        "category": rating.category.name,
-                        "probability": rating.probability.name,
-                        "blocked": rating.blocked
-                    })
-            
-            # Process candidates
-            if response.candidates:
-                for candidate in response.candidates:
-                    candidate_data = {
-                        "content": {
-                            "parts": [],
-                            "role": "model"
-                        },
-                        "finishReason": candidate.finish_reason.name if candidate.finish_reason else None,
-                        "safetyRatings": []
-                    }
-                    
-                    # Add text content if available
-                    if candidate.content and candidate.content.parts:
-                        for part in candidate.content.parts:
-                            if hasattr(part, 'text') and part.text:
-                                candidate_data["content"]["parts"].append({"text": part.text})
-                    
-                    # Add safety ratings
-                    if candidate.safety_ratings:
-                        for rating in candidate.safety_ratings:
-                            candidate_data["safetyRatings"].append({
-                                "category": rating.category.name,
-                                "probability": rating.probability.name,
-                                "blocked": rating.blocked
-                            })
-                    
-                    formatted_response["candidates"].append(candidate_data)
-            
+    generation_config = {
+        "temperature": temperature,
+        "top_p": top_p,
+        "top_k": top_k,
+        "max_output_tokens": max_output_tokens,
+        "response_mime_type": response_mime_type,
+    }
+
+    cache = get_extraction_cache()
+    cache_key = None
+    if use_cache and cache.enabled:
+        cache_key = build_cache_key(
+            input_digest or digest_input(input_data),
+            prompt_text,
+            MODEL_ID,
+            generation_config,
+            model_backend_source(),
+        )
+        cached_response = cache.get(cache_key)
+        if cached_response is not None:
+            MODEL_CALLS.inc(api="generate", outcome="cache_hit")
+            return cached_response
+
+    content_parts = build_content_parts(prompt_text, input_data)
+    limiter = get_rate_limiter()
+    breaker = get_circuit_breaker()
+    estimated_tokens = estimate_tokens(content_parts)
+    size = request_bytes(content_parts)
+
+    with counted_call("generate"):
+        for attempt in range(max_retries + 1):
+            # Fails fast with CircuitOpenError while the backend is unhealthy
+            breaker.before_call()
+            try:
+                # Waits for RPM/TPM/in-flight capacity shared with the other workers, or raises RateLimitExceeded
+                lease = limiter.acquire(estimated_tokens)
+            except RateLimitExceeded:
+                breaker.abandon()
+                raise
+
+            started = time.perf_counter()
+            try:
+                formatted_response = get_model_backend().generate(content_parts, generation_config)
+            except Exception as e:
+                limiter.release(lease)
+                error_class = classify_error(e)
+                record_attempt(started, size, error_class=error_class)
+                breaker.record_error(error_class)
+                delay = retry_delay_for(e, error_class, attempt, max_retries)
+                MODEL_RETRIES.inc(error_class=error_class)
+                if error_class == ERROR_QUOTA:
+                    limiter.pause(delay)  # hold back every worker, not just this one
+                time.sleep(delay)
+                continue
+
+            record_attempt(started, size, response=formatted_response)
+            limiter.release(lease, used_tokens(formatted_response))
+            breaker.record_success()
+
+            if cache_key and is_cacheable(formatted_response):
+                cache.set(cache_key, formatted_response)
+
             return formatted_response
-            
-        except Exception as e:
-            error_str = str(e).lower()
-            
-            # Check for rate limiting or quota errors
-            if any(term in error_str for term in ['rate limit', 'quota', '429', 'resource exhausted']):
-                if attempt < max_retries:
-                    retry_delay = exponential_backoff(attempt)
-                    print(f"Rate limited. Retrying in {retry_delay:.2f} seconds... (Attempt {attempt + 1}/{max_retries})")
-                    time.sleep(retry_delay)
-                    continue
+
+def _get_call_semaphore() -> asyncio.Semaphore:
+    """Per event loop semaphore bounding in-flight async model calls."""
+    loop = asyncio.get_running_loop()
+    semaphore = _call_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+        _call_semaphores[loop] = semaphore
+    return semaphore
+
+async def acall_gemini_api(
+    prompt_text: str,
+    input_data: Optional[Union[str, dict, list]] = None,
+    response_mime_type: Optional[str] = None,
+    max_retries: int = MAX_RETRIES,
+    temperature: float = 0.9,
+    top_p: float = 1.0,
+    top_k: int = 32,
+    max_output_tokens: int = 65536,
+    use_cache: bool = True,
+    input_digest: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Async variant of call_gemini_api for ASGI views.
+
+    Uses the backend's native async generate, waits with asyncio.sleep
+    between retries and caps in-flight calls per event loop at
+    MAX_CONCURRENT_CALLS, so one process can keep many requests open
+    without one thread per request. File reads and non-memory cache
+    lookups run in worker threads.
+
+    Args and return value are the same as call_gemini_api.
+    """
+    generation_config = {
+        "temperature": temperature,
+        "top_p": top_p,
+        "top_k": top_k,
+        "max_output_tokens": max_output_tokens,
+        "response_mime_type": response_mime_type,
+    }
+
+    cache = get_extraction_cache()
+    cache_key = None
+    if use_cache and cache.enabled:
+        if input_digest is None:
+            input_digest = await asyncio.to_thread(digest_input, input_data)
+        cache_key = build_cache_key(input_digest, prompt_text, MODEL_ID, generation_config, model_backend_source())
+        cached_response = await asyncio.to_thread(cache.get, cache_key)
+        if cached_response is not None:
+            MODEL_CALLS.inc(api="agenerate", outcome="cache_hit")
+            return cached_response
+
+    content_parts = await asyncio.to_thread(build_content_parts, prompt_text, input_data)
+    backend = await asyncio.to_thread(get_model_backend)  # first use may build the client
+    limiter = get_rate_limiter()
+    breaker = get_circuit_breaker()
+    estimated_tokens = estimate_tokens(content_parts)
+    size = request_bytes(content_parts)
+
+    with counted_call("agenerate"):
+        for attempt in range(max_retries + 1):
+            await asyncio.to_thread(breaker.before_call)
+            async with _get_call_semaphore():
+                try:
+                    lease = await limiter.aacquire(estimated_tokens)
+                except RateLimitExceeded:
+                    await asyncio.to_thread(breaker.abandon)
+                    raise
+
+                started = time.perf_counter()
+                try:
+                    formatted_response = await backend.agenerate(content_parts, generation_config)
+                except Exception as e:
+                    await asyncio.to_thread(limiter.release, lease)
+                    error = e
                 else:
-                    raise APIRateLimitError(
-                        f"Max retries ({max_retries}) exceeded due to rate limiting. "
-                        f"Please wait before making more requests."
-                    )
-            
-            # For other errors, retry with exponential backoff
-            if attempt < max_retries:
-                retry_delay = exponential_backoff(attempt)
-                print(f"Request failed: {str(e)}. Retrying in {retry_delay:.2f} seconds... (Attempt {attempt + 1}/{max_retries})")
-                time.sleep(retry_delay)
+                    error = None
+                    await asyncio.to_thread(limiter.release, lease, used_tokens(formatted_response))
+
+            if error is not None:
+                error_class = classify_error(error)
+                record_attempt(started, size, error_class=error_class)
+                await asyncio.to_thread(breaker.record_error, error_class)
+                delay = retry_delay_for(error, error_class, attempt, max_retries)
+                MODEL_RETRIES.inc(error_class=error_class)
+                if error_class == ERROR_QUOTA:
+                    await asyncio.to_thread(limiter.pause, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            record_attempt(started, size, response=formatted_response)
+            await asyncio.to_thread(breaker.record_success)
+
+            if cache_key and is_cacheable(formatted_response):
+                await asyncio.to_thread(cache.set, cache_key, formatted_response)
+
+            return formatted_response
+
+async def astream_gemini_api(
+    prompt_text: str,
+    input_data: Optional[Union[str, dict, list]] = None,
+    response_mime_type: Optional[str] = None,
+    max_retries: int = MAX_RETRIES,
+    temperature: float = 0.9,
+    top_p: float = 1.0,
+    top_k: int = 32,
+    max_output_tokens: int = 65536,
+    use_cache: bool = True,
+    input_digest: Optional[str] = None
+) -> AsyncIterator[StreamChunk]:
+    """
+    Streaming variant of acall_gemini_api.
+
+    Yields StreamChunk text deltas as the model produces them, then one
+    chunk carrying the assembled response dict, which is cached like any
+    other response. A cache hit yields the whole text as a single delta.
+    The call goes through the same breaker, rate limiter and semaphore as
+    acall_gemini_api and holds its semaphore slot until the stream ends.
+
+    Failures are retried only while nothing was yielded yet; once deltas
+    went out to the caller the error is raised, since a retry would repeat
+    output the client has already seen.
+
+    Args are the same as call_gemini_api.
+    """
+    generation_config = {
+        "temperature": temperature,
+        "top_p": top_p,
+        "top_k": top_k,
+        "max_output_tokens": max_output_tokens,
+        "response_mime_type": response_mime_type,
+    }
+
+    cache = get_extraction_cache()
+    cache_key = None
+    if use_cache and cache.enabled:
+        if input_digest is None:
+            input_digest = await asyncio.to_thread(digest_input, input_data)
+        cache_key = build_cache_key(input_digest, prompt_text, MODEL_ID, generation_config, model_backend_source())
+        cached_response = await asyncio.to_thread(cache.get, cache_key)
+        if cached_response is not None:
+            MODEL_CALLS.inc(api="astream", outcome="cache_hit")
+            text = response_text(cached_response)
+            if text:
+                yield StreamChunk(text=text)
+            yield StreamChunk(response=cached_response)
+            return
+
+    content_parts = await asyncio.to_thread(build_content_parts, prompt_text, input_data)
+    backend = await asyncio.to_thread(get_model_backend)  # first use may build the client
+    limiter = get_rate_limiter()
+    breaker = get_circuit_breaker()
+    estimated_tokens = estimate_tokens(content_parts)
+    size = request_bytes(content_parts)
+
+    with counted_call("astream"):
+        for attempt in range(max_retries + 1):
+            await asyncio.to_thread(breaker.before_call)
+            async with _get_call_semaphore():
+                try:
+                    lease = await limiter.aacquire(estimated_tokens)
+                except RateLimitExceeded:
+                    await asyncio.to_thread(breaker.abandon)
+                    raise
+
+                formatted_response = None
+                error = None
+                streamed = False
+                started = time.perf_counter()
+                try:
+                    async for chunk in backend.astream(content_parts, generation_config):
+                        if chunk.response is not None:
+                            formatted_response = chunk.response
+                        else:
+                            streamed = True
+                            yield chunk
+                except Exception as e:
+                    error = e
+                except BaseException:
+                    # The consumer went away (client disconnect, cancellation): no outcome to record.
+                    # Not offloaded to a thread, the generator may be closing
+                    breaker.abandon()
+                    raise
+                finally:
+                    # Not offloaded to a thread: this also runs while the generator is being closed
+                    if formatted_response is not None:
+                        limiter.release(lease, used_tokens(formatted_response))
+                    else:
+                        limiter.release(lease)
+
+            if error is None and formatted_response is None:
+                error = RuntimeError(f"Model backend '{backend.name}' ended the stream without a response")
+
+            if error is not None:
+                error_class = classify_error(error)
+                record_attempt(started, size, error_class=error_class)
+                await asyncio.to_thread(breaker.record_error, error_class)
+                if streamed:
+                    logger.error(f"Model stream failed after partial output, not retrying: {str(error)}")
+                    raise error
+                delay = retry_delay_for(error, error_class, attempt, max_retries)
+                MODEL_RETRIES.inc(error_class=error_class)
+                if error_class == ERROR_QUOTA:
+                    await asyncio.to_thread(limiter.pause, delay)
+                await asyncio.sleep(delay)
                 continue
-            
-            raise Exception(f"API request failed after {max_retries} retries: {str(e)}")
+
+            record_attempt(started, size, response=formatted_response)
+            await asyncio.to_thread(breaker.record_success)
+
+            if cache_key and is_cacheable(formatted_response):
+                await asyncio.to_thread(cache.set, cache_key, formatted_response)
+
+            yield StreamChunk(response=formatted_response)
+            return
+
 
 def call_gemini_api_with_file(
     file_path: str, 
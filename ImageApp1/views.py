@@ -1,30 +1,31 @@
 import os
+import hmac
 import json
+from collections import Counter
 from dotenv import load_dotenv
 from django.conf import settings
-from django.core.files.storage import default_storage
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
-import google.generativeai as genai
-from django.views import View
 
-from .models import Document
+from .models import RECENT_DOCUMENTS_SINCE, DailyUsage, Document, DocumentContent, ExtractionBatch, ExtractionJob
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework import status
 from django.shortcuts import get_object_or_404, render
 
-import mimetypes
-from PIL import Image
-from io import BytesIO
-
-from .serializers import DocumentSerializer
-from django.utils import timezone
+from .serializers import DOCUMENT_LIST_FIELDS, DocumentSerializer, document_field_names, document_queryset
+from .pagination import InvalidCursor, keyset_page, parse_page_size
+from .usage import USAGE_GROUPINGS, usage_series, usage_totals
+from .id_codec import decode_id, encode_id, encode_ids
+from .compression import accepts_encoding, content_encoding
+from .search import SearchError, search_documents
+from .export import CONTENT_TYPES, FORMAT_NDJSON, ExportError, export_documents, parse_column_mapping
 from cryptography.fernet import InvalidToken
 
 from django.utils.dateparse import parse_date
-from cryptography.fernet import Fernet
+from django.utils.http import parse_etags
 from django.conf import settings
 
 import logging
@@ -34,6 +35,17 @@ from ImageExtraction.logger import log_exception
 logger = logging.getLogger(__name__)
 
 from .vertex_model import call_gemini_api
+from .pipeline import (
+    PipelineError, document_content, get_renderer, parse_reimbursement_response, prepare_model_input, render_document_html,
+    render_html, save_reimbursement_document,
+)
+from .prompt import REIMBURSEMENT_VALIDATION_PROMPT
+from .jobs import enqueue_extraction_batch, enqueue_extraction_job
+from .extraction_cache import get_extraction_cache
+from .ingestion import BATCH_MAX_FILES, UploadRejected, ingest_upload, iter_archive_members
+from .retry_policy import CircuitOpenError, get_circuit_breaker
+from .rate_limiter import RateLimitExceeded, get_rate_limiter
+from .metrics import METRICS, PROMETHEUS_CONTENT_TYPE, render_metrics
 
 
 # Load environment variables and configure the Gemini API key
@@ -43,70 +55,56 @@ if env_path and os.path.exists(env_path):
 else:
     load_dotenv()
 
-def safe_json_load(raw_string: str):
-    if not raw_string or not raw_string.strip():
-        raise json.JSONDecodeError("Empty or whitespace-only string", raw_string, 0)
-
-    cleaned = raw_string.strip()
+def is_truthy(value) -> bool:
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
 
-    if cleaned.startswith("```json"):
-        lines = cleaned.splitlines()
-        cleaned = "\n".join(lines[1:-1])
+class InvalidQuery(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
 
-    return json.loads(cleaned)
+def parse_date_range(query_params) -> dict:
+    """Inclusive 'from' / 'to' YYYY-MM-DD bounds present in query_params, raising InvalidQuery for a bad one."""
+    bounds = {}
+    for param in ('from', 'to'):
+        value = query_params.get(param)
+        if value:
+            try:
+                bounds[param] = parse_date(value)
+            except ValueError:  # well formed but not a real date, e.g. 2026-02-30
+                bounds[param] = None
+            if not bounds[param]:
+                raise InvalidQuery(f"Invalid '{param}' date. Please use YYYY-MM-DD.")
+    return bounds
+
+def parse_owner_id(query_params):
+    """The admin's optional user_id filter as an int, None when absent, raising InvalidQuery when not a number."""
+    owner_id = query_params.get('user_id')
+    if not owner_id:
+        return None
+    if not owner_id.isdigit():
+        raise InvalidQuery("user_id must be a number.")
+    return int(owner_id)
+
+def parse_fields(query_params) -> list:
+    """Comma separated 'fields' to return, default DOCUMENT_LIST_FIELDS, raising InvalidQuery for unknown names."""
+    fields_param = query_params.get('fields')
+    fields = [name.strip() for name in fields_param.split(',') if name.strip()] if fields_param else list(DOCUMENT_LIST_FIELDS)
+    unknown = sorted(set(fields) - set(document_field_names()))
+    if unknown:
+        raise InvalidQuery(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header with an ETag, as RFC 9110 asks for If-None-Match."""
+    tags = parse_etags(if_none_match or "")
+    return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
 
 def encrypt_id(id: int) -> str:
-    fernet = Fernet(settings.FERNET_KEY)
-    id_bytes = str(id).encode()  # convert int id to bytes
-    encrypted = fernet.encrypt(id_bytes)
-    return encrypted.decode()  # convert bytes back to string for JSON response
+    return encode_id(id)
 
 def decrypt_id(token: str) -> int:
-    fernet = Fernet(settings.FERNET_KEY)
-    decrypted = fernet.decrypt(token.encode())
-    return int(decrypted.decode())
-
-# Global prompt for JSON to HTML conversion
-JSON_TO_HTML_PROMPT = """
-You are an expert at converting structured JSON data into a complete, human-readable, and printable HTML document.
-
-Your task is to generate a **fully styled and structured HTML report** using the provided JSON data.
-
-Requirements:
-1. Wrap the entire content in `<!DOCTYPE html>`, `<html>`, `<head>`, and `<body>` tags.
-2. Inside the `<head>`:
-- Add a `<meta charset="UTF-8">` tag.
-- Set a proper `<title>` based on the document type (e.g., "Invoice Report", "Document Analysis").
-- Include a `<style>` tag with CSS for layout, table formatting, and conditional formatting.
-3. Inside the `<body>`:
-- Use a centered `.container` div with padding, background, shadow, and max-width.
-- Display document title and relevant header information.
-- Show key information in structured format using `<p>`, `<h3>`, etc.
-- Use `<table>` for tabular data with proper headers and styling.
-- Apply appropriate CSS classes for different data types.
-- Add professional styling with proper spacing and typography.
-
-STRICT RULES:
-- Do NOT include JavaScript or external CSS.
-- Use only embedded CSS inside a `<style>` tag.
-- Do NOT include forms, inputs, buttons, links, or scripts.
-- Do NOT use markdown code blocks or ```html formatting in your response.
-- Return only the raw HTML code without any explanations, comments, or formatting.
-
-OUTPUT FORMAT:
-Your response must start with:
-<!DOCTYPE html>
-
-And must end with:
-</html>
-
-Do not include any text before <!DOCTYPE html> or after </html>
-Do not wrap the HTML in markdown code blocks or any other formatting
-
-JSON Data:
-{}
-""".strip()
-
+    return decode_id(token)
 
 @csrf_exempt
 def get_json_from_file(request):
@@ -148,8 +146,9 @@ class GetDocumentByIdView(APIView):
             logger.debug(f"Decrypted ID: {decrypted_id}")
 
             # 2) Fetch object or 404
-            doc = get_object_or_404(Document, id=decrypted_id)
+            doc = get_object_or_404(Document.objects.select_related('content'), id=decrypted_id)
             logger.info(f"Document {decrypted_id} retrieved successfully")
+            content = document_content(doc)
 
             # 3) Build absolute URL for file download
             file_url = request.build_absolute_uri(doc.file.url)
@@ -157,8 +156,8 @@ class GetDocumentByIdView(APIView):
             return Response({
                 "status": "success",
                 "filepath": file_url,
-                "json_data": doc.json_data,
-                "html_data": doc.html_content,
+                "json_data": content.json_data,
+                "html_data": content.html_content,
                 "input_token": doc.input_token,
                 "output_token":doc.output_token
             }, status=status.HTTP_200_OK)
@@ -177,7 +176,65 @@ class GetDocumentByIdView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class DocumentHtmlView(APIView):
+    """
+    The stored HTML report of a document as text/html.
+
+    When the stored bytes are already in an encoding the client accepts
+    (gzip, or zstd without a dictionary) they are sent as they are with
+    Content-Encoding, without decompressing and recompressing. The ETag is
+    the render digest, weak because the encoded and identity responses
+    differ byte for byte; unchanged reports revalidate with a 304 without
+    the HTML being read.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, doc_id):
+        try:
+            decrypted_id = decrypt_id(doc_id)
+        except InvalidToken:
+            return Response({"error": "Invalid or corrupted document ID"}, status=status.HTTP_400_BAD_REQUEST)
+
+        contents = DocumentContent.objects.filter(document_id=decrypted_id)
+        # Assuming user.id == 2 is an admin user
+        if request.user.id != 2:
+            contents = contents.filter(document__userid=request.user)
+        # html_content is deferred: only loaded when the response carries it
+        content = contents.filter(html_content__isnull=False).only('html_digest').first()
+        if content is None:
+            return Response({"error": "No HTML stored for this document"}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = f'W/"{content.html_digest}"' if content.html_digest else None
+        if etag and etag_matches(request.headers.get("If-None-Match"), etag):
+            response = HttpResponseNotModified()
+        else:
+            html = content.html_content
+            if not html:
+                return Response({"error": "No HTML stored for this document"}, status=status.HTTP_404_NOT_FOUND)
+            encoding = content_encoding(html.compressed) if getattr(html, "compressed", None) else None
+            if encoding and accepts_encoding(request.headers.get("Accept-Encoding", ""), encoding):
+                response = HttpResponse(html.compressed, content_type="text/html; charset=utf-8")
+                response["Content-Encoding"] = encoding
+            else:
+                response = HttpResponse(html, content_type="text/html; charset=utf-8")
+        if etag:
+            response["ETag"] = etag
+        response["Vary"] = "Accept-Encoding"
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
 class UserDocumentView(APIView):
+    """
+    Lists the caller's documents (all documents for the admin), newest first.
+
+    Query params:
+        fields: Comma separated fields to return, default DOCUMENT_LIST_FIELDS;
+                json_data / html_content are only joined in when asked for
+        page_size: Rows per page, default DEFAULT_PAGE_SIZE, capped at MAX_PAGE_SIZE
+        cursor: next_cursor of the previous page
+
+    count and the token totals come from the DailyUsage rollups, on the first page only.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -185,6 +242,17 @@ class UserDocumentView(APIView):
             user = request.user
             logger.info(f"UserDocumentView accessed by user ID: {user.id}")
 
+            try:
+                fields = parse_fields(request.query_params)
+            except InvalidQuery as e:
+                return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
+
+            cursor = request.query_params.get('cursor')
+            try:
+                page_size = parse_page_size(request.query_params.get('page_size'))
+            except InvalidCursor as e:
+                return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
+
             # Assuming user.id == 2 is an admin user
             if user.id == 2: 
                 documents = Document.objects.all()
@@ -193,25 +261,38 @@ class UserDocumentView(APIView):
                 documents = Document.objects.filter(userid=user)
                 logger.info(f"Fetching documents for user ID: {user.id}")
 
-            serializer = DocumentSerializer(documents, many=True)
-            serialized_data = serializer.data
-            logger.info(f"{len(serialized_data)} documents retrieved successfully.")
+            try:
+                page, next_cursor = keyset_page(
+                    document_queryset(documents, fields), cursor, page_size,
+                    recent_since=RECENT_DOCUMENTS_SINCE if user.id == 2 else None,
+                )
+            except InvalidCursor as e:
+                return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Encrypt the 'id' field
-            for doc in serialized_data:
-                doc['id'] = encrypt_id(doc['id'])
+            serialized_data = DocumentSerializer(page, many=True, fields=fields).data
 
-            total_input_tokens = sum(getattr(doc, "input_token", 0) or 0 for doc in documents)
-            total_output_tokens = sum(getattr(doc, "output_token", 0) or 0 for doc in documents)
+            # Encrypt the 'id' field
+            if 'id' in fields:
+                for doc, token in zip(serialized_data, encode_ids(doc['id'] for doc in serialized_data)):
+                    doc['id'] = token
 
-            logger.info(f"{len(serialized_data)} documents retrieved. Total input: {total_input_tokens}, output: {total_output_tokens}")
-            
-            return Response({
-                "count": documents.count(),
+            payload = {
                 "documents": serialized_data,
-                "total_input_tokens": total_input_tokens,
-                "total_output_tokens": total_output_tokens,
-            }, status=status.HTTP_200_OK)
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None,
+            }
+            if not cursor:
+                rollups = DailyUsage.objects.all() if user.id == 2 else DailyUsage.objects.filter(userid=user)
+                totals = usage_totals(rollups)
+                payload.update(totals)
+                logger.info(
+                    f"{len(serialized_data)} of {totals['count']} documents retrieved. "
+                    f"Total input: {totals['total_input_tokens']}, output: {totals['total_output_tokens']}"
+                )
+            else:
+                logger.info(f"{len(serialized_data)} documents retrieved successfully.")
+
+            return Response(payload, status=status.HTTP_200_OK)
             
         except Exception:
             logger.error("Exception occurred while fetching user documents.", exc_info=True)
@@ -221,6 +302,75 @@ class UserDocumentView(APIView):
                 "message": "An error occurred while retrieving documents. Please try again later."
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class DocumentSearchView(APIView):
+    """
+    Searches the extracted values of the caller's documents (all documents
+    for the admin), newest first, through the DocumentSearchField index.
+
+    Query params:
+        filter: Repeatable; path=value, or path>value, path>=value, path<value,
+                path<=value with a number or date, e.g. vendor.name=Acme Ltd,
+                total_amount>50000, invoice_date>=2026-07-01. List positions
+                are left out of paths (line_items.amount)
+        q: Words that must all appear in the extracted text values
+        document_type: Only search this document type
+        user_id: Admin only, restrict to one user (default: all users)
+        fields, page_size, cursor: As for the document listing
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+
+        try:
+            fields = parse_fields(request.query_params)
+        except InvalidQuery as e:
+            return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Assuming user.id == 2 is an admin user
+        if user.id == 2:
+            documents = Document.objects.all()
+            try:
+                owner_id = parse_owner_id(request.query_params)
+            except InvalidQuery as e:
+                return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
+            if owner_id:
+                documents = documents.filter(userid_id=owner_id)
+        else:
+            documents = Document.objects.filter(userid=user)
+            owner_id = user.id
+        if 'document_type' in request.query_params:
+            documents = documents.filter(document_type=request.query_params['document_type'])
+
+        try:
+            documents = search_documents(
+                documents, request.query_params.getlist('filter'), request.query_params.get('q', ''), user_id=owner_id,
+            )
+            page_size = parse_page_size(request.query_params.get('page_size'))
+            page, next_cursor = keyset_page(
+                document_queryset(documents, fields), request.query_params.get('cursor'), page_size
+            )
+        except SearchError as e:
+            return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
+        except InvalidCursor as e:
+            return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            serialized_data = DocumentSerializer(page, many=True, fields=fields).data
+            if 'id' in fields:
+                for doc, token in zip(serialized_data, encode_ids(doc['id'] for doc in serialized_data)):
+                    doc['id'] = token
+            logger.info(f"Document search by user ID {user.id} returned {len(serialized_data)} documents")
+            return Response({
+                "documents": serialized_data,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None,
+            }, status=status.HTTP_200_OK)
+        except Exception:
+            logger.error("Exception occurred while searching documents.", exc_info=True)
+            log_exception(logger)
+            return Response({"error": "An error occurred while searching documents."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class FilteredDocumentView(APIView):
     def post(self, request):
         try:
@@ -242,13 +392,16 @@ class FilteredDocumentView(APIView):
                     "error": "Invalid date format. Please use YYYY-MM-DD."
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            documents = Document.objects.filter(userid=user_id, entry_date=entry_date)
+            # One query over document_user_date_id_idx; the count is taken from the fetched rows
+            documents = list(
+                Document.objects.filter(userid=user_id, entry_date=entry_date).select_related('content').order_by('id')
+            )
             serializer = DocumentSerializer(documents, many=True)
 
-            logger.info(f"{documents.count()} documents found for user_id={user_id} on {entry_date}")
+            logger.info(f"{len(documents)} documents found for user_id={user_id} on {entry_date}")
 
             return Response({
-                "count": documents.count(),
+                "count": len(documents),
                 "documents": serializer.data
             }, status=status.HTTP_200_OK)
 
@@ -266,6 +419,8 @@ class RenderJsonToHtmlView(APIView):
         data = request.data
         encrypted_id = data.get("encrypted_doc_id")
         user_id = data.get("userid")
+        bypass_cache = is_truthy(data.get("bypass_cache", ""))
+        renderer = data.get("renderer")
 
         if not encrypted_id or not user_id:
             return Response({"error": "Missing required fields"}, status=status.HTTP_400_BAD_REQUEST)
@@ -275,33 +430,14 @@ class RenderJsonToHtmlView(APIView):
         except InvalidToken:
             return Response({"error": "Invalid encrypted ID"}, status=status.HTTP_400_BAD_REQUEST)
 
-        doc = get_object_or_404(Document, id=decrypted_id, userid_id=user_id)
-        json_data = doc.json_data
-
-        prompt = JSON_TO_HTML_PROMPT.format(json.dumps(json_data, indent=2))
+        doc = get_object_or_404(Document.objects.select_related('content'), id=decrypted_id, userid_id=user_id)
 
         try:
-            response = call_gemini_api(
-                prompt_text=prompt
-            )
-            result = response['candidates'][0]['content']['parts'][0]['text']
-            raw_html = result
-
-            # 🔧 Handle if the model returns a list or extra escaping
-            try:
-                # if response is a list as a string
-                parsed_html = json.loads(raw_html)
-                if isinstance(parsed_html, list):
-                    html_body = "".join(parsed_html)  # merge all parts
-                else:
-                    html_body = parsed_html
-            except Exception: # Catch broader exceptions during parsing
-                html_body = raw_html
-
-            # Final cleanup
-            html_body = html_body.replace("\\n", "").replace("\n", "").replace('\\"', '"')
-
+            html_body = render_document_html(doc, use_cache=not bypass_cache, renderer=renderer)
             return render(request, 'rendered_html.html', {'html_body': html_body})
+        except PipelineError as e:
+            logger.error(f"Error rendering JSON to HTML: {e.message}")
+            return Response({"error": f"An error occurred while rendering HTML: {e.message}"}, status=e.status_code)
         except Exception as e:
             logger.error(f"Error rendering JSON to HTML: {e}", exc_info=True)
             log_exception(logger)
@@ -319,12 +455,11 @@ class UploadAndProcessFileView(APIView):
         prompt_text = request.POST.get("prompt_text")
         user_id = request.POST.get("user_id")
         doc_type = request.POST.get("doc_type")
+        bypass_cache = is_truthy(request.POST.get("bypass_cache", ""))
+        renderer = request.POST.get("renderer") or None
 
         logger.info("Upload request received")
 
-        input_tokens = 0 # Initialize with default value
-        output_tokens = 0 # Initialize with default value
-
         if not uploaded_file:
             logger.error("Upload failed: 'pdf_file' is missing in the request.", exc_info=True)
             return Response(
@@ -332,186 +467,389 @@ class UploadAndProcessFileView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Set default prompt text based on doc_type if not provided
-        if not prompt_text:
-            if doc_type == 'docextraction':
-                prompt_text = (
-                    "You are an intelligent data extraction model. Extract all relevant structured "
-                    "data from the invoice provided. Identify and capture any key information that "
-                    "would typically be found on a commercial invoice, such as metadata, party details, "
-                    "line items, totals, and any other meaningful elements. Present the extracted data "
-                    "in a structured JSON format."
-                    "dont add ```json or ``` in your response"
-                )
-            elif doc_type == 'reimbursement':
-                # Moved REIMBURSEMENT_EXTRACTION_PROMPT here to avoid duplication
-                REIMBURSEMENT_EXTRACTION_PROMPT = """
-                You are an expense management assistant. Your task is to process a batch of expense documents for reimbursement. For each document, you will:
-                Classify the expense type from the following categories: 'Travel', 'Food', 'Mobile', 'Stay', or 'Others'.
-                Determine reimbursement eligibility: Expenses classified as 'Travel' or 'Food' are Allowed for Reimbursement. All other categories are Not Allowed for Reimbursement.
-                Extract key details:
-                Expense Type
-                Date of Expense
-                Expense Amount (in INR)
-                Vendor Name
-                Once all documents are processed, present the information in two distinct summary tables:
-                Section 1: Allowed for Reimbursement
-                This table should include all expenses eligible for reimbursement.
-                Columns: 'Expense Type', 'Date', 'Expense Amount (INR)', 'Vendor'.
-                Below the table, provide a 'Total Amount for Reimbursement (INR)' for this section.
-                Section 2: Not Allowed for Reimbursement
-                This table should include all expenses not eligible for reimbursement.
-                Columns: 'Expense Type', 'Date', 'Expense Amount (INR)', 'Vendor'.
-                Below the table, provide a 'Total Not Allowed (INR)' for this section.
-                Ensure clarity, accuracy, and a professional format suitable for account approvers.
-                dont add ```json or ``` in your response""".strip()
-                prompt_text = REIMBURSEMENT_EXTRACTION_PROMPT
-            else:
-                logger.warning(f"No specific prompt provided for doc_type: {doc_type}. Using generic prompt.")
-                prompt_text = "Extract all structured data from the document in JSON format."
+        try:
+            renderer = get_renderer(renderer)
+        except PipelineError as e:
+            return Response({"status": "error", "message": e.message}, status=e.status_code)
+
+        try:
+            # Stream the upload to storage, validating and hashing it on the way
+            try:
+                ingested = ingest_upload(uploaded_file, "uploads/pdf_files", document_type=doc_type)
+            except UploadRejected as e:
+                logger.error(f"Upload rejected: {e.message}")
+                return Response({"status": "error", "message": e.message}, status=e.status_code)
+
+            # Extraction, HTML conversion and the DB insert run in run_extraction_worker
+            job = enqueue_extraction_job(
+                relative_path=ingested.relative_path,
+                input_sha256=ingested.sha256,
+                source_name=ingested.original_name,
+                user_id=user_id,
+                doc_type=doc_type,
+                prompt_text=prompt_text,
+                bypass_cache=bypass_cache,
+                renderer=renderer,
+            )
+
+            return Response({
+                "status": job.status,
+                "job_id": str(job.id),
+                "status_url": request.build_absolute_uri(
+                    reverse("upload_status", kwargs={"job_id": job.id})
+                ),
+            }, status=status.HTTP_202_ACCEPTED)
+
+        except Exception as e:
+            logger.error(f"Error in UploadAndProcessFileView: {str(e)}", exc_info=True)
+            log_exception(logger)
+            return Response(
+                {"status": "error", "message": f"An internal server error occurred: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class ExtractionJobStatusView(APIView):
+    permission_classes = [IsAuthenticated]
 
+    def get(self, request, job_id):
+        jobs = ExtractionJob.objects.all()
+        # Assuming user.id == 2 is an admin user
+        if request.user.id != 2:
+            jobs = jobs.filter(userid=request.user)
+        job = get_object_or_404(jobs, id=job_id)
 
         try:
-            # Save uploaded file
-            custom_dir = "uploads/pdf_files"
-            save_dir = os.path.join(settings.MEDIA_ROOT, custom_dir)
-            os.makedirs(save_dir, exist_ok=True)
-
-            file_name = uploaded_file.name
-            extension = os.path.splitext(file_name)[1].lower()
-            relative_path = default_storage.save(os.path.join(custom_dir, file_name), uploaded_file)
-            absolute_path = os.path.join(settings.MEDIA_ROOT, relative_path)
-
-            if extension not in [".jpg", ".jpeg", ".png", ".pdf"]:
-                logger.error("Unsupported file type provided.", exc_info=True)
-                return Response(
-                    {"status": "error", "message": "Unsupported file type"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            payload = {
+                "job_id": str(job.id),
+                "status": job.status,
+                "created_at": job.created_at,
+                "started_at": job.started_at,
+                "finished_at": job.finished_at,
+            }
+            if job.status == ExtractionJob.STATUS_SUCCEEDED and job.document_id:
+                payload["document_id"] = encrypt_id(job.document_id)
+            elif job.status == ExtractionJob.STATUS_FAILED:
+                payload["message"] = job.error
+            elif job.status == ExtractionJob.STATUS_QUEUED and job.available_at:
+                payload["retry_at"] = job.available_at
+            if job.stats:
+                payload["stats"] = job.stats
+
+            return Response(payload, status=status.HTTP_200_OK)
 
-            # Step 1: Extract structured JSON
-            try:
-                response = call_gemini_api(
-                    prompt_text=prompt_text,
-                    input_data=absolute_path,
-                    response_mime_type="application/json"
-                )
-                
-                if not response or 'candidates' not in response:
-                    logger.error("Invalid API response format for JSON extraction.", exc_info=True)
-                    return Response({"error": "Invalid API response format"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                
-                try:
-                    # Get the response text
-                    result_json = response['candidates'][0]['content']['parts'][0]['text']
-                    logger.debug(f"Raw JSON API response: {result_json[:200]}...")  # Log first 200 chars for debugging
-                    
-                    if not result_json:
-                        logger.error("Empty JSON response from API.", exc_info=True)
-                        return Response({"error": "Empty JSON response from API"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                    
-                    # Try to parse JSON with our safe parser
-                    parsed_json = safe_json_load(result_json)
-                    
-                    if parsed_json is None:
-                        logger.error("Failed to parse JSON: Invalid JSON format", exc_info=True)
-                        return Response({"error": "Invalid JSON format received from API"}, status=status.HTTP_400_BAD_REQUEST)
-                    
-                    # Handle cases where the model might return a list with a single dictionary
-                    if isinstance(parsed_json, list) and parsed_json:
-                        parsed_json = parsed_json[0]
-
-                    if not isinstance(parsed_json, dict):
-                        logger.error("Parsed JSON is not a dictionary.", exc_info=True)
-                        return Response({"error": "Invalid JSON format received from API"}, status=status.HTTP_400_BAD_REQUEST)
-
-                    logger.debug("Successfully parsed JSON response")
-                    
-                except KeyError as e:
-                    logger.error(f"Missing key in API response: {str(e)}", exc_info=True)
-                    return Response({"error": "Invalid API response format"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                except Exception as e:
-                    logger.error(f"Unexpected error processing API response: {str(e)}", exc_info=True)
-                    return Response({"error": "Error processing API response"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON decoding error during extraction: {str(e)}", exc_info=True)
-                return Response({"error": "Invalid JSON received from API"}, status=status.HTTP_400_BAD_REQUEST)
-            except Exception as e:
-                logger.error(f"Error during JSON extraction API call: {str(e)}", exc_info=True)
-                return Response({"error": f"Error during JSON extraction: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            # --- HIGHLIGHT: Consistent Metadata Extraction ---
-            if 'usageMetadata' in response:
-                usage_metadata = response['usageMetadata']
-                input_tokens = usage_metadata.get('promptTokenCount', 0)
-                output_tokens = usage_metadata.get('candidatesTokenCount', 0)
-                logger.info(f"JSON Extraction - Input Tokens: {input_tokens}, Output Tokens: {output_tokens}")
-            else:
-                logger.info("JSON Extraction - Usage metadata not available in the response.")
-            # --- END HIGHLIGHT ---
+        except Exception:
+            logger.error("Error while fetching extraction job status", exc_info=True)
+            log_exception(logger)
+            return Response(
+                {"error": "An internal server error occurred while retrieving the job status."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
-            # Step 2: Convert JSON to HTML
-            html_prompt = JSON_TO_HTML_PROMPT.format(json.dumps(parsed_json, indent=2, ensure_ascii=False))
-            
-            try:
-                html_response_obj = call_gemini_api(
-                    prompt_text=html_prompt
-                )
-                result_html = html_response_obj['candidates'][0]['content']['parts'][0]['text']
-                # logger.debug(f"Raw HTML API response: {result_html}")
+BATCH_PROGRESS_TIMEOUT = 30 * 60  # seconds a progress stream stays open
+JOB_FINAL_STATUSES = (ExtractionJob.STATUS_SUCCEEDED, ExtractionJob.STATUS_FAILED)
+
+
+def batch_job_entry(job: ExtractionJob) -> dict:
+    entry = {
+        "index": job.batch_index,
+        "file": job.source_name,
+        "job_id": str(job.id),
+        "status": job.status,
+    }
+    if job.status == ExtractionJob.STATUS_SUCCEEDED and job.document_id:
+        entry["document_id"] = encrypt_id(job.document_id)
+    elif job.status == ExtractionJob.STATUS_FAILED:
+        entry["error"] = job.error
+    return entry
+
+
+def batch_manifest(batch: ExtractionBatch) -> dict:
+    """Every input of the batch, in upload order, with its document_id or error."""
+    jobs = list(batch.jobs.only(
+        'id', 'batch_index', 'source_name', 'status', 'document_id', 'error', 'finished_at'
+    ).order_by('batch_index'))
+
+    files = [
+        {"index": item["index"], "file": item["file"], "status": "rejected", "error": item["error"]}
+        for item in batch.rejected
+    ]
+    files.extend(batch_job_entry(job) for job in jobs)
+    files.sort(key=lambda entry: entry["index"])
+
+    done = all(job.status in JOB_FINAL_STATUSES for job in jobs)
+    finished_at = max((job.finished_at for job in jobs if job.finished_at), default=None) if done else None
+    return {
+        "batch_id": str(batch.id),
+        "status": "completed" if done else "running",
+        "total_files": batch.total_files,
+        "counts": dict(Counter(entry["status"] for entry in files)),
+        "created_at": batch.created_at,
+        "finished_at": finished_at,
+        "elapsed_seconds": round((finished_at - batch.created_at).total_seconds(), 2) if finished_at else None,
+        "files": files,
+    }
+
+
+class BatchUploadView(APIView):
+    """
+    Accepts many files ("files", repeated) and/or one zip ("archive") in a
+    single request. Every acceptable file is queued as an ExtractionJob, so
+    the run_extraction_worker pool processes them in parallel under the model
+    rate limits; files refused at ingestion are reported in the manifest.
+    """
+    permission_classes = [IsAuthenticated]
 
-                # Handle if the HTML comes as a JSON stringified list
-                try:
-                    maybe_list = json.loads(result_html)
-                    if isinstance(maybe_list, list):
-                        html_content = "".join(maybe_list)
-                    else:
-                        html_content = str(maybe_list)
-                except json.JSONDecodeError:
-                    html_content = result_html # If not JSON, use as is
+    def post(self, request):
+        uploaded_files = request.FILES.getlist("files")
+        archive = request.FILES.get("archive")
+        prompt_text = request.POST.get("prompt_text")
+        user_id = request.POST.get("user_id")
+        doc_type = request.POST.get("doc_type")
+        bypass_cache = is_truthy(request.POST.get("bypass_cache", ""))
+        renderer = request.POST.get("renderer") or None
 
-                # Final cleanup for HTML content
-                html_content = html_content.replace("\\n", "").replace("\n", "").replace('\\"', '"')
+        logger.info(f"Batch upload request received ({len(uploaded_files)} file(s), archive={bool(archive)})")
 
-            except Exception as e:
-                logger.error(f"Error during HTML conversion API call: {str(e)}", exc_info=True)
-                return Response({"error": f"Error during HTML conversion: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            # Save extracted JSON to file
-            json_filename = os.path.splitext(relative_path)[0] + ".json"
-            json_path = os.path.join(settings.MEDIA_ROOT, json_filename)
-            with open(json_path, "w", encoding="utf-8") as jf:
-                json.dump(parsed_json, jf, indent=2, ensure_ascii=False)
-
-            # Save record to database
-            doc = Document.objects.create(
-                filepath=relative_path,
-                file=relative_path,
-                json_data=parsed_json,
-                html_content=html_content,
-                userid_id=user_id,
-                document_type=doc_type,  # Save file type here
-                input_token = input_tokens, # --- HIGHLIGHT: Save input tokens ---
-                output_token = output_tokens # --- HIGHLIGHT: Save output tokens ---
+        if not uploaded_files and not archive:
+            return Response(
+                {"status": "error", "message": "Missing 'files' or 'archive'"},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-            encrypted_doc_id = encrypt_id(doc.id)
-            logger.info(f"Document processed and saved successfully. Document ID: {encrypted_doc_id}")
+        try:
+            renderer = get_renderer(renderer)
+            sources = list(uploaded_files)
+            if archive:
+                sources.extend(iter_archive_members(archive, max_files=BATCH_MAX_FILES))
+            if len(sources) > BATCH_MAX_FILES:
+                raise UploadRejected(f"A batch holds at most {BATCH_MAX_FILES} files", status_code=413)
+        except (PipelineError, UploadRejected) as e:
+            return Response({"status": "error", "message": e.message}, status=e.status_code)
+
+        try:
+            accepted = []
+            rejected = []
+            for index, uploaded_file in enumerate(sources):
+                try:
+                    ingested = ingest_upload(uploaded_file, "uploads/pdf_files", document_type=doc_type)
+                except UploadRejected as e:
+                    logger.warning(f"Batch file {uploaded_file.name} rejected: {e.message}")
+                    rejected.append({"index": index, "file": uploaded_file.name, "error": e.message})
+                    continue
+                accepted.append((index, uploaded_file.name, ingested))
+
+            if not accepted:
+                return Response(
+                    {"status": "error", "message": "No acceptable files in the batch", "files": rejected},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            batch = enqueue_extraction_batch(
+                user_id,
+                accepted,
+                rejected=rejected,
+                doc_type=doc_type,
+                prompt_text=prompt_text,
+                bypass_cache=bypass_cache,
+                renderer=renderer,
+            )
 
             return Response({
-                "status": "success",
-                "document_id": encrypted_doc_id,
-            }, status=status.HTTP_200_OK)
+                "status": "queued",
+                "batch_id": str(batch.id),
+                "status_url": request.build_absolute_uri(
+                    reverse("batch_status", kwargs={"batch_id": batch.id})
+                ),
+                "progress_url": request.build_absolute_uri(
+                    reverse("batch_progress", kwargs={"batch_id": batch.id})
+                ),
+                "manifest": batch_manifest(batch),
+            }, status=status.HTTP_202_ACCEPTED)
 
         except Exception as e:
-            logger.error(f"Error in UploadAndProcessFileView: {str(e)}", exc_info=True)
+            logger.error(f"Error in BatchUploadView: {str(e)}", exc_info=True)
             log_exception(logger)
             return Response(
                 {"status": "error", "message": f"An internal server error occurred: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class BatchStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, batch_id):
+        batches = ExtractionBatch.objects.all()
+        # Assuming user.id == 2 is an admin user
+        if request.user.id != 2:
+            batches = batches.filter(userid=request.user)
+        batch = get_object_or_404(batches, id=batch_id)
+
+        try:
+            return Response(batch_manifest(batch), status=status.HTTP_200_OK)
+        except Exception:
+            logger.error("Error while building the batch manifest", exc_info=True)
+            log_exception(logger)
+            return Response(
+                {"error": "An internal server error occurred while retrieving the batch status."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class ExtractionCacheStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(get_extraction_cache().stats(), status=status.HTTP_200_OK)
+
+class ModelRateLimitStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(get_rate_limiter().stats(), status=status.HTTP_200_OK)
+
+class UsageView(APIView):
+    """
+    Document and token usage from the DailyUsage rollups.
+
+    Query params:
+        from, to: Inclusive YYYY-MM-DD bounds, both optional
+        group_by: day (default), month, document_type or total
+        document_type: Only count this document type
+        user_id: Admin only, restrict to one user (default: all users)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        group_by = request.query_params.get('group_by', 'day')
+        if group_by not in USAGE_GROUPINGS:
+            return Response(
+                {"error": f"group_by must be one of {', '.join(USAGE_GROUPINGS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            bounds = parse_date_range(request.query_params)
+        except InvalidQuery as e:
+            return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Assuming user.id == 2 is an admin user
+        if user.id == 2:
+            rollups = DailyUsage.objects.all()
+            try:
+                owner_id = parse_owner_id(request.query_params)
+            except InvalidQuery as e:
+                return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
+            if owner_id:
+                rollups = rollups.filter(userid_id=owner_id)
+        else:
+            rollups = DailyUsage.objects.filter(userid=user)
+        if 'from' in bounds:
+            rollups = rollups.filter(date__gte=bounds['from'])
+        if 'to' in bounds:
+            rollups = rollups.filter(date__lte=bounds['to'])
+        if 'document_type' in request.query_params:
+            rollups = rollups.filter(document_type=request.query_params['document_type'])
+
+        try:
+            payload = {"group_by": group_by, **usage_totals(rollups)}
+            if group_by != 'total':
+                payload["series"] = usage_series(rollups, group_by)
+            return Response(payload, status=status.HTTP_200_OK)
+        except Exception as e:
+            logger.error(f"Error computing usage: {str(e)}", exc_info=True)
+            log_exception(logger)
+            return Response({"error": "An error occurred while computing usage."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class DocumentExportView(APIView):
+    """
+    Streams the extracted data of the caller's documents (all documents for
+    the admin) as an attachment, in id order and in constant memory.
+
+    Query params:
+        export_format: ndjson (default), csv or parquet ("format" is DRF's renderer override)
+        from, to: Inclusive YYYY-MM-DD bounds on entry_date, both optional
+        document_type: Only export this document type
+        columns: column=json.path pairs, comma separated, flattening json_data
+                 into columns (default DOCUMENT_EXPORT["CSV_COLUMNS"] for csv/parquet)
+        user_id: Admin only, restrict to one user (default: all users)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        export_format = request.query_params.get('export_format', FORMAT_NDJSON)
+
+        try:
+            bounds = parse_date_range(request.query_params)
+        except InvalidQuery as e:
+            return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Assuming user.id == 2 is an admin user
+        if user.id == 2:
+            documents = Document.objects.all()
+            try:
+                owner_id = parse_owner_id(request.query_params)
+            except InvalidQuery as e:
+                return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
+            if owner_id:
+                documents = documents.filter(userid_id=owner_id)
+        else:
+            documents = Document.objects.filter(userid=user)
+        if 'from' in bounds:
+            documents = documents.filter(entry_date__gte=bounds['from'])
+        if 'to' in bounds:
+            documents = documents.filter(entry_date__lte=bounds['to'])
+        if 'document_type' in request.query_params:
+            documents = documents.filter(document_type=request.query_params['document_type'])
+
+        try:
+            columns = parse_column_mapping(request.query_params.get('columns'))
+            stream = export_documents(documents, export_format, columns=columns)
+        except ExportError as e:
+            return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info(f"Document export ({export_format}) started by user ID: {user.id}")
+        filename = "documents-{}-{}.{}".format(bounds.get('from', 'start'), bounds.get('to', 'end'), export_format)
+        response = StreamingHttpResponse(stream, content_type=CONTENT_TYPES[export_format])
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+class ModelHealthView(APIView):
+    """Unauthenticated probe for load balancers: 503 while the model circuit breaker is open."""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        breaker = get_circuit_breaker().state()
+        if breaker["state"] == "open":
+            return Response(
+                {"status": "unavailable", "circuit_breaker": breaker},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(max(1, round(breaker["retry_after"])))}
+            )
+        return Response({"status": "ok", "circuit_breaker": breaker}, status=status.HTTP_200_OK)
+
+class MetricsView(APIView):
+    """
+    Pipeline and model call metrics of every worker on this host, in the
+    Prometheus text format (see metrics.py). Served at /metrics for
+    scrapers; when METRICS["TOKEN"] is set, requests must send it as
+    "Authorization: Bearer <token>".
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        token = METRICS.get("TOKEN")
+        if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return Response({"error": "Invalid or missing metrics token"}, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            return HttpResponse(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+        except Exception as e:
+            logger.error(f"Error while collecting metrics: {str(e)}", exc_info=True)
+            log_exception(logger)
+            return Response({"error": f"Could not collect metrics: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class UploadAndValidateReimbursementView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -519,125 +857,67 @@ class UploadAndValidateReimbursementView(APIView):
         uploaded_file = request.FILES.get("file")
         user_id = request.POST.get("user_id")
         document_id = request.POST.get("document_id")
+        bypass_cache = is_truthy(request.POST.get("bypass_cache", ""))
+        renderer = request.POST.get("renderer") or None
 
         if not uploaded_file or not user_id:
             return Response({"error": "Missing file or user_id"}, status=status.HTTP_400_BAD_REQUEST)
 
-        input_tokens = 0 # Initialize with default value
-        output_tokens = 0 # Initialize with default value
-
         try:
             # Save file
-            file_name = uploaded_file.name
-            extension = os.path.splitext(file_name)[1].lower()
-            folder = "uploads/reimbursement"
-            file_path = default_storage.save(os.path.join(folder, file_name), uploaded_file)
-            full_path = os.path.join(settings.MEDIA_ROOT, file_path)
-
-            if extension not in [".jpg", ".jpeg", ".png", ".pdf"]:
-                return Response({"error": "Unsupported file type"}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Gemini prompt for extraction
-            REIMBURSEMENT_EXTRACTION_PROMPT = """You are an expense management assistant. Your task is to process a batch of expense documents for reimbursement. For each document, you will:
-                Classify the expense type from the following categories: 'Travel', 'Food', 'Mobile', 'Stay', or 'Others'.
-                Determine reimbursement eligibility: Expenses classified as 'Travel' or 'Food' are Allowed for Reimbursement. All other categories are Not Allowed for Reimbursement.
-                Extract key details:
-                Expense Type
-                Date of Expense
-                Expense Amount (in INR)
-                Vendor Name
-                Once all documents are processed, present the information in two distinct summary tables:
-                Section 1: Allowed for Reimbursement
-                This table should include all expenses eligible for reimbursement.
-                Columns: 'Expense Type', 'Date', 'Expense Amount (INR)', 'Vendor'.
-                Below the table, provide a 'Total Amount for Reimbursement (INR)' for this section.
-                Section 2: Not Allowed for Reimbursement
-                This table should include all expenses not eligible for reimbursement.
-                Columns: 'Expense Type', 'Date', 'Expense Amount (INR)', 'Vendor'.
-                Below the table, provide a 'Total Not Allowed (INR)' for this section.
-                Ensure clarity, accuracy, and a professional format suitable for account approvers.""".strip() 
+            try:
+                ingested = ingest_upload(uploaded_file, "uploads/reimbursement", document_type="reimbursement")
+            except UploadRejected as e:
+                return Response({"error": e.message}, status=e.status_code)
+            file_path = ingested.relative_path
+            full_path = ingested.absolute_path
 
             # Step 1: Extract JSON
             try:
+                input_data, input_digest = prepare_model_input(full_path, ingested.sha256)
                 response = call_gemini_api(
-                    prompt_text=REIMBURSEMENT_EXTRACTION_PROMPT,
-                    input_data=full_path, # Use full_path for call_gemini_api
-                    response_mime_type="application/json"
+                    prompt_text=REIMBURSEMENT_VALIDATION_PROMPT,
+                    input_data=input_data,
+                    response_mime_type="application/json",
+                    use_cache=not bypass_cache,
+                    input_digest=input_digest
                 )
-                result = response['candidates'][0]['content']['parts'][0]['text']
-                extracted_json = safe_json_load(result)
-
-                if isinstance(extracted_json, list) and extracted_json:
-                    extracted_json = extracted_json[0]
+            except (RateLimitExceeded, CircuitOpenError) as e:
+                logger.warning(f"Reimbursement extraction not attempted: {e.message}")
+                return Response({"error": e.message}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
             except Exception as e:
                 logger.error(f"Error during reimbursement JSON extraction: {str(e)}", exc_info=True)
                 return Response({"error": f"Error during reimbursement JSON extraction: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            # --- HIGHLIGHT: Consistent Metadata Extraction ---
-            if 'usageMetadata' in response:
-                usage_metadata = response['usageMetadata']
-                input_tokens = usage_metadata.get('promptTokenCount', 0)
-                output_tokens = usage_metadata.get('candidatesTokenCount', 0)
-                logger.info(f"Reimbursement - Input Tokens: {input_tokens}, Output Tokens: {output_tokens}")
-            else:
-                logger.info("Reimbursement - Usage metadata not available in the response.")
-            # --- END HIGHLIGHT ---
+            try:
+                extracted_json, input_tokens, output_tokens = parse_reimbursement_response(response)
+            except PipelineError as e:
+                return Response({"error": e.message}, status=e.status_code)
 
             # Step 2: Convert JSON to HTML
-            prompt_html = JSON_TO_HTML_PROMPT.format(json.dumps(extracted_json, indent=2))
             try:
-                html_response_obj = call_gemini_api(
-                    prompt_text=prompt_html
+                html_body, html_input_tokens, html_output_tokens = render_html(
+                    extracted_json, use_cache=not bypass_cache, renderer=renderer
                 )
-                result_html = html_response_obj['candidates'][0]['content']['parts'][0]['text']
-                
-                # Optional: clean parsed HTML (if Gemini returns it as a list)
-                try:
-                    parsed_html = json.loads(result_html)
-                    html_body = "".join(parsed_html) if isinstance(parsed_html, list) else parsed_html
-                except json.JSONDecodeError:
-                    html_body = result_html # If not JSON, use as is
-
-                # Final cleanup for HTML content
-                html_body = html_body.replace("\\n", "").replace("\n", "").replace('\\"', '"')
-            except Exception as e:
-                logger.error(f"Error during reimbursement HTML conversion: {str(e)}", exc_info=True)
-                return Response({"error": f"Error during reimbursement HTML conversion: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                input_tokens += html_input_tokens
+                output_tokens += html_output_tokens
+            except PipelineError as e:
+                logger.error(f"Error during reimbursement HTML conversion: {e.message}")
+                return Response({"error": f"Error during reimbursement HTML conversion: {e.message}"}, status=e.status_code)
 
             # Step 3: Save to DB (create or update)
-            if document_id:
-                logger.info(f"Updating existing reimbursement document for ID: {document_id}")
-                logger.debug(f"HTML Body: {html_body[:200]}...") # Log beginning of HTML
-                try:
-                    doc_id = decrypt_id(document_id)
-                    doc = get_object_or_404(Document, id=doc_id, userid_id=user_id) 
-                    doc.file = file_path
-                    doc.filepath = file_path
-                    doc.reimbursement_data = extracted_json
-                    doc.html_content = html_body
-                    doc.input_token = input_tokens # --- HIGHLIGHT: Save input tokens ---
-                    doc.output_token = output_tokens # --- HIGHLIGHT: Save output tokens ---
-                    doc.save()
-                    logger.info(f"Updated reimbursement document {doc_id}")
-                except Document.DoesNotExist:
-                    logger.error(f"Document not found for ID {doc_id} and user {user_id}", exc_info=True)
-                    return Response({"error": "Document not found for given ID and user"}, status=status.HTTP_404_NOT_FOUND)
-                except InvalidToken:
-                    logger.error(f"Invalid encrypted document ID for update: {document_id}", exc_info=True)
-                    return Response({"error": "Invalid encrypted document ID for update"}, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                logger.info("Creating new reimbursement document.")
-                doc = Document.objects.create(
-                    file=file_path,
-                    filepath=file_path,
-                    reimbursement_data=extracted_json,
-                    html_content=html_body,
-                    userid_id=user_id,
-                    document_type='reimbursement', # Explicitly set for new docs
-                    input_token=input_tokens,
-                    output_token=output_tokens
+            try:
+                doc_id = decrypt_id(document_id) if document_id else None
+                doc = save_reimbursement_document(
+                    file_path, user_id, extracted_json, html_body, renderer,
+                    input_tokens, output_tokens, doc_id=doc_id, original_name=ingested.original_name
                 )
-                logger.info(f"Created new reimbursement document {doc.id}")
+            except Document.DoesNotExist:
+                logger.error(f"Document not found for ID {doc_id} and user {user_id}", exc_info=True)
+                return Response({"error": "Document not found for given ID and user"}, status=status.HTTP_404_NOT_FOUND)
+            except InvalidToken:
+                logger.error(f"Invalid encrypted document ID for update: {document_id}", exc_info=True)
+                return Response({"error": "Invalid encrypted document ID for update"}, status=status.HTTP_400_BAD_REQUEST)
 
             encrypted_doc_id = encrypt_id(doc.id)
 
@@ -14,6 +14,8 @@ from pathlib import Path
 
 
 import os
+import json
+import tempfile
 
 
 
@@ -216,6 +218,157 @@ X_FRAME_OPTIONS = 'ALLOWALL'
 
 FERNET_KEY = b'0JrZYrB4GSD1agNWN_wZGJn8dEUmuXOb-02rLyubWDY='  
 
+# Storage of DocumentContent.json_data / html_content (ImageApp1/compression.py).
+# "gzip" blobs can be served as is with Content-Encoding; "zstd" needs the zstandard package and
+# can use a dictionary trained with `manage.py train_compression_dictionary` (DICTIONARY_ID)
+CONTENT_COMPRESSION = {
+    "CODEC": os.getenv("CONTENT_COMPRESSION_CODEC", "gzip"),
+    "LEVEL": int(os.getenv("CONTENT_COMPRESSION_LEVEL", 0)) or None,
+    "MIN_BYTES": 256,
+    # Needed to read rows written with a dictionary: keep it on persistent storage shared by all servers
+    "DICTIONARY_DIR": os.path.join(MEDIA_ROOT, "compression_dicts"),
+    "DICTIONARY_ID": int(os.getenv("CONTENT_COMPRESSION_DICTIONARY_ID", 0)) or None,
+}
+
+# Document ids in API responses (ImageApp1/id_codec.py): "compact" = stable 22-char tokens,
+# "fernet" = the older randomized tokens; both are accepted on input
+ID_CODEC = {
+    "MODE": os.getenv("ID_CODEC_MODE", "compact"),
+}
+
+# Bulk export of extracted data (ImageApp1/export.py, documents/export/ and manage.py export_documents)
+DOCUMENT_EXPORT = {
+    "CHUNK_SIZE": int(os.getenv("DOCUMENT_EXPORT_CHUNK_SIZE", 2000)),
+    # Default CSV/Parquet columns as {"column": "json.path"}; empty exports json_data whole
+    "CSV_COLUMNS": json.loads(os.getenv("DOCUMENT_EXPORT_CSV_COLUMNS", "{}")),
+    "PARQUET_ROW_GROUP_ROWS": int(os.getenv("DOCUMENT_EXPORT_PARQUET_ROW_GROUP_ROWS", 20000)),
+}
+
+# Search over extracted fields (ImageApp1/search.py, documents/search/)
+SEARCH_INDEX = {
+    "MAX_ROWS_PER_DOCUMENT": int(os.getenv("SEARCH_INDEX_MAX_ROWS_PER_DOCUMENT", 2000)),
+    "MAX_CONDITIONS": 10,
+}
+
+# Background extraction workers (python manage.py run_extraction_worker)
+EXTRACTION_WORKER_CONCURRENCY = int(os.getenv("EXTRACTION_WORKER_CONCURRENCY", 4))
+EXTRACTION_JOB_POLL_INTERVAL = float(os.getenv("EXTRACTION_JOB_POLL_INTERVAL", 1.0))  # seconds
+EXTRACTION_JOB_STALE_AFTER = int(os.getenv("EXTRACTION_JOB_STALE_AFTER", 15 * 60))  # seconds
+EXTRACTION_JOB_MAX_ATTEMPTS = 3
+# Jobs shed by the rate limiter or circuit breaker are retried with capped exponential backoff
+EXTRACTION_JOB_DEFER_INITIAL_DELAY = float(os.getenv("EXTRACTION_JOB_DEFER_INITIAL_DELAY", 5))  # seconds
+EXTRACTION_JOB_DEFER_MAX_DELAY = float(os.getenv("EXTRACTION_JOB_DEFER_MAX_DELAY", 5 * 60))  # seconds
+EXTRACTION_JOB_MAX_DEFERRALS = int(os.getenv("EXTRACTION_JOB_MAX_DEFERRALS", 20))
+
+# Cold-start budget checked by `python manage.py startup_benchmark`
+STARTUP_BUDGET_MS = 1500
+
+# Content-addressed upload storage (ImageApp1/blob_storage.py): one file per distinct
+# content under MEDIA_ROOT/<ROOT>, shared by every Document of that content.
+# Unreferenced blobs are removed by `python manage.py gc_blobs`.
+CONTENT_ADDRESSED_STORAGE = {
+    "ENABLED": os.getenv("CONTENT_ADDRESSED_STORAGE_ENABLED", "true").lower() == "true",
+    "ROOT": "blobs",
+    "GC_GRACE_SECONDS": int(os.getenv("BLOB_GC_GRACE_SECONDS", 24 * 60 * 60)),
+}
+
+# Pipeline stage and model call metrics (ImageApp1/metrics.py), served at /metrics in the
+# Prometheus text format. Each process writes its values to DIRECTORY every FLUSH_INTERVAL
+# seconds and /metrics merges the files of all workers, so DIRECTORY must be local to the host.
+METRICS = {
+    "ENABLED": os.getenv("METRICS_ENABLED", "true").lower() == "true",
+    "DIRECTORY": os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "imageextraction_metrics")),
+    "FLUSH_INTERVAL": float(os.getenv("METRICS_FLUSH_INTERVAL", 5)),  # seconds
+    "TOKEN": os.getenv("METRICS_TOKEN", ""),  # bearer token required by /metrics when set
+    "MAX_DOCUMENT_TYPES": 20,  # document_type label values per process, the rest are "other"
+}
+
+# Upload ingestion limits, enforced while the file is streamed to storage
+UPLOAD_MAX_BYTES = 25 * 1024 * 1024
+UPLOAD_MAX_PDF_PAGES = 100
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+BATCH_MAX_FILES = 200  # files per batch upload (multipart files + zip members)
+
+# Large PDFs are split into page-range shards that are extracted concurrently and merged
+# (ImageApp1/pdf_sharding.py, needs pypdf). MAX_SHARD_TOKENS > 0 also closes a shard once its
+# estimated size (258 tokens per page + text layer) would exceed it.
+PDF_SHARDING = {
+    "ENABLED": os.getenv("PDF_SHARDING_ENABLED", "true").lower() == "true",
+    "MIN_PAGES": 10,
+    "PAGES_PER_SHARD": 5,
+    "MAX_SHARD_TOKENS": 0,
+    "MAX_CONCURRENT_SHARDS": 8,
+}
+
+# Born-digital PDFs are sent as their compact embedded text (ImageApp1/pdf_text.py, needs pypdf);
+# pages without a reliable text layer are still sent as PDF
+PDF_TEXT_LAYER = {
+    "ENABLED": os.getenv("PDF_TEXT_LAYER_ENABLED", "true").lower() == "true",
+    "MIN_CHARS_PER_PAGE": 200,
+    "MIN_PRINTABLE_RATIO": 0.9,
+    "MAX_TOKENS_PER_PAGE": 1500,
+}
+
+# JPEG/PNG uploads are normalized before they are sent to the model (ImageApp1/image_preprocessing.py):
+# EXIF orientation, downscale to MAX_LONG_EDGE, grayscale + autocontrast, JPEG re-encode to TARGET_BYTES
+IMAGE_PREPROCESSING = {
+    "ENABLED": os.getenv("IMAGE_PREPROCESSING_ENABLED", "true").lower() == "true",
+    "MAX_LONG_EDGE": 2048,  # pixels
+    "GRAYSCALE": True,
+    "AUTOCONTRAST": True,
+    "TARGET_BYTES": 1024 * 1024,
+    "JPEG_QUALITY": 85,
+    "MIN_JPEG_QUALITY": 50,
+}
+
+# JSON -> HTML report renderer: "local" (deterministic, no tokens) or "llm" (JSON_TO_HTML_PROMPT)
+HTML_RENDERER = os.getenv("HTML_RENDERER", "local")
+
+# Content-addressed cache in front of call_gemini_api
+# BACKEND: "memory" (per process LRU), "file" (shared on the host) or "database" (shared everywhere)
+EXTRACTION_CACHE = {
+    "ENABLED": os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true",
+    "BACKEND": os.getenv("EXTRACTION_CACHE_BACKEND", "memory"),
+    "LOCATION": os.path.join(BASE_DIR, 'media', 'cache', 'extraction'),
+    "TTL": 7 * 24 * 60 * 60,  # seconds
+    "MAX_ENTRIES": 1000,
+}
+
+# Proactive limits for model calls, shared by all threads and worker processes on the host
+# through a SQLite file. 0 disables a limit; calls that cannot be admitted within MAX_WAIT are shed.
+MODEL_RATE_LIMIT = {
+    "ENABLED": os.getenv("MODEL_RATE_LIMIT_ENABLED", "true").lower() == "true",
+    "LOCATION": os.getenv(
+        "MODEL_RATE_LIMIT_PATH", os.path.join(tempfile.gettempdir(), "imageextraction_model_rate_limit.sqlite3")
+    ),
+    "REQUESTS_PER_MINUTE": int(os.getenv("MODEL_REQUESTS_PER_MINUTE", 300)),
+    "TOKENS_PER_MINUTE": int(os.getenv("MODEL_TOKENS_PER_MINUTE", 1000000)),
+    "MAX_IN_FLIGHT": int(os.getenv("MODEL_MAX_IN_FLIGHT", 32)),
+    "MAX_WAIT": 30,  # seconds
+}
+
+# Retries per error class in call_gemini_api (MAX_RETRIES stays the overall cap);
+# permanent and safety-blocked errors are never retried
+MODEL_RETRY_POLICY = {
+    "BUDGETS": {"retryable": 3, "quota": 5, "permanent": 0, "safety_blocked": 0},
+    "MAX_DELAYS": {"retryable": 10, "quota": 60},  # seconds
+}
+
+# Fail model calls fast for COOL_DOWN seconds once FAILURE_RATE of the calls in the
+# last WINDOW seconds (at least MIN_CALLS) failed; GET /IDA/health/ answers 503 meanwhile
+MODEL_CIRCUIT_BREAKER = {
+    "ENABLED": os.getenv("MODEL_CIRCUIT_BREAKER_ENABLED", "true").lower() == "true",
+    # Host-local file shared by the web and worker processes, like MODEL_RATE_LIMIT's
+    "LOCATION": os.getenv(
+        "MODEL_CIRCUIT_BREAKER_PATH", os.path.join(tempfile.gettempdir(), "imageextraction_model_circuit.sqlite3")
+    ),
+    "WINDOW": 60,
+    "MIN_CALLS": 10,
+    "FAILURE_RATE": 0.5,
+    "COOL_DOWN": 30,
+    "PROBE_TIMEOUT": 120,  # seconds before the probe of a dead process is given up
+}
+
 # import os
 # os.environ["VERTEX_SERVICE_ACCOUNT"] = "D:/IDP_AI_App/Backend/Django Projects (2)/Django Projects/ImageExtraction/keys/vertex.json"
 
@@ -21,9 +21,13 @@ from django.contrib.auth import views
 from django.conf.urls.static import static
 from django.conf import settings
 
+from ImageApp1.views import MetricsView
+
 urlpatterns = [
     path("admin/", admin.site.urls),    
     path("IDA/",include("ImageApp1.urls")),    
+    # Prometheus scrape endpoint, at the conventional path outside the API prefix
+    path("metrics", MetricsView.as_view(), name="metrics"),
     path('', include('authentication.urls')),
 ]
 